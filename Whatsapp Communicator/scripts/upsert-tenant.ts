@@ -58,6 +58,28 @@ async function main() {
   // Intentionally do not print apiKey/webhookSecret.
   // eslint-disable-next-line no-console
   console.log('Tenant upserted:', tenant);
+
+  await reloadRunningServer();
+}
+
+// The server keeps tenants in memory; ask it to reload now instead of at its next refresh.
+async function reloadRunningServer() {
+  const baseUrl = process.env.COMMUNICATOR_URL || `http://localhost:${process.env.PORT || 3001}`;
+  const adminToken = process.env.ADMIN_TOKEN;
+  if (!adminToken) return;
+
+  try {
+    const res = await fetch(`${baseUrl}/api/admin/tenants/reload`, {
+      method: 'POST',
+      headers: { 'x-admin-token': adminToken },
+      signal: AbortSignal.timeout(5000),
+    });
+    // eslint-disable-next-line no-console
+    console.log(res.ok ? 'Server tenant registry reloaded' : `Server reload failed: ${res.status}`);
+  } catch {
+    // eslint-disable-next-line no-console
+    console.log('Server not reachable; it picks up the change at its next refresh');
+  }
 }
 
 await main()
@@ -4,6 +4,7 @@ const envSchema = z.object({
   PORT: z.coerce.number().int().positive().default(3001),
   ADMIN_TOKEN: z.string().min(8),
   SAK_BASE_URL: z.string().url().default('http://13.201.102.10:5000/api/v1'),
+  TENANT_REFRESH_MS: z.coerce.number().int().min(5000).default(60_000),
 });
 
 export type AppConfig = z.infer<typeof envSchema>;
@@ -2,6 +2,7 @@ import { Router } from 'express';
 import { z } from 'zod';
 import type { SakApiKeyMode } from '@prisma/client';
 import type { TenantRepository } from '../whatsapp/TenantRepository.js';
+import type { SessionRegistry } from '../whatsapp/SessionRegistry.js';
 
 function requireAdminToken(expected: string) {
   return (req: any, res: any, next: any) => {
@@ -25,6 +26,7 @@ const tenantCreateSchema = z.object({
 export function buildAdminRoutes(params: {
   adminToken: string;
   tenants: TenantRepository;
+  sessions: SessionRegistry;
 }) {
   const router = Router();
 
@@ -61,6 +63,7 @@ export function buildAdminRoutes(params: {
       webhookSecret: parsed.data.webhookSecret,
       phoneNumber: parsed.data.phoneNumber,
     });
+    params.sessions.set(tenant);
 
     res.status(201).json({
       tenant: {
@@ -77,14 +80,22 @@ export function buildAdminRoutes(params: {
   router.post('/tenants/:sessionId/disable', async (req, res) => {
     const sessionId = req.params.sessionId;
     const updated = await params.tenants.setActive(sessionId, false);
+    params.sessions.set(updated);
     res.json({ sessionId: updated.sessionId, isActive: updated.isActive });
   });
 
   router.post('/tenants/:sessionId/enable', async (req, res) => {
     const sessionId = req.params.sessionId;
     const updated = await params.tenants.setActive(sessionId, true);
+    params.sessions.set(updated);
     res.json({ sessionId: updated.sessionId, isActive: updated.isActive });
   });
 
+  // Reload the in-memory session registry (e.g. after scripts/upsert-tenant.ts).
+  router.post('/tenants/reload', async (_req, res) => {
+    await params.sessions.reload();
+    res.json({ ok: true, sessions: params.sessions.size() });
+  });
+
   return router;
 }
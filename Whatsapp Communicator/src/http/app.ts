@@ -25,6 +25,7 @@ export function buildApp(params: {
   app.use('/api/admin', buildAdminRoutes({
     adminToken: params.config.ADMIN_TOKEN,
     tenants: params.communicator.getTenantRepository(),
+    sessions: params.communicator.getSessionRegistry(),
   }));
 
   return app;
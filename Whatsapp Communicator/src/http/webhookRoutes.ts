@@ -5,14 +5,20 @@ export function buildWebhookRoutes(communicator: WhatsAppCommunicator) {
   const router = Router();
 
   router.post('/sak', async (req, res) => {
-    const result = await communicator.handleIncomingWebhook({
-      headers: req.headers as any,
-      getHeader: (name: string) => req.get(name) ?? undefined,
-      rawBody: req.rawBody,
-      body: req.body,
-    });
+    try {
+      const result = await communicator.handleIncomingWebhook({
+        headers: req.headers as any,
+        getHeader: (name: string) => req.get(name) ?? undefined,
+        rawBody: req.rawBody,
+        body: req.body,
+      });
 
-    res.status(result.status).send(result.body);
+      res.status(result.status).send(result.body);
+    } catch (err) {
+      // eslint-disable-next-line no-console
+      console.error('Webhook handling failed:', err instanceof Error ? err.message : err);
+      res.status(500).send('webhook handling failed');
+    }
   });
 
   return router;
@@ -9,8 +9,11 @@ const config = loadConfig();
 const communicator = new WhatsAppCommunicator({
   prisma,
   sakBaseUrl: config.SAK_BASE_URL,
+  tenantRefreshMs: config.TENANT_REFRESH_MS,
 });
 
+await communicator.start();
+
 const app = buildApp({ config, communicator });
 
 app.listen(config.PORT, () => {
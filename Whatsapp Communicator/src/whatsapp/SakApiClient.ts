@@ -4,8 +4,48 @@ export type SakAuth =
   | { mode: 'session'; apiKey: string }
   | { mode: 'user'; apiKey: string; sessionId: string };
 
+export type SakClientOptions = {
+  timeoutMs?: number;
+  maxAttempts?: number;
+  backoffBaseMs?: number;
+  // Per-session send pacing (token bucket), to stay under WhatsApp throughput caps.
+  sendsPerSecond?: number;
+  burst?: number;
+};
+
+type Bucket = { tokens: number; updatedAt: number };
+
+class SakSendError extends Error {
+  constructor(
+    message: string,
+    readonly retryable: boolean,
+    // From the gateway's Retry-After header (429/503).
+    readonly retryAfterMs?: number
+  ) {
+    super(message);
+  }
+}
+
+// Node's global fetch keeps connections to the SAK host alive between requests, so the
+// client only adds a deadline, retries for transient failures and per-session pacing.
 export class SakApiClient {
-  constructor(private readonly baseUrl: string) {}
+  private readonly timeoutMs: number;
+  private readonly maxAttempts: number;
+  private readonly backoffBaseMs: number;
+  private readonly sendsPerSecond: number;
+  private readonly burst: number;
+  private readonly buckets = new Map<string, Bucket>();
+
+  constructor(
+    private readonly baseUrl: string,
+    options: SakClientOptions = {}
+  ) {
+    this.timeoutMs = options.timeoutMs ?? 15_000;
+    this.maxAttempts = Math.max(1, options.maxAttempts ?? 3);
+    this.backoffBaseMs = options.backoffBaseMs ?? 1000;
+    this.sendsPerSecond = options.sendsPerSecond ?? 1;
+    this.burst = Math.max(1, options.burst ?? 5);
+  }
 
   async sendText(auth: SakAuth, payload: SendTextRequest): Promise<void> {
     const headers: Record<string, string> = {
@@ -17,15 +57,73 @@ export class SakApiClient {
       headers['x-session-id'] = auth.sessionId;
     }
 
-    const res = await fetch(`${this.baseUrl}/messages/send`, {
-      method: 'POST',
-      headers,
-      body: JSON.stringify(payload),
-    });
+    const bucketKey = auth.mode === 'user' ? auth.sessionId : auth.apiKey;
+
+    for (let attempt = 1; ; attempt++) {
+      await this.acquire(bucketKey);
+      try {
+        await this.post('/messages/send', headers, payload);
+        return;
+      } catch (err) {
+        const retryable = err instanceof SakSendError ? err.retryable : true;
+        if (!retryable || attempt >= this.maxAttempts) throw err;
+        // Exponential backoff with jitter on the upper half; Retry-After is the floor.
+        const exp = this.backoffBaseMs * 2 ** (attempt - 1);
+        const retryAfterMs = err instanceof SakSendError ? err.retryAfterMs ?? 0 : 0;
+        await sleep(Math.max(exp / 2 + Math.random() * (exp / 2), retryAfterMs));
+      }
+    }
+  }
+
+  private async post(path: string, headers: Record<string, string>, body: unknown): Promise<void> {
+    let res: Response;
+    try {
+      res = await fetch(`${this.baseUrl}${path}`, {
+        method: 'POST',
+        headers,
+        body: JSON.stringify(body),
+        signal: AbortSignal.timeout(this.timeoutMs),
+      });
+    } catch (err) {
+      throw new SakSendError(`SAK send failed: ${err instanceof Error ? err.message : String(err)}`, true);
+    }
 
     if (!res.ok) {
       const text = await res.text().catch(() => '');
-      throw new Error(`SAK send failed: ${res.status} ${res.statusText} ${text}`.trim());
+      throw new SakSendError(
+        `SAK send failed: ${res.status} ${res.statusText} ${text}`.trim(),
+        res.status === 429 || res.status >= 500,
+        parseRetryAfterMs(res.headers.get('retry-after'))
+      );
+    }
+  }
+
+  // Wait until the session's bucket has a token, then take it.
+  private async acquire(key: string): Promise<void> {
+    for (;;) {
+      const now = Date.now();
+      const bucket = this.buckets.get(key) ?? { tokens: this.burst, updatedAt: now };
+      bucket.tokens = Math.min(this.burst, bucket.tokens + ((now - bucket.updatedAt) / 1000) * this.sendsPerSecond);
+      bucket.updatedAt = now;
+      this.buckets.set(key, bucket);
+      if (bucket.tokens >= 1) {
+        bucket.tokens -= 1;
+        return;
+      }
+      await sleep(((1 - bucket.tokens) / this.sendsPerSecond) * 1000);
     }
   }
 }
+
+// Retry-After is either a delay in seconds or an HTTP date.
+function parseRetryAfterMs(value: string | null): number | undefined {
+  const raw = value?.trim();
+  if (!raw) return undefined;
+  if (/^\d+(\.\d+)?$/.test(raw)) return Math.round(Number(raw) * 1000);
+  const at = Date.parse(raw);
+  return Number.isFinite(at) ? Math.max(0, at - Date.now()) : undefined;
+}
+
+function sleep(ms: number) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
@@ -0,0 +1,77 @@
+import crypto from 'crypto';
+import type { KeyObject } from 'crypto';
+import type { Tenant } from '@prisma/client';
+import type { TenantRepository } from './TenantRepository.js';
+
+export type SessionEntry = {
+  tenant: Tenant;
+  // Tenant webhook secret, prepared once for HMAC checks.
+  hmacKey: KeyObject;
+};
+
+/**
+ * In-memory sessionId -> tenant map.
+ *
+ * Loaded at startup, updated by the admin routes as they change tenants and reloaded
+ * every `refreshMs` (or via POST /api/admin/tenants/reload) to pick up changes made
+ * by scripts. Webhook handling reads only from memory.
+ */
+export class SessionRegistry {
+  private sessions = new Map<string, SessionEntry>();
+  private loading: Promise<void> | null = null;
+  private timer: NodeJS.Timeout | null = null;
+
+  constructor(
+    private readonly tenants: TenantRepository,
+    private readonly refreshMs = 60_000
+  ) {}
+
+  async start(): Promise<void> {
+    await this.reload();
+    if (this.timer) return;
+    this.timer = setInterval(() => {
+      this.reload().catch((err) => {
+        // eslint-disable-next-line no-console
+        console.error('Tenant registry reload failed:', err instanceof Error ? err.message : err);
+      });
+    }, this.refreshMs);
+    this.timer.unref();
+  }
+
+  stop(): void {
+    if (this.timer) clearInterval(this.timer);
+    this.timer = null;
+  }
+
+  async reload(): Promise<void> {
+    // A reload requested while one is running starts after it, so it sees the latest rows.
+    while (this.loading) await this.loading;
+    this.loading = this.tenants
+      .list()
+      .then((tenants) => {
+        const next = new Map<string, SessionEntry>();
+        for (const tenant of tenants) next.set(tenant.sessionId, SessionRegistry.entry(tenant));
+        this.sessions = next;
+      })
+      .finally(() => {
+        this.loading = null;
+      });
+    await this.loading;
+  }
+
+  get(sessionId: string): SessionEntry | undefined {
+    return this.sessions.get(sessionId);
+  }
+
+  set(tenant: Tenant): void {
+    this.sessions.set(tenant.sessionId, SessionRegistry.entry(tenant));
+  }
+
+  size(): number {
+    return this.sessions.size;
+  }
+
+  private static entry(tenant: Tenant): SessionEntry {
+    return { tenant, hmacKey: crypto.createSecretKey(Buffer.from(tenant.webhookSecret, 'utf8')) };
+  }
+}
@@ -1,4 +1,5 @@
 import crypto from 'crypto';
+import type { KeyObject } from 'crypto';
 import type { Request } from 'express';
 
 function safeEqualHex(aHex: string, bHex: string): boolean {
@@ -9,9 +10,17 @@ function safeEqualHex(aHex: string, bHex: string): boolean {
 }
 
 export class WebhookVerifier {
+  // `signature` is the X-Webhook-Signature header value (hex, optionally "sha256=" prefixed).
+  verify(raw: Buffer, signature: string, secret: string | KeyObject): boolean {
+    const provided = signature.replace(/^sha256=/i, '').trim();
+    if (!provided) return false;
+    const expected = crypto.createHmac('sha256', secret).update(raw).digest('hex');
+    return safeEqualHex(provided, expected);
+  }
+
   verifyOrThrow(params: {
     req: Request;
-    secret: string;
+    secret: string | KeyObject;
   }): void {
     const sigHeader = params.req.get('X-Webhook-Signature') || '';
     const provided = sigHeader.replace(/^sha256=/i, '').trim();
@@ -1,21 +1,29 @@
-import type { PrismaClient } from '@prisma/client';
-import { SakApiClient } from './SakApiClient.js';
+import type { PrismaClient, Tenant } from '@prisma/client';
+import { SakApiClient, type SakAuth } from './SakApiClient.js';
 import { TenantRepository } from './TenantRepository.js';
 import { WebhookVerifier } from './WebhookVerifier.js';
 import { MessageRouter } from './MessageRouter.js';
+import { SessionRegistry } from './SessionRegistry.js';
 import type { SakWebhookEvent } from './types.js';
 
 export class WhatsAppCommunicator {
   private readonly tenants: TenantRepository;
+  private readonly sessions: SessionRegistry;
   private readonly sak: SakApiClient;
   private readonly verifier = new WebhookVerifier();
   private readonly router = new MessageRouter();
 
-  constructor(params: { prisma: PrismaClient; sakBaseUrl: string }) {
+  constructor(params: { prisma: PrismaClient; sakBaseUrl: string; tenantRefreshMs?: number }) {
     this.tenants = new TenantRepository(params.prisma);
+    this.sessions = new SessionRegistry(this.tenants, params.tenantRefreshMs);
     this.sak = new SakApiClient(params.sakBaseUrl);
   }
 
+  // Load the session registry; webhooks are resolved from memory afterwards.
+  start(): Promise<void> {
+    return this.sessions.start();
+  }
+
   async handleIncomingWebhook(req: {
     headers: Record<string, string | string[] | undefined>;
     getHeader: (name: string) => string | undefined;
@@ -28,26 +36,20 @@ export class WhatsAppCommunicator {
       return { status: 200, body: { ok: true } };
     }
 
-    const tenant = await this.tenants.getBySessionId(payload.sessionId);
-    if (!tenant || !tenant.isActive) {
+    const session = this.sessions.get(payload.sessionId);
+    if (!session || !session.tenant.isActive) {
       return { status: 200, body: { ok: true } };
     }
+    const { tenant } = session;
 
-    // Verify signature using the tenant's webhook secret
-    // This is implemented in the Express route where we have the Request object;
-    // here we do a minimal verification using passed in header getter.
+    // Verify signature using the tenant's webhook secret (prepared HMAC key).
     const sigHeader = req.getHeader('x-webhook-signature') ?? req.getHeader('X-Webhook-Signature') ?? '';
-    const provided = sigHeader.replace(/^sha256=/i, '').trim();
-    if (!provided) {
+    if (!sigHeader.trim()) {
       return { status: 401, body: 'missing signature' };
     }
 
     const raw = req.rawBody ?? Buffer.from(JSON.stringify(req.body ?? {}));
-    const crypto = await import('crypto');
-    const expected = crypto.createHmac('sha256', tenant.webhookSecret).update(raw).digest('hex');
-    const a = Buffer.from(provided, 'hex');
-    const b = Buffer.from(expected, 'hex');
-    if (a.length !== b.length || !crypto.timingSafeEqual(a, b)) {
+    if (!this.verifier.verify(raw, sigHeader, session.hmacKey)) {
       return { status: 401, body: 'invalid signature' };
     }
 
@@ -62,22 +64,36 @@ export class WhatsAppCommunicator {
       return { status: 200, body: { ok: true } };
     }
 
-    if (tenant.apiKeyMode === 'session') {
-      await this.sak.sendText({ mode: 'session', apiKey: tenant.apiKey }, { to, text: decision.replyText });
-    } else {
-      await this.sak.sendText(
-        { mode: 'user', apiKey: tenant.apiKey, sessionId: tenant.sessionId },
-        { to, text: decision.replyText }
-      );
-    }
+    // Acknowledge first: a send can take tens of seconds with retries and pacing, and a
+    // slow ack makes the SAK gateway redeliver the webhook (a duplicate reply).
+    this.sendReply(tenant, to, decision.replyText);
 
     return { status: 200, body: { ok: true } };
   }
 
+  private sendReply(tenant: Tenant, to: string, text: string) {
+    const auth: SakAuth =
+      tenant.apiKeyMode === 'session'
+        ? { mode: 'session', apiKey: tenant.apiKey }
+        : { mode: 'user', apiKey: tenant.apiKey, sessionId: tenant.sessionId };
+
+    this.sak.sendText(auth, { to, text }).catch((err) => {
+      // eslint-disable-next-line no-console
+      console.error(
+        `Reply to ${to} on session ${tenant.sessionId} failed:`,
+        err instanceof Error ? err.message : err
+      );
+    });
+  }
+
   getTenantRepository(): TenantRepository {
     return this.tenants;
   }
 
+  getSessionRegistry(): SessionRegistry {
+    return this.sessions;
+  }
+
   getWebhookVerifier(): WebhookVerifier {
     return this.verifier;
   }
@@ -0,0 +1,35 @@
+-- CreateTable
+CREATE TABLE "IngestJob" (
+    "id" TEXT NOT NULL,
+    "seq" SERIAL NOT NULL,
+    "tenantId" TEXT NOT NULL,
+    "source" TEXT NOT NULL,
+    "orderingKey" TEXT NOT NULL,
+    "dedupeKey" TEXT,
+    "payload" JSONB NOT NULL,
+    "status" TEXT NOT NULL DEFAULT 'PENDING',
+    "attempts" INTEGER NOT NULL DEFAULT 0,
+    "maxAttempts" INTEGER NOT NULL DEFAULT 5,
+    "runAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "lockedAt" TIMESTAMP(3),
+    "lockedBy" TEXT,
+    "lastError" TEXT,
+    "result" JSONB,
+    "completedAt" TIMESTAMP(3),
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "IngestJob_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE UNIQUE INDEX "IngestJob_dedupeKey_key" ON "IngestJob"("dedupeKey");
+
+-- CreateIndex
+CREATE INDEX "IngestJob_status_runAt_idx" ON "IngestJob"("status", "runAt");
+
+-- CreateIndex
+CREATE INDEX "IngestJob_orderingKey_seq_idx" ON "IngestJob"("orderingKey", "seq");
+
+-- CreateIndex
+CREATE INDEX "IngestJob_tenantId_status_idx" ON "IngestJob"("tenantId", "status");
@@ -0,0 +1,33 @@
+-- CreateTable
+CREATE TABLE "LeadScoreState" (
+    "leadId" TEXT NOT NULL,
+    "tenantId" TEXT NOT NULL,
+    "messages" INTEGER NOT NULL DEFAULT 0,
+    "notes" INTEGER NOT NULL DEFAULT 0,
+    "calls" INTEGER NOT NULL DEFAULT 0,
+    "completedTasks" INTEGER NOT NULL DEFAULT 0,
+    "successEvents" INTEGER NOT NULL DEFAULT 0,
+    "answeredCalls" INTEGER NOT NULL DEFAULT 0,
+    "missedCalls" INTEGER NOT NULL DEFAULT 0,
+    "responseCount" INTEGER NOT NULL DEFAULT 0,
+    "responseMsSum" DOUBLE PRECISION NOT NULL DEFAULT 0,
+    "pendingInboundCount" INTEGER NOT NULL DEFAULT 0,
+    "pendingInboundMsSum" DOUBLE PRECISION NOT NULL DEFAULT 0,
+    "activityBuckets" JSONB NOT NULL DEFAULT '{}',
+    "lastActivityAt" TIMESTAMP(3),
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "LeadScoreState_pkey" PRIMARY KEY ("leadId")
+);
+
+-- CreateIndex
+CREATE INDEX "LeadScoreState_tenantId_idx" ON "LeadScoreState"("tenantId");
+
+-- CreateIndex
+CREATE INDEX "LeadScoreState_lastActivityAt_idx" ON "LeadScoreState"("lastActivityAt");
+
+-- CreateIndex
+CREATE INDEX "LeadEvent_leadId_createdAt_idx" ON "LeadEvent"("leadId", "createdAt");
+
+-- AddForeignKey
+ALTER TABLE "LeadScoreState" ADD CONSTRAINT "LeadScoreState_leadId_fkey" FOREIGN KEY ("leadId") REFERENCES "Lead"("id") ON DELETE CASCADE ON UPDATE CASCADE;
@@ -0,0 +1,26 @@
+-- CreateTable
+CREATE TABLE "DailyRollup" (
+    "tenantId" TEXT NOT NULL,
+    "day" DATE NOT NULL,
+    "channel" "LeadChannel" NOT NULL,
+    "newLeads" INTEGER NOT NULL DEFAULT 0,
+    "messagesIn" INTEGER NOT NULL DEFAULT 0,
+    "messagesOut" INTEGER NOT NULL DEFAULT 0,
+    "wonLeads" INTEGER NOT NULL DEFAULT 0,
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "DailyRollup_pkey" PRIMARY KEY ("tenantId","day","channel")
+);
+
+-- CreateTable
+CREATE TABLE "SuccessDailyRollup" (
+    "tenantId" TEXT NOT NULL,
+    "day" DATE NOT NULL,
+    "type" "SuccessEventType" NOT NULL,
+    "salesmanId" TEXT NOT NULL DEFAULT '',
+    "count" INTEGER NOT NULL DEFAULT 0,
+    "weight" DOUBLE PRECISION NOT NULL DEFAULT 0,
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "SuccessDailyRollup_pkey" PRIMARY KEY ("tenantId","day","type","salesmanId")
+);
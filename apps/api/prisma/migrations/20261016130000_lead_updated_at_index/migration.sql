@@ -0,0 +1,2 @@
+-- CreateIndex
+CREATE INDEX "Lead_tenantId_updatedAt_id_idx" ON "Lead"("tenantId", "updatedAt", "id");
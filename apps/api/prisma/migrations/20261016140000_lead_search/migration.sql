@@ -0,0 +1,29 @@
+-- Trigram indexes for substring search (GET /leads?search=)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- AlterTable
+ALTER TABLE "Lead" ADD COLUMN "phoneDigits" TEXT;
+
+-- Keep phoneDigits in sync with phone on every write path
+CREATE OR REPLACE FUNCTION "lead_phone_digits"() RETURNS trigger AS $$
+BEGIN
+  NEW."phoneDigits" := NULLIF(regexp_replace(COALESCE(NEW."phone", ''), '\D', '', 'g'), '');
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "Lead_phoneDigits_trigger"
+BEFORE INSERT OR UPDATE OF "phone" ON "Lead"
+FOR EACH ROW EXECUTE FUNCTION "lead_phone_digits"();
+
+-- Backfill
+UPDATE "Lead" SET "phoneDigits" = NULLIF(regexp_replace(COALESCE("phone", ''), '\D', '', 'g'), '') WHERE "phone" IS NOT NULL;
+
+-- CreateIndex
+CREATE INDEX "Lead_fullName_idx" ON "Lead" USING GIN ("fullName" gin_trgm_ops);
+
+-- CreateIndex
+CREATE INDEX "Lead_email_idx" ON "Lead" USING GIN ("email" gin_trgm_ops);
+
+-- CreateIndex
+CREATE INDEX "Lead_phoneDigits_idx" ON "Lead" USING GIN ("phoneDigits" gin_trgm_ops);
@@ -0,0 +1,49 @@
+-- AlterTable
+ALTER TABLE "Client" ADD COLUMN "emailKey" TEXT,
+ADD COLUMN "phoneKey" TEXT;
+
+-- AlterTable
+ALTER TABLE "Lead" ADD COLUMN "emailKey" TEXT,
+ADD COLUMN "phoneKey" TEXT;
+
+-- Canonical contact keys. Must stay in sync with phoneKey()/emailKey() in
+-- src/services/contactIdentity.ts.
+CREATE OR REPLACE FUNCTION "contact_phone_key"(raw TEXT) RETURNS TEXT AS $$
+  SELECT CASE WHEN length(d) >= 7 THEN '+' || d END
+  FROM (SELECT regexp_replace(regexp_replace(COALESCE(raw, ''), '[^0-9]', '', 'g'), '^00', '') AS d) s
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION "contact_email_key"(raw TEXT) RETURNS TEXT AS $$
+  SELECT CASE WHEN position('@' IN e) > 1 THEN e END
+  FROM (SELECT lower(btrim(COALESCE(raw, ''))) AS e) s
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION "contact_keys_trigger"() RETURNS trigger AS $$
+BEGIN
+  NEW."phoneKey" := "contact_phone_key"(NEW."phone");
+  NEW."emailKey" := "contact_email_key"(NEW."email");
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "Client_contactKeys_trigger"
+BEFORE INSERT OR UPDATE OF "phone", "email" ON "Client"
+FOR EACH ROW EXECUTE FUNCTION "contact_keys_trigger"();
+
+CREATE TRIGGER "Lead_contactKeys_trigger"
+BEFORE INSERT OR UPDATE OF "phone", "email" ON "Lead"
+FOR EACH ROW EXECUTE FUNCTION "contact_keys_trigger"();
+
+-- Existing rows are backfilled in batches by `npm run contacts:backfill`.
+
+-- CreateIndex
+CREATE INDEX "Client_tenantId_phoneKey_idx" ON "Client"("tenantId", "phoneKey");
+
+-- CreateIndex
+CREATE INDEX "Client_tenantId_emailKey_idx" ON "Client"("tenantId", "emailKey");
+
+-- CreateIndex
+CREATE INDEX "Lead_tenantId_phoneKey_idx" ON "Lead"("tenantId", "phoneKey");
+
+-- CreateIndex
+CREATE INDEX "Lead_tenantId_emailKey_idx" ON "Lead"("tenantId", "emailKey");
@@ -0,0 +1,5 @@
+-- CreateIndex
+CREATE INDEX "Task_leadId_createdAt_idx" ON "Task"("leadId", "createdAt");
+
+-- CreateIndex
+CREATE INDEX "TriageQueueItem_leadId_status_idx" ON "TriageQueueItem"("leadId", "status");
@@ -0,0 +1,11 @@
+-- CreateIndex
+CREATE INDEX "LeadEvent_tenantId_createdAt_id_idx" ON "LeadEvent"("tenantId", "createdAt", "id");
+
+-- CreateIndex
+CREATE INDEX "Note_tenantId_createdAt_id_idx" ON "Note"("tenantId", "createdAt", "id");
+
+-- CreateIndex
+CREATE INDEX "Call_tenantId_createdAt_id_idx" ON "Call"("tenantId", "createdAt", "id");
+
+-- CreateIndex
+CREATE INDEX "Task_tenantId_createdAt_id_idx" ON "Task"("tenantId", "createdAt", "id");
@@ -0,0 +1,13 @@
+-- AlterTable
+ALTER TABLE "SlaViolation" ADD COLUMN "escalateAt" TIMESTAMP(3);
+
+-- Backfill open violations whose rule escalates
+UPDATE "SlaViolation" v
+SET "escalateAt" = v."dueAt" + r."escalationTimeMinutes" * INTERVAL '1 minute'
+FROM "SlaRule" r
+WHERE r."id" = v."slaRuleId"
+  AND r."escalationTimeMinutes" IS NOT NULL
+  AND v."status" IN ('PENDING', 'BREACHED');
+
+-- CreateIndex
+CREATE INDEX "SlaViolation_status_escalateAt_idx" ON "SlaViolation"("status", "escalateAt");
@@ -0,0 +1,10 @@
+-- AlterTable
+ALTER TABLE "Message" ADD COLUMN     "status" TEXT,
+ADD COLUMN     "providerMessageId" TEXT,
+ADD COLUMN     "attempts" INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN     "nextAttemptAt" TIMESTAMP(3),
+ADD COLUMN     "lastError" TEXT,
+ADD COLUMN     "sentAt" TIMESTAMP(3);
+
+-- CreateIndex
+CREATE INDEX "Message_status_nextAttemptAt_idx" ON "Message"("status", "nextAttemptAt");
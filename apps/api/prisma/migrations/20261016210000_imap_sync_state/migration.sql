@@ -0,0 +1,16 @@
+-- CreateTable
+CREATE TABLE "ImapSyncState" (
+    "id" TEXT NOT NULL,
+    "tenantId" TEXT NOT NULL,
+    "account" TEXT NOT NULL,
+    "mailbox" TEXT NOT NULL,
+    "uidValidity" BIGINT NOT NULL,
+    "lastUid" BIGINT NOT NULL,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "ImapSyncState_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE UNIQUE INDEX "ImapSyncState_account_mailbox_key" ON "ImapSyncState"("account", "mailbox");
@@ -0,0 +1,28 @@
+-- AlterTable
+ALTER TABLE "Lead" ADD COLUMN "wonAt" TIMESTAMP(3);
+
+-- Existing WON leads: the last status change to WON, else the last update.
+UPDATE "Lead" l SET "wonAt" = COALESCE(
+  (SELECT max(e."createdAt") FROM "LeadEvent" e
+   WHERE e."tenantId" = l."tenantId" AND e."leadId" = l."id"
+     AND e."type" IN ('STATUS_CHANGED', 'BULK_STATUS_UPDATE')
+     AND e."payload"->>'status' = 'WON'),
+  l."updatedAt")
+WHERE l."status" = 'WON';
+
+-- When a lead entered WON, for daily rollups (src/services/rollups.ts). Maintained here
+-- so every write path (single, bulk, import) sets it; null while not WON.
+CREATE OR REPLACE FUNCTION "lead_won_at_trigger"() RETURNS trigger AS $$
+BEGIN
+  IF NEW."status" <> 'WON' THEN
+    NEW."wonAt" := NULL;
+  ELSIF TG_OP = 'INSERT' OR OLD."status" IS DISTINCT FROM 'WON' THEN
+    NEW."wonAt" := COALESCE(NEW."wonAt", NOW());
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "Lead_wonAt_trigger"
+BEFORE INSERT OR UPDATE OF "status" ON "Lead"
+FOR EACH ROW EXECUTE FUNCTION "lead_won_at_trigger"();
@@ -0,0 +1,79 @@
+// Per-tenant in-flight limiter for provider calls. Each tenant gets a fixed number
+// of concurrent LLM requests; further calls wait in a bounded FIFO queue, so one
+// noisy tenant can't consume the whole provider rate limit.
+
+const MAX_IN_FLIGHT = Math.max(1, Number(process.env.AI_TENANT_MAX_IN_FLIGHT ?? 4))
+const MAX_QUEUED = Math.max(0, Number(process.env.AI_TENANT_MAX_QUEUED ?? 100))
+const QUEUE_TIMEOUT_MS = Math.max(1000, Number(process.env.AI_TENANT_QUEUE_TIMEOUT_MS ?? 30_000))
+
+type Waiter = { resolve: () => void; reject: (err: Error) => void; timer: NodeJS.Timeout }
+
+type TenantSlots = { active: number; queue: Waiter[]; rejected: number }
+
+const tenants = new Map<string, TenantSlots>()
+
+function slotsFor(tenantId: string): TenantSlots {
+  let slots = tenants.get(tenantId)
+  if (!slots) {
+    slots = { active: 0, queue: [], rejected: 0 }
+    tenants.set(tenantId, slots)
+  }
+  return slots
+}
+
+function acquire(tenantId: string): Promise<void> {
+  const slots = slotsFor(tenantId)
+  if (slots.active < MAX_IN_FLIGHT) {
+    slots.active++
+    return Promise.resolve()
+  }
+
+  if (slots.queue.length >= MAX_QUEUED) {
+    slots.rejected++
+    return Promise.reject(new Error('AI concurrency limit reached for tenant'))
+  }
+
+  return new Promise((resolve, reject) => {
+    const waiter: Waiter = {
+      resolve,
+      reject,
+      timer: setTimeout(() => {
+        slots.queue = slots.queue.filter((w) => w !== waiter)
+        slots.rejected++
+        reject(new Error('Timed out waiting for an AI slot'))
+      }, QUEUE_TIMEOUT_MS)
+    }
+    slots.queue.push(waiter)
+  })
+}
+
+function release(tenantId: string) {
+  const slots = slotsFor(tenantId)
+  const next = slots.queue.shift()
+  if (next) {
+    // Hand the slot straight to the next waiter; `active` stays the same.
+    clearTimeout(next.timer)
+    next.resolve()
+    return
+  }
+  slots.active = Math.max(0, slots.active - 1)
+}
+
+export async function withTenantAiSlot<T>(tenantId: string | undefined, fn: () => Promise<T>): Promise<T> {
+  const key = tenantId ?? '_default'
+  await acquire(key)
+  try {
+    return await fn()
+  } finally {
+    release(key)
+  }
+}
+
+export function getAiConcurrencyStats() {
+  return Array.from(tenants.entries()).map(([tenantId, s]) => ({
+    tenantId,
+    active: s.active,
+    queued: s.queue.length,
+    rejected: s.rejected
+  }))
+}
@@ -2,9 +2,13 @@ import type { LeadChannel } from '@prisma/client'
 import type { AiProvider, ReplyDraft, TriageResult } from './types.js'
 import { createOpenAiTriageAndReply, type OpenAiProviderConfig } from './providers/openai.js'
 import { createGeminiTriageAndReply, type GeminiProviderConfig } from './providers/gemini.js'
+import { buildResponseCacheKey, cachedTriageAndDraft, type TriageAndDraft } from './responseCache.js'
+import { withTenantAiSlot } from './concurrency.js'
 
 export type AiGatewayConfig = {
   provider: AiProvider
+  // Scopes the response cache and the in-flight limiter.
+  tenantId?: string
   openai?: OpenAiProviderConfig
   gemini?: GeminiProviderConfig
 }
@@ -27,10 +31,16 @@ export type ReplyInput = {
 export interface AiGateway {
   triage(input: TriageInput): Promise<TriageResult>
   draftReply(input: ReplyInput): Promise<ReplyDraft>
+  // Both results from a single provider call (cached by normalized message text).
+  triageAndDraft(input: ReplyInput): Promise<TriageAndDraft>
 }
 
 function createMockGateway(): AiGateway {
-  return {
+  const gateway: AiGateway = {
+    async triageAndDraft(input) {
+      const [triage, draft] = await Promise.all([gateway.triage(input), gateway.draftReply(input)])
+      return { triage, draft }
+    },
     async triage(input) {
       const text = input.customerMessage.toLowerCase()
       const isArabic = /[\u0600-\u06FF]/.test(input.customerMessage)
@@ -78,6 +88,7 @@ function createMockGateway(): AiGateway {
       }
     }
   }
+  return gateway
 }
 
 function createOpenAiGateway(config: AiGatewayConfig): AiGateway {
@@ -85,13 +96,41 @@ function createOpenAiGateway(config: AiGatewayConfig): AiGateway {
   const openai = createOpenAiTriageAndReply(config.openai ?? { apiKey: process.env.OPENAI_API_KEY })
 
   return {
+    async triageAndDraft(input) {
+      const cacheKey = buildResponseCacheKey({
+        scope: `${config.tenantId ?? '_default'}:OPENAI:${openai.model}`,
+        channel: input.channel,
+        pricingAllowed: input.pricingAllowed,
+        customerMessage: input.customerMessage
+      })
+
+      try {
+        return await cachedTriageAndDraft(cacheKey, () =>
+          withTenantAiSlot(config.tenantId, () =>
+            openai.triageAndDraft({
+              leadId: input.leadId,
+              channel: input.channel,
+              customerMessage: input.customerMessage,
+              pricingAllowed: input.pricingAllowed,
+              knowledgeSnippets: input.knowledgeSnippets
+            })
+          )
+        )
+      } catch (err) {
+        // eslint-disable-next-line no-console
+        console.warn('OPENAI triageAndDraft failed; falling back to MOCK:', err instanceof Error ? err.message : err)
+        return mock.triageAndDraft(input)
+      }
+    },
     async triage(input) {
       try {
-        return await openai.triage({
-          leadId: input.leadId,
-          channel: input.channel,
-          customerMessage: input.customerMessage
-        })
+        return await withTenantAiSlot(config.tenantId, () =>
+          openai.triage({
+            leadId: input.leadId,
+            channel: input.channel,
+            customerMessage: input.customerMessage
+          })
+        )
       } catch (err) {
         // eslint-disable-next-line no-console
         console.warn('OPENAI triage failed; falling back to MOCK:', err instanceof Error ? err.message : err)
@@ -100,13 +139,15 @@ function createOpenAiGateway(config: AiGatewayConfig): AiGateway {
     },
     async draftReply(input) {
       try {
-        return await openai.draftReply({
-          leadId: input.leadId,
-          channel: input.channel,
-          customerMessage: input.customerMessage,
-          pricingAllowed: input.pricingAllowed,
-          knowledgeSnippets: input.knowledgeSnippets
-        })
+        return await withTenantAiSlot(config.tenantId, () =>
+          openai.draftReply({
+            leadId: input.leadId,
+            channel: input.channel,
+            customerMessage: input.customerMessage,
+            pricingAllowed: input.pricingAllowed,
+            knowledgeSnippets: input.knowledgeSnippets
+          })
+        )
       } catch (err) {
         // eslint-disable-next-line no-console
         console.warn('OPENAI draftReply failed; falling back to MOCK:', err instanceof Error ? err.message : err)
@@ -121,13 +162,41 @@ function createGeminiGateway(config: AiGatewayConfig): AiGateway {
   const gemini = createGeminiTriageAndReply(config.gemini ?? { apiKey: process.env.GEMINI_API_KEY })
 
   return {
+    async triageAndDraft(input) {
+      const cacheKey = buildResponseCacheKey({
+        scope: `${config.tenantId ?? '_default'}:GEMINI:${gemini.model}`,
+        channel: input.channel,
+        pricingAllowed: input.pricingAllowed,
+        customerMessage: input.customerMessage
+      })
+
+      try {
+        return await cachedTriageAndDraft(cacheKey, () =>
+          withTenantAiSlot(config.tenantId, () =>
+            gemini.triageAndDraft({
+              leadId: input.leadId,
+              channel: input.channel,
+              customerMessage: input.customerMessage,
+              pricingAllowed: input.pricingAllowed,
+              knowledgeSnippets: input.knowledgeSnippets
+            })
+          )
+        )
+      } catch (err) {
+        // eslint-disable-next-line no-console
+        console.warn('GEMINI triageAndDraft failed; falling back to MOCK:', err instanceof Error ? err.message : err)
+        return mock.triageAndDraft(input)
+      }
+    },
     async triage(input) {
       try {
-        return await gemini.triage({
-          leadId: input.leadId,
-          channel: input.channel,
-          customerMessage: input.customerMessage
-        })
+        return await withTenantAiSlot(config.tenantId, () =>
+          gemini.triage({
+            leadId: input.leadId,
+            channel: input.channel,
+            customerMessage: input.customerMessage
+          })
+        )
       } catch (err) {
         // eslint-disable-next-line no-console
         console.warn('GEMINI triage failed; falling back to MOCK:', err instanceof Error ? err.message : err)
@@ -136,13 +205,15 @@ function createGeminiGateway(config: AiGatewayConfig): AiGateway {
     },
     async draftReply(input) {
       try {
-        return await gemini.draftReply({
-          leadId: input.leadId,
-          channel: input.channel,
-          customerMessage: input.customerMessage,
-          pricingAllowed: input.pricingAllowed,
-          knowledgeSnippets: input.knowledgeSnippets
-        })
+        return await withTenantAiSlot(config.tenantId, () =>
+          gemini.draftReply({
+            leadId: input.leadId,
+            channel: input.channel,
+            customerMessage: input.customerMessage,
+            pricingAllowed: input.pricingAllowed,
+            knowledgeSnippets: input.knowledgeSnippets
+          })
+        )
       } catch (err) {
         // eslint-disable-next-line no-console
         console.warn('GEMINI draftReply failed; falling back to MOCK:', err instanceof Error ? err.message : err)
@@ -1,5 +1,6 @@
 import { z } from 'zod'
 import type { ReplyDraft, TriageResult } from '../types.js'
+import { requestJson } from '../../httpClient.js'
 
 export type GeminiProviderConfig = {
   apiKey?: string
@@ -31,14 +32,21 @@ function pickResponseText(data: any): string {
   return chunks.join('\n').trim()
 }
 
-async function callGeminiJson(opts: { apiKey: string; model: string; system: string; user: string }): Promise<unknown> {
+const AI_REQUEST_TIMEOUT_MS = Number(process.env.AI_REQUEST_TIMEOUT_MS ?? 30_000)
+
+async function callGeminiJson(opts: {
+  apiKey: string
+  model: string
+  system: string
+  user: string
+  maxOutputTokens?: number
+}): Promise<unknown> {
   const model = opts.model
   const url = `https://generativelanguage.googleapis.com/v1beta/models/${encodeURIComponent(model)}:generateContent?key=${encodeURIComponent(opts.apiKey)}`
 
-  const res = await fetch(url, {
+  const res = await requestJson(url, {
     method: 'POST',
-    headers: { 'content-type': 'application/json' },
-    body: JSON.stringify({
+    body: {
       contents: [
         {
           role: 'user',
@@ -47,12 +55,13 @@ async function callGeminiJson(opts: { apiKey: string; model: string; system: str
       ],
       generationConfig: {
         temperature: 0.2,
-        maxOutputTokens: 500
+        maxOutputTokens: opts.maxOutputTokens ?? 500
       }
-    })
+    },
+    timeoutMs: AI_REQUEST_TIMEOUT_MS
   })
 
-  const data = await res.json().catch(() => ({}))
+  const data = res.data
   if (!res.ok) {
     const msg =
       typeof (data as any)?.error?.message === 'string'
@@ -82,6 +91,11 @@ const replySchema = z.object({
   escalationReason: z.string().min(1).optional()
 })
 
+const combinedSchema = z.object({
+  triage: triageSchema,
+  reply: replySchema
+})
+
 function detectArabic(text: string): boolean {
   return /[\u0600-\u06FF]/.test(text)
 }
@@ -90,81 +104,118 @@ function customerAsksPricing(message: string): boolean {
   return /price|pricing|discount|quote|quotation|rate|cost/i.test(message)
 }
 
+const TRIAGE_JSON_SHAPE =
+  '{"language":"en|ar","heat":"COLD|WARM|HOT|VERY_HOT|ON_FIRE","reason":"string","productTag?":"string","department?":"string","confidence":0..1}'
+
+const REPLY_JSON_SHAPE =
+  '{"language":"en|ar","message":"string","confidence":0..1,"shouldEscalate":true|false,"escalationReason?":"string"}'
+
+const TRIAGE_HEURISTICS =
+  'Heuristics:\n' +
+  '- language: detect Arabic vs English.\n' +
+  '- heat: HOT+ if urgent/asap/delivery/availability/price request; else WARM; COLD only for very generic greeting.\n' +
+  '- confidence: 0..1 (be honest).\n'
+
+const REPLY_RULES =
+  'Rules: If the customer asks for pricing and pricingAllowed=false, must set shouldEscalate=true and escalationReason="PRICING_NOT_ALLOWED". ' +
+  'If you are uncertain (confidence < 0.6) or missing essential details, set shouldEscalate=true and escalationReason="LOW_CONFIDENCE".'
+
+type DraftInput = {
+  leadId: string
+  channel: string
+  customerMessage: string
+  pricingAllowed: boolean
+  knowledgeSnippets?: Array<{ title: string; content: string }>
+}
+
+function buildReplyUserPrompt(input: DraftInput): string {
+  const expectedLang = detectArabic(input.customerMessage) ? 'ar' : 'en'
+
+  const snippets = (input.knowledgeSnippets ?? [])
+    .slice(0, 5)
+    .map((s, i) => `#${i + 1} ${s.title}\n${s.content}`)
+    .join('\n\n')
+
+  return (
+    `LeadId: ${input.leadId}\n` +
+    `Channel: ${input.channel}\n` +
+    `pricingAllowed: ${String(input.pricingAllowed)}\n` +
+    `Prefer language: ${expectedLang}\n` +
+    `Customer message: ${input.customerMessage}\n\n` +
+    (snippets ? `Knowledge snippets (may be used):\n${snippets}\n\n` : '') +
+    'Reply style: human-like, concise, no emojis, ask 1-2 clarifying questions if needed.'
+  )
+}
+
+function enforcePricingGuardrail(parsed: ReplyDraft, input: DraftInput): ReplyDraft {
+  const asksPrice = customerAsksPricing(input.customerMessage)
+  if (asksPrice && !input.pricingAllowed) {
+    return {
+      language: parsed.language,
+      message:
+        parsed.language === 'ar'
+          ? 'تم استلام استفسارك. سأقوم بتحويل طلب التسعير إلى مسؤول المبيعات للمتابعة.'
+          : 'We received your enquiry. I will route the pricing request to our sales team to follow up.',
+      confidence: Math.max(parsed.confidence, 0.6),
+      shouldEscalate: true,
+      escalationReason: 'PRICING_NOT_ALLOWED'
+    }
+  }
+
+  return parsed
+}
+
 export function createGeminiTriageAndReply(config: GeminiProviderConfig) {
   const apiKey = config.apiKey
   const model = config.model ?? process.env.GEMINI_MODEL ?? 'gemini-1.5-flash'
 
   return {
+    model,
+
     async triage(input: { leadId: string; channel: string; customerMessage: string }): Promise<TriageResult> {
       if (!apiKey) throw new Error('GEMINI_API_KEY not set')
 
-      const system =
-        'You are a lead-triage classifier for a CRM. Return ONLY valid JSON that matches this schema: ' +
-        '{"language":"en|ar","heat":"COLD|WARM|HOT|VERY_HOT|ON_FIRE","reason":"string","productTag?":"string","department?":"string","confidence":0..1}.'
+      const system = `You are a lead-triage classifier for a CRM. Return ONLY valid JSON that matches this schema: ${TRIAGE_JSON_SHAPE}.`
 
       const user =
         `LeadId: ${input.leadId}\n` +
         `Channel: ${input.channel}\n` +
         `Customer message: ${input.customerMessage}\n\n` +
-        'Heuristics:\n' +
-        '- language: detect Arabic vs English.\n' +
-        '- heat: HOT+ if urgent/asap/delivery/availability/price request; else WARM; COLD only for very generic greeting.\n' +
-        '- confidence: 0..1 (be honest).\n'
+        TRIAGE_HEURISTICS
 
       const raw = await callGeminiJson({ apiKey, model, system, user })
       return triageSchema.parse(raw)
     },
 
-    async draftReply(input: {
-      leadId: string
-      channel: string
-      customerMessage: string
-      pricingAllowed: boolean
-      knowledgeSnippets?: Array<{ title: string; content: string }>
-    }): Promise<ReplyDraft> {
+    async draftReply(input: DraftInput): Promise<ReplyDraft> {
       if (!apiKey) throw new Error('GEMINI_API_KEY not set')
 
-      const isArabic = detectArabic(input.customerMessage)
-      const expectedLang = isArabic ? 'ar' : 'en'
-
       const system =
-        'You are a sales assistant that drafts short, helpful replies. Return ONLY valid JSON that matches this schema: ' +
-        '{"language":"en|ar","message":"string","confidence":0..1,"shouldEscalate":true|false,"escalationReason?":"string"}. ' +
-        'Rules: If the customer asks for pricing and pricingAllowed=false, must set shouldEscalate=true and escalationReason="PRICING_NOT_ALLOWED". ' +
-        'If you are uncertain (confidence < 0.6) or missing essential details, set shouldEscalate=true and escalationReason="LOW_CONFIDENCE".'
+        `You are a sales assistant that drafts short, helpful replies. Return ONLY valid JSON that matches this schema: ${REPLY_JSON_SHAPE}. ` +
+        REPLY_RULES
 
-      const snippets = (input.knowledgeSnippets ?? [])
-        .slice(0, 5)
-        .map((s, i) => `#${i + 1} ${s.title}\n${s.content}`)
-        .join('\n\n')
-
-      const user =
-        `LeadId: ${input.leadId}\n` +
-        `Channel: ${input.channel}\n` +
-        `pricingAllowed: ${String(input.pricingAllowed)}\n` +
-        `Prefer language: ${expectedLang}\n` +
-        `Customer message: ${input.customerMessage}\n\n` +
-        (snippets ? `Knowledge snippets (may be used):\n${snippets}\n\n` : '') +
-        'Reply style: human-like, concise, no emojis, ask 1-2 clarifying questions if needed.'
+      const raw = await callGeminiJson({ apiKey, model, system, user: buildReplyUserPrompt(input) })
+      return enforcePricingGuardrail(replySchema.parse(raw), input)
+    },
 
-      const raw = await callGeminiJson({ apiKey, model, system, user })
-      const parsed = replySchema.parse(raw)
-
-      const asksPrice = customerAsksPricing(input.customerMessage)
-      if (asksPrice && !input.pricingAllowed) {
-        return {
-          language: parsed.language,
-          message:
-            parsed.language === 'ar'
-              ? 'تم استلام استفسارك. سأقوم بتحويل طلب التسعير إلى مسؤول المبيعات للمتابعة.'
-              : 'We received your enquiry. I will route the pricing request to our sales team to follow up.',
-          confidence: Math.max(parsed.confidence, 0.6),
-          shouldEscalate: true,
-          escalationReason: 'PRICING_NOT_ALLOWED'
-        }
-      }
+    async triageAndDraft(input: DraftInput): Promise<{ triage: TriageResult; draft: ReplyDraft }> {
+      if (!apiKey) throw new Error('GEMINI_API_KEY not set')
 
-      return parsed
+      const system =
+        'You are a CRM assistant. In a single pass, classify the customer enquiry for lead triage and draft a short, helpful sales reply. ' +
+        `Return ONLY valid JSON that matches this schema: {"triage":${TRIAGE_JSON_SHAPE},"reply":${REPLY_JSON_SHAPE}}. ` +
+        `Triage ${TRIAGE_HEURISTICS}\nReply ` +
+        REPLY_RULES
+
+      const raw = await callGeminiJson({
+        apiKey,
+        model,
+        system,
+        user: buildReplyUserPrompt(input),
+        maxOutputTokens: 800
+      })
+      const parsed = combinedSchema.parse(raw)
+      return { triage: parsed.triage, draft: enforcePricingGuardrail(parsed.reply, input) }
     }
   }
 }
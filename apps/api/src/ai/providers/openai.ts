@@ -1,5 +1,6 @@
 import { z } from 'zod'
 import type { ReplyDraft, TriageResult } from '../types.js'
+import { requestJson } from '../../httpClient.js'
 
 export type OpenAiProviderConfig = {
   apiKey?: string
@@ -38,31 +39,32 @@ function pickResponseText(data: any): string {
   return chunks.join('\n').trim()
 }
 
+const AI_REQUEST_TIMEOUT_MS = Number(process.env.AI_REQUEST_TIMEOUT_MS ?? 30_000)
+
 async function callOpenAIJson(opts: {
   apiKey: string
   model: string
   system: string
   user: string
+  maxOutputTokens?: number
 }): Promise<unknown> {
   const baseUrl = (process.env.OPENAI_BASE_URL ?? 'https://api.openai.com/v1').replace(/\/+$/, '')
-  const res = await fetch(`${baseUrl}/responses`, {
+  const res = await requestJson(`${baseUrl}/responses`, {
     method: 'POST',
-    headers: {
-      authorization: `Bearer ${opts.apiKey}`,
-      'content-type': 'application/json'
-    },
-    body: JSON.stringify({
+    headers: { authorization: `Bearer ${opts.apiKey}` },
+    body: {
       model: opts.model,
       input: [
         { role: 'system', content: opts.system },
         { role: 'user', content: opts.user }
       ],
       temperature: 0.2,
-      max_output_tokens: 500
-    })
+      max_output_tokens: opts.maxOutputTokens ?? 500
+    },
+    timeoutMs: AI_REQUEST_TIMEOUT_MS
   })
 
-  const data = await res.json().catch(() => ({}))
+  const data = res.data
   if (!res.ok) {
     const msg = typeof data?.error?.message === 'string' ? data.error.message : `OpenAI error (${res.status})`
     throw new Error(msg)
@@ -89,6 +91,11 @@ const replySchema = z.object({
   escalationReason: z.string().min(1).optional()
 })
 
+const combinedSchema = z.object({
+  triage: triageSchema,
+  reply: replySchema
+})
+
 function detectArabic(text: string): boolean {
   return /[\u0600-\u06FF]/.test(text)
 }
@@ -97,91 +104,130 @@ function customerAsksPricing(message: string): boolean {
   return /price|pricing|discount|quote|quotation|rate|cost/i.test(message)
 }
 
+const TRIAGE_JSON_SHAPE =
+  '{"language":"en|ar","heat":"COLD|WARM|HOT|VERY_HOT|ON_FIRE","reason":"string","productTag?":"string","department?":"string","confidence":0..1}'
+
+const REPLY_JSON_SHAPE =
+  '{"language":"en|ar","message":"string","confidence":0..1,"shouldEscalate":true|false,"escalationReason?":"string"}'
+
+const TRIAGE_HEURISTICS =
+  'Heuristics:\n' +
+  '- language: detect Arabic vs English.\n' +
+  '- heat: HOT+ if urgent/asap/delivery/availability/price request; else WARM; COLD only for very generic greeting.\n' +
+  '- confidence: 0..1 (be honest).\n'
+
+const REPLY_RULES =
+  'CRITICAL RULES: ' +
+  '1. READ THE CUSTOMER MESSAGE CAREFULLY - if they already mention product name, quantity, specs, or requirements, DO NOT ask for those again. ' +
+  '2. Acknowledge what they asked for specifically. ' +
+  '3. If the customer asks for pricing and pricingAllowed=false, set shouldEscalate=true and escalationReason="PRICING_NOT_ALLOWED". ' +
+  '4. If you are uncertain (confidence < 0.6) or missing essential info that customer did NOT provide, set shouldEscalate=true. ' +
+  '5. Be concise, professional, no emojis. ' +
+  '6. Only ask for clarification if something is genuinely unclear or missing from their message. '
+
+type DraftInput = {
+  leadId: string
+  channel: string
+  customerMessage: string
+  pricingAllowed: boolean
+  knowledgeSnippets?: Array<{ title: string; content: string }>
+}
+
+function buildReplyUserPrompt(input: DraftInput): string {
+  const expectedLang = detectArabic(input.customerMessage) ? 'ar' : 'en'
+
+  const snippets = (input.knowledgeSnippets ?? [])
+    .slice(0, 5)
+    .map((s, i) => `#${i + 1} ${s.title}\n${s.content}`)
+    .join('\n\n')
+
+  return (
+    `LeadId: ${input.leadId}\n` +
+    `Channel: ${input.channel}\n` +
+    `pricingAllowed: ${String(input.pricingAllowed)}\n` +
+    `Prefer language: ${expectedLang}\n` +
+    `\n--- CUSTOMER MESSAGE START ---\n${input.customerMessage}\n--- CUSTOMER MESSAGE END ---\n\n` +
+    (snippets ? `Knowledge snippets (may be used for context):\n${snippets}\n\n` : '') +
+    'IMPORTANT: The customer message above contains their enquiry. ' +
+    'Acknowledge what they specifically asked for. ' +
+    'Only ask for additional info if it is genuinely missing from their message. ' +
+    'If they mentioned a product, quantity, or specs, DO NOT ask for those.'
+  )
+}
+
+// Hard guardrail enforcement (server-side): pricing not allowed => escalate.
+function enforcePricingGuardrail(parsed: ReplyDraft, input: DraftInput): ReplyDraft {
+  const asksPrice = customerAsksPricing(input.customerMessage)
+  if (asksPrice && !input.pricingAllowed) {
+    return {
+      language: parsed.language,
+      message:
+        parsed.language === 'ar'
+          ? 'تم استلام استفسارك. سأقوم بتحويل طلب التسعير إلى مسؤول المبيعات للمتابعة.'
+          : 'We received your enquiry. I will route the pricing request to our sales team to follow up.',
+      confidence: Math.max(parsed.confidence, 0.6),
+      shouldEscalate: true,
+      escalationReason: 'PRICING_NOT_ALLOWED'
+    }
+  }
+
+  return parsed
+}
+
 export function createOpenAiTriageAndReply(config: OpenAiProviderConfig) {
   const apiKey = config.apiKey
   const model = config.model ?? process.env.OPENAI_MODEL ?? 'gpt-4o-mini'
 
   return {
+    model,
+
     async triage(input: { leadId: string; channel: string; customerMessage: string }): Promise<TriageResult> {
       if (!apiKey) throw new Error('OPENAI_API_KEY not set')
 
       const system =
-        'You are a lead-triage classifier for a CRM. Return ONLY valid JSON that matches this schema: ' +
-        '{"language":"en|ar","heat":"COLD|WARM|HOT|VERY_HOT|ON_FIRE","reason":"string","productTag?":"string","department?":"string","confidence":0..1}. '
+        `You are a lead-triage classifier for a CRM. Return ONLY valid JSON that matches this schema: ${TRIAGE_JSON_SHAPE}. `
 
       const user =
         `LeadId: ${input.leadId}\n` +
         `Channel: ${input.channel}\n` +
         `Customer message: ${input.customerMessage}\n\n` +
-        'Heuristics:\n' +
-        '- language: detect Arabic vs English.\n' +
-        '- heat: HOT+ if urgent/asap/delivery/availability/price request; else WARM; COLD only for very generic greeting.\n' +
-        '- confidence: 0..1 (be honest).\n'
+        TRIAGE_HEURISTICS
 
       const raw = await callOpenAIJson({ apiKey, model, system, user })
       const parsed = triageSchema.parse(raw)
       return parsed
     },
 
-    async draftReply(input: {
-      leadId: string
-      channel: string
-      customerMessage: string
-      pricingAllowed: boolean
-      knowledgeSnippets?: Array<{ title: string; content: string }>
-    }): Promise<ReplyDraft> {
+    async draftReply(input: DraftInput): Promise<ReplyDraft> {
       if (!apiKey) throw new Error('OPENAI_API_KEY not set')
 
-      const isArabic = detectArabic(input.customerMessage)
-      const expectedLang = isArabic ? 'ar' : 'en'
-
       const system =
-        'You are a professional sales assistant that drafts helpful replies to customer enquiries. Return ONLY valid JSON that matches this schema: ' +
-        '{"language":"en|ar","message":"string","confidence":0..1,"shouldEscalate":true|false,"escalationReason?":"string"}. ' +
-        'CRITICAL RULES: ' +
-        '1. READ THE CUSTOMER MESSAGE CAREFULLY - if they already mention product name, quantity, specs, or requirements, DO NOT ask for those again. ' +
-        '2. Acknowledge what they asked for specifically. ' +
-        '3. If the customer asks for pricing and pricingAllowed=false, set shouldEscalate=true and escalationReason="PRICING_NOT_ALLOWED". ' +
-        '4. If you are uncertain (confidence < 0.6) or missing essential info that customer did NOT provide, set shouldEscalate=true. ' +
-        '5. Be concise, professional, no emojis. ' +
-        '6. Only ask for clarification if something is genuinely unclear or missing from their message. ';
-
-      const snippets = (input.knowledgeSnippets ?? [])
-        .slice(0, 5)
-        .map((s, i) => `#${i + 1} ${s.title}\n${s.content}`)
-        .join('\n\n')
+        `You are a professional sales assistant that drafts helpful replies to customer enquiries. Return ONLY valid JSON that matches this schema: ${REPLY_JSON_SHAPE}. ` +
+        REPLY_RULES
 
-      const user =
-        `LeadId: ${input.leadId}\n` +
-        `Channel: ${input.channel}\n` +
-        `pricingAllowed: ${String(input.pricingAllowed)}\n` +
-        `Prefer language: ${expectedLang}\n` +
-        `\n--- CUSTOMER MESSAGE START ---\n${input.customerMessage}\n--- CUSTOMER MESSAGE END ---\n\n` +
-        (snippets ? `Knowledge snippets (may be used for context):\n${snippets}\n\n` : '') +
-        'IMPORTANT: The customer message above contains their enquiry. ' +
-        'Acknowledge what they specifically asked for. ' +
-        'Only ask for additional info if it is genuinely missing from their message. ' +
-        'If they mentioned a product, quantity, or specs, DO NOT ask for those.';
+      const raw = await callOpenAIJson({ apiKey, model, system, user: buildReplyUserPrompt(input) })
+      return enforcePricingGuardrail(replySchema.parse(raw), input)
+    },
 
-      const raw = await callOpenAIJson({ apiKey, model, system, user })
-      const parsed = replySchema.parse(raw)
-
-      // Hard guardrail enforcement (server-side): pricing not allowed => escalate.
-      const asksPrice = customerAsksPricing(input.customerMessage)
-      if (asksPrice && !input.pricingAllowed) {
-        return {
-          language: parsed.language,
-          message:
-            parsed.language === 'ar'
-              ? 'تم استلام استفسارك. سأقوم بتحويل طلب التسعير إلى مسؤول المبيعات للمتابعة.'
-              : 'We received your enquiry. I will route the pricing request to our sales team to follow up.',
-          confidence: Math.max(parsed.confidence, 0.6),
-          shouldEscalate: true,
-          escalationReason: 'PRICING_NOT_ALLOWED'
-        }
-      }
+    // Triage and reply in one structured call: one round trip and one copy of the system prompt.
+    async triageAndDraft(input: DraftInput): Promise<{ triage: TriageResult; draft: ReplyDraft }> {
+      if (!apiKey) throw new Error('OPENAI_API_KEY not set')
 
-      return parsed
+      const system =
+        'You are a CRM assistant. In a single pass, classify the customer enquiry for lead triage and draft a helpful sales reply. ' +
+        `Return ONLY valid JSON that matches this schema: {"triage":${TRIAGE_JSON_SHAPE},"reply":${REPLY_JSON_SHAPE}}. ` +
+        `Triage ${TRIAGE_HEURISTICS}\nReply ` +
+        REPLY_RULES
+
+      const raw = await callOpenAIJson({
+        apiKey,
+        model,
+        system,
+        user: buildReplyUserPrompt(input),
+        maxOutputTokens: 800
+      })
+      const parsed = combinedSchema.parse(raw)
+      return { triage: parsed.triage, draft: enforcePricingGuardrail(parsed.reply, input) }
     }
   }
 }
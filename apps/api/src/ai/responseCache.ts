@@ -0,0 +1,105 @@
+import crypto from 'crypto'
+import type { ReplyDraft, TriageResult } from './types.js'
+
+// Content-addressed cache for combined triage+draft results. Short, repetitive
+// enquiries ("price?", "catalog", "hi") produce the same answer, so the key is the
+// normalized message text plus the inputs that change the answer (channel,
+// pricingAllowed) and the tenant/provider/model that produced it.
+
+export type TriageAndDraft = { triage: TriageResult; draft: ReplyDraft }
+
+const TTL_MS = Math.max(0, Number(process.env.AI_RESPONSE_CACHE_TTL_MS ?? 10 * 60 * 1000))
+const MAX_ENTRIES = Math.max(0, Number(process.env.AI_RESPONSE_CACHE_MAX_ENTRIES ?? 2000))
+const MAX_TEXT_CHARS = Math.max(1, Number(process.env.AI_RESPONSE_CACHE_MAX_CHARS ?? 280))
+
+const entries = new Map<string, { value: TriageAndDraft; expiresAt: number }>()
+const inFlight = new Map<string, Promise<TriageAndDraft>>()
+
+let hits = 0
+let misses = 0
+
+export function normalizeMessageForCache(text: string): string {
+  return text
+    .normalize('NFKC')
+    .toLowerCase()
+    .replace(/[\p{P}\p{S}]+/gu, ' ')
+    .replace(/\s+/g, ' ')
+    .trim()
+}
+
+export function buildResponseCacheKey(parts: {
+  scope: string
+  channel: string
+  pricingAllowed: boolean
+  customerMessage: string
+}): string | null {
+  if (TTL_MS === 0 || MAX_ENTRIES === 0) return null
+  const normalized = normalizeMessageForCache(parts.customerMessage)
+  // Long messages practically never repeat; don't spend cache slots on them.
+  if (!normalized || normalized.length > MAX_TEXT_CHARS) return null
+
+  return crypto
+    .createHash('sha256')
+    .update(`${parts.scope}\u0000${parts.channel}\u0000${parts.pricingAllowed ? 1 : 0}\u0000${normalized}`)
+    .digest('hex')
+}
+
+function readEntry(key: string): TriageAndDraft | undefined {
+  const entry = entries.get(key)
+  if (!entry) return undefined
+  if (entry.expiresAt <= Date.now()) {
+    entries.delete(key)
+    return undefined
+  }
+  // Refresh LRU position.
+  entries.delete(key)
+  entries.set(key, entry)
+  return entry.value
+}
+
+function writeEntry(key: string, value: TriageAndDraft) {
+  entries.delete(key)
+  entries.set(key, { value, expiresAt: Date.now() + TTL_MS })
+  while (entries.size > MAX_ENTRIES) {
+    const oldest = entries.keys().next().value
+    if (oldest === undefined) break
+    entries.delete(oldest)
+  }
+}
+
+// Returns the cached result or runs `compute` once for all concurrent callers with
+// the same key. Failures are not cached.
+export async function cachedTriageAndDraft(
+  key: string | null,
+  compute: () => Promise<TriageAndDraft>
+): Promise<TriageAndDraft> {
+  if (!key) return compute()
+
+  const cached = readEntry(key)
+  if (cached) {
+    hits++
+    return cached
+  }
+
+  const pending = inFlight.get(key)
+  if (pending) {
+    hits++
+    return pending
+  }
+
+  misses++
+  const run = compute()
+    .then((value) => {
+      writeEntry(key, value)
+      return value
+    })
+    .finally(() => {
+      inFlight.delete(key)
+    })
+  inFlight.set(key, run)
+  return run
+}
+
+export function getResponseCacheStats() {
+  return { entries: entries.size, inFlight: inFlight.size, hits, misses, ttlMs: TTL_MS, maxEntries: MAX_ENTRIES }
+}
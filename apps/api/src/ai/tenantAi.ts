@@ -1,7 +1,15 @@
 import type { PrismaClient } from '@prisma/client'
-import { createAiGateway } from './gateway.js'
+import { createAiGateway, type AiGateway } from './gateway.js'
 
-export async function createAiGatewayForTenant(prisma: PrismaClient, tenantId: string) {
+export async function createAiGatewayForTenant(prisma: PrismaClient, tenantId: string): Promise<AiGateway> {
+  return (await buildTenantGateway(prisma, tenantId)).gateway
+}
+
+// `fallback` is set when the tenant config couldn't be read and env defaults were used.
+async function buildTenantGateway(
+  prisma: PrismaClient,
+  tenantId: string
+): Promise<{ gateway: AiGateway; fallback: boolean }> {
   // Safe defaults from env.
   const envProvider = (process.env.AI_PROVIDER ?? 'MOCK') as any
   const envOpenAi = {
@@ -14,22 +22,69 @@ export async function createAiGatewayForTenant(prisma: PrismaClient, tenantId: s
     const cfg = await prisma.tenantAiConfig.findUnique({ where: { tenantId } })
 
     if (!cfg) {
-      return createAiGateway({ provider: envProvider, openai: envOpenAi })
+      return { gateway: createAiGateway({ provider: envProvider, tenantId, openai: envOpenAi }), fallback: false }
     }
 
-    return createAiGateway({
+    const gateway = createAiGateway({
       provider: cfg.provider as any,
+      tenantId,
       openai: {
         apiKey: cfg.openaiApiKey ?? envOpenAi.apiKey,
         model: cfg.openaiModel ?? envOpenAi.model,
         baseUrl: envOpenAi.baseUrl
       }
     })
+    return { gateway, fallback: false }
   } catch (err) {
     // If migrations haven't been applied yet, Prisma will throw because the table doesn't exist.
     // In that case, fall back to env-based behavior.
     // eslint-disable-next-line no-console
     console.warn('Tenant AI config unavailable; using env defaults:', err instanceof Error ? err.message : err)
-    return createAiGateway({ provider: envProvider, openai: envOpenAi })
+    return { gateway: createAiGateway({ provider: envProvider, tenantId, openai: envOpenAi }), fallback: true }
   }
 }
+
+// Process-wide gateway registry. Building a gateway costs a DB read, and a reused
+// gateway keeps its provider connections warm, so gateways are cached per tenant.
+// PATCH /ai/config invalidates explicitly; the TTL bounds staleness when the
+// config is changed through another API instance.
+const GATEWAY_TTL_MS = Math.max(0, Number(process.env.AI_GATEWAY_CACHE_TTL_MS ?? 5 * 60 * 1000))
+// An env-default gateway used because the config lookup failed is only kept briefly,
+// so a transient DB error doesn't pin the tenant to the wrong provider.
+const FALLBACK_TTL_MS = Math.min(GATEWAY_TTL_MS, 5000)
+
+type RegistryEntry = { gateway: AiGateway; expiresAt: number }
+
+const gatewayRegistry = new Map<string, RegistryEntry>()
+const pendingBuilds = new Map<string, Promise<AiGateway>>()
+const generations = new Map<string, number>()
+
+export async function getAiGatewayForTenant(prisma: PrismaClient, tenantId: string): Promise<AiGateway> {
+  const cached = gatewayRegistry.get(tenantId)
+  if (cached && cached.expiresAt > Date.now()) return cached.gateway
+
+  const pending = pendingBuilds.get(tenantId)
+  if (pending) return pending
+
+  const generation = generations.get(tenantId) ?? 0
+  const build = buildTenantGateway(prisma, tenantId)
+    .then(({ gateway, fallback }) => {
+      // Don't cache a gateway built from config that was invalidated mid-build.
+      if ((generations.get(tenantId) ?? 0) === generation) {
+        gatewayRegistry.set(tenantId, { gateway, expiresAt: Date.now() + (fallback ? FALLBACK_TTL_MS : GATEWAY_TTL_MS) })
+      }
+      return gateway
+    })
+    .finally(() => {
+      if (pendingBuilds.get(tenantId) === build) pendingBuilds.delete(tenantId)
+    })
+
+  pendingBuilds.set(tenantId, build)
+  return build
+}
+
+export function invalidateAiGatewayForTenant(tenantId: string) {
+  generations.set(tenantId, (generations.get(tenantId) ?? 0) + 1)
+  gatewayRegistry.delete(tenantId)
+  pendingBuilds.delete(tenantId)
+}
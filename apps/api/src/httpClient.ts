@@ -0,0 +1,96 @@
+import http from 'http';
+import https from 'https';
+
+// Shared outbound HTTP client with keep-alive connection pooling.
+//
+// Provider calls (OpenAI, Gemini, ...) go to a handful of hosts at high frequency;
+// reusing sockets avoids a TCP + TLS handshake on every request.
+
+const MAX_SOCKETS = Math.max(1, Number(process.env.HTTP_MAX_SOCKETS_PER_HOST ?? 32));
+const KEEP_ALIVE_MS = Math.max(1000, Number(process.env.HTTP_KEEP_ALIVE_MS ?? 30_000));
+const DEFAULT_TIMEOUT_MS = Math.max(1000, Number(process.env.HTTP_DEFAULT_TIMEOUT_MS ?? 30_000));
+
+const agentOptions = {
+  keepAlive: true,
+  keepAliveMsecs: KEEP_ALIVE_MS,
+  maxSockets: MAX_SOCKETS,
+  maxFreeSockets: Math.min(MAX_SOCKETS, 16),
+  scheduling: 'lifo' as const
+};
+
+const httpAgent = new http.Agent(agentOptions);
+const httpsAgent = new https.Agent(agentOptions);
+
+export type JsonResponse<T = any> = {
+  ok: boolean;
+  status: number;
+  headers: http.IncomingHttpHeaders;
+  data: T;
+};
+
+export function requestJson<T = any>(
+  url: string,
+  opts: {
+    method?: string;
+    headers?: Record<string, string>;
+    body?: unknown;
+    timeoutMs?: number;
+  } = {}
+): Promise<JsonResponse<T>> {
+  const target = new URL(url);
+  const isHttps = target.protocol === 'https:';
+  const payload = opts.body === undefined ? undefined : Buffer.from(JSON.stringify(opts.body));
+  const timeoutMs = opts.timeoutMs ?? DEFAULT_TIMEOUT_MS;
+
+  const headers: Record<string, string | number> = {
+    accept: 'application/json',
+    ...(opts.headers ?? {})
+  };
+  if (payload) {
+    headers['content-type'] = headers['content-type'] ?? 'application/json';
+    headers['content-length'] = payload.length;
+  }
+
+  return new Promise((resolve, reject) => {
+    const req = (isHttps ? https : http).request(
+      target,
+      {
+        method: opts.method ?? (payload ? 'POST' : 'GET'),
+        headers,
+        agent: isHttps ? httpsAgent : httpAgent
+      },
+      (res) => {
+        const chunks: Buffer[] = [];
+        res.on('data', (chunk: Buffer) => chunks.push(chunk));
+        res.on('error', reject);
+        res.on('end', () => {
+          clearTimeout(timer);
+          const text = Buffer.concat(chunks).toString('utf8');
+          let data: any = {};
+          if (text) {
+            try {
+              data = JSON.parse(text);
+            } catch {
+              data = { raw: text };
+            }
+          }
+          const status = res.statusCode ?? 0;
+          resolve({ ok: status >= 200 && status < 300, status, headers: res.headers, data });
+        });
+      }
+    );
+
+    // Whole-request deadline (connect + response), not just socket idle time.
+    const timer = setTimeout(() => {
+      req.destroy(new Error(`Request to ${target.host} timed out after ${timeoutMs}ms`));
+    }, timeoutMs);
+
+    req.on('error', (err) => {
+      clearTimeout(timer);
+      reject(err);
+    });
+
+    if (payload) req.write(payload);
+    req.end();
+  });
+}
@@ -5,8 +5,15 @@ import helmet from 'helmet';
 import { routes } from './routes.js';
 import { errorHandler } from './http.js';
 import { sakWebhookRouter } from './whatsapp/sakWebhook.js';
-import { configureEmail, pollEmails } from './services/email.js';
-import { handleIngestMessage } from './routes.js';
+import { configureEmail, startEmailIdleMonitor, stopEmailMonitor } from './services/email.js';
+import { enqueueIngest, startIngestWorkers, stopIngestWorkers } from './services/ingestQueue.js';
+import { failInterruptedBackgroundJobs } from './services/backgroundJobs.js';
+import { startLeadScoreMaintenance, stopLeadScoreMaintenance } from './services/leadScoreState.js';
+import { startSlaEngine, stopSlaEngine } from './services/sla.js';
+import { startOutboundDispatcher, stopOutboundDispatcher } from './services/outbound.js';
+import { startWhatsAppSessions } from './services/whatsappSessions.js';
+import { flushRollups } from './services/rollups.js';
+import { stopAuditLog } from './services/auditLog.js';
 import { prisma } from './db.js';
 
 const app = express();
@@ -26,6 +33,14 @@ app.use('/api/webhooks', sakWebhookRouter);
 app.use(routes);
 app.use(errorHandler);
 
+// Drain the durable ingest queue (webhooks and pollers only enqueue).
+startIngestWorkers();
+void failInterruptedBackgroundJobs();
+startLeadScoreMaintenance();
+startSlaEngine();
+startOutboundDispatcher();
+startWhatsAppSessions();
+
 // Configure email service if credentials are provided
 const gmailPubSubConfigured = Boolean(process.env.GMAIL_CLIENT_ID && process.env.GMAIL_REFRESH_TOKEN);
 const imapPollingEnabled =
@@ -57,52 +72,45 @@ if (imapPollingEnabled) {
     },
   });
 
-  // Start polling for emails every 5 minutes
-  const pollInterval = Number(process.env.EMAIL_POLL_INTERVAL_MINUTES || 5);
-  
-  const pollEmailsTask = async () => {
-    try {
-      console.log('[Email] Starting email poll...');
-      // Get the default tenant ID from env or first tenant
-      let defaultTenantId = process.env.DEFAULT_TENANT_ID;
-      if (!defaultTenantId) {
-        const tenant = await prisma.tenant.findFirst();
-        defaultTenantId = tenant?.id;
-      }
+  // One long-lived IDLE connection; new mail is picked up within seconds.
+  const startEmailIngest = async () => {
+    // Get the default tenant ID from env or first tenant
+    let defaultTenantId = process.env.DEFAULT_TENANT_ID;
+    if (!defaultTenantId) {
+      const tenant = await prisma.tenant.findFirst();
+      defaultTenantId = tenant?.id;
+    }
 
-      if (!defaultTenantId) {
-        console.warn('[Email] No tenant found for email ingestion');
-        return;
-      }
+    if (!defaultTenantId) {
+      console.warn('[Email] No tenant found for email ingestion');
+      return;
+    }
+    const tenantId = defaultTenantId;
 
-      let emailCount = 0;
-      await pollEmails(async (email) => {
-        emailCount++;
+    startEmailIdleMonitor({
+      tenantId,
+      onNewEmail: async (email) => {
         console.log(`[Email] Received email from ${email.from}: ${email.subject}`);
-        await handleIngestMessage({
-          tenantId: defaultTenantId,
-          body: {
-            channel: 'EMAIL',
-            fullName: email.fromName,
-            email: email.from,
-            customerMessage: email.text,
-            externalId: email.messageId,
+        await enqueueIngest({
+          tenantId,
+          source: 'EMAIL_IMAP',
+          dedupeKey: email.messageId ? `email:${tenantId}:${email.messageId}` : undefined,
+          payload: {
+            body: {
+              channel: 'EMAIL',
+              fullName: email.fromName,
+              email: email.from,
+              customerMessage: email.text,
+              externalId: email.messageId,
+            },
           },
         });
-      });
-      console.log(`[Email] Poll complete. Processed ${emailCount} new emails.`);
-    } catch (error) {
-      console.error('[Email] Polling error:', error);
-    }
+      },
+    });
   };
 
-  // Poll immediately on startup
-  pollEmailsTask();
-  
-  // Then poll at regular intervals
-  setInterval(pollEmailsTask, pollInterval * 60 * 1000);
-
-  console.log(`[Email] Service configured (polling every ${pollInterval} minutes)`);
+  startEmailIngest().catch((error) => console.error('[Email] Failed to start IMAP ingestion:', error));
+  console.log('[Email] Service configured (IMAP IDLE)');
 } else {
   if (gmailPubSubConfigured) {
     console.log('[Email] IMAP polling disabled (Gmail Pub/Sub is configured)');
@@ -183,7 +191,39 @@ if (process.env.GMAIL_CLIENT_ID && process.env.GMAIL_REFRESH_TOKEN) {
 }
 
 const port = Number(process.env.PORT ?? 4000);
-app.listen(port, () => {
+const server = app.listen(port, () => {
   // eslint-disable-next-line no-console
   console.log(`API listening on http://localhost:${port}`);
 });
+
+// Graceful shutdown: stop taking requests and workers, then drain in-memory buffers
+// (audit log, rollups, SLA violations, lead scores) before exiting.
+let shuttingDown = false;
+async function shutdown(signal: string) {
+  if (shuttingDown) return;
+  shuttingDown = true;
+  console.log(`[Shutdown] ${signal} received, draining...`);
+
+  server.close();
+  const steps: Array<[string, () => Promise<unknown>]> = [
+    ['email', stopEmailMonitor],
+    ['ingest', stopIngestWorkers],
+    ['outbound', stopOutboundDispatcher],
+    ['sla', stopSlaEngine],
+    ['leadScores', stopLeadScoreMaintenance],
+    ['rollups', flushRollups],
+    ['auditLog', stopAuditLog]
+  ];
+  for (const [name, step] of steps) {
+    try {
+      await step();
+    } catch (err) {
+      console.error(`[Shutdown] ${name} failed:`, err instanceof Error ? err.message : err);
+    }
+  }
+  await prisma.$disconnect().catch(() => {});
+  process.exit(0);
+}
+
+process.once('SIGTERM', () => void shutdown('SIGTERM'));
+process.once('SIGINT', () => void shutdown('SIGINT'));
@@ -1,4 +1,5 @@
 import { Router } from 'express';
+import type { Lead, Prisma } from '@prisma/client';
 import { z } from 'zod';
 import { prisma } from './db.js';
 import { asyncHandler } from './http.js';
@@ -13,358 +14,59 @@ import {
   signAuthToken,
   verifyPassword
 } from './auth.js';
-import { createAiGatewayForTenant } from './ai/tenantAi.js';
-import { pickSalesmanRoundRobin } from './services/routing.js';
+import { getAiGatewayForTenant, invalidateAiGatewayForTenant } from './ai/tenantAi.js';
+import { getResponseCacheStats } from './ai/responseCache.js';
+import { getAiConcurrencyStats } from './ai/concurrency.js';
 import { recomputeSalesmanScores } from './services/scoring.js';
 import { updateLeadScore, calculateLeadScore, getQualificationLevel } from './services/leadScoring.js';
-import { createAuditLog } from './services/auditLog.js';
+import { createAuditLog, flushAuditLogs, getAuditLogStats } from './services/auditLog.js';
+import { getBackgroundJob, startBackgroundJob } from './services/backgroundJobs.js';
+import { recalculateTenantLeadScores } from './services/batchScoring.js';
+import { markLeadScoresDirty, recordLeadActivity } from './services/leadScoreState.js';
+import { getDashboardStats, invalidateDashboardStats } from './services/dashboardCache.js';
+import { keysetPages, selectCsvColumns, streamCsv } from './services/csvExport.js';
+import { discardLeadImportUpload, importLeadsFromCsv, receiveLeadImportUpload } from './services/leadImport.js';
+import type { CsvColumn } from './services/csvExport.js';
+import { buildLeadListWhere, leadsUpdatedBefore } from './services/leadSearch.js';
+import { decodeCursor, encodeCursor } from './services/pagination.js';
+import type { KeysetCursor } from './services/pagination.js';
+import { getLeadTimeline, TIMELINE_KINDS } from './services/leadTimeline.js';
+import { ACTIVITY_TYPES, getActivityFeed } from './services/activityFeed.js';
+import {
+  bumpDailyRollup,
+  bumpMessageRollup,
+  bumpStatusRollups,
+  bumpSuccessRollup,
+  flushRollups,
+  getChannelTotals,
+  getDailyTimeSeries,
+  getSuccessTotals,
+  rebuildDailyRollups,
+  subtractLeadsFromRollups,
+  utcDay
+} from './services/rollups.js';
+import { enqueueIngest, retryDeadIngestJob } from './services/ingestQueue.js';
+import {
+  getIngestTimingStats,
+  handleIngestMessage,
+  ingestMessageBodySchema,
+  ingestMessageSchema
+} from './services/ingest.js';
+import {
+  createNotificationForUser,
+  getUnreadNotificationCount,
+  markAllNotificationsRead,
+  markNotificationRead,
+  notifyTenantRoles,
+  subscribeNotifications
+} from './services/notifications.js';
+import { applyLeadOwnershipChanges, invalidateSalesmanRoster, resetLoadLedger } from './services/loadLedger.js';
+import { buildEmailCustomerMessage, getEmailEnquiryKeywords, isLikelyEnquiry } from './services/emailEnquiry.js';
 
 export const routes = Router();
 
 // AI gateway is resolved per-tenant (DB-configurable) with env fallback.
 
-/**
- * Smart enquiry detection - filters out promotional/automated emails
- */
-function parseKeywordList(raw: string | undefined): string[] {
-  if (!raw) return [];
-  return raw
-    .split(/[,\n]/g)
-    .map((s) => s.trim().toLowerCase())
-    .filter((s) => s.length >= 2);
-}
-
-function normalizeForKeywordMatch(input: string): string {
-  return (input || '')
-    .toLowerCase()
-    .replace(/[^a-z0-9]+/g, ' ')
-    .replace(/\s+/g, ' ')
-    .trim();
-}
-
-function buildEmailCustomerMessage(email: {
-  from?: string | null;
-  fromName?: string | null;
-  subject?: string | null;
-  text?: string | null;
-}): string {
-  const from = (email.from ?? '').trim();
-  const fromName = (email.fromName ?? '').trim();
-  const subject = (email.subject ?? '').trim();
-  const text = (email.text ?? '').trim();
-
-  const headerFrom = fromName ? `${fromName} <${from || 'unknown'}>` : (from || 'unknown');
-  const headerSubject = subject || '(no subject)';
-
-  // Keep payload bounded to avoid huge token usage from long email threads.
-  const MAX_BODY_CHARS = 4000;
-  const clippedBody = text.length > MAX_BODY_CHARS ? `${text.slice(0, MAX_BODY_CHARS)}\n\n[trimmed]` : text;
-
-  return `Email enquiry\nFrom: ${headerFrom}\nSubject: ${headerSubject}\n\nMessage:\n${clippedBody}`;
-}
-
-function anyKeywordMatches(subject: string, body: string, keywords: string[]): boolean {
-  if (!keywords || keywords.length === 0) return false;
-  const hay = normalizeForKeywordMatch(`${subject}\n${body}`);
-  for (const kw of keywords) {
-    const needle = normalizeForKeywordMatch(kw);
-    if (!needle) continue;
-    if (hay.includes(needle)) return true;
-  }
-  return false;
-}
-
-function getEmailEnquiryKeywords(): string[] {
-  // If you set EMAIL_ENQUIRY_KEYWORDS, it will be used as a strict allowlist.
-  // Example:
-  // EMAIL_ENQUIRY_KEYWORDS="air circulator,man cooler,heavy duty exhaust,tube axial,centrifugal blower,axial flow,pedestal fan,wall mount fan,tubular fan,hvls"
-  const configured = parseKeywordList(process.env.EMAIL_ENQUIRY_KEYWORDS);
-  if (configured.length > 0) return configured;
-
-  // No keywords configured => return empty list so behaviour stays backward-compatible.
-  return [];
-}
-
-function isLikelyEnquiry(
-  email: { from: string; subject: string; text: string; fromName?: string },
-  opts?: { requireKeywordMatch?: boolean; keywords?: string[] }
-): boolean {
-  const subject = email.subject?.toLowerCase() || '';
-  const body = email.text?.toLowerCase() || '';
-  const from = email.from?.toLowerCase() || '';
-  
-  // Block specific automated sender domains/addresses - newsletters, marketing, automation
-  const blockedSenders = [
-    // E-commerce & Services
-    '@amazon.com',
-    '@amazon.in',
-    '@netflix.com',
-    '@uber.com',
-    '@swiggy.in',
-    '@zomato.com',
-    '@paytm.com',
-    '@phonepe.com',
-    '@razorpay.com',
-    // Social Media
-    '@facebookmail.com',
-    '@linkedin.com',
-    '@twitter.com',
-    '@instagram.com',
-    '@tiktok.com',
-    // Google Services
-    '@google.com',
-    '@youtube.com',
-    '@gmail.com', // Only if from Google itself
-    // Newsletter & Email Marketing Platforms
-    '@mail.beehiiv.com',
-    '@beehiiv.com',
-    '@mailchimp.com',
-    '@sendgrid.net',
-    '@mailgun.org',
-    '@sendinblue.com',
-    '@constantcontact.com',
-    '@aweber.com',
-    '@convertkit.com',
-    '@substack.com',
-    '@ghost.io',
-    // No-reply addresses
-    'donotreply@',
-    'do-not-reply@',
-    'no-reply@',
-    'noreply@',
-    'notifications@',
-    'alerts@',
-    'news@',
-    'updates@',
-    'newsletter@',
-    'marketing@',
-    'mailer-daemon',
-    'postmaster@',
-  ];
-  
-  for (const blocked of blockedSenders) {
-    if (from.includes(blocked)) {
-      return false;
-    }
-  }
-  
-  // Skip common promotional/automated patterns in subject/body
-  const spamPatterns = [
-    'unsubscribe',
-    'newsletter',
-    'automated message',
-    'automation',
-    'auto-reply',
-    'out of office',
-    'manage preferences',
-    'update preferences',
-    'email preferences',
-    'view in browser',
-    'read online',
-    'forward to a friend',
-    'this email was sent',
-    'because you subscribed',
-    'you are receiving this',
-    'privacy policy',
-    'terms of service',
-    'sponsored',
-    'advertise',
-    'delivery notification',
-    'shipping update',
-    'order confirmation',
-    'password reset',
-    'verify your email',
-    'confirm your email',
-    'account security',
-    'login alert',
-    'new sign-in',
-    'new device',
-    'safe-t claim',
-    'refund processed',
-    'payment received',
-    'transaction alert',
-    'otp',
-    'one-time password',
-    'verification code',
-    'promotional',
-    'limited time offer',
-    '% off',
-    'special offer',
-    'flash sale',
-    'mailing list',
-    'email digest',
-    'weekly roundup',
-    'monthly update',
-    'subscription',
-    'click here',
-    'congratulations',
-    'beehiiv',
-    'substack',
-    // Not sales enquiries
-    'job application',
-    'apply for',
-    'career',
-    'resume',
-    'cv',
-    'vacancy',
-    'hiring',
-  ];
-  
-  for (const pattern of spamPatterns) {
-    if (from.includes(pattern) || subject.includes(pattern) || body.includes(pattern)) {
-      return false;
-    }
-  }
-
-  // Newsletters usually contain many links; enquiries rarely do.
-  const urlCount = (body.match(/https?:\/\//g) || []).length;
-  if (urlCount >= 6) {
-    return false;
-  }
-  
-  // Look for enquiry indicators - these must be present for it to be an enquiry
-  const enquiryPatterns = [
-    'quote',
-    'quotation',
-    'rfq',
-    'request for quotation',
-    'price',
-    'pricing',
-    'best price',
-    'rate',
-    'rates',
-    'price list',
-    'enquiry',
-    'inquiry',
-    'enquire',
-    'inquire',
-    'interested in',
-    'looking for',
-    'requirement',
-    'require',
-    'need',
-    'want to buy',
-    'want to purchase',
-    'want to order',
-    'please send',
-    'please share',
-    'please provide',
-    'can you send',
-    'could you send',
-    'product details',
-    'service details',
-    'more information',
-    'availability',
-    'in stock',
-    'lead time',
-    'delivery time',
-    'delivery charges',
-    'shipping charges',
-    'payment terms',
-    'proforma invoice',
-    'pro forma invoice',
-    'pi',
-    'bulk order',
-    'wholesale',
-    'catalog',
-    'catalogue',
-    'brochure',
-    'datasheet',
-    'data sheet',
-    'specification',
-    'specifications',
-    'specs',
-    'technical details',
-    'dimensions',
-    'size',
-    'model',
-    'part number',
-    'sku',
-    'samples',
-    'minimum order',
-    'moq',
-  ];
-  
-  let enquiryScore = 0;
-  for (const pattern of enquiryPatterns) {
-    if (subject.includes(pattern) || body.includes(pattern)) {
-      enquiryScore++;
-    }
-  }
-
-  // Optional: strict product keyword allowlist.
-  const keywords = opts?.keywords ?? [];
-  const requireKeywordMatch = opts?.requireKeywordMatch ?? false;
-  if (requireKeywordMatch && keywords.length > 0) {
-    const hasKeyword = anyKeywordMatches(subject, body, keywords);
-    if (!hasKeyword) return false;
-  }
-
-  // Must have at least one enquiry pattern to be considered a genuine enquiry.
-  // This prevents random personal emails from being processed.
-  return enquiryScore > 0;
-}
-
-async function createNotificationForUser(params: {
-  tenantId: string;
-  userId: string;
-  type: string;
-  title: string;
-  body?: string | null;
-  entityType?: string | null;
-  entityId?: string | null;
-}) {
-  try {
-    await prisma.notification.create({
-      data: {
-        tenantId: params.tenantId,
-        userId: params.userId,
-        type: params.type,
-        title: params.title,
-        body: params.body ?? null,
-        entityType: params.entityType ?? null,
-        entityId: params.entityId ?? null
-      }
-    });
-  } catch (err) {
-    // If migrations aren't applied yet, keep the app usable.
-    // eslint-disable-next-line no-console
-    console.warn(
-      'Failed to create notification (missing migration?):',
-      err instanceof Error ? err.message : err
-    );
-  }
-}
-
-async function notifyTenantRoles(params: {
-  tenantId: string;
-  roles: Array<'OWNER' | 'ADMIN' | 'MANAGER' | 'SALESMAN'>;
-  type: string;
-  title: string;
-  body?: string | null;
-  entityType?: string | null;
-  entityId?: string | null;
-}) {
-  const users: Array<{ id: string }> = await prisma.user.findMany({
-    where: { tenantId: params.tenantId, active: true, role: { in: params.roles } },
-    select: { id: true }
-  });
-
-  await Promise.all(
-    users.map((u: { id: string }) =>
-      createNotificationForUser({
-        tenantId: params.tenantId,
-        userId: u.id,
-        type: params.type,
-        title: params.title,
-        body: params.body,
-        entityType: params.entityType,
-        entityId: params.entityId
-      })
-    )
-  );
-}
-
 routes.get('/health', (_req, res) => res.json({ ok: true }));
 
 // Notifications (per-user)
@@ -410,7 +112,7 @@ routes.get(
   asyncHandler(async (req, res) => {
     const { tenantId, userId } = getAuthContext(req);
     try {
-      const count = await prisma.notification.count({ where: { tenantId, userId, readAt: null } });
+      const count = await getUnreadNotificationCount(tenantId, userId);
       res.json({ count });
     } catch (err) {
       // eslint-disable-next-line no-console
@@ -430,10 +132,7 @@ routes.post(
     const notificationId = z.string().parse(req.params.id);
 
     try {
-      await prisma.notification.updateMany({
-        where: { id: notificationId, tenantId, userId, readAt: null },
-        data: { readAt: new Date() }
-      });
+      await markNotificationRead(tenantId, userId, notificationId);
     } catch (err) {
       // eslint-disable-next-line no-console
       console.warn(
@@ -446,6 +145,34 @@ routes.post(
   })
 );
 
+routes.post(
+  '/notifications/read-all',
+  asyncHandler(async (req, res) => {
+    const { tenantId, userId } = getAuthContext(req);
+
+    try {
+      await markAllNotificationsRead(tenantId, userId);
+    } catch (err) {
+      // eslint-disable-next-line no-console
+      console.warn(
+        'POST /notifications/read-all failed (missing migration?):',
+        err instanceof Error ? err.message : err
+      );
+    }
+
+    res.json({ ok: true });
+  })
+);
+
+// Server-sent events: `notification` for each new notification, `unread` with the count.
+routes.get(
+  '/notifications/stream',
+  asyncHandler(async (req, res) => {
+    const { tenantId, userId } = getAuthContext(req);
+    subscribeNotifications(tenantId, userId, res);
+  })
+);
+
 routes.post(
   '/auth/login',
   asyncHandler(async (req, res) => {
@@ -587,6 +314,7 @@ routes.patch(
           openaiModel: body.openaiModel ?? undefined
         }
       });
+      invalidateAiGatewayForTenant(tenantId);
 
       res.json({ ok: true, config: { tenantId, provider: updated.provider, openaiModel: updated.openaiModel ?? null } });
     } catch (err) {
@@ -598,6 +326,23 @@ routes.patch(
   })
 );
 
+// AI call cache / per-tenant limiter state for this process
+routes.get(
+  '/ai/stats',
+  asyncHandler(async (req, res) => {
+    const { tenantId, role } = getAuthContext(req);
+    if (role === 'SALESMAN') throw new Error('Forbidden');
+
+    const concurrency = getAiConcurrencyStats().find((s) => s.tenantId === tenantId) ?? {
+      tenantId,
+      active: 0,
+      queued: 0,
+      rejected: 0
+    };
+    res.json({ cache: getResponseCacheStats(), concurrency });
+  })
+);
+
 // Bots (multi-bot per tenant for departments/products)
 routes.get(
   '/bots',
@@ -664,6 +409,99 @@ routes.patch(
   })
 );
 
+// WhatsApp sessions (SAK numbers routed to this tenant). Secrets are write-only.
+const whatsappSessionSelect = {
+  id: true,
+  sessionId: true,
+  phoneNumber: true,
+  isActive: true,
+  createdAt: true,
+  updatedAt: true
+} as const;
+
+routes.get(
+  '/whatsapp/sessions',
+  asyncHandler(async (req, res) => {
+    const { tenantId, role } = getAuthContext(req);
+    if (role !== 'OWNER' && role !== 'ADMIN') throw new Error('Forbidden');
+
+    const sessions = await prisma.whatsAppSession.findMany({
+      where: { tenantId },
+      orderBy: { createdAt: 'asc' },
+      select: whatsappSessionSelect
+    });
+    res.json({ sessions });
+  })
+);
+
+routes.post(
+  '/whatsapp/sessions',
+  asyncHandler(async (req, res) => {
+    const { tenantId, role } = getAuthContext(req);
+    if (role !== 'OWNER' && role !== 'ADMIN') throw new Error('Forbidden');
+
+    const body = z
+      .object({
+        sessionId: z.string().min(4),
+        apiKey: z.string().min(10),
+        webhookSecret: z.string().min(10),
+        phoneNumber: z.string().optional(),
+        isActive: z.boolean().default(true)
+      })
+      .parse(req.body);
+
+    const existing = await prisma.whatsAppSession.findUnique({ where: { sessionId: body.sessionId }, select: { id: true } });
+    if (existing) throw new HttpError(409, 'Session is already registered');
+
+    const session = await prisma.whatsAppSession.create({
+      data: { tenantId, ...body },
+      select: whatsappSessionSelect
+    });
+    const { refreshWhatsAppSessions } = await import('./services/whatsappSessions.js');
+    await refreshWhatsAppSessions();
+    res.json({ session });
+  })
+);
+
+routes.patch(
+  '/whatsapp/sessions/:id',
+  asyncHandler(async (req, res) => {
+    const { tenantId, role } = getAuthContext(req);
+    if (role !== 'OWNER' && role !== 'ADMIN') throw new Error('Forbidden');
+
+    const id = z.string().parse(req.params.id);
+    const body = z
+      .object({
+        apiKey: z.string().min(10).optional(),
+        webhookSecret: z.string().min(10).optional(),
+        phoneNumber: z.string().nullable().optional(),
+        isActive: z.boolean().optional()
+      })
+      .parse(req.body);
+
+    const updated = await prisma.whatsAppSession.updateMany({ where: { id, tenantId }, data: body });
+    if (updated.count !== 1) throw new HttpError(404, 'Session not found');
+    const { refreshWhatsAppSessions } = await import('./services/whatsappSessions.js');
+    await refreshWhatsAppSessions();
+    res.json({ ok: true });
+  })
+);
+
+routes.delete(
+  '/whatsapp/sessions/:id',
+  asyncHandler(async (req, res) => {
+    const { tenantId, role } = getAuthContext(req);
+    if (role !== 'OWNER' && role !== 'ADMIN') throw new Error('Forbidden');
+
+    const id = z.string().parse(req.params.id);
+    const deleted = await prisma.whatsAppSession.deleteMany({ where: { id, tenantId } });
+    if (deleted.count !== 1) throw new HttpError(404, 'Session not found');
+    const { refreshWhatsAppSessions } = await import('./services/whatsappSessions.js');
+    await refreshWhatsAppSessions();
+    res.json({ ok: true });
+  })
+);
+
 // Dev bootstrap: create tenant + manager user.
 routes.post(
   '/dev/bootstrap',
@@ -810,6 +648,9 @@ routes.post(
         note: body.note
       }
     });
+    recordLeadActivity(tenantId, lead.id, { kind: 'SUCCESS_EVENT' });
+    bumpSuccessRollup(tenantId, ev);
+    invalidateDashboardStats(tenantId);
 
     await prisma.leadEvent.create({
       data: {
@@ -859,55 +700,8 @@ routes.get(
   asyncHandler(async (req, res) => {
     const { tenantId } = getAuthContext(req);
 
-    const [totalLeads, newLeads, activeLeads, convertedLeads, totalTriageOpen, totalSalesmen, recentSuccessEvents] = await Promise.all([
-      prisma.lead.count({ where: { tenantId } }),
-      prisma.lead.count({ where: { tenantId, status: 'NEW' } }),
-      prisma.lead.count({ where: { tenantId, status: { in: ['CONTACTED', 'QUALIFIED', 'QUOTED'] } } }),
-      prisma.lead.count({ where: { tenantId, status: 'WON' } }),
-      prisma.triageQueueItem.count({ where: { tenantId, status: 'OPEN' } }),
-      prisma.salesman.count({ where: { tenantId } }),
-      prisma.successEvent.findMany({
-        where: { tenantId, createdAt: { gte: new Date(Date.now() - 7 * 24 * 60 * 60 * 1000) } },
-        orderBy: { createdAt: 'desc' },
-        take: 5,
-        include: {
-          definition: true,
-          lead: { select: { fullName: true, phone: true } }
-        }
-      })
-    ]);
-
-    const leadsByStatus = await prisma.lead.groupBy({
-      by: ['status'],
-      where: { tenantId },
-      _count: { _all: true }
-    });
-
-    const leadsByHeat = await prisma.lead.groupBy({
-      by: ['heat'],
-      where: { tenantId },
-      _count: { _all: true }
-    });
-
-    const leadsByChannel = await prisma.lead.groupBy({
-      by: ['channel'],
-      where: { tenantId },
-      _count: { _all: true }
-    });
-
-    res.json({
-      ok: true,
-      totalLeads,
-      newLeads,
-      activeLeads,
-      convertedLeads,
-      totalTriageOpen,
-      totalSalesmen,
-      leadsByStatus: leadsByStatus.map((x) => ({ status: x.status, count: x._count._all })),
-      leadsByHeat: leadsByHeat.map((x) => ({ heat: x.heat, count: x._count._all })),
-      leadsByChannel: leadsByChannel.map((x) => ({ channel: x.channel, count: x._count._all })),
-      recentSuccessEvents
-    });
+    const stats = await getDashboardStats(tenantId);
+    res.json({ ok: true, ...stats });
   })
 );
 
@@ -924,13 +718,8 @@ routes.get(
 
     const since = new Date(Date.now() - days * 24 * 60 * 60 * 1000);
 
-    const [eventsByType, leadStatusCounts, leadHeatCounts, salesmanAgg] = await Promise.all([
-      prisma.successEvent.groupBy({
-        by: ['type'],
-        where: { tenantId, createdAt: { gte: since } },
-        _count: { _all: true },
-        _sum: { weight: true }
-      }),
+    const [successTotals, leadStatusCounts, leadHeatCounts] = await Promise.all([
+      getSuccessTotals(tenantId, utcDay(since)),
       prisma.lead.groupBy({
         by: ['status'],
         where: { tenantId },
@@ -940,16 +729,10 @@ routes.get(
         by: ['heat'],
         where: { tenantId },
         _count: { _all: true }
-      }),
-      prisma.successEvent.groupBy({
-        by: ['salesmanId'],
-        where: { tenantId, createdAt: { gte: since } },
-        _count: { _all: true },
-        _sum: { weight: true }
       })
     ]);
 
-    const salesmanIds = salesmanAgg.map((x) => x.salesmanId).filter((id): id is string => Boolean(id));
+    const salesmanIds = successTotals.bySalesman.map((x) => x.salesmanId);
     const salesmen = salesmanIds.length
       ? await prisma.salesman.findMany({
           where: { tenantId, id: { in: salesmanIds } },
@@ -959,16 +742,15 @@ routes.get(
 
     const salesmanById = new Map(salesmen.map((s) => [s.id, s] as const));
 
-    const leaderboard = salesmanAgg
-      .filter((x) => Boolean(x.salesmanId))
+    const leaderboard = successTotals.bySalesman
       .map((x) => {
-        const salesman = salesmanById.get(x.salesmanId as string);
+        const salesman = salesmanById.get(x.salesmanId);
         return {
-          salesmanId: x.salesmanId as string,
+          salesmanId: x.salesmanId,
           displayName: salesman?.user.displayName ?? x.salesmanId,
           email: salesman?.user.email ?? null,
-          events: x._count._all,
-          weight: x._sum.weight ?? 0
+          events: x.count,
+          weight: x.weight
         };
       })
       .sort((a, b) => b.weight - a.weight)
@@ -978,7 +760,7 @@ routes.get(
       ok: true,
       days,
       since: since.toISOString(),
-      eventsByType: eventsByType.map((x) => ({ type: x.type, count: x._count._all, weight: x._sum.weight ?? 0 })),
+      eventsByType: successTotals.byType.map((x) => ({ type: x.type, count: x.count, weight: x.weight })),
       leadStatusCounts: leadStatusCounts.map((x) => ({ status: x.status, count: x._count._all })),
       leadHeatCounts: leadHeatCounts.map((x) => ({ heat: x.heat, count: x._count._all })),
       leaderboard
@@ -999,85 +781,17 @@ routes.get(
 
     const since = new Date(Date.now() - days * 24 * 60 * 60 * 1000);
 
-    // Get all leads created in timeframe
-    const leads = await prisma.lead.findMany({
-      where: { tenantId, createdAt: { gte: since } },
-      orderBy: { createdAt: 'asc' },
-      select: { id: true, createdAt: true, status: true, channel: true, heat: true }
-    });
-
-    // Get all success events in timeframe
-    const successEvents = await prisma.successEvent.findMany({
-      where: { tenantId, createdAt: { gte: since } },
-      orderBy: { createdAt: 'asc' },
-      select: { id: true, createdAt: true, type: true, weight: true, salesmanId: true }
-    });
-
-    // Get messages in timeframe
-    const messages = await prisma.message.findMany({
-      where: { tenantId, createdAt: { gte: since } },
-      orderBy: { createdAt: 'asc' },
-      select: { id: true, createdAt: true, direction: true, channel: true }
-    });
-
-    // Group by day
-    const dailyStats: Record<string, any> = {};
-    
-    // Process leads
-    for (const lead of leads) {
-      const dateKey = lead.createdAt.toISOString().split('T')[0];
-      if (!dailyStats[dateKey]) {
-        dailyStats[dateKey] = { date: dateKey, newLeads: 0, messagesIn: 0, messagesOut: 0, successEvents: 0, successWeight: 0 };
-      }
-      dailyStats[dateKey].newLeads++;
-    }
-
-    // Process messages
-    for (const msg of messages) {
-      const dateKey = msg.createdAt.toISOString().split('T')[0];
-      if (!dailyStats[dateKey]) {
-        dailyStats[dateKey] = { date: dateKey, newLeads: 0, messagesIn: 0, messagesOut: 0, successEvents: 0, successWeight: 0 };
-      }
-      if (msg.direction === 'IN') {
-        dailyStats[dateKey].messagesIn++;
-      } else {
-        dailyStats[dateKey].messagesOut++;
-      }
-    }
-
-    // Process success events
-    for (const ev of successEvents) {
-      const dateKey = ev.createdAt.toISOString().split('T')[0];
-      if (!dailyStats[dateKey]) {
-        dailyStats[dateKey] = { date: dateKey, newLeads: 0, messagesIn: 0, messagesOut: 0, successEvents: 0, successWeight: 0 };
-      }
-      dailyStats[dateKey].successEvents++;
-      dailyStats[dateKey].successWeight += ev.weight;
-    }
-
-    // Convert to array and sort
-    const timeSeries = Object.values(dailyStats).sort((a: any, b: any) => a.date.localeCompare(b.date));
-
-    // Channel performance
-    const channelPerformance = await prisma.lead.groupBy({
-      by: ['channel'],
-      where: { tenantId },
-      _count: { _all: true }
-    });
-
-    const channelConversions = await prisma.lead.groupBy({
-      by: ['channel'],
-      where: { tenantId, status: 'WON' },
-      _count: { _all: true }
-    });
+    // Read from the daily rollups (day granularity, UTC); cost scales with days, not events.
+    const [timeSeries, channelTotals] = await Promise.all([
+      getDailyTimeSeries(tenantId, utcDay(since)),
+      getChannelTotals(tenantId)
+    ]);
 
-    const channelConversionMap = new Map(channelConversions.map(c => [c.channel, c._count._all]));
-    
-    const channelStats = channelPerformance.map(cp => ({
-      channel: cp.channel,
-      total: cp._count._all,
-      converted: channelConversionMap.get(cp.channel) || 0,
-      conversionRate: ((channelConversionMap.get(cp.channel) || 0) / cp._count._all * 100).toFixed(1)
+    const channelStats = channelTotals.map((c) => ({
+      channel: c.channel,
+      total: c.total,
+      converted: c.won,
+      conversionRate: ((c.won / c.total) * 100).toFixed(1)
     }));
 
     res.json({
@@ -1090,6 +804,24 @@ routes.get(
   })
 );
 
+// Recompute the daily rollups from source tables (after imports, restores or drift).
+routes.post(
+  '/analytics/rollups/rebuild',
+  asyncHandler(async (req, res) => {
+    const { tenantId, role, userId } = getAuthContext(req);
+    if (role !== 'OWNER' && role !== 'ADMIN') throw new Error('Forbidden');
+
+    const { job, alreadyRunning } = await startBackgroundJob({
+      tenantId,
+      type: 'ROLLUP_REBUILD',
+      createdById: userId,
+      run: () => rebuildDailyRollups(tenantId)
+    });
+
+    res.status(202).json({ ok: true, jobId: job.id, alreadyRunning });
+  })
+);
+
 // Export analytics data as CSV
 routes.get(
   '/analytics/export',
@@ -1098,113 +830,120 @@ routes.get(
     if (role === 'SALESMAN') throw new Error('Forbidden');
 
     const reportType = z.enum(['leads', 'success', 'salesmen']).parse((req.query as any)?.type);
+    const day = new Date().toISOString().split('T')[0];
 
     if (reportType === 'leads') {
-      const leads = await prisma.lead.findMany({
-        where: { tenantId },
-        orderBy: { createdAt: 'desc' },
-        take: 5000,
-        include: { assignee: { include: { user: true } } }
-      });
-
-      const headers = ['ID', 'Full Name', 'Phone', 'Email', 'Channel', 'Status', 'Heat', 'Assigned To', 'Created At'];
-      const rows = leads.map(l => [
-        l.id,
-        l.fullName ?? '',
-        l.phone ?? '',
-        l.email ?? '',
-        l.channel,
-        l.status,
-        l.heat,
-        l.assignee?.user.displayName ?? 'Unassigned',
-        l.createdAt.toISOString()
-      ]);
-
-      const csvLines = [headers, ...rows].map(row =>
-        row.map(cell => `"${String(cell).replace(/"/g, '""')}"`).join(',')
+      const fetchPage = (cursor: KeysetCursor | null, take: number) =>
+        prisma.lead.findMany({
+          where: cursor ? { tenantId, ...leadsUpdatedBefore(cursor) } : { tenantId },
+          orderBy: [{ updatedAt: 'desc' }, { id: 'desc' }],
+          take,
+          include: { assignee: { include: { user: { select: { displayName: true } } } } }
+        });
+      type LeadRow = Awaited<ReturnType<typeof fetchPage>>[number];
+
+      const columns = selectCsvColumns<LeadRow>(
+        [
+          { key: 'id', header: 'ID', value: (l) => l.id },
+          { key: 'fullName', header: 'Full Name', value: (l) => l.fullName },
+          { key: 'phone', header: 'Phone', value: (l) => l.phone },
+          { key: 'email', header: 'Email', value: (l) => l.email },
+          { key: 'channel', header: 'Channel', value: (l) => l.channel },
+          { key: 'status', header: 'Status', value: (l) => l.status },
+          { key: 'heat', header: 'Heat', value: (l) => l.heat },
+          { key: 'assignedTo', header: 'Assigned To', value: (l) => l.assignee?.user.displayName ?? 'Unassigned' },
+          { key: 'createdAt', header: 'Created At', value: (l) => l.createdAt.toISOString() }
+        ],
+        (req.query as any)?.columns
       );
-      const csv = csvLines.join('\n');
 
-      res.setHeader('Content-Type', 'text/csv');
-      res.setHeader('Content-Disposition', `attachment; filename="leads-report-${new Date().toISOString().split('T')[0]}.csv"`);
-      res.send(csv);
-    } else if (reportType === 'success') {
-      const events = await prisma.successEvent.findMany({
-        where: { tenantId },
-        orderBy: { createdAt: 'desc' },
-        take: 5000,
-        include: {
-          lead: { select: { fullName: true, phone: true } },
-          salesman: { include: { user: true } },
-          definition: { select: { name: true } }
-        }
+      await streamCsv(req, res, {
+        filename: `leads-report-${day}.csv`,
+        columns,
+        pages: keysetPages(fetchPage, (lead) => lead.updatedAt)
       });
-
-      const headers = ['ID', 'Type', 'Definition', 'Weight', 'Lead Name', 'Lead Phone', 'Salesman', 'Note', 'Created At'];
-      const rows = events.map(e => [
-        e.id,
-        e.type,
-        e.definition?.name ?? e.type,
-        e.weight,
-        e.lead.fullName ?? '',
-        e.lead.phone ?? '',
-        e.salesman?.user.displayName ?? 'Unknown',
-        e.note ?? '',
-        e.createdAt.toISOString()
-      ]);
-
-      const csvLines = [headers, ...rows].map(row =>
-        row.map(cell => `"${String(cell).replace(/"/g, '""')}"`).join(',')
-      );
-      const csv = csvLines.join('\n');
-
-      res.setHeader('Content-Type', 'text/csv');
-      res.setHeader('Content-Disposition', `attachment; filename="success-report-${new Date().toISOString().split('T')[0]}.csv"`);
-      res.send(csv);
-    } else if (reportType === 'salesmen') {
-      const salesmen = await prisma.salesman.findMany({
-        where: { tenantId },
-        include: {
-          user: true,
-          assignedLeads: {
-            where: { status: { notIn: ['WON', 'LOST'] } }
+    } else if (reportType === 'success') {
+      const fetchPage = (cursor: KeysetCursor | null, take: number) =>
+        prisma.successEvent.findMany({
+          where: cursor
+            ? {
+                tenantId,
+                OR: [{ createdAt: { lt: cursor.at } }, { createdAt: cursor.at, id: { lt: cursor.id } }]
+              }
+            : { tenantId },
+          orderBy: [{ createdAt: 'desc' }, { id: 'desc' }],
+          take,
+          include: {
+            lead: { select: { fullName: true, phone: true } },
+            salesman: { include: { user: { select: { displayName: true } } } },
+            definition: { select: { name: true } }
           }
-        }
-      });
+        });
+      type SuccessRow = Awaited<ReturnType<typeof fetchPage>>[number];
+
+      const columns = selectCsvColumns<SuccessRow>(
+        [
+          { key: 'id', header: 'ID', value: (e) => e.id },
+          { key: 'type', header: 'Type', value: (e) => e.type },
+          { key: 'definition', header: 'Definition', value: (e) => e.definition?.name ?? e.type },
+          { key: 'weight', header: 'Weight', value: (e) => e.weight },
+          { key: 'leadName', header: 'Lead Name', value: (e) => e.lead.fullName },
+          { key: 'leadPhone', header: 'Lead Phone', value: (e) => e.lead.phone },
+          { key: 'salesman', header: 'Salesman', value: (e) => e.salesman?.user.displayName ?? 'Unknown' },
+          { key: 'note', header: 'Note', value: (e) => e.note },
+          { key: 'createdAt', header: 'Created At', value: (e) => e.createdAt.toISOString() }
+        ],
+        (req.query as any)?.columns
+      );
 
-      const successCounts = await prisma.successEvent.groupBy({
-        by: ['salesmanId'],
-        where: { tenantId },
-        _count: { _all: true },
-        _sum: { weight: true }
+      await streamCsv(req, res, {
+        filename: `success-report-${day}.csv`,
+        columns,
+        pages: keysetPages(fetchPage, (event) => event.createdAt)
       });
+    } else if (reportType === 'salesmen') {
+      const [salesmen, openLeads, successCounts] = await Promise.all([
+        prisma.salesman.findMany({
+          where: { tenantId },
+          include: { user: { select: { displayName: true, email: true } } }
+        }),
+        prisma.lead.groupBy({
+          by: ['assignedToSalesmanId'],
+          where: { tenantId, assignedToSalesmanId: { not: null }, status: { notIn: ['WON', 'LOST'] } },
+          _count: { _all: true }
+        }),
+        prisma.successEvent.groupBy({
+          by: ['salesmanId'],
+          where: { tenantId },
+          _count: { _all: true },
+          _sum: { weight: true }
+        })
+      ]);
 
+      const openLeadMap = new Map(openLeads.map((x) => [x.assignedToSalesmanId, x._count._all]));
       const successMap = new Map(successCounts.map(s => [s.salesmanId, { count: s._count._all, weight: s._sum.weight || 0 }]));
 
-      const headers = ['ID', 'Name', 'Email', 'Active', 'Score', 'Capacity', 'Active Leads', 'Success Events', 'Success Weight'];
-      const rows = salesmen.map(s => {
-        const success = successMap.get(s.id) || { count: 0, weight: 0 };
-        return [
-          s.id,
-          s.user.displayName,
-          s.user.email,
-          s.isActive ? 'Yes' : 'No',
-          s.score,
-          s.capacity,
-          s.assignedLeads.length,
-          success.count,
-          success.weight
-        ];
-      });
-
-      const csvLines = [headers, ...rows].map(row =>
-        row.map(cell => `"${String(cell).replace(/"/g, '""')}"`).join(',')
+      const columns = selectCsvColumns<(typeof salesmen)[number]>(
+        [
+          { key: 'id', header: 'ID', value: (s) => s.id },
+          { key: 'name', header: 'Name', value: (s) => s.user.displayName },
+          { key: 'email', header: 'Email', value: (s) => s.user.email },
+          { key: 'active', header: 'Active', value: (s) => (s.isActive ? 'Yes' : 'No') },
+          { key: 'score', header: 'Score', value: (s) => s.score },
+          { key: 'capacity', header: 'Capacity', value: (s) => s.capacity },
+          { key: 'activeLeads', header: 'Active Leads', value: (s) => openLeadMap.get(s.id) ?? 0 },
+          { key: 'successEvents', header: 'Success Events', value: (s) => successMap.get(s.id)?.count ?? 0 },
+          { key: 'successWeight', header: 'Success Weight', value: (s) => successMap.get(s.id)?.weight ?? 0 }
+        ],
+        (req.query as any)?.columns
       );
-      const csv = csvLines.join('\n');
 
-      res.setHeader('Content-Type', 'text/csv');
-      res.setHeader('Content-Disposition', `attachment; filename="salesmen-report-${new Date().toISOString().split('T')[0]}.csv"`);
-      res.send(csv);
+      // One row per salesman; small enough to send as a single page.
+      await streamCsv(req, res, {
+        filename: `salesmen-report-${day}.csv`,
+        columns,
+        pages: [salesmen]
+      });
     }
   })
 );
@@ -1277,12 +1016,39 @@ routes.post(
         reason: 'AUTO_ESCALATED'
       }))
     });
+    resetLoadLedger(tenant.id);
+    invalidateDashboardStats(tenant.id);
+    for (const lead of leads) bumpDailyRollup(tenant.id, lead.channel, { newLeads: 1 }, lead.createdAt);
 
     res.json({ ok: true, salesmen: createdSalesmen, leads });
   })
 );
 
-// Leads
+// Filters shared by GET /leads and GET /leads/export/csv.
+const leadListQuery = z.object({
+  search: z.string().max(200).optional(),
+  q: z.string().max(200).optional(),
+  status: z.enum(['NEW', 'CONTACTED', 'QUALIFIED', 'QUOTED', 'WON', 'LOST', 'ON_HOLD']).optional(),
+  heat: z.enum(['COLD', 'WARM', 'HOT', 'VERY_HOT', 'ON_FIRE']).optional(),
+  channel: z
+    .enum([
+      'MANUAL',
+      'WHATSAPP',
+      'FACEBOOK',
+      'INSTAGRAM',
+      'INDIAMART',
+      'JUSTDIAL',
+      'GEM',
+      'PHONE',
+      'EMAIL',
+      'PERSONAL_VISIT',
+      'OTHER'
+    ])
+    .optional(),
+  assignee: z.string().optional()
+});
+
+// Leads (newest activity first). Pass `nextCursor` back as `cursor` for the next page.
 routes.get(
   '/leads',
   asyncHandler(async (req, res) => {
@@ -1295,21 +1061,48 @@ routes.get(
 
     if (role === 'SALESMAN' && !salesman) throw new Error('Salesman profile not found');
 
-    const where = {
-      tenantId,
-      ...(role === 'SALESMAN' && salesman ? { assignedToSalesmanId: salesman.id } : {})
-    } as const;
+    const query = leadListQuery
+      .extend({
+        cursor: z.string().optional(),
+        limit: z.coerce.number().int().min(1).max(500).default(200)
+      })
+      .parse(req.query);
 
-    const leads = await prisma.lead.findMany({
-      where,
-      orderBy: { updatedAt: 'desc' },
-      take: 200
+    const where = buildLeadListWhere(tenantId, {
+      ...query,
+      search: query.search ?? query.q,
+      assignee: role === 'SALESMAN' && salesman ? salesman.id : query.assignee
+    });
+    const cursor = query.cursor ? decodeCursor(query.cursor) : null;
+
+    const page = await prisma.lead.findMany({
+      where: cursor ? { AND: [where, leadsUpdatedBefore(cursor)] } : where,
+      orderBy: [{ updatedAt: 'desc' }, { id: 'desc' }],
+      take: query.limit + 1
     });
 
-    res.json({ leads });
+    const leads = page.slice(0, query.limit);
+    const last = leads[leads.length - 1];
+    const nextCursor = page.length > query.limit && last ? encodeCursor({ at: last.updatedAt, id: last.id }) : null;
+
+    res.json({ leads, nextCursor });
   })
 );
 
+const leadCsvColumns: CsvColumn<Lead>[] = [
+  { key: 'id', header: 'ID', value: (l) => l.id },
+  { key: 'fullName', header: 'Full Name', value: (l) => l.fullName },
+  { key: 'phone', header: 'Phone', value: (l) => l.phone },
+  { key: 'email', header: 'Email', value: (l) => l.email },
+  { key: 'channel', header: 'Channel', value: (l) => l.channel },
+  { key: 'status', header: 'Status', value: (l) => l.status },
+  { key: 'heat', header: 'Heat', value: (l) => l.heat },
+  { key: 'language', header: 'Language', value: (l) => l.language },
+  { key: 'assignedTo', header: 'Assigned To', value: (l) => l.assignedToSalesmanId },
+  { key: 'createdAt', header: 'Created At', value: (l) => l.createdAt.toISOString() },
+  { key: 'updatedAt', header: 'Updated At', value: (l) => l.updatedAt.toISOString() }
+];
+
 routes.get(
   '/leads/export/csv',
   asyncHandler(async (req, res) => {
@@ -1322,139 +1115,64 @@ routes.get(
 
     if (role === 'SALESMAN' && !salesman) throw new Error('Salesman profile not found');
 
-    const where = {
-      tenantId,
-      ...(role === 'SALESMAN' && salesman ? { assignedToSalesmanId: salesman.id } : {})
-    } as const;
+    const filters = leadListQuery
+      .extend({
+        createdFrom: z.coerce.date().optional(),
+        createdTo: z.coerce.date().optional(),
+        // Pre-`assignee` name of the filter; existing export links still use it.
+        salesmanId: z.string().optional()
+      })
+      .parse(req.query);
+    const columns = selectCsvColumns(leadCsvColumns, (req.query as any)?.columns);
+
+    const where: Prisma.LeadWhereInput = {
+      ...buildLeadListWhere(tenantId, {
+        ...filters,
+        search: filters.search ?? filters.q,
+        assignee: role === 'SALESMAN' && salesman ? salesman.id : filters.assignee ?? filters.salesmanId
+      }),
+      ...(filters.createdFrom || filters.createdTo
+        ? { createdAt: { gte: filters.createdFrom, lte: filters.createdTo } }
+        : {})
+    };
 
-    const leads = await prisma.lead.findMany({
-      where,
-      orderBy: { updatedAt: 'desc' },
-      take: 1000
+    await streamCsv(req, res, {
+      filename: `leads-${new Date().toISOString().split('T')[0]}.csv`,
+      columns,
+      pages: keysetPages(
+        (cursor, take) =>
+          prisma.lead.findMany({
+            where: cursor ? { AND: [where, leadsUpdatedBefore(cursor)] } : where,
+            orderBy: [{ updatedAt: 'desc' }, { id: 'desc' }],
+            take
+          }),
+        (lead) => lead.updatedAt
+      )
     });
-
-    // Build CSV
-    const headers = ['ID', 'Full Name', 'Phone', 'Email', 'Channel', 'Status', 'Heat', 'Language', 'Assigned To', 'Created At', 'Updated At'];
-    const rows = leads.map((l) => [
-      l.id,
-      l.fullName ?? '',
-      l.phone ?? '',
-      l.email ?? '',
-      l.channel,
-      l.status,
-      l.heat,
-      l.language,
-      l.assignedToSalesmanId ?? '',
-      l.createdAt.toISOString(),
-      l.updatedAt.toISOString()
-    ]);
-
-    const csvLines = [headers, ...rows].map((row) =>
-      row.map((cell) => `"${String(cell).replace(/"/g, '""')}"`).join(',')
-    );
-    const csv = csvLines.join('\n');
-
-    res.setHeader('Content-Type', 'text/csv');
-    res.setHeader('Content-Disposition', `attachment; filename="leads-${new Date().toISOString().split('T')[0]}.csv"`);
-    res.send(csv);
   })
 );
 
 routes.post(
   '/leads/import/csv',
   asyncHandler(async (req, res) => {
-    const { tenantId, role } = getAuthContext(req);
+    const { tenantId, role, userId } = getAuthContext(req);
     if (role === 'SALESMAN') throw new Error('Forbidden');
 
-    const { csvData } = z.object({ csvData: z.string() }).parse(req.body);
-
-    // Parse CSV (simple parser for headers + rows)
-    const lines = csvData.split('\n').filter((line) => line.trim());
-    if (lines.length < 2) throw new Error('CSV must have headers and at least one data row');
-
-    const headers = lines[0].split(',').map((h) => h.trim().replace(/^"|"$/g, ''));
-    const rows = lines.slice(1).map((line) => {
-      const values: string[] = [];
-      let current = '';
-      let inQuotes = false;
-      
-      for (let i = 0; i < line.length; i++) {
-        const char = line[i];
-        if (char === '"') {
-          if (inQuotes && line[i + 1] === '"') {
-            current += '"';
-            i++;
-          } else {
-            inQuotes = !inQuotes;
-          }
-        } else if (char === ',' && !inQuotes) {
-          values.push(current.trim());
-          current = '';
-        } else {
-          current += char;
-        }
-      }
-      values.push(current.trim());
-      return values;
+    // Raw CSV body (text/csv) or legacy JSON { csvData }; parsed and inserted by a
+    // background job. Poll GET /jobs/:id for progress and row-level errors.
+    const file = await receiveLeadImportUpload(req);
+    const { job, alreadyRunning } = await startBackgroundJob({
+      tenantId,
+      type: 'LEAD_IMPORT',
+      createdById: userId,
+      run: (ctx) => importLeadsFromCsv(tenantId, file, ctx)
     });
-
-    const fullNameIdx = headers.findIndex((h) => h.toLowerCase().includes('name'));
-    const phoneIdx = headers.findIndex((h) => h.toLowerCase().includes('phone'));
-    const emailIdx = headers.findIndex((h) => h.toLowerCase().includes('email'));
-    const channelIdx = headers.findIndex((h) => h.toLowerCase().includes('channel'));
-
-    let created = 0;
-    let skipped = 0;
-    const errors: string[] = [];
-
-    for (const row of rows) {
-      try {
-        const fullName = fullNameIdx >= 0 ? row[fullNameIdx]?.replace(/^"|"$/g, '') : null;
-        const phone = phoneIdx >= 0 ? row[phoneIdx]?.replace(/^"|"$/g, '') : null;
-        const email = emailIdx >= 0 ? row[emailIdx]?.replace(/^"|"$/g, '') : null;
-        let channel = channelIdx >= 0 ? row[channelIdx]?.replace(/^"|"$/g, '').toUpperCase() : 'OTHER';
-
-        if (!fullName && !phone && !email) {
-          skipped++;
-          continue;
-        }
-
-        // Validate channel
-        const validChannels = [
-          'MANUAL',
-          'WHATSAPP',
-          'FACEBOOK',
-          'INSTAGRAM',
-          'INDIAMART',
-          'JUSTDIAL',
-          'GEM',
-          'PHONE',
-          'EMAIL',
-          'PERSONAL_VISIT',
-          'OTHER'
-        ];
-        if (!validChannels.includes(channel)) channel = 'OTHER';
-
-        await prisma.lead.create({
-          data: {
-            tenantId,
-            channel: channel as any,
-            fullName,
-            phone,
-            email,
-            language: 'EN',
-            heat: 'WARM',
-            status: 'NEW'
-          }
-        });
-        created++;
-      } catch (e) {
-        errors.push(`Row error: ${e instanceof Error ? e.message : 'Unknown'}`);
-        skipped++;
-      }
+    if (alreadyRunning) {
+      await discardLeadImportUpload(file);
+      throw new HttpError(409, 'Another lead import is still running');
     }
 
-    res.json({ ok: true, created, skipped, errors: errors.slice(0, 10) });
+    res.status(202).json({ ok: true, jobId: job.id });
   })
 );
 
@@ -1464,9 +1182,21 @@ routes.get(
     const { tenantId, role, userId } = getAuthContext(req);
     const leadId = z.string().parse(req.params.id);
 
+    // Summary only: the conversation itself is paged through GET /leads/:id/timeline.
     const lead = await prisma.lead.findFirst({
       where: { id: leadId, tenantId },
-      include: { messages: true, events: true, triageItems: true, successEvents: true }
+      include: {
+        triageItems: { where: { status: 'OPEN' }, orderBy: { createdAt: 'desc' } },
+        successEvents: { orderBy: { createdAt: 'desc' }, take: 20 },
+        messages: {
+          orderBy: [{ createdAt: 'desc' }, { id: 'desc' }],
+          take: 1,
+          select: { id: true, direction: true, channel: true, body: true, createdAt: true }
+        },
+        _count: {
+          select: { messages: true, events: true, notes: true, calls: true, tasks: true, successEvents: true }
+        }
+      }
     });
     if (!lead) throw new Error('Lead not found');
 
@@ -1475,29 +1205,88 @@ routes.get(
       if (!salesman || lead.assignedToSalesmanId !== salesman.id) throw new Error('Forbidden');
     }
 
-    res.json({ lead });
+    const { messages, _count, ...summary } = lead;
+    res.json({ lead: { ...summary, lastMessage: messages[0] ?? null, counts: _count } });
   })
 );
 
-// Delete a lead and all related data (messages, events, etc.)
-routes.delete(
-  '/leads/:id',
+// Conversation timeline: messages, events, notes, calls and tasks merged newest page
+// first. Pass `olderCursor` as `before` to page back, `newerCursor` as `after` to poll.
+routes.get(
+  '/leads/:id/timeline',
   asyncHandler(async (req, res) => {
     const { tenantId, role, userId } = getAuthContext(req);
     const leadId = z.string().parse(req.params.id);
+    const query = z
+      .object({
+        before: z.string().optional(),
+        after: z.string().optional(),
+        limit: z.coerce.number().int().min(1).max(200).default(50),
+        kinds: z.string().optional(),
+        includePayload: z.enum(['0', '1', 'true', 'false']).optional()
+      })
+      .parse(req.query);
+    if (query.before && query.after) throw new HttpError(400, 'Use either before or after, not both');
 
-    // Only OWNER, ADMIN, MANAGER can delete leads
-    if (role === 'SALESMAN') {
-      throw new HttpError(403, 'Salesmen cannot delete leads');
-    }
+    const kinds = query.kinds
+      ? z
+          .array(z.enum(TIMELINE_KINDS))
+          .parse(query.kinds.split(',').map((k) => k.trim()).filter(Boolean))
+      : undefined;
 
     const lead = await prisma.lead.findFirst({
-      where: { id: leadId, tenantId }
+      where: { id: leadId, tenantId },
+      select: { id: true, assignedToSalesmanId: true }
     });
-    if (!lead) throw new HttpError(404, 'Lead not found');
+    if (!lead) throw new Error('Lead not found');
+
+    if (role === 'SALESMAN') {
+      const salesman = await prisma.salesman.findFirst({ where: { tenantId, userId } });
+      if (!salesman || lead.assignedToSalesmanId !== salesman.id) throw new Error('Forbidden');
+    }
+
+    const page = await getLeadTimeline({
+      tenantId,
+      leadId,
+      limit: query.limit,
+      before: query.before ? decodeCursor(query.before) : null,
+      after: query.after ? decodeCursor(query.after) : null,
+      kinds,
+      includePayload: query.includePayload === '1' || query.includePayload === 'true'
+    });
+
+    res.json({
+      items: page.items,
+      olderCursor: page.hasOlder && page.olderCursor ? encodeCursor(page.olderCursor) : null,
+      newerCursor: page.newerCursor ? encodeCursor(page.newerCursor) : query.after ?? null,
+      hasOlder: page.hasOlder,
+      hasNewer: page.hasNewer
+    });
+  })
+);
+
+// Delete a lead and all related data (messages, events, etc.)
+routes.delete(
+  '/leads/:id',
+  asyncHandler(async (req, res) => {
+    const { tenantId, role, userId } = getAuthContext(req);
+    const leadId = z.string().parse(req.params.id);
+
+    // Only OWNER, ADMIN, MANAGER can delete leads
+    if (role === 'SALESMAN') {
+      throw new HttpError(403, 'Salesmen cannot delete leads');
+    }
+
+    const lead = await prisma.lead.findFirst({
+      where: { id: leadId, tenantId }
+    });
+    if (!lead) throw new HttpError(404, 'Lead not found');
 
     // Delete related data in correct order (foreign key constraints)
+    await flushRollups();
     await prisma.$transaction(async (tx) => {
+      await subtractLeadsFromRollups(tx, tenantId, [leadId]);
+
       // Delete triage items
       await tx.triageQueueItem.deleteMany({ where: { leadId, tenantId } });
       
@@ -1525,6 +1314,8 @@ routes.delete(
       // Finally delete the lead
       await tx.lead.delete({ where: { id: leadId } });
     });
+    applyLeadOwnershipChanges(tenantId, [{ before: lead, after: null }]);
+    invalidateDashboardStats(tenantId);
 
     // Audit log
     await createAuditLog({
@@ -1583,6 +1374,8 @@ routes.post(
         language: body.language ?? 'en'
       }
     });
+    bumpDailyRollup(tenantId, lead.channel, { newLeads: 1 }, lead.createdAt);
+    invalidateDashboardStats(tenantId);
 
     res.json({ lead });
   })
@@ -1597,11 +1390,21 @@ routes.post(
       .object({ status: z.enum(['NEW', 'CONTACTED', 'QUALIFIED', 'QUOTED', 'WON', 'LOST', 'ON_HOLD']) })
       .parse(req.body);
 
+    const before = await prisma.lead.findFirst({
+      where: { id: leadId, tenantId },
+      select: { status: true, assignedToSalesmanId: true, channel: true }
+    });
+    if (!before) throw new Error('Lead not found');
+
     const updated = await prisma.lead.updateMany({
       where: { id: leadId, tenantId },
       data: { status: body.status }
     });
     if (updated.count !== 1) throw new Error('Lead not found');
+    applyLeadOwnershipChanges(tenantId, [{ before, after: { ...before, status: body.status } }]);
+    bumpStatusRollups(tenantId, [{ channel: before.channel, from: before.status, to: body.status }]);
+    markLeadScoresDirty(tenantId, [leadId]);
+    invalidateDashboardStats(tenantId);
 
     await prisma.leadEvent.create({
       data: {
@@ -1713,6 +1516,8 @@ routes.post(
 
       return { user, salesman };
     });
+    invalidateSalesmanRoster(tenantId);
+    invalidateDashboardStats(tenantId);
 
     res.json({
       salesman: {
@@ -1758,6 +1563,7 @@ routes.patch(
     if (!salesman) throw new Error('Salesman not found');
 
     await prisma.salesman.update({ where: { id: salesmanId }, data: salesmanData });
+    invalidateSalesmanRoster(tenantId);
 
     // Update user display name if provided
     if (body.displayName) {
@@ -1813,6 +1619,7 @@ routes.post(
       where: { id: item.id },
       data: { status: 'CLOSED' }
     });
+    invalidateDashboardStats(tenantId);
 
     await prisma.leadEvent.create({
       data: {
@@ -1841,6 +1648,7 @@ routes.post(
       where: { id: item.id },
       data: { status: 'OPEN', suggestedSalesmanId: null }
     });
+    invalidateDashboardStats(tenantId);
 
     await prisma.leadEvent.create({
       data: {
@@ -1870,15 +1678,23 @@ routes.post(
     const salesman = await prisma.salesman.findFirst({ where: { id: body.salesmanId, tenantId } });
     if (!salesman) throw new Error('Salesman not found');
 
+    const before = await prisma.lead.findFirst({
+      where: { id: item.leadId, tenantId },
+      select: { status: true, assignedToSalesmanId: true }
+    });
+    if (!before) throw new Error('Lead not found');
+
     await prisma.lead.update({
       where: { id: item.leadId, tenantId },
       data: { assignedToSalesmanId: salesman.id }
     });
+    applyLeadOwnershipChanges(tenantId, [{ before, after: { ...before, assignedToSalesmanId: salesman.id } }]);
 
     await prisma.triageQueueItem.update({
       where: { id: item.id },
       data: { status: 'ASSIGNED', suggestedSalesmanId: salesman.id }
     });
+    invalidateDashboardStats(tenantId);
 
     await prisma.leadEvent.create({
       data: {
@@ -1932,10 +1748,18 @@ routes.post(
       }
     }
 
+    const before = await prisma.lead.findMany({
+      where: { id: { in: body.leadIds }, tenantId },
+      select: { status: true, assignedToSalesmanId: true }
+    });
     const updated = await prisma.lead.updateMany({
       where: { id: { in: body.leadIds }, tenantId },
       data: { assignedToSalesmanId: body.salesmanId }
     });
+    applyLeadOwnershipChanges(
+      tenantId,
+      before.map((lead) => ({ before: lead, after: { ...lead, assignedToSalesmanId: body.salesmanId } }))
+    );
 
     for (const leadId of body.leadIds) {
       await prisma.leadEvent.create({
@@ -1963,10 +1787,24 @@ routes.post(
       status: z.enum(['NEW', 'CONTACTED', 'QUALIFIED', 'QUOTED', 'WON', 'LOST', 'ON_HOLD'])
     }).parse(req.body);
 
+    const before = await prisma.lead.findMany({
+      where: { id: { in: body.leadIds }, tenantId },
+      select: { status: true, assignedToSalesmanId: true, channel: true }
+    });
     const updated = await prisma.lead.updateMany({
       where: { id: { in: body.leadIds }, tenantId },
       data: { status: body.status }
     });
+    applyLeadOwnershipChanges(
+      tenantId,
+      before.map((lead) => ({ before: lead, after: { ...lead, status: body.status } }))
+    );
+    bumpStatusRollups(
+      tenantId,
+      before.map((lead) => ({ channel: lead.channel, from: lead.status, to: body.status }))
+    );
+    markLeadScoresDirty(tenantId, body.leadIds);
+    invalidateDashboardStats(tenantId);
 
     for (const leadId of body.leadIds) {
       await prisma.leadEvent.create({
@@ -1998,13 +1836,24 @@ routes.post(
     // Ensure all leads belong to this tenant
     const existing = await prisma.lead.findMany({
       where: { tenantId, id: { in: body.leadIds } },
-      select: { id: true, channel: true, fullName: true, email: true, phone: true }
+      select: {
+        id: true,
+        channel: true,
+        fullName: true,
+        email: true,
+        phone: true,
+        status: true,
+        assignedToSalesmanId: true
+      }
     });
     if (existing.length !== body.leadIds.length) {
       throw new HttpError(400, 'One or more leads not found');
     }
 
+    await flushRollups();
     await prisma.$transaction(async (tx) => {
+      await subtractLeadsFromRollups(tx, tenantId, body.leadIds);
+
       const leadIdFilter = { tenantId, leadId: { in: body.leadIds } } as const;
 
       await tx.triageQueueItem.deleteMany({ where: leadIdFilter });
@@ -2018,6 +1867,11 @@ routes.post(
 
       await tx.lead.deleteMany({ where: { tenantId, id: { in: body.leadIds } } });
     });
+    applyLeadOwnershipChanges(
+      tenantId,
+      existing.map((lead) => ({ before: lead, after: null }))
+    );
+    invalidateDashboardStats(tenantId);
 
     await createAuditLog({
       tenantId,
@@ -2068,6 +1922,7 @@ routes.post(
       where: { id: leadId },
       data: { assignedToSalesmanId: body.salesmanId }
     });
+    applyLeadOwnershipChanges(tenantId, [{ before: lead, after: { ...lead, assignedToSalesmanId: body.salesmanId } }]);
 
     await prisma.leadEvent.create({
       data: {
@@ -2151,6 +2006,7 @@ routes.post(
         content: body.content
       }
     });
+    recordLeadActivity(tenantId, leadId, { kind: 'NOTE', at: note.createdAt });
 
     await prisma.leadEvent.create({
       data: {
@@ -2229,6 +2085,7 @@ routes.post(
         recordingUrl: input.recordingUrl
       }
     });
+    recordLeadActivity(tenantId, leadId, { kind: 'CALL', outcome: call.outcome, at: call.createdAt });
 
     await prisma.leadEvent.create({
       data: {
@@ -2393,6 +2250,9 @@ routes.patch(
       where: { id: taskId },
       data: updateData
     });
+    if ((existingTask.status === 'COMPLETED') !== (task.status === 'COMPLETED')) {
+      recordLeadActivity(tenantId, task.leadId, { kind: 'TASK_COMPLETED', delta: task.status === 'COMPLETED' ? 1 : -1 });
+    }
 
     await prisma.leadEvent.create({
       data: {
@@ -2436,6 +2296,9 @@ routes.delete(
     await prisma.task.delete({
       where: { id: taskId }
     });
+    if (existingTask.status === 'COMPLETED') {
+      recordLeadActivity(tenantId, existingTask.leadId, { kind: 'TASK_COMPLETED', delta: -1 });
+    }
 
     await prisma.leadEvent.create({
       data: {
@@ -2616,53 +2479,21 @@ routes.post(
       }
     }
 
-    // Send via WhatsApp if channel is WHATSAPP and phone exists
-    let whatsappMessageId: string | undefined;
-    let emailMessageId: string | undefined;
-    
-    if (body.channel === 'WHATSAPP' && lead.phone) {
-      const { sendWhatsAppMessage } = await import('./services/whatsapp.js');
-      const result = await sendWhatsAppMessage({
-        to: lead.phone,
-        message: body.content
-      });
-      
-      if (!result.success) {
-        console.error('Failed to send WhatsApp message:', result.error);
-        // Continue anyway to log the message attempt
-      } else {
-        whatsappMessageId = result.messageId;
-      }
-    }
-
-    // Send via Email if channel is EMAIL and email exists
-    if (body.channel === 'EMAIL' && lead.email) {
-      const { sendEmail } = await import('./services/email.js');
-      const result = await sendEmail({
-        to: lead.email,
-        subject: `Re: Enquiry from ${lead.fullName || 'Customer'}`,
-        text: body.content,
-      });
-      
-      if (!result.success) {
-        console.error('Failed to send email:', result.error);
-        // Continue anyway to log the message attempt
-      } else {
-        emailMessageId = result.messageId;
-      }
-    }
-
-    // Log as outbound message
-    const message = await prisma.message.create({
-      data: {
-        tenantId,
-        leadId,
-        conversationId: conversation.id,
-        direction: 'OUT',
-        channel: body.channel as any,
-        body: body.content
-      }
+    // WhatsApp/email go out through the dispatcher; the row starts QUEUED and is moved to
+    // SENT/FAILED by the worker. Other channels are only logged.
+    const { enqueueOutboundMessage } = await import('./services/outbound.js');
+    const message = await enqueueOutboundMessage({
+      tenantId,
+      leadId,
+      conversationId: conversation.id,
+      channel: body.channel,
+      body: body.content,
+      to: body.channel === 'WHATSAPP' ? lead.phone : body.channel === 'EMAIL' ? lead.email : null,
+      subject: body.channel === 'EMAIL' ? `Re: Enquiry from ${lead.fullName || 'Customer'}` : undefined,
+      userId
     });
+    recordLeadActivity(tenantId, leadId, { kind: 'MESSAGE', direction: 'OUT', at: message.createdAt });
+    bumpMessageRollup(tenantId, message.channel, message.direction, message.createdAt);
 
     // Create event
     await prisma.leadEvent.create({
@@ -2674,8 +2505,7 @@ routes.post(
           messageId: message.id, 
           channel: body.channel, 
           userId,
-          whatsappMessageId,
-          emailMessageId
+          status: message.status
         }
       }
     });
@@ -2686,13 +2516,17 @@ routes.post(
         where: { id: leadId },
         data: { status: 'CONTACTED' }
       });
+      invalidateDashboardStats(tenantId);
     }
 
     // Mark SLA as responded
     const { markSlaResponded } = await import('./services/sla.js');
-    await markSlaResponded(leadId);
+    await markSlaResponded(tenantId, leadId);
 
-    res.json({ ok: true, message: { id: message.id, createdAt: message.createdAt.toISOString() } });
+    res.json({
+      ok: true,
+      message: { id: message.id, createdAt: message.createdAt.toISOString(), status: message.status }
+    });
   })
 );
 
@@ -2719,6 +2553,7 @@ routes.get(
           considerSkills: false
         }
       });
+      invalidateSalesmanRoster(tenantId);
     }
 
     res.json({ config });
@@ -2762,6 +2597,7 @@ routes.patch(
         data: body
       });
     }
+    invalidateSalesmanRoster(tenantId);
 
     res.json({ ok: true, config });
   })
@@ -2795,7 +2631,7 @@ routes.post(
     const lead = await prisma.lead.findFirst({ where: { id: body.leadId, tenantId } });
     if (!lead) throw new Error('Lead not found');
 
-    const ai = await createAiGatewayForTenant(prisma, tenantId);
+    const ai = await getAiGatewayForTenant(prisma, tenantId);
 
     const triage = await ai.triage({
       leadId: lead.id,
@@ -2807,6 +2643,8 @@ routes.post(
       where: { id: lead.id },
       data: { language: triage.language, heat: triage.heat }
     });
+    markLeadScoresDirty(tenantId, [lead.id]);
+    invalidateDashboardStats(tenantId);
 
     await prisma.leadEvent.create({
       data: {
@@ -2849,7 +2687,7 @@ routes.post(
     const lead = await prisma.lead.findFirst({ where: { id: body.leadId, tenantId } });
     if (!lead) throw new Error('Lead not found');
 
-    const ai = await createAiGatewayForTenant(prisma, tenantId);
+    const ai = await getAiGatewayForTenant(prisma, tenantId);
 
     const draft = await ai.draftReply({
       leadId: lead.id,
@@ -2882,6 +2720,7 @@ routes.post(
             reason: draft.escalationReason ?? 'AI_ESCALATION'
           }
         });
+        invalidateDashboardStats(tenantId);
 
         await notifyTenantRoles({
           tenantId,
@@ -2899,325 +2738,6 @@ routes.post(
   })
 );
 
-const ingestMessageBodySchema = z.object({
-  botId: z.string().optional(),
-  channel: z.enum([
-    'MANUAL',
-    'WHATSAPP',
-    'FACEBOOK',
-    'INSTAGRAM',
-    'INDIAMART',
-    'JUSTDIAL',
-    'GEM',
-    'PHONE',
-    'EMAIL',
-    'PERSONAL_VISIT',
-    'OTHER'
-  ]),
-  externalId: z.string().optional(),
-  fullName: z.string().optional(),
-  phone: z.string().optional(),
-  email: z.string().optional(),
-  customerMessage: z.string().min(1).optional(),
-  text: z.string().min(1).optional()
-});
-
-const ingestMessageSchema = ingestMessageBodySchema.refine((v) => Boolean(v.customerMessage ?? v.text), {
-  path: ['customerMessage'],
-  message: 'Required'
-});
-
-async function ensureConversation(params: {
-  tenantId: string;
-  leadId: string;
-  channel: z.infer<typeof ingestMessageBodySchema>['channel'];
-}) {
-  const now = new Date();
-  return prisma.conversation.upsert({
-    where: { leadId: params.leadId },
-    update: { lastMessageAt: now },
-    create: {
-      tenantId: params.tenantId,
-      leadId: params.leadId,
-      channel: params.channel as any,
-      lastMessageAt: now
-    }
-  });
-}
-
-async function upsertClientFromIngest(params: {
-  tenantId: string;
-  fullName?: string;
-  phone?: string;
-  email?: string;
-}) {
-  const { tenantId, fullName, phone, email } = params;
-  if (!phone && !email) return null;
-
-  const existing =
-    (phone
-      ? await prisma.client.findFirst({ where: { tenantId, phone } })
-      : null) ??
-    (email
-      ? await prisma.client.findFirst({ where: { tenantId, email } })
-      : null);
-
-  if (!existing) {
-    return prisma.client.create({
-      data: {
-        tenantId,
-        contactName: fullName,
-        phone,
-        email
-      }
-    });
-  }
-
-  const update: Record<string, unknown> = {};
-  if (!existing.contactName && fullName) update.contactName = fullName;
-  if (!existing.phone && phone) update.phone = phone;
-  if (!existing.email && email) update.email = email;
-
-  if (Object.keys(update).length === 0) return existing;
-  return prisma.client.update({ where: { id: existing.id }, data: update });
-}
-
-export async function handleIngestMessage(params: {
-  tenantId: string;
-  body: z.infer<typeof ingestMessageSchema>;
-}) {
-  const { tenantId, body } = params;
-
-  const customerMessage = body.customerMessage ?? body.text;
-  if (!customerMessage) throw new Error('customerMessage is required');
-
-  const bot = body.botId
-    ? await prisma.bot.findFirst({ where: { id: body.botId, tenantId, isActive: true } })
-    : null;
-
-  const client = await upsertClientFromIngest({
-    tenantId,
-    fullName: body.fullName,
-    phone: body.phone,
-    email: body.email
-  });
-
-  // Try to find an existing lead:
-  // - idempotency: channel+externalId
-  // - else: most recent OPEN lead for this client/contact in same channel
-  let lead = null as any;
-  if (body.externalId) {
-    lead = await prisma.lead.findFirst({
-      where: { tenantId, channel: body.channel as any, externalId: body.externalId }
-    });
-  }
-
-  if (!lead && client) {
-    lead = await prisma.lead.findFirst({
-      where: {
-        tenantId,
-        channel: body.channel as any,
-        clientId: client.id,
-        status: { notIn: ['WON', 'LOST'] }
-      },
-      orderBy: { createdAt: 'desc' }
-    });
-  }
-
-  if (!lead && body.phone) {
-    lead = await prisma.lead.findFirst({
-      where: {
-        tenantId,
-        channel: body.channel as any,
-        phone: body.phone,
-        status: { notIn: ['WON', 'LOST'] }
-      },
-      orderBy: { createdAt: 'desc' }
-    });
-  }
-
-  if (!lead && body.email) {
-    lead = await prisma.lead.findFirst({
-      where: {
-        tenantId,
-        channel: body.channel as any,
-        email: body.email,
-        status: { notIn: ['WON', 'LOST'] }
-      },
-      orderBy: { createdAt: 'desc' }
-    });
-  }
-
-  let createdNewLead = false;
-  if (!lead) {
-    lead = await prisma.lead.create({
-      data: {
-        tenantId,
-        clientId: client?.id ?? null,
-        channel: body.channel as any,
-        externalId: body.externalId,
-        fullName: body.fullName ?? client?.contactName ?? null,
-        phone: body.phone ?? client?.phone ?? null,
-        email: body.email ?? client?.email ?? null,
-        language: 'en'
-      }
-    });
-    createdNewLead = true;
-  } else if (!lead.clientId && client) {
-    // Backfill link for legacy leads
-    lead = await prisma.lead.update({ where: { id: lead.id }, data: { clientId: client.id } });
-  }
-
-  const conversation = await ensureConversation({ tenantId, leadId: lead.id, channel: body.channel });
-
-  await prisma.message.create({
-    data: {
-      tenantId,
-      leadId: lead.id,
-      conversationId: conversation.id,
-      direction: 'IN',
-      channel: body.channel as any,
-      body: customerMessage,
-      raw: { botId: bot?.id ?? null }
-    }
-  });
-
-  // Trigger SLA monitoring
-  const { triggerSlaMonitoring } = await import('./services/sla.js');
-  
-  if (createdNewLead) {
-    // New lead SLA
-    await triggerSlaMonitoring({
-      tenantId,
-      leadId: lead.id,
-      event: 'NEW_LEAD',
-      lead: { status: lead.status, heat: lead.heat, channel: lead.channel }
-    });
-  } else {
-    // Message received SLA
-    await triggerSlaMonitoring({
-      tenantId,
-      leadId: lead.id,
-      event: 'MESSAGE_RECEIVED',
-      lead: { status: lead.status, heat: lead.heat, channel: lead.channel }
-    });
-  }
-
-  const ai = await createAiGatewayForTenant(prisma, tenantId);
-
-  // AI triage updates language + heat.
-  const triage = await ai.triage({
-    leadId: lead.id,
-    channel: lead.channel,
-    customerMessage
-  });
-
-  await prisma.lead.update({
-    where: { id: lead.id },
-    data: { language: triage.language, heat: triage.heat }
-  });
-
-  await prisma.leadEvent.create({
-    data: {
-      tenantId,
-      leadId: lead.id,
-      type: 'AI_TRIAGE',
-      payload: triage
-    }
-  });
-
-  const pricingAllowed = bot?.pricingMode === 'STANDARD';
-  const draft = await ai.draftReply({
-    leadId: lead.id,
-    channel: lead.channel,
-    customerMessage,
-    pricingAllowed
-  });
-
-  await prisma.leadEvent.create({
-    data: {
-      tenantId,
-      leadId: lead.id,
-      type: 'AI_DRAFT_REPLY',
-      payload: { ...draft, botId: bot?.id ?? null }
-    }
-  });
-
-  if (draft.shouldEscalate) {
-    const existing = await prisma.triageQueueItem.findFirst({
-      where: { tenantId, leadId: lead.id, status: 'OPEN' }
-    });
-
-    if (!existing) {
-      await prisma.triageQueueItem.create({
-        data: {
-          tenantId,
-          leadId: lead.id,
-          reason: draft.escalationReason ?? 'AI_ESCALATION',
-          suggestedSalesmanId: null
-        }
-      });
-
-      await notifyTenantRoles({
-        tenantId,
-        roles: ['OWNER', 'ADMIN', 'MANAGER'],
-        type: 'TRIAGE_ESCALATED',
-        title: 'Triage escalation',
-        body: `${draft.escalationReason ?? 'AI_ESCALATION'} (lead ${lead.fullName ?? lead.phone ?? lead.id})`,
-        entityType: 'Lead',
-        entityId: lead.id
-      });
-    }
-  } else {
-    // Auto-assign if unassigned.
-    const current = await prisma.lead.findFirst({
-      where: { id: lead.id, tenantId },
-      select: { assignedToSalesmanId: true }
-    });
-
-    const shouldAutoAssign = body.channel !== 'PERSONAL_VISIT' && lead.channel !== 'PERSONAL_VISIT';
-    if (shouldAutoAssign && !current?.assignedToSalesmanId) {
-      const picked = await pickSalesmanRoundRobin(prisma, tenantId, lead.id);
-      if (picked) {
-        await prisma.lead.update({ where: { id: lead.id }, data: { assignedToSalesmanId: picked.id } });
-        await prisma.leadEvent.create({
-          data: {
-            tenantId,
-            leadId: lead.id,
-            type: 'AUTO_ASSIGNED',
-            payload: { salesmanId: picked.id, mode: 'WEIGHTED' }
-          }
-        });
-
-        await createNotificationForUser({
-          tenantId,
-          userId: picked.userId,
-          type: 'LEAD_ASSIGNED',
-          title: 'New lead assigned',
-          body: `${lead.fullName ?? lead.phone ?? lead.id}`,
-          entityType: 'Lead',
-          entityId: lead.id
-        });
-      }
-    }
-
-    // Persist the assistant reply as an OUT message (simulation).
-    await prisma.message.create({
-      data: {
-        tenantId,
-        leadId: lead.id,
-        conversationId: conversation.id,
-        direction: 'OUT',
-        channel: body.channel as any,
-        body: draft.message,
-        raw: { botId: bot?.id ?? null, simulated: true }
-      }
-    });
-  }
-
-  return { ok: true, leadId: lead.id, triage, draft } as const;
-}
-
 // External webhook ingestion (no cookie/dev headers) secured by WEBHOOK_SECRET.
 routes.post(
   '/webhooks/ingest/message',
@@ -3242,8 +2762,13 @@ routes.post(
     const { tenantId, ...rest } = body;
 
     const ingestBody = ingestMessageSchema.parse(rest);
-    const out = await handleIngestMessage({ tenantId, body: ingestBody });
-    res.json(out);
+    const { jobId, duplicate } = await enqueueIngest({
+      tenantId,
+      source: 'WEBHOOK_INGEST',
+      payload: { body: ingestBody },
+      dedupeKey: ingestBody.externalId ? `ingest:${tenantId}:${ingestBody.channel}:${ingestBody.externalId}` : undefined
+    });
+    res.status(202).json({ ok: true, queued: true, jobId, duplicate });
   })
 );
 
@@ -3287,29 +2812,33 @@ routes.post(
 routes.post(
   '/leads/bulk/recalculate-scores',
   asyncHandler(async (req, res) => {
-    const { tenantId, role } = getAuthContext(req);
+    const { tenantId, role, userId } = getAuthContext(req);
     if (role === 'SALESMAN') {
       res.status(403).json({ error: 'Forbidden' });
       return;
     }
 
-    const leads = await prisma.lead.findMany({
-      where: { tenantId },
-      select: { id: true }
+    // Runs as a background job; poll GET /jobs/:id for progress and the final counts.
+    const { job, alreadyRunning } = await startBackgroundJob({
+      tenantId,
+      type: 'LEAD_SCORE_RECALC',
+      createdById: userId,
+      run: (ctx) => recalculateTenantLeadScores(tenantId, ctx)
     });
 
-    let updated = 0;
-    for (const lead of leads) {
-      try {
-        await updateLeadScore(lead.id);
-        updated++;
-      } catch (err) {
-        // eslint-disable-next-line no-console
-        console.error(`Failed to update score for lead ${lead.id}:`, err);
-      }
-    }
+    res.status(202).json({ ok: true, jobId: job.id, alreadyRunning });
+  })
+);
+
+routes.get(
+  '/jobs/:id',
+  asyncHandler(async (req, res) => {
+    const { tenantId, role } = getAuthContext(req);
+    if (role === 'SALESMAN') throw new Error('Forbidden');
 
-    res.json({ ok: true, totalLeads: leads.length, updated });
+    const job = await getBackgroundJob(tenantId, z.string().parse(req.params.id));
+    if (!job) throw new HttpError(404, 'Job not found');
+    res.json({ job });
   })
 );
 
@@ -3362,6 +2891,10 @@ routes.post(
       salesmanId: z.string()
     }).parse(req.body);
 
+    const before = await prisma.lead.findMany({
+      where: { id: { in: body.leadIds }, tenantId },
+      select: { status: true, assignedToSalesmanId: true }
+    });
     const result = await prisma.lead.updateMany({
       where: { 
         id: { in: body.leadIds },
@@ -3369,6 +2902,10 @@ routes.post(
       },
       data: { assignedToSalesmanId: body.salesmanId }
     });
+    applyLeadOwnershipChanges(
+      tenantId,
+      before.map((lead) => ({ before: lead, after: { ...lead, assignedToSalesmanId: body.salesmanId } }))
+    );
 
     await createAuditLog({
       tenantId,
@@ -3396,6 +2933,10 @@ routes.post(
       status: z.enum(['NEW', 'CONTACTED', 'QUALIFIED', 'QUOTED', 'WON', 'LOST', 'ON_HOLD'])
     }).parse(req.body);
 
+    const before = await prisma.lead.findMany({
+      where: { id: { in: body.leadIds }, tenantId },
+      select: { status: true, assignedToSalesmanId: true, channel: true }
+    });
     const result = await prisma.lead.updateMany({
       where: { 
         id: { in: body.leadIds },
@@ -3403,6 +2944,16 @@ routes.post(
       },
       data: { status: body.status as any }
     });
+    applyLeadOwnershipChanges(
+      tenantId,
+      before.map((lead) => ({ before: lead, after: { ...lead, status: body.status } }))
+    );
+    bumpStatusRollups(
+      tenantId,
+      before.map((lead) => ({ channel: lead.channel, from: lead.status, to: body.status }))
+    );
+    markLeadScoresDirty(tenantId, body.leadIds);
+    invalidateDashboardStats(tenantId);
 
     await createAuditLog({
       tenantId,
@@ -3416,90 +2967,46 @@ routes.post(
   })
 );
 
-// Activity Feed
+// Activity Feed (newest first). Pass `nextCursor` back as `cursor` for older activity.
 routes.get(
   '/activity-feed',
   asyncHandler(async (req, res) => {
     const { tenantId, role, userId } = getAuthContext(req);
-    
-    const limit = z.coerce.number().int().positive().max(100).default(50).parse(req.query.limit);
 
-    // Get recent events across the tenant
-    const events = await prisma.leadEvent.findMany({
-      where: { tenantId },
-      include: {
-        lead: {
-          select: {
-            id: true,
-            fullName: true,
-            phone: true,
-            status: true
-          }
-        }
-      },
-      orderBy: { createdAt: 'desc' },
-      take: limit
-    });
+    const query = z
+      .object({
+        limit: z.coerce.number().int().positive().max(100).default(50),
+        cursor: z.string().optional(),
+        leadId: z.string().optional(),
+        salesmanId: z.string().optional(),
+        types: z.string().optional()
+      })
+      .parse(req.query);
 
-    // Get recent notes
-    const notes = await prisma.note.findMany({
-      where: { tenantId },
-      include: {
-        lead: {
-          select: {
-            id: true,
-            fullName: true,
-            phone: true
-          }
-        }
-      },
-      orderBy: { createdAt: 'desc' },
-      take: 20
-    });
+    const types = query.types
+      ? z
+          .array(z.enum(ACTIVITY_TYPES))
+          .parse(query.types.split(',').map((t) => t.trim()).filter(Boolean))
+      : undefined;
 
-    // Get recent calls
-    const calls = await prisma.call.findMany({
-      where: { tenantId },
-      include: {
-        lead: {
-          select: {
-            id: true,
-            fullName: true,
-            phone: true
-          }
-        }
-      },
-      orderBy: { createdAt: 'desc' },
-      take: 20
-    });
+    // Salesmen only see activity on their own leads.
+    let salesmanId = query.salesmanId;
+    if (role === 'SALESMAN') {
+      const salesman = await prisma.salesman.findFirst({ where: { tenantId, userId } });
+      if (!salesman) throw new Error('Salesman profile not found');
+      salesmanId = salesman.id;
+    }
 
-    // Get recent tasks
-    const tasks = await prisma.task.findMany({
-      where: { tenantId },
-      include: {
-        lead: {
-          select: {
-            id: true,
-            fullName: true,
-            phone: true
-          }
-        }
-      },
-      orderBy: { createdAt: 'desc' },
-      take: 20
+    const { feed, nextCursor } = await getActivityFeed({
+      tenantId,
+      limit: query.limit,
+      cursor: query.cursor ? decodeCursor(query.cursor) : null,
+      leadId: query.leadId,
+      salesmanId,
+      types
     });
 
-    // Combine and sort by time
-    const feed: Array<{ time: Date; type: string; data: any }> = [];
-    
-    events.forEach(e => feed.push({ time: e.createdAt, type: 'event', data: e }));
-    notes.forEach(n => feed.push({ time: n.createdAt, type: 'note', data: n }));
-    calls.forEach(c => feed.push({ time: c.createdAt, type: 'call', data: c }));
-    tasks.forEach(t => feed.push({ time: t.createdAt, type: 'task', data: t }));
-
-    feed.sort((a, b) => b.time.getTime() - a.time.getTime());
-
-    res.json({ feed: feed.slice(0, limit) });
+    res.json({ feed, nextCursor: nextCursor ? encodeCursor(nextCursor) : null });
   })
 );
 
@@ -3583,6 +3090,8 @@ routes.patch(
       where: { id: ruleId, tenantId },
       data: body
     });
+    const { invalidateSlaRules } = await import('./services/sla.js');
+    invalidateSlaRules(tenantId);
 
     await createAuditLog({
       tenantId,
@@ -3611,6 +3120,8 @@ routes.delete(
     await prisma.slaRule.delete({
       where: { id: ruleId, tenantId }
     });
+    const { invalidateSlaRules } = await import('./services/sla.js');
+    invalidateSlaRules(tenantId);
 
     await createAuditLog({
       tenantId,
@@ -3732,6 +3243,8 @@ routes.get(
     if (entityType) where.entityType = entityType;
     if (entityId) where.entityId = entityId;
 
+    // Entries are written in batches; include the ones still buffered on this instance.
+    await flushAuditLogs();
     const logs = await prisma.auditLog.findMany({
       where,
       orderBy: { createdAt: 'desc' },
@@ -3742,6 +3255,16 @@ routes.get(
   })
 );
 
+// Audit log writer counters for this process
+routes.get(
+  '/audit-logs/stats',
+  asyncHandler(async (req, res) => {
+    const { role } = getAuthContext(req);
+    if (role === 'SALESMAN') throw new Error('Forbidden');
+    res.json({ stats: getAuditLogStats() });
+  })
+);
+
 // Channel ingestion (generic webhook entrypoint)
 // This simulates WhatsApp Web / 3rd-party inbound messages into our system.
 routes.post(
@@ -3749,325 +3272,143 @@ routes.post(
   asyncHandler(async (req, res) => {
     const tenantId = getTenantId(req);
     const body = ingestMessageSchema.parse(req.body);
-    const out = await handleIngestMessage({ tenantId, body });
-    res.json(out);
+    const { jobId, duplicate } = await enqueueIngest({ tenantId, source: 'INGEST_API', payload: { body } });
+    res.status(202).json({ ok: true, queued: true, jobId, duplicate });
   })
 );
 
-// Manual email polling trigger for testing
-routes.post(
-  '/admin/poll-emails',
+// Ingest queue status (poll a single job, inspect/retry the dead-letter store)
+routes.get(
+  '/ingest/jobs/:id',
   asyncHandler(async (req, res) => {
-    const tenantId = getTenantId(req);
-    const { pollEmails } = await import('./services/email.js');
+    const { tenantId } = getAuthContext(req);
+    const job = await prisma.ingestJob.findFirst({
+      where: { id: req.params.id, tenantId },
+      select: {
+        id: true,
+        source: true,
+        status: true,
+        attempts: true,
+        maxAttempts: true,
+        runAt: true,
+        lastError: true,
+        result: true,
+        createdAt: true,
+        completedAt: true
+      }
+    });
+    if (!job) throw new HttpError(404, 'Job not found');
+    res.json({ job });
+  })
+);
 
-    const keywords = getEmailEnquiryKeywords();
-    const requireKeywordMatch =
-      keywords.length > 0 && String(process.env.EMAIL_ENQUIRY_REQUIRE_KEYWORDS ?? '1').toLowerCase() !== '0';
-    
-    const emails: any[] = [];
-    try {
-      await pollEmails(async (email) => {
-        console.log(`[Manual Poll] Received: ${email.from} - ${email.subject}`);
-        emails.push({ from: email.from, subject: email.subject });
+routes.get(
+  '/ingest/jobs',
+  asyncHandler(async (req, res) => {
+    const { tenantId, role } = getAuthContext(req);
+    if (role === 'SALESMAN') throw new Error('Forbidden');
 
-        const isEnquiry = isLikelyEnquiry(email, { keywords, requireKeywordMatch });
-        if (!isEnquiry) {
-          console.log(`[Manual Poll] Skipping non-enquiry email: ${email.subject}`);
-          return;
-        }
+    const status = z.enum(['PENDING', 'PROCESSING', 'DONE', 'DEAD']).default('DEAD').parse(req.query.status);
+    const limit = z.coerce.number().int().positive().max(500).default(100).parse(req.query.limit);
 
-        await handleIngestMessage({
-          tenantId,
-          body: {
-            channel: 'EMAIL',
-            fullName: email.fromName,
-            email: email.from,
-            customerMessage: buildEmailCustomerMessage(email),
-            externalId: email.messageId,
-          },
-        });
-      });
-      res.json({ success: true, emailsProcessed: emails.length, emails });
-    } catch (error: any) {
-      res.status(500).json({ 
-        success: false, 
-        error: error?.message || 'Unknown error',
-        details: error?.stack
-      });
-    }
+    const [jobs, counts] = await Promise.all([
+      prisma.ingestJob.findMany({
+        where: { tenantId, status },
+        orderBy: { createdAt: 'desc' },
+        take: limit
+      }),
+      prisma.ingestJob.groupBy({
+        by: ['status'],
+        where: { tenantId },
+        _count: { _all: true }
+      })
+    ]);
+
+    res.json({
+      jobs,
+      counts: Object.fromEntries(counts.map((c) => [c.status, c._count._all]))
+    });
   })
 );
 
-// Gmail Pub/Sub webhook - receives push notifications when new emails arrive
-let gmailWebhookInFlight = false;
-let gmailWebhookBackoffUntilMs = 0;
+// Per-stage ingest latency (lookup, persist, SLA, AI triage, AI draft, assign) for this process.
+routes.get(
+  '/ingest/timings',
+  asyncHandler(async (req, res) => {
+    const { role } = getAuthContext(req);
+    if (role === 'SALESMAN') throw new Error('Forbidden');
+    res.json(getIngestTimingStats());
+  })
+);
 
-function getRetryAfterMsFromError(error: any): number | undefined {
-  const candidate = error?.retryAfterMs;
-  if (Number.isFinite(candidate)) return candidate;
-  return undefined;
-}
+routes.post(
+  '/ingest/jobs/:id/retry',
+  asyncHandler(async (req, res) => {
+    const { tenantId, role } = getAuthContext(req);
+    if (role === 'SALESMAN') throw new Error('Forbidden');
+
+    const ok = await retryDeadIngestJob(tenantId, req.params.id);
+    if (!ok) throw new HttpError(404, 'Dead-letter job not found');
+    res.json({ ok: true });
+  })
+);
 
+// Run the IMAP monitor's checkpointed sync now instead of waiting for IDLE or the resync timer.
+routes.post(
+  '/admin/poll-emails',
+  asyncHandler(async (req, res) => {
+    getTenantId(req);
+    const { requestEmailSync } = await import('./services/email.js');
+    if (!requestEmailSync()) throw new HttpError(409, 'IMAP ingestion is not connected');
+    res.json({ success: true });
+  })
+);
+
+// Gmail Pub/Sub webhook - receives push notifications when new emails arrive.
+// Every notification is acknowledged at once and coalesced into the tenant's pending
+// sync (services/gmailSync.ts), so Pub/Sub never retries into a busy processor.
 routes.post(
   '/webhooks/gmail',
   asyncHandler(async (req, res) => {
-    const now = Date.now();
-    if (now < gmailWebhookBackoffUntilMs) {
-      res.status(200).json({
-        success: true,
-        skipped: true,
-        reason: 'rate_limited',
-        retryAfter: new Date(gmailWebhookBackoffUntilMs).toISOString(),
-      });
-      return;
-    }
+    // Pub/Sub sends data in this format
+    const pubsubMessage = req.body.message;
 
-    if (gmailWebhookInFlight) {
-      res.status(200).json({ success: true, skipped: true, reason: 'in_flight' });
+    if (!pubsubMessage || !pubsubMessage.data) {
+      console.warn('[Gmail Webhook] Invalid payload - no message data');
+      res.status(400).json({ error: 'Invalid payload' });
       return;
     }
 
-    gmailWebhookInFlight = true;
-
-    try {
-      // Pub/Sub sends data in this format
-      const pubsubMessage = req.body.message;
-      
-      if (!pubsubMessage || !pubsubMessage.data) {
-        console.warn('[Gmail Webhook] Invalid payload - no message data');
-        res.status(400).json({ error: 'Invalid payload' });
-        return;
-      }
-
-      // Decode the Pub/Sub message
-      const data = JSON.parse(
-        Buffer.from(pubsubMessage.data, 'base64').toString('utf-8')
-      );
-
-      console.log('[Gmail Webhook] Received notification:', data);
-
-      // Get tenant ID from query param or use default
-      const tenantId = req.query.tenantId as string || process.env.DEFAULT_TENANT_ID;
-      if (!tenantId) {
-        console.warn('[Gmail Webhook] No tenant ID provided');
-        res.status(400).json({ error: 'Missing tenant ID' });
-        return;
-      }
-
-      const historyId = String((data as any)?.historyId || '').trim();
-      if (!historyId) {
-        console.warn('[Gmail Webhook] Missing historyId in notification');
-        res.status(200).json({ success: true, skipped: true, reason: 'missing_history_id' });
-        return;
-      }
-
-      console.log('[Gmail Webhook] Importing Gmail service...');
-      // Import Gmail service
-      const {
-        fetchGmailMessage,
-        markGmailMessageAsRead,
-        listGmailHistoryMessageIds,
-        listUnreadGmailMessages,
-      } = await import('./services/gmailPubSub.js');
-
-      // Load last processed historyId for this tenant.
-      let seeded = false;
-      let syncState = await prisma.gmailSyncState.findUnique({ where: { tenantId } });
-      if (!syncState) {
-        syncState = await prisma.gmailSyncState.create({
-          data: {
-            tenantId,
-            emailAddress: (data as any)?.emailAddress ? String((data as any).emailAddress) : null,
-            // Seed cursor to current notification historyId.
-            // We'll still do a best-effort one-time unread scan below to avoid missing the first batch.
-            lastHistoryId: historyId,
-            updatedAt: new Date(),
-          },
-        });
-        seeded = true;
-        console.log(`[Gmail Webhook] Seeded historyId for tenant ${tenantId}: ${historyId}`);
-      }
+    // Decode the Pub/Sub message
+    const data = JSON.parse(Buffer.from(pubsubMessage.data, 'base64').toString('utf-8'));
 
-      let startHistoryId = syncState.lastHistoryId;
-      try {
-        const current = BigInt(historyId);
-        const last = BigInt(startHistoryId);
-        if (current <= last) {
-          res.status(200).json({ success: true, skipped: true, reason: 'no_new_history' });
-          return;
-        }
-      } catch {
-        // If parsing fails, just continue.
-      }
-
-      let messageIds: string[] = [];
-      if (seeded) {
-        // Best-effort: one-time unread scan so we don't miss the first notification batch.
-        console.log('[Gmail Webhook] No prior history cursor; doing one-time unread scan');
-        const messages = await listUnreadGmailMessages(10);
-        messageIds = (messages || []).map((m: any) => String(m?.id || '')).filter(Boolean);
-      } else {
-        console.log(`[Gmail Webhook] Fetching history since ${startHistoryId} -> ${historyId}`);
-        try {
-          const historyResult = await listGmailHistoryMessageIds({
-            startHistoryId,
-            labelId: 'INBOX',
-            maxPages: 10,
-          });
-          messageIds = historyResult.messageIds;
-        } catch (e: any) {
-          // Gmail returns 404 when the startHistoryId is too old/invalid; reset to current.
-          const status = e?.code ?? e?.response?.status;
-          if (status === 404 || String(e?.message || '').toLowerCase().includes('history')) {
-            console.warn(`[Gmail Webhook] Invalid/expired historyId (${startHistoryId}); resetting to ${historyId}`);
-            await prisma.gmailSyncState.update({
-              where: { tenantId },
-              data: {
-                lastHistoryId: historyId,
-                emailAddress: (data as any)?.emailAddress ? String((data as any).emailAddress) : syncState.emailAddress,
-                updatedAt: new Date(),
-              },
-            });
-            res.status(200).json({ success: true, reset: true });
-            return;
-          }
-
-          throw e;
-        }
-      }
-
-      // De-dup
-      messageIds = Array.from(new Set(messageIds));
-
-      console.log(`[Gmail Webhook] Found ${messageIds.length} changed message(s) from history`);
-
-      let processed = 0;
-      let skipped = 0;
-
-      const keywords = getEmailEnquiryKeywords();
-      const requireKeywordMatch =
-        keywords.length > 0 && String(process.env.EMAIL_ENQUIRY_REQUIRE_KEYWORDS ?? '1').toLowerCase() !== '0';
-
-      for (const messageId of messageIds) {
-        try {
-          const email = await fetchGmailMessage(messageId);
-          
-          console.log(`[Gmail Webhook] Fetched email from: ${email.from} - Subject: ${email.subject}`);
-
-          // Only process unread messages (watch is configured on UNREAD, but history can include other changes).
-          if (!Array.isArray(email.labels) || !email.labels.includes('UNREAD')) {
-            skipped++;
-            continue;
-          }
-
-          // Smart enquiry detection - skip promotional/automated emails
-          const isEnquiry = isLikelyEnquiry(email, { keywords, requireKeywordMatch });
-          
-          if (!isEnquiry) {
-            console.log(`[Gmail Webhook] Skipping non-enquiry email: ${email.subject}`);
-            await markGmailMessageAsRead(messageId);
-            skipped++;
-            continue;
-          }
-
-          // Check if we've already processed this email (duplicate prevention)
-          const existingLead = await prisma.lead.findFirst({
-            where: {
-              tenantId,
-              channel: 'EMAIL',
-              externalId: email.messageId,
-            },
-          });
-
-          if (existingLead) {
-            console.log(`[Gmail Webhook] Skipping duplicate email (already processed): ${email.messageId}`);
-            await markGmailMessageAsRead(messageId);
-            skipped++;
-            continue;
-          }
-
-          console.log(`[Gmail Webhook] Processing enquiry: ${email.from} - ${email.subject}`);
-
-          // Ingest into system
-          const result = await handleIngestMessage({
-            tenantId,
-            body: {
-              channel: 'EMAIL',
-              fullName: email.fromName,
-              email: email.from,
-              customerMessage: buildEmailCustomerMessage(email),
-              externalId: email.messageId,
-            },
-          });
-
-          console.log(`[Gmail Webhook] handleIngestMessage result:`, JSON.stringify(result));
-
-          // Send email reply if draft was generated and not escalated
-          if (result.ok && result.draft && !result.draft.shouldEscalate) {
-            try {
-              const { sendGmailMessage } = await import('./services/gmailPubSub.js');
-              await sendGmailMessage({
-                to: email.from,
-                subject: `Re: ${email.subject}`,
-                text: result.draft.message,
-              });
-              console.log(`[Gmail Webhook] Sent email reply to ${email.from}`);
-            } catch (sendError: any) {
-              console.error(`[Gmail Webhook] Failed to send email reply:`, sendError.message);
-            }
-          }
-
-          // Mark as read
-          await markGmailMessageAsRead(messageId);
-          processed++;
-          console.log(`[Gmail Webhook] Successfully processed message ${messageId}`);
-        } catch (error: any) {
-          console.error(`[Gmail Webhook] Failed to process message ${messageId}:`, error.message, error.stack);
-        }
-      }
-
-      // Persist that we've consumed up to this historyId.
-      await prisma.gmailSyncState.update({
-        where: { tenantId },
-        data: {
-          lastHistoryId: historyId,
-          emailAddress: (data as any)?.emailAddress ? String((data as any).emailAddress) : syncState.emailAddress,
-          updatedAt: new Date(),
-        },
-      });
-
-      console.log(`[Gmail Webhook] Summary: ${processed} processed, ${skipped} skipped`);
-      res.status(200).json({ success: true, processed, skipped });
-    } catch (error: any) {
-      const status = error?.code ?? error?.response?.status;
-      if (status === 429) {
-        const retryAfterMs = getRetryAfterMsFromError(error);
-        if (retryAfterMs) {
-          gmailWebhookBackoffUntilMs = Math.max(gmailWebhookBackoffUntilMs, retryAfterMs);
-        } else {
-          gmailWebhookBackoffUntilMs = Math.max(gmailWebhookBackoffUntilMs, Date.now() + 10 * 60 * 1000);
-        }
-
-        console.warn(
-          `[Gmail Webhook] Gmail rate-limited; backing off until ${new Date(gmailWebhookBackoffUntilMs).toISOString()}`
-        );
+    // Get tenant ID from query param or use default
+    const tenantId = (req.query.tenantId as string) || process.env.DEFAULT_TENANT_ID;
+    if (!tenantId) {
+      console.warn('[Gmail Webhook] No tenant ID provided');
+      res.status(400).json({ error: 'Missing tenant ID' });
+      return;
+    }
 
-        // IMPORTANT: acknowledge Pub/Sub so it doesn't retry and amplify the rate limit.
-        res.status(200).json({
-          success: true,
-          skipped: true,
-          reason: 'rate_limited',
-          retryAfter: new Date(gmailWebhookBackoffUntilMs).toISOString(),
-        });
-        return;
-      }
+    const historyId = String((data as any)?.historyId || '').trim();
+    if (!historyId) {
+      console.warn('[Gmail Webhook] Missing historyId in notification');
+      res.status(200).json({ success: true, skipped: true, reason: 'missing_history_id' });
+      return;
+    }
 
-      console.error('[Gmail Webhook] Error:', error);
-      res.status(500).json({ error: error.message });
-    } finally {
-      gmailWebhookInFlight = false;
+    const { acceptGmailNotification } = await import('./services/gmailSync.js');
+    const { accepted, coalesced } = acceptGmailNotification({
+      tenantId,
+      historyId,
+      emailAddress: (data as any)?.emailAddress ? String((data as any).emailAddress) : null
+    });
+    if (!accepted) {
+      res.status(200).json({ success: true, skipped: true, reason: 'invalid_history_id' });
+      return;
     }
+
+    res.status(200).json({ success: true, queued: true, coalesced });
   })
 );
 
@@ -4198,7 +3539,9 @@ routes.delete(
     const leadIds = emailLeads.map(l => l.id);
 
     // Delete all related data for these leads
+    await flushRollups();
     await prisma.$transaction(async (tx) => {
+      await subtractLeadsFromRollups(tx, tenantId, leadIds);
       await tx.triageQueueItem.deleteMany({ where: { tenantId, leadId: { in: leadIds } } });
       await tx.successEvent.deleteMany({ where: { tenantId, leadId: { in: leadIds } } });
       await tx.leadEvent.deleteMany({ where: { tenantId, leadId: { in: leadIds } } });
@@ -4210,6 +3553,8 @@ routes.delete(
       await tx.lead.deleteMany({ where: { id: { in: leadIds } } });
     });
 
+    resetLoadLedger(tenantId);
+    invalidateDashboardStats(tenantId);
     console.log(`[Gmail Admin] Deleted ${leadIds.length} email leads for tenant ${tenantId}`);
 
     res.json({ ok: true, deletedCount: leadIds.length });
@@ -0,0 +1,23 @@
+import 'dotenv/config';
+import { prisma } from '../db.js';
+import { backfillContactKeys } from '../services/contactIdentity.js';
+
+// Fill Client/Lead phoneKey + emailKey for rows written before the keys existed.
+//   npm run contacts:backfill
+
+async function main() {
+  const startedAt = Date.now();
+  const totals = await backfillContactKeys((table, updated) => {
+    console.log(`[ContactKeys] ${table}: ${updated} row(s)`);
+  });
+  console.log(
+    `[ContactKeys] Backfilled ${totals.clients} client(s) and ${totals.leads} lead(s) in ${Date.now() - startedAt}ms`
+  );
+}
+
+main()
+  .catch((error) => {
+    console.error('[ContactKeys] Backfill failed:', error?.message || error);
+    process.exitCode = 1;
+  })
+  .finally(() => prisma.$disconnect());
@@ -0,0 +1,32 @@
+import 'dotenv/config';
+import { prisma } from '../db.js';
+import { rebuildDailyRollups } from '../services/rollups.js';
+
+// Backfill / repair the daily analytics rollups.
+//   npm run rollups:rebuild                   -> every tenant
+//   npm run rollups:rebuild -- --tenant <id>  -> one tenant
+
+async function main() {
+  const flag = process.argv.indexOf('--tenant');
+  const tenantId = flag >= 0 ? process.argv[flag + 1] : undefined;
+  if (flag >= 0 && !tenantId) throw new Error('--tenant requires a tenant id');
+
+  const tenants = tenantId
+    ? [{ id: tenantId }]
+    : await prisma.tenant.findMany({ select: { id: true }, orderBy: { createdAt: 'asc' } });
+
+  for (const tenant of tenants) {
+    const startedAt = Date.now();
+    const result = await rebuildDailyRollups(tenant.id);
+    console.log(
+      `[Rollups] Rebuilt tenant ${tenant.id}: ${result.dailyRows} daily row(s), ${result.successRows} success row(s) in ${Date.now() - startedAt}ms`
+    );
+  }
+}
+
+main()
+  .catch((error) => {
+    console.error('[Rollups] Rebuild failed:', error?.message || error);
+    process.exitCode = 1;
+  })
+  .finally(() => prisma.$disconnect());
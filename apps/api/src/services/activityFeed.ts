@@ -0,0 +1,81 @@
+import { prisma } from '../db.js';
+import { createdAtPast, mergeKeysetPages } from './pagination.js';
+import type { KeysetCursor } from './pagination.js';
+
+// Tenant activity stream (GET /activity-feed).
+//
+// Lead events, notes, calls and tasks, newest first. Each table is read with a keyset
+// query on its (tenantId, createdAt, id) index (or (leadId, createdAt) for one lead),
+// `limit + 1` rows past the cursor, and the four pages are k-way merged. The merged page
+// is exact, so following `nextCursor` reaches all history at the cost of one range scan
+// per table per page.
+
+export const ACTIVITY_TYPES = ['event', 'note', 'call', 'task'] as const;
+export type ActivityType = (typeof ACTIVITY_TYPES)[number];
+
+export type ActivityFeedQuery = {
+  tenantId: string;
+  limit: number;
+  cursor?: KeysetCursor | null;
+  leadId?: string;
+  // Only activity on leads assigned to this salesman.
+  salesmanId?: string;
+  types?: ActivityType[];
+};
+
+export type ActivityItem = {
+  type: ActivityType;
+  id: string;
+  time: Date;
+  data: Record<string, unknown>;
+};
+
+const leadSelect = { id: true, fullName: true, phone: true, status: true } as const;
+
+export async function getActivityFeed(
+  query: ActivityFeedQuery
+): Promise<{ feed: ActivityItem[]; nextCursor: KeysetCursor | null }> {
+  const { tenantId, limit, cursor } = query;
+  const types = new Set<ActivityType>(query.types?.length ? query.types : ACTIVITY_TYPES);
+
+  const where = {
+    tenantId,
+    ...(query.leadId ? { leadId: query.leadId } : {}),
+    ...(query.salesmanId ? { lead: { assignedToSalesmanId: query.salesmanId } } : {}),
+    ...(cursor ? createdAtPast(cursor, 'desc') : {})
+  };
+  const page = {
+    where,
+    orderBy: [{ createdAt: 'desc' as const }, { id: 'desc' as const }],
+    take: limit + 1,
+    include: { lead: { select: leadSelect } }
+  };
+  const none = Promise.resolve([] as never[]);
+
+  const [events, notes, calls, tasks] = await Promise.all([
+    types.has('event') ? prisma.leadEvent.findMany(page) : none,
+    types.has('note') ? prisma.note.findMany(page) : none,
+    types.has('call') ? prisma.call.findMany(page) : none,
+    types.has('task') ? prisma.task.findMany(page) : none
+  ]);
+
+  const tag = <T extends { id: string; createdAt: Date }>(type: ActivityType, rows: T[]) =>
+    rows.map((row): Omit<ActivityItem, 'time'> & { createdAt: Date } => ({
+      type,
+      id: row.id,
+      createdAt: row.createdAt,
+      data: row
+    }));
+
+  const { items, more } = mergeKeysetPages(
+    [tag('event', events), tag('note', notes), tag('call', calls), tag('task', tasks)],
+    limit,
+    'desc'
+  );
+
+  const last = items[items.length - 1];
+  return {
+    feed: items.map(({ type, id, createdAt, data }) => ({ type, id, time: createdAt, data })),
+    nextCursor: more && last ? { at: last.createdAt, id: last.id } : null
+  };
+}
@@ -1,6 +1,19 @@
+import type { Prisma } from '@prisma/client';
 import { prisma } from '../db.js';
 
-export async function createAuditLog(params: {
+// Buffered audit log writer.
+//
+// createAuditLog queues the entry and returns; entries are written with one createMany
+// when AUDIT_LOG_BATCH_SIZE are waiting or AUDIT_LOG_FLUSH_MS after the first one,
+// whichever comes first. When AUDIT_LOG_MAX_BUFFER entries are waiting (e.g. the DB is
+// slow), callers wait for a flush instead of growing the buffer. A failed batch is
+// retried once with the next flush, then dropped. stopAuditLog() flushes on shutdown.
+
+const BATCH_SIZE = Math.max(1, Number(process.env.AUDIT_LOG_BATCH_SIZE ?? 200));
+const FLUSH_DELAY_MS = Math.max(50, Number(process.env.AUDIT_LOG_FLUSH_MS ?? 1000));
+const MAX_BUFFER = Math.max(BATCH_SIZE, Number(process.env.AUDIT_LOG_MAX_BUFFER ?? 10_000));
+
+export type AuditLogEntry = {
   tenantId: string;
   userId?: string;
   action: string;
@@ -10,23 +23,102 @@ export async function createAuditLog(params: {
   metadata?: any;
   ipAddress?: string;
   userAgent?: string;
-}): Promise<void> {
-  try {
-    await prisma.auditLog.create({
-      data: {
-        tenantId: params.tenantId,
-        userId: params.userId || null,
-        action: params.action,
-        entityType: params.entityType,
-        entityId: params.entityId || null,
-        changes: params.changes || null,
-        metadata: params.metadata || null,
-        ipAddress: params.ipAddress || null,
-        userAgent: params.userAgent || null
-      }
-    });
-  } catch (err) {
-    // eslint-disable-next-line no-console
-    console.warn('Failed to create audit log:', err instanceof Error ? err.message : err);
+};
+
+type QueuedEntry = { data: Prisma.AuditLogCreateManyInput; attempts: number };
+
+let buffer: QueuedEntry[] = [];
+let flushTimer: NodeJS.Timeout | null = null;
+let flushing: Promise<void> | null = null;
+
+const stats = { queued: 0, written: 0, failed: 0, dropped: 0, waits: 0 };
+
+export function getAuditLogStats() {
+  return { ...stats, buffered: buffer.length };
+}
+
+export async function createAuditLog(params: AuditLogEntry): Promise<void> {
+  // Backpressure: hold the caller until a flush makes room.
+  while (buffer.length >= MAX_BUFFER) {
+    stats.waits++;
+    await flushAuditLogs();
+  }
+
+  buffer.push({
+    data: {
+      tenantId: params.tenantId,
+      userId: params.userId || null,
+      action: params.action,
+      entityType: params.entityType,
+      entityId: params.entityId || null,
+      changes: params.changes || undefined,
+      metadata: params.metadata || undefined,
+      ipAddress: params.ipAddress || null,
+      userAgent: params.userAgent || null,
+      createdAt: new Date()
+    },
+    attempts: 0
+  });
+  stats.queued++;
+
+  if (buffer.length >= BATCH_SIZE) void flushAuditLogs();
+  else scheduleFlush();
+}
+
+function scheduleFlush() {
+  if (flushTimer) return;
+  flushTimer = setTimeout(() => {
+    flushTimer = null;
+    void flushAuditLogs();
+  }, FLUSH_DELAY_MS);
+  flushTimer.unref();
+}
+
+export async function flushAuditLogs() {
+  while (flushing) await flushing;
+  if (buffer.length === 0) return;
+
+  const batch = buffer;
+  buffer = [];
+  if (flushTimer) clearTimeout(flushTimer);
+  flushTimer = null;
+
+  flushing = writeBatch(batch).finally(() => {
+    flushing = null;
+  });
+  await flushing;
+}
+
+async function writeBatch(batch: QueuedEntry[]) {
+  for (let i = 0; i < batch.length; i += BATCH_SIZE) {
+    const chunk = batch.slice(i, i + BATCH_SIZE);
+    try {
+      await prisma.auditLog.createMany({ data: chunk.map((e) => e.data) });
+      stats.written += chunk.length;
+    } catch (err) {
+      stats.failed += chunk.length;
+      const retry = chunk.filter((e) => e.attempts === 0 && buffer.length < MAX_BUFFER);
+      for (const entry of retry) entry.attempts++;
+      stats.dropped += chunk.length - retry.length;
+      buffer.unshift(...retry);
+      if (buffer.length > 0) scheduleFlush();
+      // eslint-disable-next-line no-console
+      console.warn(
+        `Failed to write ${chunk.length} audit log(s), ${retry.length} queued for retry:`,
+        err instanceof Error ? err.message : err
+      );
+    }
+  }
+}
+
+export async function stopAuditLog() {
+  if (flushTimer) clearTimeout(flushTimer);
+  flushTimer = null;
+  await flushAuditLogs();
+  // Anything re-queued by a failed final write gets one more try.
+  if (buffer.length > 0) await flushAuditLogs();
+  if (buffer.length > 0) {
+    stats.dropped += buffer.length;
+    buffer = [];
   }
 }
@@ -0,0 +1,120 @@
+import type { BackgroundJob } from '@prisma/client';
+import { prisma } from '../db.js';
+
+// Tenant-scoped background jobs for long operations started from the UI (e.g.
+// rescoring every lead). The request returns the job id immediately; the work runs
+// in-process on the instance that accepted it and reports progress to the
+// BackgroundJob row, which clients poll via GET /jobs/:id.
+
+export type BackgroundJobType = 'LEAD_SCORE_RECALC' | 'ROLLUP_REBUILD' | 'LEAD_IMPORT';
+
+export type BackgroundJobContext = {
+  jobId: string;
+  tenantId: string;
+  setTotal: (total: number) => Promise<void>;
+  reportProgress: (progress: { processed: number; failed?: number }) => Promise<void>;
+};
+
+const PROGRESS_WRITE_INTERVAL_MS = 1000;
+// A RUNNING job that hasn't written progress for this long belongs to a dead process.
+const STALE_AFTER_MS = Math.max(60_000, Number(process.env.BACKGROUND_JOB_STALE_MS ?? 10 * 60 * 1000));
+
+const runningJobs = new Map<string, Promise<void>>();
+
+export async function startBackgroundJob(params: {
+  tenantId: string;
+  type: BackgroundJobType;
+  createdById?: string | null;
+  run: (ctx: BackgroundJobContext) => Promise<unknown>;
+}): Promise<{ job: BackgroundJob; alreadyRunning: boolean }> {
+  const { tenantId, type } = params;
+
+  // One job of a given type per tenant at a time.
+  const existing = await prisma.backgroundJob.findFirst({
+    where: { tenantId, type, status: 'RUNNING' },
+    orderBy: { createdAt: 'desc' }
+  });
+  if (existing) {
+    if (Date.now() - existing.updatedAt.getTime() < STALE_AFTER_MS) {
+      return { job: existing, alreadyRunning: true };
+    }
+    await prisma.backgroundJob.update({
+      where: { id: existing.id },
+      data: { status: 'FAILED', error: 'Interrupted (worker stopped reporting progress)', finishedAt: new Date() }
+    });
+  }
+
+  const job = await prisma.backgroundJob.create({
+    data: { tenantId, type, status: 'RUNNING', createdById: params.createdById ?? null, startedAt: new Date() }
+  });
+
+  const task = executeJob(job, params.run).finally(() => runningJobs.delete(job.id));
+  runningJobs.set(job.id, task);
+
+  return { job, alreadyRunning: false };
+}
+
+async function executeJob(job: BackgroundJob, run: (ctx: BackgroundJobContext) => Promise<unknown>) {
+  let processed = 0;
+  let failed = 0;
+  let lastWriteAt = 0;
+
+  const ctx: BackgroundJobContext = {
+    jobId: job.id,
+    tenantId: job.tenantId,
+    setTotal: async (total) => {
+      await prisma.backgroundJob.update({ where: { id: job.id }, data: { total } });
+    },
+    reportProgress: async (progress) => {
+      processed = progress.processed;
+      failed = progress.failed ?? failed;
+      const now = Date.now();
+      if (now - lastWriteAt < PROGRESS_WRITE_INTERVAL_MS) return;
+      lastWriteAt = now;
+      await prisma.backgroundJob.update({ where: { id: job.id }, data: { processed, failed } });
+    }
+  };
+
+  try {
+    const result = await run(ctx);
+    await prisma.backgroundJob.update({
+      where: { id: job.id },
+      data: { status: 'SUCCEEDED', processed, failed, result: (result ?? null) as any, finishedAt: new Date() }
+    });
+    console.log(`[BackgroundJobs] ${job.type} ${job.id} finished for tenant ${job.tenantId}`);
+  } catch (error: any) {
+    console.error(`[BackgroundJobs] ${job.type} ${job.id} failed:`, error?.message || error);
+    try {
+      await prisma.backgroundJob.update({
+        where: { id: job.id },
+        data: {
+          status: 'FAILED',
+          processed,
+          failed,
+          error: String(error?.message || error).slice(0, 2000),
+          finishedAt: new Date()
+        }
+      });
+    } catch (updateError: any) {
+      console.error(`[BackgroundJobs] Failed to record failure for ${job.id}:`, updateError?.message || updateError);
+    }
+  }
+}
+
+export async function getBackgroundJob(tenantId: string, jobId: string) {
+  return prisma.backgroundJob.findFirst({ where: { id: jobId, tenantId } });
+}
+
+// Jobs left RUNNING by a previous process of this instance can never finish.
+export async function failInterruptedBackgroundJobs() {
+  try {
+    const staleBefore = new Date(Date.now() - STALE_AFTER_MS);
+    const result = await prisma.backgroundJob.updateMany({
+      where: { status: 'RUNNING', updatedAt: { lt: staleBefore } },
+      data: { status: 'FAILED', error: 'Interrupted by restart', finishedAt: new Date() }
+    });
+    if (result.count > 0) console.warn(`[BackgroundJobs] Marked ${result.count} interrupted job(s) as failed`);
+  } catch (error: any) {
+    console.warn('[BackgroundJobs] Startup cleanup failed (missing migration?):', error?.message || error);
+  }
+}
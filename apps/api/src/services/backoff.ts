@@ -0,0 +1,17 @@
+// Retry delays shared by the ingest queue and the outbound dispatcher.
+
+export function computeBackoffMs(attempts: number, opts: { baseMs: number; maxMs: number }): number {
+  const exp = Math.min(opts.maxMs, opts.baseMs * 2 ** Math.max(0, attempts - 1));
+  // Full jitter on the upper half keeps retries from a burst from lining up.
+  return Math.floor(exp / 2 + Math.random() * (exp / 2));
+}
+
+// Retry-After header value (delay in seconds, or an HTTP date) in ms; undefined when
+// absent or unparseable.
+export function parseRetryAfterMs(value: string | string[] | undefined, now: number = Date.now()): number | undefined {
+  const raw = (Array.isArray(value) ? value[0] : value)?.trim();
+  if (!raw) return undefined;
+  if (/^\d+(\.\d+)?$/.test(raw)) return Math.round(Number(raw) * 1000);
+  const at = Date.parse(raw);
+  return Number.isFinite(at) ? Math.max(0, at - now) : undefined;
+}
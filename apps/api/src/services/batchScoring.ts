@@ -0,0 +1,417 @@
+import { Prisma } from '@prisma/client';
+import type { LeadChannel, LeadHeat } from '@prisma/client';
+import { prisma } from '../db.js';
+import type { BackgroundJobContext } from './backgroundJobs.js';
+import {
+  activityBucketKey,
+  channelConversionWeight,
+  getActivityWindows,
+  getQualificationLevel,
+  pruneActivityBuckets,
+  scoreFromAggregates,
+  type ActivityBuckets,
+  type LeadActivityAggregates
+} from './leadScoring.js';
+
+// Set-based lead scoring for a whole tenant.
+//
+// Instead of loading every relation of every lead (calculateLeadScore), leads are read
+// in id-ordered chunks; per-lead activity comes from one grouped query per table, the
+// channel conversion table is computed once, and the scores of a chunk are written
+// back with a single UPDATE ... FROM (VALUES ...). The formula itself is shared with
+// the per-lead path (scoreFromAggregates), so both produce identical scores.
+
+const CHUNK_SIZE = Math.max(100, Number(process.env.LEAD_SCORE_BATCH_SIZE ?? 1000));
+
+type CountRow = { leadId: string; total: number; recent: number; previous: number };
+
+// Running counters the incremental scorer keeps per lead (LeadScoreState).
+export type LeadScoreStateRow = {
+  leadId: string;
+  tenantId: string;
+  messages: number;
+  notes: number;
+  calls: number;
+  completedTasks: number;
+  successEvents: number;
+  answeredCalls: number;
+  missedCalls: number;
+  responseCount: number;
+  responseMsSum: number;
+  pendingInboundCount: number; // inbound messages since the last outbound one
+  pendingInboundMsSum: number; // sum of their timestamps (epoch ms)
+  activityBuckets: ActivityBuckets;
+  lastActivityAt: Date | null;
+};
+
+export function emptyAggregates(): LeadActivityAggregates {
+  return {
+    messages: 0,
+    notes: 0,
+    calls: 0,
+    completedTasks: 0,
+    successEvents: 0,
+    answeredCalls: 0,
+    missedCalls: 0,
+    recentMessages: 0,
+    recentActivity: 0,
+    previousActivity: 0,
+    responseCount: 0,
+    responseMsSum: 0
+  };
+}
+
+export async function getChannelConversionWeights(tenantId: string): Promise<Map<LeadChannel, number>> {
+  const rows = await prisma.lead.groupBy({
+    by: ['channel', 'status'],
+    where: { tenantId },
+    _count: { _all: true }
+  });
+
+  const totals = new Map<LeadChannel, { total: number; won: number }>();
+  for (const row of rows) {
+    const entry = totals.get(row.channel) ?? { total: 0, won: 0 };
+    entry.total += row._count._all;
+    if (row.status === 'WON') entry.won += row._count._all;
+    totals.set(row.channel, entry);
+  }
+
+  const weights = new Map<LeadChannel, number>();
+  for (const [channel, { total, won }] of totals) weights.set(channel, channelConversionWeight(total, won));
+  return weights;
+}
+
+export async function loadActivityAggregates(
+  tenantId: string,
+  leadIds: string[],
+  now: number = Date.now()
+): Promise<Map<string, LeadActivityAggregates>> {
+  const windows = getActivityWindows(now);
+  const oneWeekAgo = new Date(windows.oneWeekAgo);
+  const twoWeeksAgo = new Date(windows.twoWeeksAgo);
+
+  const [messages, responses, notes, calls, tasks, successEvents, events] = await Promise.all([
+    prisma.$queryRaw<CountRow[]>`
+      SELECT "leadId",
+             COUNT(*)::int AS "total",
+             COUNT(*) FILTER (WHERE "createdAt" > ${oneWeekAgo})::int AS "recent",
+             COUNT(*) FILTER (WHERE "createdAt" > ${twoWeeksAgo} AND "createdAt" <= ${oneWeekAgo})::int AS "previous"
+      FROM "Message"
+      WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[])
+      GROUP BY "leadId"
+    `,
+    // First outbound message after each inbound one (uses Message(leadId, createdAt)).
+    prisma.$queryRaw<Array<{ leadId: string; responseCount: number; responseMsSum: number }>>`
+      SELECT i."leadId",
+             COUNT(*)::int AS "responseCount",
+             COALESCE(SUM(EXTRACT(EPOCH FROM (o."createdAt" - i."createdAt")) * 1000), 0)::float8 AS "responseMsSum"
+      FROM "Message" i
+      JOIN LATERAL (
+        SELECT m."createdAt" FROM "Message" m
+        WHERE m."leadId" = i."leadId" AND m."direction" = 'OUT' AND m."createdAt" > i."createdAt"
+        ORDER BY m."createdAt" ASC
+        LIMIT 1
+      ) o ON TRUE
+      WHERE i."tenantId" = ${tenantId} AND i."leadId" = ANY(${leadIds}::text[]) AND i."direction" = 'IN'
+      GROUP BY i."leadId"
+    `,
+    prisma.$queryRaw<CountRow[]>`
+      SELECT "leadId",
+             COUNT(*)::int AS "total",
+             COUNT(*) FILTER (WHERE "createdAt" > ${oneWeekAgo})::int AS "recent",
+             COUNT(*) FILTER (WHERE "createdAt" > ${twoWeeksAgo} AND "createdAt" <= ${oneWeekAgo})::int AS "previous"
+      FROM "Note"
+      WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[])
+      GROUP BY "leadId"
+    `,
+    prisma.$queryRaw<Array<CountRow & { answered: number; missed: number }>>`
+      SELECT "leadId",
+             COUNT(*)::int AS "total",
+             COUNT(*) FILTER (WHERE "outcome" = 'ANSWERED')::int AS "answered",
+             COUNT(*) FILTER (WHERE "outcome" IN ('NO_ANSWER', 'BUSY'))::int AS "missed",
+             COUNT(*) FILTER (WHERE "createdAt" > ${oneWeekAgo})::int AS "recent",
+             COUNT(*) FILTER (WHERE "createdAt" > ${twoWeeksAgo} AND "createdAt" <= ${oneWeekAgo})::int AS "previous"
+      FROM "Call"
+      WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[])
+      GROUP BY "leadId"
+    `,
+    prisma.$queryRaw<Array<{ leadId: string; completed: number }>>`
+      SELECT "leadId", COUNT(*)::int AS "completed"
+      FROM "Task"
+      WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[]) AND "status" = 'COMPLETED'
+      GROUP BY "leadId"
+    `,
+    prisma.$queryRaw<Array<{ leadId: string; total: number }>>`
+      SELECT "leadId", COUNT(*)::int AS "total"
+      FROM "SuccessEvent"
+      WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[])
+      GROUP BY "leadId"
+    `,
+    prisma.$queryRaw<Array<{ leadId: string; recent: number; previous: number }>>`
+      SELECT "leadId",
+             COUNT(*) FILTER (WHERE "createdAt" > ${oneWeekAgo})::int AS "recent",
+             COUNT(*) FILTER (WHERE "createdAt" > ${twoWeeksAgo} AND "createdAt" <= ${oneWeekAgo})::int AS "previous"
+      FROM "LeadEvent"
+      WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[]) AND "createdAt" > ${twoWeeksAgo}
+      GROUP BY "leadId"
+    `
+  ]);
+
+  const byLead = new Map<string, LeadActivityAggregates>();
+  const get = (leadId: string) => {
+    let agg = byLead.get(leadId);
+    if (!agg) {
+      agg = emptyAggregates();
+      byLead.set(leadId, agg);
+    }
+    return agg;
+  };
+
+  for (const row of messages) {
+    const agg = get(row.leadId);
+    agg.messages = row.total;
+    agg.recentMessages = row.recent;
+    agg.recentActivity += row.recent;
+    agg.previousActivity += row.previous;
+  }
+  for (const row of responses) {
+    const agg = get(row.leadId);
+    agg.responseCount = row.responseCount;
+    agg.responseMsSum = row.responseMsSum;
+  }
+  for (const row of notes) {
+    const agg = get(row.leadId);
+    agg.notes = row.total;
+    agg.recentActivity += row.recent;
+    agg.previousActivity += row.previous;
+  }
+  for (const row of calls) {
+    const agg = get(row.leadId);
+    agg.calls = row.total;
+    agg.answeredCalls = row.answered;
+    agg.missedCalls = row.missed;
+    agg.recentActivity += row.recent;
+    agg.previousActivity += row.previous;
+  }
+  for (const row of tasks) get(row.leadId).completedTasks = row.completed;
+  for (const row of successEvents) get(row.leadId).successEvents = row.total;
+  for (const row of events) {
+    const agg = get(row.leadId);
+    agg.recentActivity += row.recent;
+    agg.previousActivity += row.previous;
+  }
+
+  return byLead;
+}
+
+// Lead events in the one/two-week windows, for leads whose other activity is bucketed.
+export async function loadEventWindowCounts(tenantId: string, leadIds: string[], now: number = Date.now()) {
+  const windows = getActivityWindows(now);
+  const oneWeekAgo = new Date(windows.oneWeekAgo);
+  const twoWeeksAgo = new Date(windows.twoWeeksAgo);
+  const rows = await prisma.$queryRaw<Array<{ leadId: string; recent: number; previous: number }>>`
+    SELECT "leadId",
+           COUNT(*) FILTER (WHERE "createdAt" > ${oneWeekAgo})::int AS "recent",
+           COUNT(*) FILTER (WHERE "createdAt" <= ${oneWeekAgo})::int AS "previous"
+    FROM "LeadEvent"
+    WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[]) AND "createdAt" > ${twoWeeksAgo}
+    GROUP BY "leadId"
+  `;
+  return new Map(rows.map((r) => [r.leadId, { recent: r.recent, previous: r.previous }]));
+}
+
+// `activityAt` also stamps lastActivityAt and updatedAt (explicit and event-driven
+// rescoring). Decay sweeps pass neither: GET /leads and the CSV exports page by
+// (updatedAt, id), so a score that only decayed must not move an idle lead.
+export async function writeLeadScores(
+  rows: Array<{ id: string; score: number; level: string }>,
+  opts: { activityAt?: Date }
+) {
+  if (rows.length === 0) return;
+  const values = Prisma.join(rows.map((r) => Prisma.sql`(${r.id}, ${r.score}::int, ${r.level})`));
+  const touchActivity = opts.activityAt
+    ? Prisma.sql`, "lastActivityAt" = ${opts.activityAt}, "updatedAt" = ${opts.activityAt}`
+    : Prisma.empty;
+  await prisma.$executeRaw`
+    UPDATE "Lead" AS l
+    SET "score" = v."score",
+        "qualificationLevel" = v."level"
+        ${touchActivity}
+    FROM (VALUES ${values}) AS v("id", "score", "level")
+    WHERE l."id" = v."id"
+  `;
+}
+
+// Build incremental-scoring state from the DB for leads whose aggregates were just loaded.
+export async function buildLeadScoreStates(
+  tenantId: string,
+  leadIds: string[],
+  aggregates: Map<string, LeadActivityAggregates>,
+  now: number = Date.now()
+): Promise<LeadScoreStateRow[]> {
+  const since = new Date(getActivityWindows(now).twoWeeksAgo - 60 * 60 * 1000);
+
+  const [bucketRows, pendingRows] = await Promise.all([
+    prisma.$queryRaw<Array<{ leadId: string; hour: number; messages: number; activity: number }>>`
+      SELECT a."leadId", a."hour", SUM(a."isMessage")::int AS "messages", COUNT(*)::int AS "activity"
+      FROM (
+        SELECT "leadId", FLOOR(EXTRACT(EPOCH FROM "createdAt") / 3600)::int AS "hour", 1 AS "isMessage"
+        FROM "Message"
+        WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[]) AND "createdAt" > ${since}
+        UNION ALL
+        SELECT "leadId", FLOOR(EXTRACT(EPOCH FROM "createdAt") / 3600)::int, 0
+        FROM "Note"
+        WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[]) AND "createdAt" > ${since}
+        UNION ALL
+        SELECT "leadId", FLOOR(EXTRACT(EPOCH FROM "createdAt") / 3600)::int, 0
+        FROM "Call"
+        WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[]) AND "createdAt" > ${since}
+      ) a
+      GROUP BY a."leadId", a."hour"
+    `,
+    prisma.$queryRaw<Array<{ leadId: string; count: number; msSum: number }>>`
+      SELECT i."leadId", COUNT(*)::int AS "count",
+             COALESCE(SUM(EXTRACT(EPOCH FROM i."createdAt") * 1000), 0)::float8 AS "msSum"
+      FROM "Message" i
+      WHERE i."tenantId" = ${tenantId} AND i."leadId" = ANY(${leadIds}::text[]) AND i."direction" = 'IN'
+        AND NOT EXISTS (
+          SELECT 1 FROM "Message" o
+          WHERE o."leadId" = i."leadId" AND o."direction" = 'OUT' AND o."createdAt" > i."createdAt"
+        )
+      GROUP BY i."leadId"
+    `
+  ]);
+
+  const bucketsByLead = new Map<string, ActivityBuckets>();
+  for (const row of bucketRows) {
+    const buckets = bucketsByLead.get(row.leadId) ?? {};
+    buckets[activityBucketKey(row.hour * 60 * 60 * 1000)] = [row.messages, row.activity];
+    bucketsByLead.set(row.leadId, buckets);
+  }
+  const pendingByLead = new Map(pendingRows.map((r) => [r.leadId, r]));
+
+  return leadIds.map((leadId) => {
+    const agg = aggregates.get(leadId) ?? emptyAggregates();
+    const buckets = pruneActivityBuckets(bucketsByLead.get(leadId) ?? {}, now);
+    const hours = Object.keys(buckets).map(Number);
+    const pending = pendingByLead.get(leadId);
+    return {
+      leadId,
+      tenantId,
+      messages: agg.messages,
+      notes: agg.notes,
+      calls: agg.calls,
+      completedTasks: agg.completedTasks,
+      successEvents: agg.successEvents,
+      answeredCalls: agg.answeredCalls,
+      missedCalls: agg.missedCalls,
+      responseCount: agg.responseCount,
+      responseMsSum: agg.responseMsSum,
+      pendingInboundCount: pending?.count ?? 0,
+      pendingInboundMsSum: pending?.msSum ?? 0,
+      activityBuckets: buckets,
+      lastActivityAt: hours.length > 0 ? new Date(Math.max(...hours) * 60 * 60 * 1000) : null
+    };
+  });
+}
+
+export async function saveLeadScoreStates(
+  rows: LeadScoreStateRow[],
+  now: Date = new Date(),
+  db: Prisma.TransactionClient = prisma
+) {
+  if (rows.length === 0) return;
+  const values = Prisma.join(
+    rows.map(
+      (r) => Prisma.sql`(
+        ${r.leadId}, ${r.tenantId}, ${r.messages}::int, ${r.notes}::int, ${r.calls}::int,
+        ${r.completedTasks}::int, ${r.successEvents}::int, ${r.answeredCalls}::int, ${r.missedCalls}::int,
+        ${r.responseCount}::int, ${r.responseMsSum}::float8, ${r.pendingInboundCount}::int,
+        ${r.pendingInboundMsSum}::float8, ${JSON.stringify(r.activityBuckets)}::jsonb,
+        ${r.lastActivityAt}::timestamp(3), ${now}::timestamp(3)
+      )`
+    )
+  );
+  await db.$executeRaw`
+    INSERT INTO "LeadScoreState" (
+      "leadId", "tenantId", "messages", "notes", "calls", "completedTasks", "successEvents",
+      "answeredCalls", "missedCalls", "responseCount", "responseMsSum", "pendingInboundCount",
+      "pendingInboundMsSum", "activityBuckets", "lastActivityAt", "updatedAt"
+    )
+    VALUES ${values}
+    ON CONFLICT ("leadId") DO UPDATE SET
+      "messages" = EXCLUDED."messages",
+      "notes" = EXCLUDED."notes",
+      "calls" = EXCLUDED."calls",
+      "completedTasks" = EXCLUDED."completedTasks",
+      "successEvents" = EXCLUDED."successEvents",
+      "answeredCalls" = EXCLUDED."answeredCalls",
+      "missedCalls" = EXCLUDED."missedCalls",
+      "responseCount" = EXCLUDED."responseCount",
+      "responseMsSum" = EXCLUDED."responseMsSum",
+      "pendingInboundCount" = EXCLUDED."pendingInboundCount",
+      "pendingInboundMsSum" = EXCLUDED."pendingInboundMsSum",
+      "activityBuckets" = EXCLUDED."activityBuckets",
+      "lastActivityAt" = EXCLUDED."lastActivityAt",
+      "updatedAt" = EXCLUDED."updatedAt"
+  `;
+}
+
+export async function recalculateTenantLeadScores(tenantId: string, ctx?: BackgroundJobContext) {
+  const startedAt = Date.now();
+  const total = await prisma.lead.count({ where: { tenantId } });
+  await ctx?.setTotal(total);
+
+  const channelWeights = await getChannelConversionWeights(tenantId);
+
+  let cursor: string | null = null;
+  let processed = 0;
+  let updated = 0;
+  let failed = 0;
+
+  for (;;) {
+    const leads: Array<{
+      id: string;
+      channel: LeadChannel;
+      heat: LeadHeat;
+      status: string;
+      fullName: string | null;
+      phone: string | null;
+      email: string | null;
+    }> = await prisma.lead.findMany({
+      where: { tenantId, ...(cursor ? { id: { gt: cursor } } : {}) },
+      orderBy: { id: 'asc' },
+      take: CHUNK_SIZE,
+      select: { id: true, channel: true, heat: true, status: true, fullName: true, phone: true, email: true }
+    });
+    if (leads.length === 0) break;
+    cursor = leads[leads.length - 1].id;
+
+    const now = Date.now();
+    try {
+      const leadIds = leads.map((l) => l.id);
+      const aggregates = await loadActivityAggregates(tenantId, leadIds, now);
+      const rows = leads.map((lead) => {
+        const score = scoreFromAggregates(
+          lead,
+          aggregates.get(lead.id) ?? emptyAggregates(),
+          channelWeights.get(lead.channel) ?? 0.5
+        );
+        return { id: lead.id, score, level: getQualificationLevel(score) };
+      });
+      await writeLeadScores(rows, { activityAt: new Date(now) });
+      // Full rescoring also resets the running counters used by incremental scoring.
+      await saveLeadScoreStates(await buildLeadScoreStates(tenantId, leadIds, aggregates, now), new Date(now));
+      updated += rows.length;
+    } catch (err) {
+      // A failed chunk is reported and skipped; the rest of the tenant is still rescored.
+      failed += leads.length;
+      console.error(`[BatchScoring] Chunk after ${processed} leads failed for tenant ${tenantId}:`, err);
+    }
+
+    processed += leads.length;
+    await ctx?.reportProgress({ processed, failed });
+  }
+
+  return { totalLeads: processed, updated, failed, durationMs: Date.now() - startedAt };
+}
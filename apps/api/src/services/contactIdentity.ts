@@ -0,0 +1,129 @@
+import { prisma } from '../db.js';
+
+// Canonical contact identity.
+//
+// Client and Lead carry `phoneKey` / `emailKey` columns, filled by a DB trigger from
+// `phone` / `email`, so "917737845253", "+91 77378 45253" and "0091-7737845253" all land
+// on the same key. phoneKey()/emailKey() below mirror the SQL functions
+// contact_phone_key/contact_email_key and are used to build lookups; keep them in sync.
+// Numbers stored without a country code keep their digits as-is.
+//
+// In front of the lookup sits a bounded LRU of (tenant, channel, contact) → (client,
+// lead) for chatty WhatsApp contacts; a hit is re-checked with a primary-key read, so
+// closed, reassigned-away or deleted leads simply fall through to the indexed query.
+
+const CACHE_SIZE = Math.max(100, Number(process.env.CONTACT_CACHE_SIZE ?? 10_000));
+const CACHE_TTL_MS = Math.max(1000, Number(process.env.CONTACT_CACHE_TTL_MS ?? 10 * 60 * 1000));
+const BACKFILL_BATCH_SIZE = Math.max(100, Number(process.env.CONTACT_BACKFILL_BATCH_SIZE ?? 2000));
+
+export function phoneKey(raw: string | null | undefined): string | null {
+  if (!raw) return null;
+  const digits = raw.replace(/[^0-9]/g, '').replace(/^00/, '');
+  return digits.length >= 7 ? `+${digits}` : null;
+}
+
+export function emailKey(raw: string | null | undefined): string | null {
+  if (!raw) return null;
+  // btrim() in contact_email_key strips spaces only, not tabs/newlines.
+  const email = raw.replace(/^ +| +$/g, '').toLowerCase();
+  return email.indexOf('@') > 0 ? email : null;
+}
+
+export type ContactKeys = { phoneKey: string | null; emailKey: string | null };
+
+export function contactKeys(contact: { phone?: string | null; email?: string | null }): ContactKeys {
+  return { phoneKey: phoneKey(contact.phone), emailKey: emailKey(contact.email) };
+}
+
+type CachedContact = { clientId: string | null; leadId: string; expiresAt: number };
+
+// Map iteration order is insertion order: re-inserting on hit makes the first key the
+// least recently used.
+const contactCache = new Map<string, CachedContact>();
+
+function cacheKey(tenantId: string, channel: string, keys: ContactKeys) {
+  return `${tenantId}|${channel}|${keys.phoneKey ?? ''}|${keys.emailKey ?? ''}`;
+}
+
+export function getCachedContact(tenantId: string, channel: string, keys: ContactKeys) {
+  const key = cacheKey(tenantId, channel, keys);
+  const entry = contactCache.get(key);
+  if (!entry) return null;
+  contactCache.delete(key);
+  if (entry.expiresAt <= Date.now()) return null;
+  contactCache.set(key, entry);
+  return entry;
+}
+
+export function rememberContact(
+  tenantId: string,
+  channel: string,
+  keys: ContactKeys,
+  resolved: { clientId: string | null; leadId: string }
+) {
+  if (!keys.phoneKey && !keys.emailKey) return;
+  const key = cacheKey(tenantId, channel, keys);
+  contactCache.delete(key);
+  contactCache.set(key, { ...resolved, expiresAt: Date.now() + CACHE_TTL_MS });
+  while (contactCache.size > CACHE_SIZE) {
+    const oldest = contactCache.keys().next().value;
+    if (oldest === undefined) break;
+    contactCache.delete(oldest);
+  }
+}
+
+export function forgetContact(tenantId: string, channel: string, keys: ContactKeys) {
+  contactCache.delete(cacheKey(tenantId, channel, keys));
+}
+
+// Fill phoneKey/emailKey on rows written before the keys existed (the trigger covers
+// everything written since). Walks each table by id in batches; safe to re-run.
+export async function backfillContactKeys(onProgress?: (table: string, updated: number) => void) {
+  const totals = { clients: 0, leads: 0 };
+
+  for (const table of ['Client', 'Lead'] as const) {
+    let lastId = '';
+    let updated = 0;
+    for (;;) {
+      const batch =
+        table === 'Client'
+          ? await prisma.client.findMany({
+              where: { id: { gt: lastId } },
+              orderBy: { id: 'asc' },
+              take: BACKFILL_BATCH_SIZE,
+              select: { id: true }
+            })
+          : await prisma.lead.findMany({
+              where: { id: { gt: lastId } },
+              orderBy: { id: 'asc' },
+              take: BACKFILL_BATCH_SIZE,
+              select: { id: true }
+            });
+      if (batch.length === 0) break;
+
+      const ids = batch.map((r) => r.id);
+      if (table === 'Client') {
+        await prisma.$executeRaw`
+          UPDATE "Client"
+          SET "phoneKey" = contact_phone_key("phone"), "emailKey" = contact_email_key("email")
+          WHERE "id" = ANY(${ids}::text[])
+        `;
+      } else {
+        await prisma.$executeRaw`
+          UPDATE "Lead"
+          SET "phoneKey" = contact_phone_key("phone"), "emailKey" = contact_email_key("email")
+          WHERE "id" = ANY(${ids}::text[])
+        `;
+      }
+
+      lastId = ids[ids.length - 1];
+      updated += ids.length;
+      onProgress?.(table, updated);
+      if (batch.length < BACKFILL_BATCH_SIZE) break;
+    }
+    if (table === 'Client') totals.clients = updated;
+    else totals.leads = updated;
+  }
+
+  return totals;
+}
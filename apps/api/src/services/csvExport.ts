@@ -0,0 +1,93 @@
+import type { Request, Response } from 'express';
+import { Readable } from 'node:stream';
+import { pipeline } from 'node:stream/promises';
+import { createGzip } from 'node:zlib';
+import { HttpError } from '../http.js';
+import type { KeysetCursor } from './pagination.js';
+
+// Streaming CSV exports.
+//
+// Rows are read a page at a time in keyset order and written to the response as they
+// arrive. The stream only pulls the next page once the previous one has been flushed to
+// the socket (or gzip), so memory stays at roughly one page regardless of export size,
+// and a client disconnect stops the DB reads. `?gzip=1` returns a .csv.gz attachment.
+
+export const EXPORT_PAGE_SIZE = Math.max(100, Number(process.env.CSV_EXPORT_PAGE_SIZE ?? 1000));
+
+export type CsvColumn<T> = {
+  key: string;
+  header: string;
+  value: (row: T) => unknown;
+};
+
+export function csvCell(value: unknown): string {
+  return `"${String(value ?? '').replace(/"/g, '""')}"`;
+}
+
+// `?columns=id,fullName,phone` → those columns in that order; all columns when absent.
+export function selectCsvColumns<T>(columns: CsvColumn<T>[], requested: unknown): CsvColumn<T>[] {
+  if (typeof requested !== 'string' || requested.trim() === '') return columns;
+
+  const byKey = new Map(columns.map((c) => [c.key, c] as const));
+  const selected: CsvColumn<T>[] = [];
+  for (const key of requested.split(',').map((k) => k.trim()).filter(Boolean)) {
+    const column = byKey.get(key);
+    if (!column) {
+      throw new HttpError(400, `Unknown column "${key}". Available: ${columns.map((c) => c.key).join(', ')}`);
+    }
+    selected.push(column);
+  }
+  return selected;
+}
+
+// Walk a table newest-first by (at, id). `fetchPage` must order by both keys descending
+// and return rows strictly after `cursor` in that order.
+export async function* keysetPages<T extends { id: string }>(
+  fetchPage: (cursor: KeysetCursor | null, take: number) => Promise<T[]>,
+  keyOf: (row: T) => Date,
+  pageSize: number = EXPORT_PAGE_SIZE
+): AsyncGenerator<T[]> {
+  let cursor: KeysetCursor | null = null;
+  for (;;) {
+    const page = await fetchPage(cursor, pageSize);
+    if (page.length > 0) yield page;
+    if (page.length < pageSize) return;
+    const last = page[page.length - 1];
+    cursor = { at: keyOf(last), id: last.id };
+  }
+}
+
+async function* csvChunks<T>(
+  columns: CsvColumn<T>[],
+  pages: AsyncIterable<T[]> | Iterable<T[]>
+): AsyncGenerator<string> {
+  yield columns.map((c) => csvCell(c.header)).join(',') + '\n';
+  for await (const page of pages) {
+    let chunk = '';
+    for (const row of page) {
+      chunk += columns.map((c) => csvCell(c.value(row))).join(',') + '\n';
+    }
+    yield chunk;
+  }
+}
+
+export async function streamCsv<T>(
+  req: Request,
+  res: Response,
+  params: { filename: string; columns: CsvColumn<T>[]; pages: AsyncIterable<T[]> | Iterable<T[]> }
+) {
+  const gzip = ['1', 'true'].includes(String((req.query as any)?.gzip ?? '').toLowerCase());
+
+  res.setHeader('Content-Type', gzip ? 'application/gzip' : 'text/csv; charset=utf-8');
+  res.setHeader('Content-Disposition', `attachment; filename="${params.filename}${gzip ? '.gz' : ''}"`);
+
+  const source = Readable.from(csvChunks(params.columns, params.pages));
+  try {
+    if (gzip) await pipeline(source, createGzip(), res);
+    else await pipeline(source, res);
+  } catch (error: any) {
+    // Headers (and possibly rows) are already out; all we can do is cut the response.
+    console.warn(`[CsvExport] ${params.filename} aborted:`, error?.message || error);
+    if (!res.destroyed) res.destroy();
+  }
+}
@@ -0,0 +1,102 @@
+// Incremental RFC 4180 CSV parser.
+//
+// Consumes text chunks as they arrive (file or request stream) and yields one record at
+// a time, so callers never hold more than the current record in memory. Handles quoted
+// fields containing commas, doubled quotes and line breaks, CRLF/LF/CR record endings,
+// a leading UTF-8 BOM and a missing final newline. Fully blank lines are skipped. A stray
+// quote inside an unquoted field is kept as a literal character.
+
+export type CsvRecord = {
+  fields: string[];
+  line: number; // 1-based line on which the record starts
+};
+
+export class CsvParseError extends Error {
+  line: number;
+
+  constructor(line: number, message: string) {
+    super(`Line ${line}: ${message}`);
+    this.line = line;
+  }
+}
+
+export async function* parseCsvRecords(source: AsyncIterable<string | Buffer>): AsyncGenerator<CsvRecord> {
+  let fields: string[] = [];
+  let field = '';
+  let inQuotes = false;
+  let quoteJustClosed = false; // inside a quoted field, saw a quote that may be an escape
+  let pendingCr = false; // saw CR, swallow a following LF
+  let quotedCr = false; // last quoted character was CR (CRLF counts as one line)
+  let line = 1;
+  let recordLine = 1;
+  let first = true;
+
+  const endRecord = (): CsvRecord | null => {
+    fields.push(field);
+    const record = fields.length === 1 && fields[0] === '' ? null : { fields, line: recordLine };
+    fields = [];
+    field = '';
+    return record;
+  };
+
+  for await (const raw of source) {
+    let chunk = typeof raw === 'string' ? raw : raw.toString('utf8');
+    if (first) {
+      if (chunk.charCodeAt(0) === 0xfeff) chunk = chunk.slice(1);
+      first = chunk.length === 0;
+    }
+
+    let out: CsvRecord[] = [];
+    for (let i = 0; i < chunk.length; i++) {
+      const char = chunk[i];
+
+      if (pendingCr) {
+        pendingCr = false;
+        if (char === '\n') continue;
+      }
+
+      if (inQuotes) {
+        if (quoteJustClosed) {
+          quoteJustClosed = false;
+          if (char === '"') {
+            field += '"';
+            continue;
+          }
+          inQuotes = false;
+          // Fall through: the quote closed the field, handle `char` as unquoted.
+        } else if (char === '"') {
+          quoteJustClosed = true;
+          continue;
+        } else {
+          if (char === '\r' || (char === '\n' && !quotedCr)) line++;
+          quotedCr = char === '\r';
+          field += char;
+          continue;
+        }
+      }
+
+      if (char === '"' && field === '') {
+        inQuotes = true;
+        quotedCr = false;
+      } else if (char === ',') {
+        fields.push(field);
+        field = '';
+      } else if (char === '\n' || char === '\r') {
+        const record = endRecord();
+        if (record) out.push(record);
+        if (char === '\r') pendingCr = true;
+        line++;
+        recordLine = line;
+      } else {
+        field += char;
+      }
+    }
+
+    for (const record of out) yield record;
+    out = [];
+  }
+
+  if (inQuotes && !quoteJustClosed) throw new CsvParseError(recordLine, 'unterminated quoted field');
+  const last = endRecord();
+  if (last) yield last;
+}
@@ -0,0 +1,128 @@
+import { prisma } from '../db.js';
+
+// Per-tenant cache for GET /analytics/dashboard.
+//
+// Lead counters come from one grouped pass over (status, heat, channel); the rest of the
+// payload is the open triage count, the salesman count and the latest success events.
+// Entries are fresh for DASHBOARD_CACHE_TTL_MS. After that they are still served while a
+// single background refresh runs, up to DASHBOARD_CACHE_MAX_STALE_MS. Writes to anything
+// shown (leads created or deleted, status/heat changes, triage items opened, assigned or
+// closed, success events, new salesmen) invalidate the tenant's entry, so the next read
+// recomputes.
+// Concurrent readers share one computation.
+
+const TTL_MS = Math.max(1000, Number(process.env.DASHBOARD_CACHE_TTL_MS ?? 15_000));
+const MAX_STALE_MS = Math.max(TTL_MS, Number(process.env.DASHBOARD_CACHE_MAX_STALE_MS ?? 5 * 60 * 1000));
+const ACTIVE_STATUSES = new Set<string>(['CONTACTED', 'QUALIFIED', 'QUOTED']);
+
+export type DashboardStats = Awaited<ReturnType<typeof computeDashboardStats>>;
+
+type CacheEntry = {
+  value: DashboardStats | null;
+  computedAt: number;
+  version: number; // bumped by invalidation
+  computedVersion: number;
+  refreshing: Promise<DashboardStats> | null;
+};
+
+const cache = new Map<string, CacheEntry>();
+
+async function computeDashboardStats(tenantId: string) {
+  const [groups, totalTriageOpen, totalSalesmen, recentSuccessEvents] = await Promise.all([
+    prisma.lead.groupBy({
+      by: ['status', 'heat', 'channel'],
+      where: { tenantId },
+      _count: { _all: true }
+    }),
+    prisma.triageQueueItem.count({ where: { tenantId, status: 'OPEN' } }),
+    prisma.salesman.count({ where: { tenantId } }),
+    prisma.successEvent.findMany({
+      where: { tenantId, createdAt: { gte: new Date(Date.now() - 7 * 24 * 60 * 60 * 1000) } },
+      orderBy: { createdAt: 'desc' },
+      take: 5,
+      include: {
+        definition: true,
+        lead: { select: { fullName: true, phone: true } }
+      }
+    })
+  ]);
+
+  let totalLeads = 0;
+  let newLeads = 0;
+  let activeLeads = 0;
+  let convertedLeads = 0;
+  const byStatus = new Map<string, number>();
+  const byHeat = new Map<string, number>();
+  const byChannel = new Map<string, number>();
+
+  for (const group of groups) {
+    const count = group._count._all;
+    totalLeads += count;
+    if (group.status === 'NEW') newLeads += count;
+    else if (group.status === 'WON') convertedLeads += count;
+    else if (ACTIVE_STATUSES.has(group.status)) activeLeads += count;
+    byStatus.set(group.status, (byStatus.get(group.status) ?? 0) + count);
+    byHeat.set(group.heat, (byHeat.get(group.heat) ?? 0) + count);
+    byChannel.set(group.channel, (byChannel.get(group.channel) ?? 0) + count);
+  }
+
+  return {
+    totalLeads,
+    newLeads,
+    activeLeads,
+    convertedLeads,
+    totalTriageOpen,
+    totalSalesmen,
+    leadsByStatus: [...byStatus].map(([status, count]) => ({ status, count })),
+    leadsByHeat: [...byHeat].map(([heat, count]) => ({ heat, count })),
+    leadsByChannel: [...byChannel].map(([channel, count]) => ({ channel, count })),
+    recentSuccessEvents
+  };
+}
+
+function refresh(tenantId: string, entry: CacheEntry): Promise<DashboardStats> {
+  if (entry.refreshing) return entry.refreshing;
+
+  const version = entry.version;
+  entry.refreshing = computeDashboardStats(tenantId)
+    .then((value) => {
+      entry.value = value;
+      entry.computedAt = Date.now();
+      // An invalidation that landed mid-computation keeps the entry dirty.
+      entry.computedVersion = version;
+      return value;
+    })
+    .finally(() => {
+      entry.refreshing = null;
+    });
+  return entry.refreshing;
+}
+
+export async function getDashboardStats(tenantId: string): Promise<DashboardStats> {
+  let entry = cache.get(tenantId);
+  if (!entry) {
+    entry = { value: null, computedAt: 0, version: 0, computedVersion: -1, refreshing: null };
+    cache.set(tenantId, entry);
+  }
+
+  const age = Date.now() - entry.computedAt;
+  const clean = entry.computedVersion === entry.version;
+
+  if (entry.value && clean) {
+    if (age < TTL_MS) return entry.value;
+    if (age < MAX_STALE_MS) {
+      refresh(tenantId, entry).catch((error: any) => {
+        console.warn(`[DashboardCache] Background refresh failed for tenant ${tenantId}:`, error?.message || error);
+      });
+      return entry.value;
+    }
+  }
+
+  return refresh(tenantId, entry);
+}
+
+// Lead status/heat changed, or leads were removed.
+export function invalidateDashboardStats(tenantId: string) {
+  const entry = cache.get(tenantId);
+  if (entry) entry.version++;
+}
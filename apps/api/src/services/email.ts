@@ -2,6 +2,8 @@ import { ImapFlow } from 'imapflow';
 import { simpleParser, ParsedMail } from 'mailparser';
 import nodemailer from 'nodemailer';
 import type { Transporter } from 'nodemailer';
+import { prisma } from '../db.js';
+import { mapWithConcurrency } from './concurrency.js';
 
 interface EmailConfig {
   imap: {
@@ -37,18 +39,20 @@ interface IncomingEmail {
 
 let emailConfig: EmailConfig | null = null;
 let smtpTransporter: Transporter | null = null;
-let imapClient: ImapFlow | null = null;
-let isPolling = false;
 
 export function configureEmail(config: EmailConfig) {
   emailConfig = config;
   
-  // Create SMTP transporter
+  // Pooled SMTP transporter: keeps a few authenticated connections open between sends.
   smtpTransporter = nodemailer.createTransport({
     host: config.smtp.host,
     port: config.smtp.port,
     secure: config.smtp.secure,
     auth: config.smtp.auth,
+    pool: true,
+    maxConnections: Math.max(1, Number(process.env.SMTP_MAX_CONNECTIONS ?? 3)),
+    connectionTimeout: 15_000,
+    socketTimeout: 30_000,
   });
   
   console.log('Email service configured');
@@ -64,9 +68,9 @@ export async function sendEmail(params: {
   text: string;
   html?: string;
   from?: string;
-}): Promise<{ success: boolean; messageId?: string; error?: string }> {
+}): Promise<{ success: boolean; messageId?: string; error?: string; retryable?: boolean }> {
   if (!smtpTransporter || !emailConfig) {
-    return { success: false, error: 'Email service not configured' };
+    return { success: false, error: 'Email service not configured', retryable: false };
   }
 
   try {
@@ -81,9 +85,12 @@ export async function sendEmail(params: {
     return { success: true, messageId: info.messageId };
   } catch (error) {
     console.error('Failed to send email:', error);
+    // 5xx SMTP replies (bad recipient, rejected content) won't succeed on retry.
+    const responseCode = Number((error as any)?.responseCode);
     return {
       success: false,
       error: error instanceof Error ? error.message : 'Unknown error',
+      retryable: !(responseCode >= 500 && responseCode < 600),
     };
   }
 }
@@ -111,211 +118,214 @@ async function parseEmailMessage(source: Buffer): Promise<IncomingEmail | null>
   }
 }
 
-export async function pollEmails(
-  onNewEmail: (email: IncomingEmail) => Promise<void>
-): Promise<void> {
+// Long-lived IMAP ingestion (replaces reconnect-per-poll).
+//
+// One connection per mailbox stays open in IDLE and is re-established with backoff when
+// it drops. New mail is found by UID against a persisted ImapSyncState checkpoint
+// (UIDVALIDITY + last UID), so \Seen flags are neither read nor written and someone
+// reading the inbox in a mail client doesn't affect ingestion. Messages are fetched in
+// batches of IMAP_FETCH_BATCH and parsed/handed to onNewEmail IMAP_INGEST_CONCURRENCY at
+// a time; the checkpoint moves after each batch completes.
+
+const IDLE_MAILBOX = 'INBOX';
+const IDLE_FETCH_BATCH = Math.max(1, Number(process.env.IMAP_FETCH_BATCH ?? 50));
+const IDLE_CONCURRENCY = Math.max(1, Number(process.env.IMAP_INGEST_CONCURRENCY ?? 4));
+// Safety net for missed EXISTS notifications; runs on the open connection.
+const IDLE_RESYNC_MS = Math.max(30_000, Number(process.env.IMAP_RESYNC_INTERVAL_MS ?? 5 * 60 * 1000));
+const RECONNECT_BASE_MS = 1000;
+const RECONNECT_MAX_MS = 60_000;
+
+type IdleMonitor = {
+  tenantId: string;
+  onNewEmail: (email: IncomingEmail) => Promise<void>;
+  stopped: boolean;
+  client: ImapFlow | null;
+  syncing: Promise<void> | null;
+  resyncRequested: boolean;
+  loop: Promise<void> | null;
+};
+
+let idleMonitor: IdleMonitor | null = null;
+
+export function startEmailIdleMonitor(params: {
+  tenantId: string;
+  onNewEmail: (email: IncomingEmail) => Promise<void>;
+}): void {
   if (!emailConfig) {
-    console.warn('Email service not configured; skipping poll');
+    console.warn('Email service not configured; cannot start IDLE monitor');
     return;
   }
 
-  if (isPolling) {
-    console.log('[Email Poll] Already active, skipping');
+  if (idleMonitor) {
+    console.log('Email monitoring already active');
     return;
   }
 
-  isPolling = true;
-  let timeoutId: NodeJS.Timeout | null = null;
+  const monitor: IdleMonitor = {
+    tenantId: params.tenantId,
+    onNewEmail: params.onNewEmail,
+    stopped: false,
+    client: null,
+    syncing: null,
+    resyncRequested: false,
+    loop: null
+  };
+  idleMonitor = monitor;
+  monitor.loop = runIdleMonitor(monitor);
+}
+
+async function runIdleMonitor(monitor: IdleMonitor) {
+  let failures = 0;
+  while (!monitor.stopped) {
+    const startedAt = Date.now();
+    try {
+      await runIdleSession(monitor);
+    } catch (error) {
+      console.error('[Email IDLE] Session error:', error instanceof Error ? error.message : error);
+    }
+    if (monitor.stopped) break;
+
+    // A session that stayed up for a while starts the backoff over.
+    failures = Date.now() - startedAt > 60_000 ? 1 : failures + 1;
+    const exp = Math.min(RECONNECT_MAX_MS, RECONNECT_BASE_MS * 2 ** (failures - 1));
+    const delay = Math.floor(exp / 2 + Math.random() * (exp / 2));
+    console.warn(`[Email IDLE] Connection closed; reconnecting in ${Math.ceil(delay / 1000)}s`);
+    await new Promise((resolve) => setTimeout(resolve, delay));
+  }
+}
+
+// Resolves when the connection closes.
+async function runIdleSession(monitor: IdleMonitor) {
+  const config = emailConfig as EmailConfig;
+  const client = new ImapFlow({
+    host: config.imap.host,
+    port: config.imap.port,
+    secure: config.imap.secure,
+    auth: config.imap.auth,
+    logger: false,
+    maxIdleTime: 5 * 60 * 1000,
+  });
+  monitor.client = client;
+  const closed = new Promise<void>((resolve) => client.on('close', () => resolve()));
+  client.on('error', (error: any) => console.error('[Email IDLE] IMAP error:', error?.message || error));
 
+  let resyncTimer: NodeJS.Timeout | null = null;
   try {
-    console.log('[Email Poll] Connecting to IMAP server...');
-    console.log(`[Email Poll] Host: ${emailConfig.imap.host}:${emailConfig.imap.port}`);
-    console.log(`[Email Poll] User: ${emailConfig.imap.auth.user}`);
-    
-    imapClient = new ImapFlow({
-      host: emailConfig.imap.host,
-      port: emailConfig.imap.port,
-      secure: emailConfig.imap.secure,
-      auth: emailConfig.imap.auth,
-      logger: false,
-    });
+    await client.connect();
+    await client.mailboxOpen(IDLE_MAILBOX);
+    console.log(`[Email IDLE] Watching ${IDLE_MAILBOX} of ${config.imap.auth.user}`);
 
-    // Force abort connection if Gmail throttles for too long
-    timeoutId = setTimeout(() => {
-      console.warn('[Email Poll] Connection timeout - Gmail throttling detected, aborting');
-      if (imapClient) {
-        try {
-          imapClient.logout();
-        } catch (e) {
-          // Ignore close errors
-        }
-        imapClient = null;
-      }
-    }, 20000);
-
-    await imapClient.connect();
-    
-    if (timeoutId) {
-      clearTimeout(timeoutId);
-      timeoutId = null;
-    }
-    
-    console.log('[Email Poll] Connected to IMAP server');
-
-    // Open INBOX
-    const mailbox = await imapClient.mailboxOpen('INBOX');
-    console.log(
-      `[Email Poll] Opened INBOX: ${mailbox.exists} total messages, ${mailbox.unseen || 0} unseen`
-    );
-
-    // Fetch only UNSEEN messages
-    if (mailbox.unseen && mailbox.unseen > 0) {
-      console.log(`[Email Poll] Fetching ${mailbox.unseen} unseen message(s)...`);
-      let processedCount = 0;
-      
-      for await (const message of imapClient.fetch('UNSEEN', {
-        envelope: true,
-        source: true,
-        flags: true,
-      })) {
-        console.log(
-          `[Email Poll] Processing email seq:${message.seq} uid:${message.uid}`
-        );
-        
-        const email = await parseEmailMessage(message.source);
-        if (email) {
-          try {
-            await onNewEmail(email);
-            processedCount++;
-            // Mark as seen after successful processing
-            await imapClient.messageFlagsAdd(message.seq, ['\\Seen']);
-            console.log(
-              `[Email Poll] Successfully processed and marked as seen: seq:${message.seq}`
-            );
-          } catch (error) {
-            console.error(
-              `[Email Poll] Failed to process email seq:${message.seq}:`,
-              error
-            );
-          }
-        }
-      }
-      
-      console.log(`[Email Poll] Processed ${processedCount} new email(s)`);
-    } else {
-      console.log('[Email Poll] No unseen messages');
-    }
+    // The client sits in IDLE between commands; EXISTS means new mail.
+    client.on('exists', () => requestSync(monitor, client));
+    resyncTimer = setInterval(() => requestSync(monitor, client), IDLE_RESYNC_MS);
+    requestSync(monitor, client);
 
-    await imapClient.logout();
-    console.log('[Email Poll] Completed successfully');
-  } catch (error) {
-    console.error('[Email Poll] Error:', error);
+    await closed;
   } finally {
-    if (timeoutId) {
-      clearTimeout(timeoutId);
+    if (resyncTimer) clearInterval(resyncTimer);
+    monitor.client = null;
+    try {
+      client.close();
+    } catch {
+      // Already closed
     }
-    isPolling = false;
-    imapClient = null;
   }
 }
 
-export async function startEmailIdleMonitor(
-  onNewEmail: (email: IncomingEmail) => Promise<void>
-): Promise<void> {
-  if (!emailConfig) {
-    console.warn('Email service not configured; cannot start IDLE monitor');
+// One sync at a time per connection; a request during a sync runs one more pass.
+function requestSync(monitor: IdleMonitor, client: ImapFlow) {
+  if (monitor.syncing) {
+    monitor.resyncRequested = true;
     return;
   }
+  monitor.syncing = (async () => {
+    do {
+      monitor.resyncRequested = false;
+      await syncMailbox(monitor, client);
+    } while (monitor.resyncRequested && client.usable && !monitor.stopped);
+  })()
+    .catch((error) => {
+      // The checkpoint didn't move; the next EXISTS or resync covers the range again.
+      console.error('[Email IDLE] Sync failed:', error instanceof Error ? error.message : error);
+    })
+    .finally(() => {
+      monitor.syncing = null;
+    });
+}
 
-  if (isPolling) {
-    console.log('Email monitoring already active');
-    return;
-  }
+async function syncMailbox(monitor: IdleMonitor, client: ImapFlow) {
+  const config = emailConfig as EmailConfig;
+  const box = client.mailbox;
+  if (!box || !client.usable) return;
 
-  isPolling = true;
+  const account = `${config.imap.auth.user}@${config.imap.host}`;
+  const where = { account_mailbox: { account, mailbox: IDLE_MAILBOX } };
+  const uidValidity = BigInt(box.uidValidity);
+  const state = await prisma.imapSyncState.findUnique({ where });
+  const tracking = Boolean(state && state.uidValidity === uidValidity);
 
-  try {
-    imapClient = new ImapFlow({
-      host: emailConfig.imap.host,
-      port: emailConfig.imap.port,
-      secure: emailConfig.imap.secure,
-      auth: emailConfig.imap.auth,
-      logger: false,
-    });
+  let uids: number[];
+  if (tracking) {
+    const last = Number(state!.lastUid);
+    // "N:*" always matches the newest message, even when its UID is below N.
+    uids = ((await client.search({ uid: `${last + 1}:*` }, { uid: true })) || []).filter((uid) => uid > last);
+  } else {
+    // First run, or the mailbox was rebuilt (UIDVALIDITY changed): take what is unread
+    // now, then follow UIDs from the current end of the mailbox.
+    if (state) console.warn(`[Email IDLE] UIDVALIDITY of ${IDLE_MAILBOX} changed; re-baselining`);
+    uids = (await client.search({ seen: false }, { uid: true })) || [];
+  }
+  uids.sort((a, b) => a - b);
+  const baseline = box.uidNext - 1;
 
-    await imapClient.connect();
-    console.log('Connected to IMAP server for IDLE monitoring');
+  const save = (lastUid: number) =>
+    prisma.imapSyncState.upsert({
+      where,
+      create: { tenantId: monitor.tenantId, account, mailbox: IDLE_MAILBOX, uidValidity, lastUid: BigInt(lastUid) },
+      update: { tenantId: monitor.tenantId, uidValidity, lastUid: BigInt(lastUid) },
+    });
 
-    const lock = await imapClient.getMailboxLock('INBOX');
-    try {
-      // Process existing unseen messages first
-      for await (const message of imapClient.fetch('UNSEEN', {
-        envelope: true,
-        source: true,
-        flags: true,
-      })) {
-        const email = await parseEmailMessage(message.source);
-        if (email) {
-          try {
-            await onNewEmail(email);
-            await imapClient.messageFlagsAdd(message.seq, ['\\Seen']);
-          } catch (error) {
-            console.error('Failed to process email:', error);
-          }
-        }
-      }
-    } finally {
-      lock.release();
+  let ingested = 0;
+  for (let i = 0; i < uids.length; i += IDLE_FETCH_BATCH) {
+    const batch = uids.slice(i, i + IDLE_FETCH_BATCH);
+    const messages: Array<{ uid: number; source: Buffer }> = [];
+    for await (const message of client.fetch(batch, { source: true, uid: true }, { uid: true })) {
+      messages.push({ uid: message.uid, source: message.source });
     }
 
-    // Set up IDLE listener for new messages
-    imapClient.on('exists', async () => {
-      const lock = await imapClient!.getMailboxLock('INBOX');
-      try {
-        for await (const message of imapClient!.fetch('UNSEEN', {
-          envelope: true,
-          source: true,
-          flags: true,
-        })) {
-          const email = await parseEmailMessage(message.source);
-          if (email) {
-            try {
-              await onNewEmail(email);
-              await imapClient!.messageFlagsAdd(message.seq, ['\\Seen']);
-            } catch (error) {
-              console.error('Failed to process new email:', error);
-            }
-          }
-        }
-      } finally {
-        lock.release();
-      }
+    await mapWithConcurrency(messages, IDLE_CONCURRENCY, async (message) => {
+      const email = await parseEmailMessage(message.source);
+      if (email) await monitor.onNewEmail(email);
     });
-
-    // Start IDLE
-    await imapClient.idle();
-    console.log('IDLE monitoring active');
-  } catch (error) {
-    console.error('Email IDLE monitor error:', error);
-    isPolling = false;
-    if (imapClient) {
-      try {
-        await imapClient.logout();
-      } catch {}
-      imapClient = null;
-    }
+    ingested += messages.length;
+    // While re-baselining the checkpoint is only written once the unread scan is done.
+    if (tracking) await save(batch[batch.length - 1]);
   }
+  if (!tracking) await save(Math.max(baseline, uids[uids.length - 1] ?? 0));
+
+  if (ingested > 0) console.log(`[Email IDLE] Ingested ${ingested} new email(s)`);
+}
+
+// Sync now (POST /admin/poll-emails). False when the monitor isn't connected.
+export function requestEmailSync(): boolean {
+  const monitor = idleMonitor;
+  const client = monitor?.client;
+  if (!monitor || !client?.usable) return false;
+  requestSync(monitor, client);
+  return true;
 }
 
 export async function stopEmailMonitor(): Promise<void> {
-  if (imapClient) {
+  const monitor = idleMonitor;
+  if (monitor) {
+    monitor.stopped = true;
     try {
-      await imapClient.logout();
-      console.log('Stopped email monitor');
+      await monitor.client?.logout();
     } catch (error) {
       console.error('Error stopping email monitor:', error);
     }
-    imapClient = null;
+    await monitor.syncing;
+    idleMonitor = null;
+    console.log('Stopped email monitor');
   }
-  isPolling = false;
 }
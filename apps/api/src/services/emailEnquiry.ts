@@ -0,0 +1,283 @@
+// Email enquiry filtering shared by the Gmail and IMAP ingestion paths.
+
+/**
+ * Smart enquiry detection - filters out promotional/automated emails
+ */
+function parseKeywordList(raw: string | undefined): string[] {
+  if (!raw) return [];
+  return raw
+    .split(/[,\n]/g)
+    .map((s) => s.trim().toLowerCase())
+    .filter((s) => s.length >= 2);
+}
+
+function normalizeForKeywordMatch(input: string): string {
+  return (input || '')
+    .toLowerCase()
+    .replace(/[^a-z0-9]+/g, ' ')
+    .replace(/\s+/g, ' ')
+    .trim();
+}
+
+export function buildEmailCustomerMessage(email: {
+  from?: string | null;
+  fromName?: string | null;
+  subject?: string | null;
+  text?: string | null;
+}): string {
+  const from = (email.from ?? '').trim();
+  const fromName = (email.fromName ?? '').trim();
+  const subject = (email.subject ?? '').trim();
+  const text = (email.text ?? '').trim();
+
+  const headerFrom = fromName ? `${fromName} <${from || 'unknown'}>` : (from || 'unknown');
+  const headerSubject = subject || '(no subject)';
+
+  // Keep payload bounded to avoid huge token usage from long email threads.
+  const MAX_BODY_CHARS = 4000;
+  const clippedBody = text.length > MAX_BODY_CHARS ? `${text.slice(0, MAX_BODY_CHARS)}\n\n[trimmed]` : text;
+
+  return `Email enquiry\nFrom: ${headerFrom}\nSubject: ${headerSubject}\n\nMessage:\n${clippedBody}`;
+}
+
+function anyKeywordMatches(subject: string, body: string, keywords: string[]): boolean {
+  if (!keywords || keywords.length === 0) return false;
+  const hay = normalizeForKeywordMatch(`${subject}\n${body}`);
+  for (const kw of keywords) {
+    const needle = normalizeForKeywordMatch(kw);
+    if (!needle) continue;
+    if (hay.includes(needle)) return true;
+  }
+  return false;
+}
+
+export function getEmailEnquiryKeywords(): string[] {
+  // If you set EMAIL_ENQUIRY_KEYWORDS, it will be used as a strict allowlist.
+  // Example:
+  // EMAIL_ENQUIRY_KEYWORDS="air circulator,man cooler,heavy duty exhaust,tube axial,centrifugal blower,axial flow,pedestal fan,wall mount fan,tubular fan,hvls"
+  const configured = parseKeywordList(process.env.EMAIL_ENQUIRY_KEYWORDS);
+  if (configured.length > 0) return configured;
+
+  // No keywords configured => return empty list so behaviour stays backward-compatible.
+  return [];
+}
+
+export function isLikelyEnquiry(
+  email: { from: string; subject: string; text: string; fromName?: string },
+  opts?: { requireKeywordMatch?: boolean; keywords?: string[] }
+): boolean {
+  const subject = email.subject?.toLowerCase() || '';
+  const body = email.text?.toLowerCase() || '';
+  const from = email.from?.toLowerCase() || '';
+  
+  // Block specific automated sender domains/addresses - newsletters, marketing, automation
+  const blockedSenders = [
+    // E-commerce & Services
+    '@amazon.com',
+    '@amazon.in',
+    '@netflix.com',
+    '@uber.com',
+    '@swiggy.in',
+    '@zomato.com',
+    '@paytm.com',
+    '@phonepe.com',
+    '@razorpay.com',
+    // Social Media
+    '@facebookmail.com',
+    '@linkedin.com',
+    '@twitter.com',
+    '@instagram.com',
+    '@tiktok.com',
+    // Google Services
+    '@google.com',
+    '@youtube.com',
+    '@gmail.com', // Only if from Google itself
+    // Newsletter & Email Marketing Platforms
+    '@mail.beehiiv.com',
+    '@beehiiv.com',
+    '@mailchimp.com',
+    '@sendgrid.net',
+    '@mailgun.org',
+    '@sendinblue.com',
+    '@constantcontact.com',
+    '@aweber.com',
+    '@convertkit.com',
+    '@substack.com',
+    '@ghost.io',
+    // No-reply addresses
+    'donotreply@',
+    'do-not-reply@',
+    'no-reply@',
+    'noreply@',
+    'notifications@',
+    'alerts@',
+    'news@',
+    'updates@',
+    'newsletter@',
+    'marketing@',
+    'mailer-daemon',
+    'postmaster@',
+  ];
+  
+  for (const blocked of blockedSenders) {
+    if (from.includes(blocked)) {
+      return false;
+    }
+  }
+  
+  // Skip common promotional/automated patterns in subject/body
+  const spamPatterns = [
+    'unsubscribe',
+    'newsletter',
+    'automated message',
+    'automation',
+    'auto-reply',
+    'out of office',
+    'manage preferences',
+    'update preferences',
+    'email preferences',
+    'view in browser',
+    'read online',
+    'forward to a friend',
+    'this email was sent',
+    'because you subscribed',
+    'you are receiving this',
+    'privacy policy',
+    'terms of service',
+    'sponsored',
+    'advertise',
+    'delivery notification',
+    'shipping update',
+    'order confirmation',
+    'password reset',
+    'verify your email',
+    'confirm your email',
+    'account security',
+    'login alert',
+    'new sign-in',
+    'new device',
+    'safe-t claim',
+    'refund processed',
+    'payment received',
+    'transaction alert',
+    'otp',
+    'one-time password',
+    'verification code',
+    'promotional',
+    'limited time offer',
+    '% off',
+    'special offer',
+    'flash sale',
+    'mailing list',
+    'email digest',
+    'weekly roundup',
+    'monthly update',
+    'subscription',
+    'click here',
+    'congratulations',
+    'beehiiv',
+    'substack',
+    // Not sales enquiries
+    'job application',
+    'apply for',
+    'career',
+    'resume',
+    'cv',
+    'vacancy',
+    'hiring',
+  ];
+  
+  for (const pattern of spamPatterns) {
+    if (from.includes(pattern) || subject.includes(pattern) || body.includes(pattern)) {
+      return false;
+    }
+  }
+
+  // Newsletters usually contain many links; enquiries rarely do.
+  const urlCount = (body.match(/https?:\/\//g) || []).length;
+  if (urlCount >= 6) {
+    return false;
+  }
+  
+  // Look for enquiry indicators - these must be present for it to be an enquiry
+  const enquiryPatterns = [
+    'quote',
+    'quotation',
+    'rfq',
+    'request for quotation',
+    'price',
+    'pricing',
+    'best price',
+    'rate',
+    'rates',
+    'price list',
+    'enquiry',
+    'inquiry',
+    'enquire',
+    'inquire',
+    'interested in',
+    'looking for',
+    'requirement',
+    'require',
+    'need',
+    'want to buy',
+    'want to purchase',
+    'want to order',
+    'please send',
+    'please share',
+    'please provide',
+    'can you send',
+    'could you send',
+    'product details',
+    'service details',
+    'more information',
+    'availability',
+    'in stock',
+    'lead time',
+    'delivery time',
+    'delivery charges',
+    'shipping charges',
+    'payment terms',
+    'proforma invoice',
+    'pro forma invoice',
+    'pi',
+    'bulk order',
+    'wholesale',
+    'catalog',
+    'catalogue',
+    'brochure',
+    'datasheet',
+    'data sheet',
+    'specification',
+    'specifications',
+    'specs',
+    'technical details',
+    'dimensions',
+    'size',
+    'model',
+    'part number',
+    'sku',
+    'samples',
+    'minimum order',
+    'moq',
+  ];
+  
+  let enquiryScore = 0;
+  for (const pattern of enquiryPatterns) {
+    if (subject.includes(pattern) || body.includes(pattern)) {
+      enquiryScore++;
+    }
+  }
+
+  // Optional: strict product keyword allowlist.
+  const keywords = opts?.keywords ?? [];
+  const requireKeywordMatch = opts?.requireKeywordMatch ?? false;
+  if (requireKeywordMatch && keywords.length > 0) {
+    const hasKeyword = anyKeywordMatches(subject, body, keywords);
+    if (!hasKeyword) return false;
+  }
+
+  // Must have at least one enquiry pattern to be considered a genuine enquiry.
+  // This prevents random personal emails from being processed.
+  return enquiryScore > 0;
+}
@@ -352,6 +352,27 @@ export async function markGmailMessageAsRead(messageId: string): Promise<void> {
   }
 }
 
+/**
+ * Mark many messages as read with batchModify (up to 1000 ids per call)
+ */
+export async function markGmailMessagesAsRead(messageIds: string[]): Promise<void> {
+  if (!gmailClient) {
+    throw new Error('Gmail service not configured');
+  }
+
+  for (let i = 0; i < messageIds.length; i += 1000) {
+    const ids = messageIds.slice(i, i + 1000);
+    await gmailClient.users.messages.batchModify({
+      userId: 'me',
+      requestBody: {
+        ids,
+        removeLabelIds: ['UNREAD'],
+      },
+    });
+  }
+  if (messageIds.length > 0) console.log(`[Gmail] Marked ${messageIds.length} message(s) as read`);
+}
+
 /**
  * Send email via Gmail API
  */
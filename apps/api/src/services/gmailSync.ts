@@ -0,0 +1,243 @@
+import { prisma } from '../db.js';
+import { mapWithConcurrency } from './concurrency.js';
+import { buildEmailCustomerMessage, getEmailEnquiryKeywords, isLikelyEnquiry } from './emailEnquiry.js';
+import { enqueueIngest } from './ingestQueue.js';
+
+// Gmail Pub/Sub notification processor (POST /webhooks/gmail).
+//
+// Every notification is accepted and only raises the tenant's target historyId; one
+// drain per tenant syncs from the stored GmailSyncState cursor up to the highest target
+// seen, so a burst of notifications costs one history.list instead of being dropped.
+// Message bodies are fetched GMAIL_FETCH_CONCURRENCY at a time, enquiries are queued for
+// ingestion and everything handled is marked read with one batchModify. The cursor moves
+// only after the whole range went through; a failed range is retried (enqueueIngest
+// dedupes the messages that already made it).
+
+const FETCH_CONCURRENCY = Math.max(1, Number(process.env.GMAIL_FETCH_CONCURRENCY ?? 8));
+const HISTORY_MAX_PAGES = Math.max(1, Number(process.env.GMAIL_HISTORY_MAX_PAGES ?? 10));
+const RETRY_DELAY_MS = 30_000;
+const RATE_LIMIT_BACKOFF_MS = 10 * 60 * 1000;
+
+type TenantSync = {
+  targetHistoryId: bigint | null;
+  emailAddress: string | null;
+  draining: Promise<void> | null;
+  retryTimer: NodeJS.Timeout | null;
+};
+
+const tenants = new Map<string, TenantSync>();
+let backoffUntilMs = 0;
+
+export function getGmailSyncStatus() {
+  return {
+    backoffUntil: backoffUntilMs > Date.now() ? new Date(backoffUntilMs).toISOString() : null,
+    tenants: [...tenants].map(([tenantId, state]) => ({
+      tenantId,
+      targetHistoryId: state.targetHistoryId?.toString() ?? null,
+      draining: Boolean(state.draining)
+    }))
+  };
+}
+
+// Returns false for an unusable historyId; `coalesced` when a drain was already running.
+export function acceptGmailNotification(params: {
+  tenantId: string;
+  historyId: string;
+  emailAddress?: string | null;
+}): { accepted: boolean; coalesced: boolean } {
+  let historyId: bigint;
+  try {
+    historyId = BigInt(params.historyId);
+  } catch {
+    return { accepted: false, coalesced: false };
+  }
+
+  let state = tenants.get(params.tenantId);
+  if (!state) {
+    state = { targetHistoryId: null, emailAddress: null, draining: null, retryTimer: null };
+    tenants.set(params.tenantId, state);
+  }
+  if (state.targetHistoryId === null || historyId > state.targetHistoryId) state.targetHistoryId = historyId;
+  if (params.emailAddress) state.emailAddress = params.emailAddress;
+
+  const coalesced = Boolean(state.draining);
+  startDrain(params.tenantId, state);
+  return { accepted: true, coalesced };
+}
+
+function startDrain(tenantId: string, state: TenantSync) {
+  if (state.draining) return;
+  const wait = backoffUntilMs - Date.now();
+  if (wait > 0) {
+    scheduleRetry(tenantId, state, wait);
+    return;
+  }
+  state.draining = drain(tenantId, state).finally(() => {
+    state.draining = null;
+  });
+}
+
+function scheduleRetry(tenantId: string, state: TenantSync, ms: number) {
+  if (state.retryTimer) return;
+  state.retryTimer = setTimeout(() => {
+    state.retryTimer = null;
+    startDrain(tenantId, state);
+  }, ms);
+  state.retryTimer.unref();
+}
+
+async function drain(tenantId: string, state: TenantSync) {
+  // Notifications arriving during a sync raise the target; go again until caught up.
+  for (;;) {
+    const target = state.targetHistoryId;
+    if (target === null) return;
+
+    try {
+      await syncTo(tenantId, target, state.emailAddress);
+    } catch (error: any) {
+      const status = error?.code ?? error?.response?.status;
+      if (status === 429) {
+        const retryAfterMs = Number.isFinite(error?.retryAfterMs) ? error.retryAfterMs : Date.now() + RATE_LIMIT_BACKOFF_MS;
+        backoffUntilMs = Math.max(backoffUntilMs, retryAfterMs);
+        console.warn(`[Gmail Sync] Gmail rate-limited; backing off until ${new Date(backoffUntilMs).toISOString()}`);
+        scheduleRetry(tenantId, state, backoffUntilMs - Date.now());
+      } else {
+        console.error(`[Gmail Sync] Sync for tenant ${tenantId} failed, retrying in ${RETRY_DELAY_MS / 1000}s:`, error?.message || error);
+        scheduleRetry(tenantId, state, RETRY_DELAY_MS);
+      }
+      return;
+    }
+
+    if (state.targetHistoryId === target) return;
+  }
+}
+
+async function syncTo(tenantId: string, target: bigint, emailAddress: string | null) {
+  const { listGmailHistoryMessageIds, listUnreadGmailMessages } = await import('./gmailPubSub.js');
+  const targetId = target.toString();
+
+  const syncState = await prisma.gmailSyncState.findUnique({ where: { tenantId } });
+  let messageIds: string[];
+  if (!syncState) {
+    // No cursor yet: one unread scan so the first batch isn't missed.
+    console.log(`[Gmail Sync] No history cursor for tenant ${tenantId}; doing one-time unread scan`);
+    const messages = await listUnreadGmailMessages(10);
+    messageIds = (messages || []).map((m: any) => String(m?.id || '')).filter(Boolean);
+  } else {
+    let last: bigint | null = null;
+    try {
+      last = BigInt(syncState.lastHistoryId);
+    } catch {
+      // Unparseable cursor: read from it anyway and let Gmail decide.
+    }
+    if (last !== null && last >= target) return;
+
+    try {
+      const history = await listGmailHistoryMessageIds({
+        startHistoryId: syncState.lastHistoryId,
+        labelId: 'INBOX',
+        maxPages: HISTORY_MAX_PAGES
+      });
+      messageIds = history.messageIds;
+    } catch (e: any) {
+      // Gmail returns 404 when the startHistoryId is too old/invalid; reset to current.
+      const status = e?.code ?? e?.response?.status;
+      if (status === 404 || String(e?.message || '').toLowerCase().includes('history')) {
+        console.warn(`[Gmail Sync] Invalid/expired historyId (${syncState.lastHistoryId}); resetting to ${targetId}`);
+        await saveCursor(tenantId, targetId, emailAddress);
+        return;
+      }
+      throw e;
+    }
+  }
+
+  console.log(`[Gmail Sync] Tenant ${tenantId}: ${messageIds.length} changed message(s) up to historyId ${targetId}`);
+  const { processed, skipped } = await processMessages(tenantId, [...new Set(messageIds)]);
+  await saveCursor(tenantId, targetId, emailAddress);
+  console.log(`[Gmail Sync] Summary: ${processed} processed, ${skipped} skipped`);
+}
+
+async function saveCursor(tenantId: string, lastHistoryId: string, emailAddress: string | null) {
+  await prisma.gmailSyncState.upsert({
+    where: { tenantId },
+    create: { tenantId, lastHistoryId, emailAddress, updatedAt: new Date() },
+    update: { lastHistoryId, ...(emailAddress ? { emailAddress } : {}), updatedAt: new Date() }
+  });
+}
+
+async function processMessages(tenantId: string, messageIds: string[]) {
+  if (messageIds.length === 0) return { processed: 0, skipped: 0 };
+  const { fetchGmailMessage, markGmailMessagesAsRead } = await import('./gmailPubSub.js');
+
+  // Fetch everything first so a failed fetch leaves nothing half-processed.
+  const fetched = await mapWithConcurrency(messageIds, FETCH_CONCURRENCY, async (id) => {
+    try {
+      return await fetchGmailMessage(id);
+    } catch (error: any) {
+      // Deleted since the notification; nothing to ingest.
+      if ((error?.code ?? error?.response?.status) === 404) return null;
+      throw error;
+    }
+  });
+
+  const keywords = getEmailEnquiryKeywords();
+  const requireKeywordMatch =
+    keywords.length > 0 && String(process.env.EMAIL_ENQUIRY_REQUIRE_KEYWORDS ?? '1').toLowerCase() !== '0';
+
+  let skipped = 0;
+  const markRead: string[] = [];
+  const enquiries: any[] = [];
+  for (const email of fetched) {
+    // Only unread messages (history can include other label changes).
+    if (!email || !Array.isArray(email.labels) || !email.labels.includes('UNREAD')) {
+      skipped++;
+      continue;
+    }
+    markRead.push(email.messageId);
+    if (!isLikelyEnquiry(email, { keywords, requireKeywordMatch })) {
+      console.log(`[Gmail Sync] Skipping non-enquiry email: ${email.subject}`);
+      skipped++;
+      continue;
+    }
+    enquiries.push(email);
+  }
+
+  // Emails that already produced a lead (one query for the batch).
+  const existing = enquiries.length
+    ? await prisma.lead.findMany({
+        where: { tenantId, channel: 'EMAIL', externalId: { in: enquiries.map((e) => e.messageId) } },
+        select: { externalId: true }
+      })
+    : [];
+  const seen = new Set(existing.map((l) => l.externalId));
+  const fresh = enquiries.filter((e) => !seen.has(e.messageId));
+  skipped += enquiries.length - fresh.length;
+
+  // Queue for ingestion; the worker sends the AI reply once the lead is created.
+  await mapWithConcurrency(fresh, FETCH_CONCURRENCY, (email) =>
+    enqueueIngest({
+      tenantId,
+      source: 'EMAIL_GMAIL',
+      dedupeKey: `gmail:${tenantId}:${email.messageId}`,
+      payload: {
+        body: {
+          channel: 'EMAIL',
+          fullName: email.fromName,
+          email: email.from,
+          customerMessage: buildEmailCustomerMessage(email),
+          externalId: email.messageId
+        },
+        reply: { via: 'GMAIL', to: email.from, subject: `Re: ${email.subject}` }
+      }
+    })
+  );
+
+  try {
+    await markGmailMessagesAsRead(markRead);
+  } catch (error: any) {
+    // Already queued (and deduped on redelivery); leaving them unread is harmless.
+    console.warn('[Gmail Sync] Failed to mark messages as read:', error?.message || error);
+  }
+
+  return { processed: fresh.length, skipped };
+}
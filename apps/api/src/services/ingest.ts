@@ -0,0 +1,464 @@
+import type { Prisma } from '@prisma/client';
+import { z } from 'zod';
+import { prisma } from '../db.js';
+import { getAiGatewayForTenant } from '../ai/tenantAi.js';
+import { reserveSalesmanRoundRobin } from './routing.js';
+import { triggerSlaMonitoring } from './sla.js';
+import { recordLeadActivity } from './leadScoreState.js';
+import { bumpDailyRollup } from './rollups.js';
+import { invalidateDashboardStats } from './dashboardCache.js';
+import { contactKeys, forgetContact, getCachedContact, rememberContact } from './contactIdentity.js';
+import { createNotificationForUser, notifyTenantRoles } from './notifications.js';
+import type { ReplyDraft, TriageResult } from '../ai/types.js';
+
+// 'combined' (default) asks the provider for triage and draft in one call.
+const AI_TRIAGE_MODE = (process.env.AI_TRIAGE_MODE ?? 'combined').toLowerCase() === 'separate' ? 'separate' : 'combined';
+
+export const ingestMessageBodySchema = z.object({
+  botId: z.string().optional(),
+  channel: z.enum([
+    'MANUAL',
+    'WHATSAPP',
+    'FACEBOOK',
+    'INSTAGRAM',
+    'INDIAMART',
+    'JUSTDIAL',
+    'GEM',
+    'PHONE',
+    'EMAIL',
+    'PERSONAL_VISIT',
+    'OTHER'
+  ]),
+  externalId: z.string().optional(),
+  fullName: z.string().optional(),
+  phone: z.string().optional(),
+  email: z.string().optional(),
+  customerMessage: z.string().min(1).optional(),
+  text: z.string().min(1).optional()
+});
+
+export const ingestMessageSchema = ingestMessageBodySchema.refine((v) => Boolean(v.customerMessage ?? v.text), {
+  path: ['customerMessage'],
+  message: 'Required'
+});
+
+export type IngestMessageBody = z.infer<typeof ingestMessageSchema>;
+
+// ---------------------------------------------------------------------------
+// Stage timings
+// ---------------------------------------------------------------------------
+
+export const INGEST_STAGES = ['lookup', 'persist', 'sla', 'aiTriage', 'aiDraft', 'aiCombined', 'assign', 'total'] as const;
+export type IngestStage = (typeof INGEST_STAGES)[number];
+export type IngestTimings = Partial<Record<IngestStage, number>>;
+
+const TIMING_SAMPLE_SIZE = Math.max(10, Number(process.env.INGEST_TIMING_SAMPLES ?? 500));
+const timingSamples: IngestTimings[] = [];
+let timingCursor = 0;
+
+function recordTimings(timings: IngestTimings) {
+  if (timingSamples.length < TIMING_SAMPLE_SIZE) {
+    timingSamples.push(timings);
+  } else {
+    timingSamples[timingCursor] = timings;
+    timingCursor = (timingCursor + 1) % TIMING_SAMPLE_SIZE;
+  }
+}
+
+async function timed<T>(timings: IngestTimings, stage: IngestStage, fn: () => Promise<T>): Promise<T> {
+  const startedAt = performance.now();
+  try {
+    return await fn();
+  } finally {
+    timings[stage] = (timings[stage] ?? 0) + Math.round((performance.now() - startedAt) * 100) / 100;
+  }
+}
+
+function percentile(sorted: number[], p: number): number {
+  if (sorted.length === 0) return 0;
+  const idx = Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1);
+  return sorted[Math.max(0, idx)];
+}
+
+// Aggregate of the most recent ingests handled by this process.
+export function getIngestTimingStats() {
+  const stages: Record<string, { count: number; avgMs: number; p50Ms: number; p95Ms: number; maxMs: number }> = {};
+
+  for (const stage of INGEST_STAGES) {
+    const values = timingSamples
+      .map((t) => t[stage])
+      .filter((v): v is number => typeof v === 'number')
+      .sort((a, b) => a - b);
+    const sum = values.reduce((acc, v) => acc + v, 0);
+    stages[stage] = {
+      count: values.length,
+      avgMs: values.length ? Math.round((sum / values.length) * 100) / 100 : 0,
+      p50Ms: percentile(values, 50),
+      p95Ms: percentile(values, 95),
+      maxMs: values.length ? values[values.length - 1] : 0
+    };
+  }
+
+  return { samples: timingSamples.length, windowSize: TIMING_SAMPLE_SIZE, stages };
+}
+
+// ---------------------------------------------------------------------------
+// Pipeline
+// ---------------------------------------------------------------------------
+
+const leadCandidateSelect = {
+  id: true,
+  clientId: true,
+  channel: true,
+  externalId: true,
+  fullName: true,
+  phone: true,
+  email: true,
+  phoneKey: true,
+  emailKey: true,
+  status: true,
+  heat: true,
+  assignedToSalesmanId: true,
+  conversation: { select: { id: true } },
+  triageItems: { where: { status: 'OPEN' }, select: { id: true }, take: 1 }
+} satisfies Prisma.LeadSelect;
+
+const clientSelect = {
+  id: true,
+  contactName: true,
+  phone: true,
+  email: true,
+  phoneKey: true,
+  emailKey: true
+} satisfies Prisma.ClientSelect;
+
+const leadLookupSelect = { ...leadCandidateSelect, client: { select: clientSelect } } satisfies Prisma.LeadSelect;
+
+type LeadLookup = Prisma.LeadGetPayload<{ select: typeof leadLookupSelect }>;
+
+const isOpen = (l: { status: string }) => l.status !== 'WON' && l.status !== 'LOST';
+
+// Resolve the contact's client and open lead on this channel. Matching uses the
+// canonical phone/email keys (see contactIdentity.ts) with raw-value fallbacks for rows
+// not yet backfilled. Repeat contacts are usually served by the LRU plus a primary-key
+// read; otherwise one indexed lead query returns the lead with its client, and only a
+// brand-new contact needs the client probe.
+async function resolveIngestContact(tenantId: string, body: IngestMessageBody) {
+  const { phone, email, externalId } = body;
+  const keys = contactKeys({ phone, email });
+
+  // externalId (idempotency) outranks the contact match, so it bypasses the cache.
+  const cached = externalId ? null : getCachedContact(tenantId, body.channel, keys);
+  if (cached) {
+    const lead = await prisma.lead.findUnique({ where: { id: cached.leadId }, select: leadLookupSelect });
+    if (lead && lead.channel === body.channel && isOpen(lead) && (lead.clientId ?? null) === cached.clientId) {
+      return { client: lead.client, lead: lead as LeadLookup | null };
+    }
+    forgetContact(tenantId, body.channel, keys);
+  }
+
+  const clientMatch: Prisma.ClientWhereInput[] = [];
+  if (keys.phoneKey) clientMatch.push({ phoneKey: keys.phoneKey });
+  if (keys.emailKey) clientMatch.push({ emailKey: keys.emailKey });
+  if (phone) clientMatch.push({ phone });
+  if (email) clientMatch.push({ email });
+
+  const contactMatch: Prisma.LeadWhereInput[] = [];
+  if (keys.phoneKey) contactMatch.push({ phoneKey: keys.phoneKey });
+  if (keys.emailKey) contactMatch.push({ emailKey: keys.emailKey });
+  if (phone) contactMatch.push({ phone });
+  if (email) contactMatch.push({ email });
+  if (clientMatch.length > 0) contactMatch.push({ client: { is: { OR: clientMatch } } });
+
+  const leadMatch: Prisma.LeadWhereInput[] = [];
+  if (externalId) leadMatch.push({ externalId });
+  if (contactMatch.length > 0) leadMatch.push({ status: { notIn: ['WON', 'LOST'] }, OR: contactMatch });
+
+  const candidates =
+    leadMatch.length > 0
+      ? await prisma.lead.findMany({
+          where: { tenantId, channel: body.channel, OR: leadMatch },
+          orderBy: { createdAt: 'desc' },
+          take: 20,
+          select: leadLookupSelect
+        })
+      : ([] as LeadLookup[]);
+
+  const matchesPhone = (c: { phone: string | null; phoneKey: string | null } | null) =>
+    Boolean(c && ((keys.phoneKey && c.phoneKey === keys.phoneKey) || (phone && c.phone === phone)));
+  const matchesEmail = (c: { email: string | null; emailKey: string | null } | null) =>
+    Boolean(c && ((keys.emailKey && c.emailKey === keys.emailKey) || (email && c.email === email)));
+
+  // Same precedence as before: phone before email. A contact with no open lead on this
+  // channel may still have a client.
+  const linked = candidates.map((l) => l.client);
+  const client =
+    linked.find((c) => matchesPhone(c)) ??
+    linked.find((c) => matchesEmail(c)) ??
+    (clientMatch.length > 0
+      ? await prisma.client
+          .findMany({ where: { tenantId, OR: clientMatch }, orderBy: { createdAt: 'asc' }, take: 5, select: clientSelect })
+          .then((clients) => clients.find((c) => matchesPhone(c)) ?? clients[0] ?? null)
+      : null);
+
+  // Lead precedence: externalId (idempotency), then the most recent open lead for
+  // the client, then by phone, then by email.
+  const lead =
+    (externalId ? candidates.find((l) => l.externalId === externalId) : undefined) ??
+    (client ? candidates.find((l) => isOpen(l) && l.clientId === client.id) : undefined) ??
+    candidates.find((l) => isOpen(l) && matchesPhone(l)) ??
+    candidates.find((l) => isOpen(l) && matchesEmail(l)) ??
+    null;
+
+  return { client, lead };
+}
+
+async function lookupIngestContext(tenantId: string, body: IngestMessageBody) {
+  const [bot, contact] = await Promise.all([
+    body.botId ? prisma.bot.findFirst({ where: { id: body.botId, tenantId, isActive: true } }) : null,
+    resolveIngestContact(tenantId, body)
+  ]);
+  return { bot, ...contact };
+}
+
+export async function handleIngestMessage(params: { tenantId: string; body: IngestMessageBody }) {
+  const { tenantId, body } = params;
+  const timings: IngestTimings = {};
+  const startedAt = performance.now();
+
+  const customerMessage = body.customerMessage ?? body.text;
+  if (!customerMessage) throw new Error('customerMessage is required');
+
+  const { bot, client, lead: existingLead } = await timed(timings, 'lookup', () =>
+    lookupIngestContext(tenantId, body)
+  );
+
+  const botId = bot?.id ?? null;
+  const hasContact = Boolean(body.phone || body.email);
+
+  // Fill in contact fields the client row is missing.
+  const clientUpdate: Prisma.ClientUpdateInput = {};
+  if (client) {
+    if (!client.contactName && body.fullName) clientUpdate.contactName = body.fullName;
+    if (!client.phone && body.phone) clientUpdate.phone = body.phone;
+    if (!client.email && body.email) clientUpdate.email = body.email;
+  }
+
+  const newClient = { tenantId, contactName: body.fullName, phone: body.phone, email: body.email };
+
+  // The inbound row is stamped explicitly so lead activity is recorded at its createdAt.
+  const receivedAt = new Date();
+  const { lead, conversationId, createdNewLead } = await timed(timings, 'persist', async () => {
+    const inbound = {
+      tenantId,
+      direction: 'IN',
+      channel: body.channel,
+      body: customerMessage,
+      raw: { botId },
+      createdAt: receivedAt
+    };
+
+    if (!existingLead) {
+      // Lead, client (if new) and conversation in one nested write, then the message.
+      const created = await prisma.lead.create({
+        data: {
+          tenant: { connect: { id: tenantId } },
+          client: client ? { connect: { id: client.id } } : hasContact ? { create: newClient } : undefined,
+          channel: body.channel,
+          externalId: body.externalId,
+          fullName: body.fullName ?? client?.contactName ?? null,
+          phone: body.phone ?? client?.phone ?? null,
+          email: body.email ?? client?.email ?? null,
+          language: 'en',
+          conversation: { create: { tenantId, channel: body.channel, lastMessageAt: receivedAt } }
+        },
+        select: leadCandidateSelect
+      });
+
+      const writes: Prisma.PrismaPromise<unknown>[] = [
+        prisma.message.create({
+          data: { ...inbound, leadId: created.id, conversationId: created.conversation?.id ?? null }
+        })
+      ];
+      if (client && Object.keys(clientUpdate).length > 0) {
+        writes.push(prisma.client.update({ where: { id: client.id }, data: clientUpdate }));
+      }
+      await prisma.$transaction(writes);
+
+      return { lead: created, conversationId: created.conversation?.id ?? null, createdNewLead: true };
+    }
+
+    const writes: Prisma.PrismaPromise<unknown>[] = [
+      prisma.conversation.upsert({
+        where: { leadId: existingLead.id },
+        update: { lastMessageAt: receivedAt, messages: { create: { ...inbound, leadId: existingLead.id } } },
+        create: {
+          tenantId,
+          leadId: existingLead.id,
+          channel: body.channel,
+          lastMessageAt: receivedAt,
+          messages: { create: { ...inbound, leadId: existingLead.id } }
+        },
+        select: { id: true }
+      })
+    ];
+
+    if (!existingLead.clientId && hasContact) {
+      // Backfill link for legacy leads
+      writes.push(
+        prisma.lead.update({
+          where: { id: existingLead.id },
+          data: { client: client ? { connect: { id: client.id } } : { create: newClient } }
+        })
+      );
+    }
+    if (client && Object.keys(clientUpdate).length > 0) {
+      writes.push(prisma.client.update({ where: { id: client.id }, data: clientUpdate }));
+    }
+
+    const [conversation] = (await prisma.$transaction(writes)) as [{ id: string }, ...unknown[]];
+    return { lead: existingLead, conversationId: conversation.id, createdNewLead: false };
+  });
+  rememberContact(tenantId, body.channel, contactKeys(body), { clientId: lead.clientId, leadId: lead.id });
+  recordLeadActivity(tenantId, lead.id, { kind: 'MESSAGE', direction: 'IN', at: receivedAt });
+  bumpDailyRollup(tenantId, body.channel, createdNewLead ? { newLeads: 1, messagesIn: 1 } : { messagesIn: 1 });
+
+  // SLA rules only depend on the lead's state before triage, so they run alongside the AI call.
+  const slaTask = timed(timings, 'sla', () =>
+    triggerSlaMonitoring({
+      tenantId,
+      leadId: lead.id,
+      event: createdNewLead ? 'NEW_LEAD' : 'MESSAGE_RECEIVED',
+      lead: { status: lead.status, heat: lead.heat, channel: lead.channel }
+    })
+  );
+
+  const ai = await getAiGatewayForTenant(prisma, tenantId);
+  const pricingAllowed = bot?.pricingMode === 'STANDARD';
+  const aiInput = { leadId: lead.id, channel: lead.channel, customerMessage, pricingAllowed };
+
+  let triage: TriageResult;
+  let draft: ReplyDraft;
+  if (AI_TRIAGE_MODE === 'separate') {
+    // AI triage updates language + heat.
+    [triage] = await Promise.all([timed(timings, 'aiTriage', () => ai.triage(aiInput)), slaTask]);
+    draft = await timed(timings, 'aiDraft', () => ai.draftReply(aiInput));
+  } else {
+    // One provider call returns both the triage (language + heat) and the reply draft.
+    const [combined] = await Promise.all([timed(timings, 'aiCombined', () => ai.triageAndDraft(aiInput)), slaTask]);
+    ({ triage, draft } = combined);
+  }
+
+  const leadLabel = `${lead.fullName ?? lead.phone ?? lead.id}`;
+  const events: Prisma.LeadEventCreateManyInput[] = [
+    { tenantId, leadId: lead.id, type: 'AI_TRIAGE', payload: triage },
+    { tenantId, leadId: lead.id, type: 'AI_DRAFT_REPLY', payload: { ...draft, botId } }
+  ];
+  const leadUpdate: Prisma.LeadUncheckedUpdateInput = { language: triage.language, heat: triage.heat };
+  const outcomeWrites: Prisma.PrismaPromise<unknown>[] = [];
+
+  const escalate = draft.shouldEscalate && lead.triageItems.length === 0;
+  const repliedAt = new Date();
+  let picked: Awaited<ReturnType<typeof reserveSalesmanRoundRobin>> = null;
+
+  if (draft.shouldEscalate) {
+    if (escalate) {
+      outcomeWrites.push(
+        prisma.triageQueueItem.create({
+          data: {
+            tenantId,
+            leadId: lead.id,
+            reason: draft.escalationReason ?? 'AI_ESCALATION',
+            suggestedSalesmanId: null
+          }
+        })
+      );
+    }
+  } else {
+    // Auto-assign if unassigned (assignee comes from the lookup; no re-read).
+    const shouldAutoAssign = body.channel !== 'PERSONAL_VISIT' && lead.channel !== 'PERSONAL_VISIT';
+    if (shouldAutoAssign && !lead.assignedToSalesmanId) {
+      picked = await timed(timings, 'assign', () => reserveSalesmanRoundRobin(prisma, tenantId, lead.id));
+      if (picked) {
+        leadUpdate.assignedToSalesmanId = picked.salesman.id;
+        events.push({
+          tenantId,
+          leadId: lead.id,
+          type: 'AUTO_ASSIGNED',
+          payload: { salesmanId: picked.salesman.id, mode: 'WEIGHTED' }
+        });
+      }
+    }
+
+    // Persist the assistant reply as an OUT message (simulation).
+    outcomeWrites.push(
+      prisma.message.create({
+        data: {
+          tenantId,
+          leadId: lead.id,
+          conversationId,
+          direction: 'OUT',
+          channel: body.channel,
+          body: draft.message,
+          raw: { botId, simulated: true },
+          createdAt: repliedAt
+        }
+      })
+    );
+  }
+
+  try {
+    await timed(timings, 'persist', () =>
+      prisma.$transaction([
+        prisma.lead.update({ where: { id: lead.id }, data: leadUpdate }),
+        prisma.leadEvent.createMany({ data: events }),
+        ...outcomeWrites
+      ])
+    );
+  } catch (error) {
+    picked?.reservation.release();
+    throw error;
+  }
+  picked?.reservation.commit();
+  // New leads, escalations (triage counts) and heat changes all move dashboard totals.
+  if (createdNewLead || escalate || triage.heat !== lead.heat) invalidateDashboardStats(tenantId);
+  // Heat may have changed even when no reply was sent.
+  if (draft.shouldEscalate) {
+    recordLeadActivity(tenantId, lead.id);
+  } else {
+    recordLeadActivity(tenantId, lead.id, { kind: 'MESSAGE', direction: 'OUT', at: repliedAt });
+    bumpDailyRollup(tenantId, body.channel, { messagesOut: 1 });
+    // The simulated reply is never delivered, so it doesn't answer SLA clocks; they are
+    // marked responded by POST /leads/:id/send-message.
+  }
+
+  if (escalate) {
+    await notifyTenantRoles({
+      tenantId,
+      roles: ['OWNER', 'ADMIN', 'MANAGER'],
+      type: 'TRIAGE_ESCALATED',
+      title: 'Triage escalation',
+      body: `${draft.escalationReason ?? 'AI_ESCALATION'} (lead ${leadLabel})`,
+      entityType: 'Lead',
+      entityId: lead.id
+    });
+  } else if (picked) {
+    const assignee = picked.salesman;
+    await timed(timings, 'assign', () =>
+      createNotificationForUser({
+        tenantId,
+        userId: assignee.userId,
+        type: 'LEAD_ASSIGNED',
+        title: 'New lead assigned',
+        body: leadLabel,
+        entityType: 'Lead',
+        entityId: lead.id
+      })
+    );
+  }
+
+  timings.total = Math.round((performance.now() - startedAt) * 100) / 100;
+  recordTimings(timings);
+
+  return { ok: true, leadId: lead.id, triage, draft, timings } as const;
+}
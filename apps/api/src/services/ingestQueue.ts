@@ -0,0 +1,294 @@
+import crypto from 'crypto';
+import os from 'os';
+import type { IngestJob, LeadChannel } from '@prisma/client';
+import { prisma } from '../db.js';
+import { computeBackoffMs } from './backoff.js';
+import { handleIngestMessage } from './ingest.js';
+
+// Durable ingestion queue.
+//
+// Webhooks and pollers persist the inbound message as an IngestJob row and return
+// immediately; a pool of in-process workers drains the table. Jobs that share an
+// orderingKey (same tenant + channel + contact) are processed strictly in order, so
+// two messages from one WhatsApp contact never race each other into the pipeline.
+// Failed jobs are retried with exponential backoff and end up as DEAD (the
+// dead-letter store) once maxAttempts is exhausted.
+
+export type IngestJobSource = 'SAK_WEBHOOK' | 'INGEST_API' | 'WEBHOOK_INGEST' | 'EMAIL_IMAP' | 'EMAIL_GMAIL';
+
+export type IngestJobBody = {
+  botId?: string;
+  channel: LeadChannel;
+  externalId?: string;
+  fullName?: string;
+  phone?: string;
+  email?: string;
+  customerMessage?: string;
+  text?: string;
+};
+
+export type IngestJobPayload = {
+  body: IngestJobBody;
+  // Email enquiries arriving via Gmail get the AI draft mailed back once ingested.
+  reply?: { via: 'GMAIL'; to: string; subject: string };
+};
+
+const WORKER_CONCURRENCY = Math.max(0, Number(process.env.INGEST_WORKER_CONCURRENCY ?? 4));
+const POLL_INTERVAL_MS = Math.max(100, Number(process.env.INGEST_POLL_INTERVAL_MS ?? 1000));
+const MAX_ATTEMPTS = Math.max(1, Number(process.env.INGEST_MAX_ATTEMPTS ?? 5));
+const BACKOFF_BASE_MS = Math.max(100, Number(process.env.INGEST_BACKOFF_BASE_MS ?? 2000));
+const BACKOFF_MAX_MS = Math.max(BACKOFF_BASE_MS, Number(process.env.INGEST_BACKOFF_MAX_MS ?? 5 * 60 * 1000));
+const LOCK_TIMEOUT_MS = Math.max(10_000, Number(process.env.INGEST_LOCK_TIMEOUT_MS ?? 5 * 60 * 1000));
+const RETENTION_HOURS = Math.max(1, Number(process.env.INGEST_JOB_RETENTION_HOURS ?? 72));
+const MAINTENANCE_INTERVAL_MS = 60 * 1000;
+
+const workerIdPrefix = `${os.hostname()}:${process.pid}`;
+
+let running = false;
+let maintenanceTimer: NodeJS.Timeout | null = null;
+const activeLoops: Promise<void>[] = [];
+let wakeWaiters: Array<() => void> = [];
+
+function normalizeContactKey(body: IngestJobBody): string | null {
+  const phoneDigits = (body.phone || '').replace(/\D/g, '');
+  if (phoneDigits) return `phone:${phoneDigits}`;
+  const email = (body.email || '').trim().toLowerCase();
+  if (email) return `email:${email}`;
+  if (body.externalId) return `ext:${body.externalId}`;
+  return null;
+}
+
+export function getIngestOrderingKey(tenantId: string, body: IngestJobBody): string {
+  const contactKey = normalizeContactKey(body);
+  // Without any contact identity there is nothing to order against.
+  if (!contactKey) return `${tenantId}:${body.channel}:anon:${crypto.randomUUID()}`;
+  return `${tenantId}:${body.channel}:${contactKey}`;
+}
+
+function wakeWorkers() {
+  const waiters = wakeWaiters;
+  wakeWaiters = [];
+  for (const wake of waiters) wake();
+}
+
+function sleepUntilWoken(ms: number): Promise<void> {
+  return new Promise((resolve) => {
+    const timer = setTimeout(done, ms);
+    function done() {
+      clearTimeout(timer);
+      wakeWaiters = wakeWaiters.filter((w) => w !== done);
+      resolve();
+    }
+    wakeWaiters.push(done);
+  });
+}
+
+function isUniqueViolation(error: any): boolean {
+  return error?.code === 'P2002';
+}
+
+export async function enqueueIngest(params: {
+  tenantId: string;
+  source: IngestJobSource;
+  payload: IngestJobPayload;
+  dedupeKey?: string;
+}): Promise<{ jobId: string; duplicate: boolean }> {
+  const { tenantId, source, payload, dedupeKey } = params;
+
+  try {
+    const job = await prisma.ingestJob.create({
+      data: {
+        tenantId,
+        source,
+        orderingKey: getIngestOrderingKey(tenantId, payload.body),
+        dedupeKey: dedupeKey || null,
+        payload: payload as any,
+        maxAttempts: MAX_ATTEMPTS
+      },
+      select: { id: true }
+    });
+    wakeWorkers();
+    return { jobId: job.id, duplicate: false };
+  } catch (error) {
+    if (dedupeKey && isUniqueViolation(error)) {
+      const existing = await prisma.ingestJob.findUnique({ where: { dedupeKey }, select: { id: true } });
+      if (existing) return { jobId: existing.id, duplicate: true };
+    }
+    throw error;
+  }
+}
+
+// Claim the next runnable job. A job is runnable only if no job with the same
+// orderingKey is in flight and no earlier job for that key is still pending
+// (including one waiting out a retry backoff).
+export async function claimNextJob(workerId: string): Promise<IngestJob | null> {
+  const rows = await prisma.$queryRaw<IngestJob[]>`
+    UPDATE "IngestJob" AS j
+    SET "status" = 'PROCESSING',
+        "lockedAt" = NOW(),
+        "lockedBy" = ${workerId},
+        "attempts" = j."attempts" + 1,
+        "updatedAt" = NOW()
+    WHERE j."id" = (
+      SELECT c."id" FROM "IngestJob" c
+      WHERE c."status" = 'PENDING'
+        AND c."runAt" <= NOW()
+        AND NOT EXISTS (
+          SELECT 1 FROM "IngestJob" p
+          WHERE p."orderingKey" = c."orderingKey"
+            AND (
+              p."status" = 'PROCESSING'
+              OR (p."status" = 'PENDING' AND p."seq" < c."seq")
+            )
+        )
+      ORDER BY c."runAt" ASC, c."seq" ASC
+      LIMIT 1
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING j.*
+  `;
+  return rows[0] ?? null;
+}
+
+async function runJob(job: IngestJob): Promise<unknown> {
+  const payload = job.payload as unknown as IngestJobPayload;
+  const result = await handleIngestMessage({ tenantId: job.tenantId, body: payload.body });
+
+  if (payload.reply?.via === 'GMAIL' && result.ok && result.draft && !result.draft.shouldEscalate) {
+    // The lead is already persisted at this point; a failed reply must not re-run ingestion.
+    try {
+      const { sendGmailMessage } = await import('./gmailPubSub.js');
+      await sendGmailMessage({ to: payload.reply.to, subject: payload.reply.subject, text: result.draft.message });
+      console.log(`[IngestQueue] Sent email reply to ${payload.reply.to}`);
+    } catch (sendError: any) {
+      console.error('[IngestQueue] Failed to send email reply:', sendError?.message || sendError);
+    }
+  }
+
+  return { leadId: result.leadId, escalated: Boolean(result.draft?.shouldEscalate), timings: result.timings };
+}
+
+export async function completeJob(job: IngestJob, result: unknown) {
+  await prisma.ingestJob.update({
+    where: { id: job.id },
+    data: {
+      status: 'DONE',
+      result: result as any,
+      lastError: null,
+      lockedAt: null,
+      lockedBy: null,
+      completedAt: new Date()
+    }
+  });
+}
+
+export async function failJob(job: IngestJob, error: any) {
+  const message = String(error?.message || error || 'Unknown error').slice(0, 2000);
+  const dead = job.attempts >= job.maxAttempts;
+
+  await prisma.ingestJob.update({
+    where: { id: job.id },
+    data: dead
+      ? { status: 'DEAD', lastError: message, lockedAt: null, lockedBy: null, completedAt: new Date() }
+      : {
+          status: 'PENDING',
+          lastError: message,
+          lockedAt: null,
+          lockedBy: null,
+          runAt: new Date(Date.now() + computeBackoffMs(job.attempts, { baseMs: BACKOFF_BASE_MS, maxMs: BACKOFF_MAX_MS }))
+        }
+  });
+
+  if (dead) {
+    console.error(`[IngestQueue] Job ${job.id} moved to dead-letter after ${job.attempts} attempts: ${message}`);
+  } else {
+    console.warn(`[IngestQueue] Job ${job.id} failed (attempt ${job.attempts}/${job.maxAttempts}): ${message}`);
+  }
+}
+
+async function workerLoop(workerId: string) {
+  while (running) {
+    let job: IngestJob | null = null;
+    try {
+      job = await claimNextJob(workerId);
+    } catch (error: any) {
+      console.error('[IngestQueue] Failed to claim job:', error?.message || error);
+      await sleepUntilWoken(POLL_INTERVAL_MS * 5);
+      continue;
+    }
+
+    if (!job) {
+      await sleepUntilWoken(POLL_INTERVAL_MS);
+      continue;
+    }
+
+    try {
+      const result = await runJob(job);
+      await completeJob(job, result);
+    } catch (error) {
+      try {
+        await failJob(job, error);
+      } catch (updateError: any) {
+        // The stale-lock reaper will return the job to PENDING.
+        console.error(`[IngestQueue] Failed to record failure for job ${job.id}:`, updateError?.message || updateError);
+      }
+    }
+    // A finished job may unblock the next job for the same contact.
+    wakeWorkers();
+  }
+}
+
+async function runMaintenance() {
+  try {
+    const staleBefore = new Date(Date.now() - LOCK_TIMEOUT_MS);
+    const reaped = await prisma.ingestJob.updateMany({
+      where: { status: 'PROCESSING', lockedAt: { lt: staleBefore } },
+      data: { status: 'PENDING', lockedAt: null, lockedBy: null, runAt: new Date() }
+    });
+    if (reaped.count > 0) {
+      console.warn(`[IngestQueue] Released ${reaped.count} stale job lock(s)`);
+      wakeWorkers();
+    }
+
+    const doneBefore = new Date(Date.now() - RETENTION_HOURS * 60 * 60 * 1000);
+    await prisma.ingestJob.deleteMany({ where: { status: 'DONE', completedAt: { lt: doneBefore } } });
+  } catch (error: any) {
+    console.warn('[IngestQueue] Maintenance failed (missing migration?):', error?.message || error);
+  }
+}
+
+export function startIngestWorkers(options?: { concurrency?: number }) {
+  if (running) return;
+  const concurrency = options?.concurrency ?? WORKER_CONCURRENCY;
+  if (concurrency <= 0) {
+    console.log('[IngestQueue] Workers disabled (INGEST_WORKER_CONCURRENCY=0)');
+    return;
+  }
+
+  running = true;
+  for (let i = 0; i < concurrency; i++) {
+    activeLoops.push(workerLoop(`${workerIdPrefix}:${i}`));
+  }
+  maintenanceTimer = setInterval(runMaintenance, MAINTENANCE_INTERVAL_MS);
+  void runMaintenance();
+
+  console.log(`[IngestQueue] Started ${concurrency} worker(s)`);
+}
+
+export async function stopIngestWorkers() {
+  if (!running) return;
+  running = false;
+  if (maintenanceTimer) clearInterval(maintenanceTimer);
+  maintenanceTimer = null;
+  wakeWorkers();
+  await Promise.allSettled(activeLoops.splice(0));
+}
+
+export async function retryDeadIngestJob(tenantId: string, jobId: string) {
+  const updated = await prisma.ingestJob.updateMany({
+    where: { id: jobId, tenantId, status: 'DEAD' },
+    data: { status: 'PENDING', attempts: 0, runAt: new Date(), lastError: null, completedAt: null }
+  });
+  if (updated.count > 0) wakeWorkers();
+  return updated.count > 0;
+}
@@ -0,0 +1,333 @@
+import type { Request } from 'express';
+import type { LeadChannel, Prisma } from '@prisma/client';
+import { createReadStream, createWriteStream } from 'node:fs';
+import { mkdtemp, rm, writeFile } from 'node:fs/promises';
+import { tmpdir } from 'node:os';
+import path from 'node:path';
+import { Transform } from 'node:stream';
+import { pipeline } from 'node:stream/promises';
+import { prisma } from '../db.js';
+import { HttpError } from '../http.js';
+import type { BackgroundJobContext } from './backgroundJobs.js';
+import { parseCsvRecords } from './csvParser.js';
+import { contactKeys } from './contactIdentity.js';
+import type { ContactKeys } from './contactIdentity.js';
+import { bumpDailyRollup } from './rollups.js';
+import { invalidateDashboardStats } from './dashboardCache.js';
+
+// Bulk lead import (POST /leads/import/csv).
+//
+// The upload is spooled to a temp file, then a background job parses it record by
+// record and inserts leads in createMany batches. Contacts are matched to existing
+// Client rows by canonical phone/email key (contactIdentity.ts), phone first like
+// ingest; unknown contacts get a new Client. A row whose client already has
+// an open lead on the same channel (or repeats an earlier row of the file) is skipped
+// as a duplicate, so re-running an import doesn't double the leads.
+
+const MAX_UPLOAD_BYTES = Math.max(1024 * 1024, Number(process.env.LEAD_IMPORT_MAX_BYTES ?? 50 * 1024 * 1024));
+const BATCH_SIZE = Math.max(50, Number(process.env.LEAD_IMPORT_BATCH_SIZE ?? 500));
+const MAX_REPORTED_ERRORS = 100;
+
+const LEAD_CHANNELS = new Set<string>([
+  'MANUAL',
+  'WHATSAPP',
+  'FACEBOOK',
+  'INSTAGRAM',
+  'INDIAMART',
+  'JUSTDIAL',
+  'GEM',
+  'PHONE',
+  'EMAIL',
+  'PERSONAL_VISIT',
+  'OTHER'
+]);
+
+export type LeadImportRowError = { row: number; error: string };
+
+export type LeadImportResult = {
+  totalRows: number;
+  created: number;
+  skipped: number;
+  duplicates: number;
+  failed: number;
+  clientsCreated: number;
+  linkedLeads: number;
+  errors: LeadImportRowError[];
+};
+
+type ImportRow = {
+  line: number;
+  fullName: string | null;
+  phone: string | null;
+  email: string | null;
+  channel: LeadChannel;
+} & ContactKeys;
+
+// Spool the request body to a temp file: either a raw CSV upload (text/csv,
+// application/octet-stream) or the legacy JSON `{ csvData }` body.
+export async function receiveLeadImportUpload(req: Request): Promise<string> {
+  const dir = await mkdtemp(path.join(tmpdir(), 'sak-import-'));
+  const file = path.join(dir, 'upload.csv');
+
+  try {
+    if (req.is('application/json')) {
+      const csvData = (req.body as any)?.csvData;
+      if (typeof csvData !== 'string') throw new HttpError(400, 'csvData is required');
+      await writeFile(file, csvData, 'utf8');
+      return file;
+    }
+
+    let received = 0;
+    const limit = new Transform({
+      transform(chunk: Buffer, _encoding, callback) {
+        received += chunk.length;
+        if (received > MAX_UPLOAD_BYTES) {
+          callback(new HttpError(413, `CSV upload exceeds ${MAX_UPLOAD_BYTES} bytes`));
+          return;
+        }
+        callback(null, chunk);
+      }
+    });
+    await pipeline(req, limit, createWriteStream(file));
+    if (received === 0) throw new HttpError(400, 'CSV upload is empty');
+    return file;
+  } catch (error) {
+    await rm(dir, { recursive: true, force: true });
+    throw error;
+  }
+}
+
+export async function discardLeadImportUpload(file: string) {
+  await rm(path.dirname(file), { recursive: true, force: true });
+}
+
+function readRecords(file: string) {
+  return parseCsvRecords(createReadStream(file, { encoding: 'utf8' }));
+}
+
+function columnIndex(headers: string[], needle: string) {
+  return headers.findIndex((h) => h.toLowerCase().includes(needle));
+}
+
+export async function importLeadsFromCsv(
+  tenantId: string,
+  file: string,
+  ctx?: BackgroundJobContext
+): Promise<LeadImportResult> {
+  const result: LeadImportResult = {
+    totalRows: 0,
+    created: 0,
+    skipped: 0,
+    duplicates: 0,
+    failed: 0,
+    clientsCreated: 0,
+    linkedLeads: 0,
+    errors: []
+  };
+  const fail = (line: number, error: string) => {
+    result.failed++;
+    if (result.errors.length < MAX_REPORTED_ERRORS) result.errors.push({ row: line, error });
+  };
+
+  try {
+    // Cheap first pass so progress has a denominator.
+    let records = -1;
+    for await (const _ of readRecords(file)) records++;
+    if (records < 1) throw new Error('CSV must have headers and at least one data row');
+    result.totalRows = records;
+    await ctx?.setTotal(records);
+
+    let headers: string[] | null = null;
+    let idx = { name: -1, phone: -1, email: -1, channel: -1 };
+    // Contacts already used by this import, so repeated rows become duplicates.
+    const seen = new Set<string>();
+    let batch: ImportRow[] = [];
+    let processed = 0;
+
+    const flush = async () => {
+      if (batch.length === 0) return;
+      const rows = batch;
+      batch = [];
+      await insertBatch(tenantId, rows, result, fail);
+      processed += rows.length;
+      await ctx?.reportProgress({ processed, failed: result.failed });
+    };
+
+    for await (const record of readRecords(file)) {
+      if (!headers) {
+        headers = record.fields.map((h) => h.trim());
+        idx = {
+          name: columnIndex(headers, 'name'),
+          phone: columnIndex(headers, 'phone'),
+          email: columnIndex(headers, 'email'),
+          channel: columnIndex(headers, 'channel')
+        };
+        continue;
+      }
+
+      const value = (i: number) => (i >= 0 ? record.fields[i]?.trim() || null : null);
+      const fullName = value(idx.name);
+      const phone = value(idx.phone);
+      const email = value(idx.email);
+      const rawChannel = value(idx.channel)?.toUpperCase() ?? 'OTHER';
+      const channel = (LEAD_CHANNELS.has(rawChannel) ? rawChannel : 'OTHER') as LeadChannel;
+
+      if (!fullName && !phone && !email) {
+        result.skipped++;
+        processed++;
+        continue;
+      }
+      if (email && !email.includes('@')) {
+        fail(record.line, `Invalid email "${email}"`);
+        processed++;
+        continue;
+      }
+
+      const contact = contactKeys({ phone, email });
+      const keys = [
+        contact.phoneKey && `${channel}|p|${contact.phoneKey}`,
+        contact.emailKey && `${channel}|e|${contact.emailKey}`
+      ].filter(Boolean) as string[];
+      if (keys.some((k) => seen.has(k))) {
+        result.duplicates++;
+        processed++;
+        continue;
+      }
+      for (const k of keys) seen.add(k);
+
+      batch.push({ line: record.line, fullName, phone, email, channel, ...contact });
+      if (batch.length >= BATCH_SIZE) await flush();
+    }
+    await flush();
+  } finally {
+    await discardLeadImportUpload(file);
+  }
+
+  if (result.created > 0) invalidateDashboardStats(tenantId);
+  console.log(
+    `[LeadImport] Tenant ${tenantId}: ${result.created} created, ${result.duplicates} duplicate(s), ${result.skipped} skipped, ${result.failed} failed`
+  );
+  return result;
+}
+
+async function insertBatch(
+  tenantId: string,
+  rows: ImportRow[],
+  result: LeadImportResult,
+  fail: (line: number, error: string) => void
+) {
+  const unique = (values: Array<string | null>) => [...new Set(values.filter((v): v is string => Boolean(v)))];
+  const phoneKeys = unique(rows.map((r) => r.phoneKey));
+  const emailKeys = unique(rows.map((r) => r.emailKey));
+  const phones = unique(rows.map((r) => r.phone));
+  const emails = unique(rows.map((r) => r.email));
+
+  // Canonical keys, plus raw values for rows written before the keys were backfilled.
+  const findClients = () =>
+    prisma.client.findMany({
+      where: {
+        tenantId,
+        OR: [
+          ...(phoneKeys.length ? [{ phoneKey: { in: phoneKeys } }, { phone: { in: phones } }] : []),
+          ...(emailKeys.length ? [{ emailKey: { in: emailKeys } }, { email: { in: emails } }] : [])
+        ]
+      },
+      orderBy: { createdAt: 'asc' },
+      select: { id: true, phone: true, email: true }
+    });
+
+  const byPhone = new Map<string, string>();
+  const byEmail = new Map<string, string>();
+  const index = (clients: Array<{ id: string; phone: string | null; email: string | null }>) => {
+    for (const c of clients) {
+      const keys = contactKeys(c);
+      // Oldest client wins when legacy rows share a key.
+      if (keys.phoneKey && !byPhone.has(keys.phoneKey)) byPhone.set(keys.phoneKey, c.id);
+      if (keys.emailKey && !byEmail.has(keys.emailKey)) byEmail.set(keys.emailKey, c.id);
+    }
+  };
+  if (phoneKeys.length || emailKeys.length) index(await findClients());
+  const clientFor = (row: ImportRow) =>
+    (row.phoneKey ? byPhone.get(row.phoneKey) : undefined) ?? (row.emailKey ? byEmail.get(row.emailKey) : undefined) ?? null;
+
+  // New contacts: one Client per phone/email (skipDuplicates absorbs concurrent inserts).
+  const toCreate = new Map<string, Prisma.ClientCreateManyInput>();
+  const claimedEmails = new Set<string>();
+  for (const row of rows) {
+    if ((!row.phoneKey && !row.emailKey) || clientFor(row)) continue;
+    const key = row.phoneKey ? `p|${row.phoneKey}` : `e|${row.emailKey}`;
+    if (toCreate.has(key)) continue;
+    // An email another new contact in this batch already claims stays with that contact;
+    // an email-only row then links to it after the insert.
+    const emailTaken = Boolean(row.emailKey) && claimedEmails.has(row.emailKey as string);
+    if (emailTaken && !row.phoneKey) continue;
+    if (row.emailKey && !emailTaken) claimedEmails.add(row.emailKey);
+    toCreate.set(key, {
+      tenantId,
+      contactName: row.fullName,
+      phone: row.phone,
+      email: emailTaken ? null : row.email
+    });
+  }
+  if (toCreate.size > 0) {
+    const created = await prisma.client.createMany({ data: [...toCreate.values()], skipDuplicates: true });
+    result.clientsCreated += created.count;
+    index(await findClients());
+  }
+
+  // Skip rows whose client already has an open lead on the same channel.
+  const clientIds = [...new Set(rows.map(clientFor).filter((id): id is string => Boolean(id)))];
+  const openLeads = clientIds.length
+    ? await prisma.lead.findMany({
+        where: { tenantId, clientId: { in: clientIds }, status: { notIn: ['WON', 'LOST'] } },
+        select: { clientId: true, channel: true }
+      })
+    : [];
+  const open = new Set(openLeads.map((l) => `${l.clientId}|${l.channel}`));
+
+  const leads: Array<Prisma.LeadCreateManyInput & { line: number }> = [];
+  for (const row of rows) {
+    const clientId = clientFor(row);
+    if (clientId && open.has(`${clientId}|${row.channel}`)) {
+      result.duplicates++;
+      continue;
+    }
+    if (clientId) result.linkedLeads++;
+    leads.push({
+      line: row.line,
+      tenantId,
+      clientId,
+      channel: row.channel,
+      fullName: row.fullName,
+      phone: row.phone,
+      email: row.email,
+      language: 'EN',
+      heat: 'WARM',
+      status: 'NEW'
+    });
+  }
+  if (leads.length === 0) return;
+
+  const createdAt = new Date();
+  const inserted: typeof leads = [];
+  try {
+    await prisma.lead.createMany({ data: leads.map(({ line: _line, ...lead }) => ({ ...lead, createdAt })) });
+    inserted.push(...leads);
+  } catch (error: any) {
+    // Retry row by row so one bad row doesn't sink the batch, and report which one failed.
+    console.warn('[LeadImport] Batch insert failed, retrying rows individually:', error?.message || error);
+    for (const { line, ...lead } of leads) {
+      try {
+        await prisma.lead.create({ data: { ...lead, createdAt } });
+        inserted.push({ line, ...lead });
+      } catch (rowError: any) {
+        fail(line, String(rowError?.message || rowError).split('\n').pop()?.trim() || 'Insert failed');
+      }
+    }
+  }
+
+  result.created += inserted.length;
+  const perChannel = new Map<LeadChannel, number>();
+  for (const lead of inserted) perChannel.set(lead.channel, (perChannel.get(lead.channel) ?? 0) + 1);
+  for (const [channel, count] of perChannel) bumpDailyRollup(tenantId, channel, { newLeads: count }, createdAt);
+}
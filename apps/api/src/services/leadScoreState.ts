@@ -0,0 +1,387 @@
+import type { LeadChannel, LeadHeat, LeadScoreState } from '@prisma/client';
+import { prisma } from '../db.js';
+import {
+  buildLeadScoreStates,
+  getChannelConversionWeights,
+  loadActivityAggregates,
+  loadEventWindowCounts,
+  saveLeadScoreStates,
+  writeLeadScores,
+  type LeadScoreStateRow
+} from './batchScoring.js';
+import {
+  activityBucketKey,
+  getQualificationLevel,
+  pruneActivityBuckets,
+  scoreFromAggregates,
+  summarizeActivityBuckets,
+  type ActivityBuckets,
+  type LeadActivityAggregates
+} from './leadScoring.js';
+
+// Incremental lead scoring.
+//
+// Write paths (messages, notes, calls, tasks, success events, status/heat changes)
+// record what happened via recordLeadActivity. Records are collected in memory and
+// flushed every LEAD_SCORE_FLUSH_MS: each affected lead's LeadScoreState counters
+// are advanced and its score recomputed from them, with no need to reload the
+// lead's history. A periodic sweep re-applies the one/two-week activity windows
+// to recently active leads so scores decay without any new activity.
+//
+// Records not yet flushed when the process dies are lost. The full rescoring job
+// (POST /leads/bulk/recalculate-scores) rebuilds every state from the DB.
+
+const FLUSH_DELAY_MS = Math.max(100, Number(process.env.LEAD_SCORE_FLUSH_MS ?? 2000));
+const SWEEP_INTERVAL_MS = Math.max(60_000, Number(process.env.LEAD_SCORE_SWEEP_INTERVAL_MS ?? 15 * 60 * 1000));
+const BATCH_SIZE = 500;
+const CHANNEL_WEIGHT_TTL_MS = 10 * 60 * 1000;
+// Windows reach back 14 days; one extra day covers the last partial bucket.
+const SWEEP_LOOKBACK_MS = 15 * 24 * 60 * 60 * 1000;
+
+export type LeadActivity =
+  | { kind: 'MESSAGE'; direction: string; at: Date }
+  | { kind: 'NOTE'; at: Date }
+  | { kind: 'CALL'; outcome: string; at: Date }
+  | { kind: 'TASK_COMPLETED'; delta: 1 | -1 }
+  | { kind: 'SUCCESS_EVENT' };
+
+type ScorableLeadRow = {
+  id: string;
+  channel: LeadChannel;
+  heat: LeadHeat;
+  status: string;
+  fullName: string | null;
+  phone: string | null;
+  email: string | null;
+  score: number;
+};
+
+const scorableLeadSelect = {
+  id: true,
+  channel: true,
+  heat: true,
+  status: true,
+  fullName: true,
+  phone: true,
+  email: true,
+  score: true
+} as const;
+
+let pending = new Map<string, { tenantId: string; activities: LeadActivity[] }>();
+let flushTimer: NodeJS.Timeout | null = null;
+let flushing: Promise<void> | null = null;
+let sweepTimer: NodeJS.Timeout | null = null;
+let sweeping = false;
+const channelWeightCache = new Map<string, { weights: Map<LeadChannel, number>; expiresAt: number }>();
+
+export function recordLeadActivity(tenantId: string, leadId: string, ...activities: LeadActivity[]) {
+  let entry = pending.get(leadId);
+  if (!entry) {
+    entry = { tenantId, activities: [] };
+    pending.set(leadId, entry);
+  }
+  entry.activities.push(...activities);
+  scheduleFlush();
+}
+
+// Fields that feed the formula changed (status, heat, contact details): rescore only.
+export function markLeadScoresDirty(tenantId: string, leadIds: string[]) {
+  for (const leadId of leadIds) recordLeadActivity(tenantId, leadId);
+}
+
+function scheduleFlush() {
+  if (flushTimer) return;
+  flushTimer = setTimeout(() => {
+    flushTimer = null;
+    void flushLeadScores();
+  }, FLUSH_DELAY_MS);
+  flushTimer.unref();
+}
+
+export async function flushLeadScores() {
+  while (flushing) await flushing;
+  if (pending.size === 0) return;
+
+  const batch = pending;
+  pending = new Map();
+  flushing = applyBatch(batch).finally(() => {
+    flushing = null;
+  });
+  await flushing;
+}
+
+async function applyBatch(batch: Map<string, { tenantId: string; activities: LeadActivity[] }>) {
+  const byTenant = new Map<string, Array<[string, LeadActivity[]]>>();
+  for (const [leadId, entry] of batch) {
+    const list = byTenant.get(entry.tenantId) ?? [];
+    list.push([leadId, entry.activities]);
+    byTenant.set(entry.tenantId, list);
+  }
+
+  for (const [tenantId, entries] of byTenant) {
+    for (let i = 0; i < entries.length; i += BATCH_SIZE) {
+      const chunk = entries.slice(i, i + BATCH_SIZE);
+      try {
+        await applyTenantChunk(tenantId, chunk);
+      } catch (error: any) {
+        console.error(`[LeadScoreState] Failed to update ${chunk.length} lead score(s) for tenant ${tenantId}:`, error?.message || error);
+      }
+    }
+  }
+}
+
+async function applyTenantChunk(tenantId: string, entries: Array<[string, LeadActivity[]]>) {
+  const now = Date.now();
+  const leadIds = entries.map(([leadId]) => leadId);
+
+  const leads: ScorableLeadRow[] = await prisma.lead.findMany({
+    where: { tenantId, id: { in: leadIds } },
+    select: scorableLeadSelect
+  });
+  if (leads.length === 0) return;
+  const liveIds = leads.map((l) => l.id);
+
+  // Leads without state are built from the DB, which already contains the writes being
+  // recorded; only existing states get the deltas applied. The build reads message
+  // history, so it runs before the transaction instead of while holding row locks.
+  const withState = await prisma.leadScoreState.findMany({
+    where: { leadId: { in: liveIds } },
+    select: { leadId: true }
+  });
+  const hasState = new Set(withState.map((s) => s.leadId));
+  const missingIds = liveIds.filter((id) => !hasState.has(id));
+  const built = new Map<string, LeadScoreStateRow>();
+  if (missingIds.length > 0) {
+    const aggregates = await loadActivityAggregates(tenantId, missingIds, now);
+    for (const row of await buildLeadScoreStates(tenantId, missingIds, aggregates, now)) built.set(row.leadId, row);
+  }
+
+  // Lock the state rows so instances flushing the same lead serialize.
+  const states = await prisma.$transaction(async (tx) => {
+    const existing = await tx.$queryRaw<LeadScoreState[]>`
+      SELECT * FROM "LeadScoreState" WHERE "leadId" = ANY(${liveIds}::text[]) FOR UPDATE
+    `;
+    const stateById = new Map(existing.map((s) => [s.leadId, toStateRow(s)]));
+
+    // A state another instance created since the check above takes the deltas; one we
+    // built stands in for a state that still doesn't exist.
+    const fresh = new Set<string>();
+    for (const [id, row] of built) {
+      if (stateById.has(id)) continue;
+      stateById.set(id, row);
+      fresh.add(id);
+    }
+    const activitiesById = new Map(entries);
+    for (const [id, state] of stateById) {
+      if (fresh.has(id)) continue;
+      applyActivities(state, activitiesById.get(id) ?? [], now);
+    }
+
+    const rows = [...stateById.values()];
+    await saveLeadScoreStates(rows, new Date(now), tx);
+    return rows;
+  });
+
+  await rescoreLeads(tenantId, leads, states, now, { touchActivity: true });
+}
+
+function toStateRow(state: LeadScoreState): LeadScoreStateRow {
+  return {
+    leadId: state.leadId,
+    tenantId: state.tenantId,
+    messages: state.messages,
+    notes: state.notes,
+    calls: state.calls,
+    completedTasks: state.completedTasks,
+    successEvents: state.successEvents,
+    answeredCalls: state.answeredCalls,
+    missedCalls: state.missedCalls,
+    responseCount: state.responseCount,
+    responseMsSum: state.responseMsSum,
+    pendingInboundCount: state.pendingInboundCount,
+    pendingInboundMsSum: state.pendingInboundMsSum,
+    activityBuckets: (state.activityBuckets ?? {}) as unknown as ActivityBuckets,
+    lastActivityAt: state.lastActivityAt
+  };
+}
+
+function addToBucket(buckets: ActivityBuckets, at: number, messages: number, activity: number) {
+  const key = activityBucketKey(at);
+  const [m, a] = buckets[key] ?? [0, 0];
+  buckets[key] = [m + messages, a + activity];
+}
+
+function applyActivities(state: LeadScoreStateRow, activities: LeadActivity[], now: number) {
+  // Reply pairing needs messages in time order; other records are order-independent.
+  const ordered = [...activities].sort((a, b) => activityTime(a) - activityTime(b));
+  let lastActivity = state.lastActivityAt?.getTime() ?? 0;
+
+  for (const activity of ordered) {
+    switch (activity.kind) {
+      case 'MESSAGE': {
+        const at = activity.at.getTime();
+        state.messages++;
+        addToBucket(state.activityBuckets, at, 1, 1);
+        lastActivity = Math.max(lastActivity, at);
+        if (activity.direction === 'IN') {
+          state.pendingInboundCount++;
+          state.pendingInboundMsSum += at;
+        } else if (activity.direction === 'OUT' && state.pendingInboundCount > 0) {
+          // Every inbound message since the last reply is answered by this one.
+          state.responseCount += state.pendingInboundCount;
+          state.responseMsSum += state.pendingInboundCount * at - state.pendingInboundMsSum;
+          state.pendingInboundCount = 0;
+          state.pendingInboundMsSum = 0;
+        }
+        break;
+      }
+      case 'NOTE':
+        state.notes++;
+        addToBucket(state.activityBuckets, activity.at.getTime(), 0, 1);
+        lastActivity = Math.max(lastActivity, activity.at.getTime());
+        break;
+      case 'CALL':
+        state.calls++;
+        if (activity.outcome === 'ANSWERED') state.answeredCalls++;
+        if (activity.outcome === 'NO_ANSWER' || activity.outcome === 'BUSY') state.missedCalls++;
+        addToBucket(state.activityBuckets, activity.at.getTime(), 0, 1);
+        lastActivity = Math.max(lastActivity, activity.at.getTime());
+        break;
+      case 'TASK_COMPLETED':
+        state.completedTasks = Math.max(0, state.completedTasks + activity.delta);
+        break;
+      case 'SUCCESS_EVENT':
+        state.successEvents++;
+        break;
+    }
+  }
+
+  state.activityBuckets = pruneActivityBuckets(state.activityBuckets, now);
+  state.lastActivityAt = lastActivity > 0 ? new Date(lastActivity) : null;
+}
+
+function activityTime(activity: LeadActivity): number {
+  return 'at' in activity ? activity.at.getTime() : 0;
+}
+
+function aggregatesFromState(
+  state: LeadScoreStateRow,
+  events: { recent: number; previous: number } | undefined,
+  now: number
+): LeadActivityAggregates {
+  const windows = summarizeActivityBuckets(state.activityBuckets, now);
+  return {
+    messages: state.messages,
+    notes: state.notes,
+    calls: state.calls,
+    completedTasks: state.completedTasks,
+    successEvents: state.successEvents,
+    answeredCalls: state.answeredCalls,
+    missedCalls: state.missedCalls,
+    recentMessages: windows.recentMessages,
+    recentActivity: windows.recentActivity + (events?.recent ?? 0),
+    previousActivity: windows.previousActivity + (events?.previous ?? 0),
+    responseCount: state.responseCount,
+    responseMsSum: state.responseMsSum
+  };
+}
+
+async function getCachedChannelWeights(tenantId: string) {
+  const cached = channelWeightCache.get(tenantId);
+  if (cached && cached.expiresAt > Date.now()) return cached.weights;
+  const weights = await getChannelConversionWeights(tenantId);
+  channelWeightCache.set(tenantId, { weights, expiresAt: Date.now() + CHANNEL_WEIGHT_TTL_MS });
+  return weights;
+}
+
+async function rescoreLeads(
+  tenantId: string,
+  leads: ScorableLeadRow[],
+  states: LeadScoreStateRow[],
+  now: number,
+  opts: { touchActivity: boolean }
+) {
+  const stateById = new Map(states.map((s) => [s.leadId, s]));
+  const [weights, events] = await Promise.all([
+    getCachedChannelWeights(tenantId),
+    loadEventWindowCounts(
+      tenantId,
+      leads.map((l) => l.id),
+      now
+    )
+  ]);
+
+  const rows: Array<{ id: string; score: number; level: string }> = [];
+  for (const lead of leads) {
+    const state = stateById.get(lead.id);
+    if (!state) continue;
+    const score = scoreFromAggregates(lead, aggregatesFromState(state, events.get(lead.id), now), weights.get(lead.channel) ?? 0.5);
+    // Decay sweeps only write scores that moved.
+    if (!opts.touchActivity && score === lead.score) continue;
+    rows.push({ id: lead.id, score, level: getQualificationLevel(score) });
+  }
+
+  await writeLeadScores(rows, opts.touchActivity ? { activityAt: new Date(now) } : {});
+  return rows.length;
+}
+
+// Re-apply the time windows to every lead with activity in the last 15 days.
+export async function sweepLeadScoreDecay() {
+  if (sweeping) return;
+  sweeping = true;
+  const startedAt = Date.now();
+  let checked = 0;
+  let changed = 0;
+  try {
+    const activeSince = new Date(startedAt - SWEEP_LOOKBACK_MS);
+    let cursor: string | null = null;
+
+    for (;;) {
+      const states: LeadScoreState[] = await prisma.leadScoreState.findMany({
+        where: { lastActivityAt: { gt: activeSince }, ...(cursor ? { leadId: { gt: cursor } } : {}) },
+        orderBy: { leadId: 'asc' },
+        take: BATCH_SIZE
+      });
+      if (states.length === 0) break;
+      cursor = states[states.length - 1].leadId;
+      checked += states.length;
+
+      const byTenant = new Map<string, LeadScoreStateRow[]>();
+      for (const state of states) {
+        const list = byTenant.get(state.tenantId) ?? [];
+        list.push(toStateRow(state));
+        byTenant.set(state.tenantId, list);
+      }
+
+      for (const [tenantId, rows] of byTenant) {
+        const leads: ScorableLeadRow[] = await prisma.lead.findMany({
+          where: { tenantId, id: { in: rows.map((r) => r.leadId) } },
+          select: scorableLeadSelect
+        });
+        changed += await rescoreLeads(tenantId, leads, rows, Date.now(), { touchActivity: false });
+      }
+    }
+
+    if (changed > 0) {
+      console.log(`[LeadScoreState] Decay sweep updated ${changed}/${checked} lead score(s) in ${Date.now() - startedAt}ms`);
+    }
+  } catch (error: any) {
+    console.warn('[LeadScoreState] Decay sweep failed (missing migration?):', error?.message || error);
+  } finally {
+    sweeping = false;
+  }
+}
+
+export function startLeadScoreMaintenance() {
+  if (sweepTimer) return;
+  sweepTimer = setInterval(() => void sweepLeadScoreDecay(), SWEEP_INTERVAL_MS);
+  sweepTimer.unref();
+}
+
+export async function stopLeadScoreMaintenance() {
+  if (sweepTimer) clearInterval(sweepTimer);
+  sweepTimer = null;
+  if (flushTimer) clearTimeout(flushTimer);
+  flushTimer = null;
+  await flushLeadScores();
+}
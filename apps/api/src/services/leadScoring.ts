@@ -1,6 +1,77 @@
 import { prisma } from '../db.js';
 import type { LeadChannel, LeadHeat } from '@prisma/client';
 
+const DAY_MS = 24 * 60 * 60 * 1000;
+
+// Per-lead activity counts the score formula needs. Built either from a lead's loaded
+// relations (calculateLeadScore) or from grouped SQL for many leads at once
+// (services/batchScoring.ts); both feed the same scoreFromAggregates.
+export type LeadActivityAggregates = {
+  messages: number;
+  notes: number;
+  calls: number;
+  completedTasks: number;
+  successEvents: number;
+  answeredCalls: number;
+  missedCalls: number;
+  recentMessages: number; // messages in the last 7 days
+  recentActivity: number; // messages + notes + calls + events in the last 7 days
+  previousActivity: number; // same, 7-14 days ago
+  responseCount: number; // inbound messages that got a later outbound reply
+  responseMsSum: number; // sum of those reply delays
+};
+
+export type ScorableLead = {
+  channel: LeadChannel;
+  heat: LeadHeat;
+  status: string;
+  fullName: string | null;
+  phone: string | null;
+  email: string | null;
+};
+
+export function getActivityWindows(now: number = Date.now()) {
+  return { oneWeekAgo: now - 7 * DAY_MS, twoWeeksAgo: now - 14 * DAY_MS };
+}
+
+// Hourly activity histogram kept per lead by the incremental scorer
+// (services/leadScoreState.ts): epoch hour -> [messages, messages + notes + calls].
+// Lead events are not bucketed; their window counts come from an indexed query.
+export type ActivityBuckets = Record<string, [number, number]>;
+
+const BUCKET_MS = 60 * 60 * 1000;
+
+export function activityBucketKey(at: number): string {
+  return String(Math.floor(at / BUCKET_MS));
+}
+
+export function pruneActivityBuckets(buckets: ActivityBuckets, now: number = Date.now()): ActivityBuckets {
+  const { twoWeeksAgo } = getActivityWindows(now);
+  const pruned: ActivityBuckets = {};
+  for (const [key, counts] of Object.entries(buckets)) {
+    if ((Number(key) + 1) * BUCKET_MS > twoWeeksAgo) pruned[key] = counts;
+  }
+  return pruned;
+}
+
+// Window counts at hour resolution (a bucket belongs to the window its start falls in).
+export function summarizeActivityBuckets(buckets: ActivityBuckets, now: number = Date.now()) {
+  const { oneWeekAgo, twoWeeksAgo } = getActivityWindows(now);
+  let recentMessages = 0;
+  let recentActivity = 0;
+  let previousActivity = 0;
+  for (const [key, [messages, activity]] of Object.entries(buckets)) {
+    const start = Number(key) * BUCKET_MS;
+    if (start > oneWeekAgo) {
+      recentMessages += messages;
+      recentActivity += activity;
+    } else if (start > twoWeeksAgo) {
+      previousActivity += activity;
+    }
+  }
+  return { recentMessages, recentActivity, previousActivity };
+}
+
 // Predictive Lead Scoring with Historical Conversion Analysis
 export async function calculateLeadScore(leadId: string): Promise<number> {
   const lead = await prisma.lead.findUnique({
@@ -17,25 +88,91 @@ export async function calculateLeadScore(leadId: string): Promise<number> {
 
   if (!lead) return 0;
 
+  const channelWeight = await getChannelConversionWeight(lead.tenantId, lead.channel);
+  return scoreFromAggregates(lead, aggregateLeadActivity(lead), channelWeight);
+}
+
+export function aggregateLeadActivity(
+  lead: {
+    messages: Array<{ direction: string; createdAt: Date }>;
+    notes: Array<{ createdAt: Date }>;
+    calls: Array<{ outcome: string; createdAt: Date }>;
+    tasks: Array<{ status: string }>;
+    successEvents: unknown[];
+    events: Array<{ createdAt: Date }>;
+  },
+  now: number = Date.now()
+): LeadActivityAggregates {
+  const { oneWeekAgo, twoWeeksAgo } = getActivityWindows(now);
+
+  let recentActivity = 0;
+  let previousActivity = 0;
+  for (const item of [...lead.messages, ...lead.notes, ...lead.calls, ...lead.events]) {
+    const time = new Date(item.createdAt).getTime();
+    if (time > oneWeekAgo) recentActivity++;
+    else if (time > twoWeeksAgo) previousActivity++;
+  }
+
+  // Pair each inbound message with the first outbound message after it.
+  const outboundTimes = lead.messages
+    .filter((m) => m.direction === 'OUT')
+    .map((m) => new Date(m.createdAt).getTime())
+    .sort((a, b) => a - b);
+  let responseCount = 0;
+  let responseMsSum = 0;
+  for (const inbound of lead.messages) {
+    if (inbound.direction !== 'IN') continue;
+    const inboundTime = new Date(inbound.createdAt).getTime();
+    const next = firstGreaterThan(outboundTimes, inboundTime);
+    if (next !== null) {
+      responseMsSum += next - inboundTime;
+      responseCount++;
+    }
+  }
+
+  return {
+    messages: lead.messages.length,
+    notes: lead.notes.length,
+    calls: lead.calls.length,
+    completedTasks: lead.tasks.filter((t) => t.status === 'COMPLETED').length,
+    successEvents: lead.successEvents.length,
+    answeredCalls: lead.calls.filter((c) => c.outcome === 'ANSWERED').length,
+    missedCalls: lead.calls.filter((c) => c.outcome === 'NO_ANSWER' || c.outcome === 'BUSY').length,
+    recentMessages: lead.messages.filter((m) => new Date(m.createdAt).getTime() > oneWeekAgo).length,
+    recentActivity,
+    previousActivity,
+    responseCount,
+    responseMsSum
+  };
+}
+
+function firstGreaterThan(sorted: number[], value: number): number | null {
+  let lo = 0;
+  let hi = sorted.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >>> 1;
+    if (sorted[mid] > value) hi = mid;
+    else lo = mid + 1;
+  }
+  return lo < sorted.length ? sorted[lo] : null;
+}
+
+export function scoreFromAggregates(lead: ScorableLead, activity: LeadActivityAggregates, channelWeight: number): number {
   let score = 0;
 
   // === PREDICTIVE FACTORS (Historical Conversion Analysis) ===
   
   // 1. Channel Conversion Probability (30 points max)
-  const channelWeight = await getChannelConversionWeight(lead.tenantId, lead.channel);
   score += channelWeight * 30;
 
   // 2. Response Time Pattern (20 points max)
-  const responseTimeScore = calculateResponseTimeScore(lead);
-  score += responseTimeScore;
+  score += calculateResponseTimeScore(activity.responseCount, activity.responseMsSum);
 
   // 3. Engagement Velocity (25 points max)
-  const velocityScore = calculateEngagementVelocity(lead);
-  score += velocityScore;
+  score += calculateEngagementVelocity(activity.recentActivity, activity.previousActivity);
 
   // 4. Lead Source Quality (15 points max)
-  const sourceQualityScore = await getSourceQualityScore(lead.tenantId, lead.channel, lead.heat);
-  score += sourceQualityScore;
+  score += getSourceQualityScore(lead.channel, lead.heat);
 
   // === ACTIVITY-BASED SCORING ===
   
@@ -45,24 +182,20 @@ export async function calculateLeadScore(leadId: string): Promise<number> {
   if (lead.email) score += 10;
 
   // Activity-based scoring
-  score += Math.min(lead.messages.length * 5, 50); // Cap at 50
-  score += Math.min(lead.notes.length * 3, 30); // Cap at 30
-  score += Math.min(lead.calls.length * 8, 60); // Cap at 60
-  score += Math.min(lead.tasks.filter(t => t.status === 'COMPLETED').length * 5, 40); // Cap at 40
+  score += Math.min(activity.messages * 5, 50); // Cap at 50
+  score += Math.min(activity.notes * 3, 30); // Cap at 30
+  score += Math.min(activity.calls * 8, 60); // Cap at 60
+  score += Math.min(activity.completedTasks * 5, 40); // Cap at 40
   
   // Success events add significant score
-  score += Math.min(lead.successEvents.length * 20, 100); // Cap at 100
+  score += Math.min(activity.successEvents * 20, 100); // Cap at 100
 
   // Call outcomes matter
-  const answeredCalls = lead.calls.filter(c => c.outcome === 'ANSWERED').length;
-  const missedCalls = lead.calls.filter(c => c.outcome === 'NO_ANSWER' || c.outcome === 'BUSY').length;
-  score += answeredCalls * 10;
-  score -= missedCalls * 3; // Penalty for unreachable leads
+  score += activity.answeredCalls * 10;
+  score -= activity.missedCalls * 3; // Penalty for unreachable leads
 
   // Recent activity boost
-  const oneWeekAgo = new Date(Date.now() - 7 * 24 * 60 * 60 * 1000);
-  const recentMessages = lead.messages.filter(m => new Date(m.createdAt) > oneWeekAgo).length;
-  score += Math.min(recentMessages * 3, 20); // Cap at 20
+  score += Math.min(activity.recentMessages * 3, 20); // Cap at 20
 
   // === STATUS-BASED SCORING ===
   if (lead.status === 'CONTACTED') score += 20;
@@ -85,6 +218,10 @@ async function getChannelConversionWeight(tenantId: string, channel: LeadChannel
     prisma.lead.count({ where: { tenantId, channel, status: 'WON' } })
   ]);
 
+  return channelConversionWeight(totalLeads, wonLeads);
+}
+
+export function channelConversionWeight(totalLeads: number, wonLeads: number): number {
   if (totalLeads === 0) return 0.5; // Default neutral weight
 
   const conversionRate = wonLeads / totalLeads;
@@ -98,27 +235,7 @@ async function getChannelConversionWeight(tenantId: string, channel: LeadChannel
 }
 
 // Calculate response time score (faster responses = higher score)
-function calculateResponseTimeScore(lead: any): number {
-  const inboundMessages = lead.messages.filter((m: any) => m.direction === 'IN');
-  const outboundMessages = lead.messages.filter((m: any) => m.direction === 'OUT');
-
-  if (inboundMessages.length === 0 || outboundMessages.length === 0) return 0;
-
-  let totalResponseTime = 0;
-  let responseCount = 0;
-
-  for (const inbound of inboundMessages) {
-    const nextOutbound = outboundMessages.find((out: any) => 
-      new Date(out.createdAt) > new Date(inbound.createdAt)
-    );
-
-    if (nextOutbound) {
-      const responseTime = new Date(nextOutbound.createdAt).getTime() - new Date(inbound.createdAt).getTime();
-      totalResponseTime += responseTime;
-      responseCount++;
-    }
-  }
-
+function calculateResponseTimeScore(responseCount: number, totalResponseTime: number): number {
   if (responseCount === 0) return 0;
 
   const avgResponseTimeMinutes = (totalResponseTime / responseCount) / (1000 * 60);
@@ -132,28 +249,7 @@ function calculateResponseTimeScore(lead: any): number {
 }
 
 // Calculate engagement velocity (activity frequency trend)
-function calculateEngagementVelocity(lead: any): number {
-  const now = Date.now();
-  const oneWeekAgo = now - (7 * 24 * 60 * 60 * 1000);
-  const twoWeeksAgo = now - (14 * 24 * 60 * 60 * 1000);
-
-  const recentActivity = [
-    ...lead.messages,
-    ...lead.notes,
-    ...lead.calls,
-    ...lead.events
-  ].filter(item => new Date(item.createdAt).getTime() > oneWeekAgo).length;
-
-  const previousActivity = [
-    ...lead.messages,
-    ...lead.notes,
-    ...lead.calls,
-    ...lead.events
-  ].filter(item => {
-    const time = new Date(item.createdAt).getTime();
-    return time > twoWeeksAgo && time <= oneWeekAgo;
-  }).length;
-
+function calculateEngagementVelocity(recentActivity: number, previousActivity: number): number {
   // Velocity calculation
   if (recentActivity > previousActivity * 1.5) return 25; // Accelerating engagement
   if (recentActivity > previousActivity) return 15; // Growing engagement
@@ -163,7 +259,7 @@ function calculateEngagementVelocity(lead: any): number {
 }
 
 // Get source quality score based on channel + heat combination
-async function getSourceQualityScore(tenantId: string, channel: LeadChannel, heat: LeadHeat): Promise<number> {
+function getSourceQualityScore(channel: LeadChannel, heat: LeadHeat): number {
   // Premium channels get higher base score
   const channelScore: Record<LeadChannel, number> = {
     'INDIAMART': 12,
@@ -0,0 +1,67 @@
+import type { LeadChannel, LeadHeat, LeadStatus, Prisma } from '@prisma/client';
+import type { KeysetCursor } from './pagination.js';
+
+// Lead list filters and search (GET /leads).
+//
+// Text search is served by trigram GIN indexes (pg_trgm) on fullName, email and
+// phoneDigits, so `contains` / ILIKE '%term%' stays an index scan at any table size.
+// phoneDigits holds the phone number with everything but digits stripped; a trigger
+// keeps it in sync, so "+971 50-000 0001" is found by "0500000001" or "971500".
+
+export type LeadListFilters = {
+  search?: string;
+  status?: LeadStatus;
+  heat?: LeadHeat;
+  channel?: LeadChannel;
+  // Salesman id, or 'unassigned'.
+  assignee?: string;
+};
+
+const MIN_PHONE_DIGITS = 3;
+
+export function phoneDigits(value: string): string {
+  return value.replace(/\D/g, '');
+}
+
+function searchWhere(term: string): Prisma.LeadWhereInput | null {
+  const q = term.trim();
+  if (!q) return null;
+
+  // Phone-looking input ("+91 98765", "050-000") searches the digits only.
+  const digits = phoneDigits(q);
+  if (/^[\d\s()+\-.]+$/.test(q) && digits.length >= MIN_PHONE_DIGITS) {
+    return { phoneDigits: { contains: digits } };
+  }
+
+  if (q.includes('@')) return { email: { contains: q, mode: 'insensitive' } };
+
+  const or: Prisma.LeadWhereInput[] = [
+    { fullName: { contains: q, mode: 'insensitive' } },
+    { email: { contains: q, mode: 'insensitive' } }
+  ];
+  if (digits.length >= MIN_PHONE_DIGITS) or.push({ phoneDigits: { contains: digits } });
+  return { OR: or };
+}
+
+export function buildLeadListWhere(tenantId: string, filters: LeadListFilters): Prisma.LeadWhereInput {
+  const search = filters.search ? searchWhere(filters.search) : null;
+
+  return {
+    tenantId,
+    ...(filters.status ? { status: filters.status } : {}),
+    ...(filters.heat ? { heat: filters.heat } : {}),
+    ...(filters.channel ? { channel: filters.channel } : {}),
+    ...(filters.assignee
+      ? { assignedToSalesmanId: filters.assignee === 'unassigned' ? null : filters.assignee }
+      : {}),
+    ...(search ? { AND: [search] } : {})
+  };
+}
+
+// Keyset continuation for lists ordered by (updatedAt desc, id desc); backed by the
+// (tenantId, updatedAt, id) index.
+export function leadsUpdatedBefore(cursor: KeysetCursor): Prisma.LeadWhereInput {
+  return {
+    OR: [{ updatedAt: { lt: cursor.at } }, { updatedAt: cursor.at, id: { lt: cursor.id } }]
+  };
+}
@@ -0,0 +1,169 @@
+import { prisma } from '../db.js';
+import { createdAtPast, mergeKeysetPages } from './pagination.js';
+import type { KeysetCursor, KeysetOrder } from './pagination.js';
+
+// Lead conversation timeline (GET /leads/:id/timeline).
+//
+// Messages, events, notes, calls and tasks of one lead merged into a single stream
+// ordered by (createdAt, id). Each source is read with a keyset query of at most
+// `limit + 1` rows on its (leadId, createdAt) index and the sources are merged in memory,
+// so a page costs the same whether the lead has ten messages or ten thousand.
+//
+// Without a cursor the newest page is returned. `before` walks back into older history,
+// `after` picks up anything newer (e.g. polling for new messages). Items within a page
+// are always oldest first.
+
+export const TIMELINE_KINDS = ['message', 'event', 'note', 'call', 'task'] as const;
+export type TimelineKind = (typeof TIMELINE_KINDS)[number];
+
+export type TimelineItem = {
+  kind: TimelineKind;
+  id: string;
+  createdAt: Date;
+  data: Record<string, unknown>;
+};
+
+export type TimelinePage = {
+  items: TimelineItem[];
+  // Cursors of the first/last item; null when the page is empty.
+  olderCursor: KeysetCursor | null;
+  newerCursor: KeysetCursor | null;
+  hasOlder: boolean;
+  hasNewer: boolean;
+};
+
+export type TimelineQuery = {
+  tenantId: string;
+  leadId: string;
+  limit: number;
+  before?: KeysetCursor | null;
+  after?: KeysetCursor | null;
+  kinds?: TimelineKind[];
+  // Include Message.raw and LeadEvent.payload (AI triage/draft JSON). Off by default.
+  includePayload?: boolean;
+};
+
+type Row = { id: string; createdAt: Date };
+
+export async function getLeadTimeline(query: TimelineQuery): Promise<TimelinePage> {
+  const { tenantId, leadId, limit } = query;
+  const kinds = new Set<TimelineKind>(query.kinds?.length ? query.kinds : TIMELINE_KINDS);
+  const includePayload = query.includePayload ?? false;
+
+  // `after` reads forward from the cursor; otherwise read backwards from `before` (or now).
+  const forward = Boolean(query.after);
+  const cursor = query.after ?? query.before ?? null;
+  const order: KeysetOrder = forward ? 'asc' : 'desc';
+  const where = { tenantId, leadId, ...(cursor ? createdAtPast(cursor, order) : {}) };
+  const page = { where, orderBy: [{ createdAt: order }, { id: order }], take: limit + 1 };
+  const none = Promise.resolve([] as never[]);
+
+  const [messages, events, notes, calls, tasks] = await Promise.all([
+    kinds.has('message')
+      ? prisma.message.findMany({
+          ...page,
+          select: {
+            id: true,
+            direction: true,
+            channel: true,
+            body: true,
+            conversationId: true,
+            status: true,
+            createdAt: true,
+            raw: includePayload
+          }
+        })
+      : none,
+    kinds.has('event')
+      ? prisma.leadEvent.findMany({
+          ...page,
+          select: { id: true, type: true, createdAt: true, payload: includePayload }
+        })
+      : none,
+    kinds.has('note')
+      ? prisma.note.findMany({
+          ...page,
+          select: { id: true, userId: true, content: true, createdAt: true, updatedAt: true }
+        })
+      : none,
+    kinds.has('call')
+      ? prisma.call.findMany({
+          ...page,
+          select: {
+            id: true,
+            userId: true,
+            direction: true,
+            outcome: true,
+            duration: true,
+            notes: true,
+            recordingUrl: true,
+            scheduledFor: true,
+            createdAt: true
+          }
+        })
+      : none,
+    kinds.has('task')
+      ? prisma.task.findMany({
+          ...page,
+          select: {
+            id: true,
+            userId: true,
+            title: true,
+            description: true,
+            dueDate: true,
+            priority: true,
+            status: true,
+            completedAt: true,
+            createdAt: true
+          }
+        })
+      : none
+  ]);
+
+  const tag = <T extends Row>(kind: TimelineKind, rows: T[]): TimelineItem[] =>
+    rows.map(({ id, createdAt, ...data }) => ({ kind, id, createdAt, data }));
+
+  const { items, more } = mergeKeysetPages(
+    [
+      tag('message', messages),
+      tag('event', events),
+      tag('note', notes),
+      tag('call', calls),
+      tag('task', tasks)
+    ],
+    limit,
+    order
+  );
+  if (!forward) items.reverse();
+
+  await attachUsers(items);
+
+  const first = items[0];
+  const last = items[items.length - 1];
+  return {
+    items,
+    olderCursor: first ? { at: first.createdAt, id: first.id } : null,
+    newerCursor: last ? { at: last.createdAt, id: last.id } : null,
+    // Reading backwards, there is something newer exactly when we started from a cursor
+    // (and vice versa); the far side is known from the extra row.
+    hasOlder: forward ? true : more,
+    hasNewer: forward ? more : Boolean(cursor)
+  };
+}
+
+// Notes, calls and tasks carry a userId; resolve display names in one query.
+async function attachUsers(items: TimelineItem[]) {
+  const userIds = [...new Set(items.map((i) => i.data.userId).filter((id): id is string => typeof id === 'string'))];
+  if (userIds.length === 0) return;
+
+  const users = await prisma.user.findMany({
+    where: { id: { in: userIds } },
+    select: { id: true, displayName: true, email: true }
+  });
+  const byId = new Map(users.map((u) => [u.id, u]));
+  for (const item of items) {
+    const id = item.data.userId;
+    if (typeof id !== 'string') continue;
+    item.data.user = byId.get(id) ?? { id, displayName: 'Unknown', email: null };
+  }
+}
@@ -0,0 +1,243 @@
+import type { AssignmentConfig, PrismaClient, Salesman } from '@prisma/client';
+
+// In-memory salesman load ledger.
+//
+// Auto-assignment needs, per tenant, the active salesmen, the assignment config and the
+// number of open (not WON/LOST) leads each salesman holds. Computing the load used to
+// mean a lead.groupBy over every open lead on each pick. The ledger seeds that once per
+// tenant, is updated incrementally by the write paths that change lead ownership or
+// open/closed status, and is periodically reconciled against the DB to absorb writes
+// it never saw (seed data, imports, other API instances).
+//
+// Picks reserve a slot synchronously (pick + reserve happen in the same tick), so two
+// concurrent ingests can no longer both push a salesman past capacity.
+
+const RECONCILE_MS = Math.max(10_000, Number(process.env.LOAD_LEDGER_RECONCILE_MS ?? 5 * 60 * 1000));
+const IDLE_EVICT_MS = Math.max(RECONCILE_MS, Number(process.env.LOAD_LEDGER_IDLE_EVICT_MS ?? 30 * 60 * 1000));
+const MAX_SALESMEN = 200;
+const CLOSED_STATUSES = new Set<string>(['WON', 'LOST']);
+
+type Roster = {
+  salesmen: Salesman[];
+  config: AssignmentConfig | null;
+};
+
+type TenantLedger = {
+  prisma: PrismaClient;
+  roster: Roster | null; // null → re-read salesmen + config on next pick
+  rosterVersion: number;
+  load: Map<string, number>; // committed open leads per salesman
+  reserved: Map<string, number>; // picks whose assignment write hasn't committed yet
+  loadSyncedAt: number;
+  lastUsedAt: number;
+};
+
+export type SalesmanPool = Roster & {
+  loadOf: (salesmanId: string) => number;
+};
+
+export type LeadOwnership = {
+  status: string;
+  assignedToSalesmanId: string | null;
+};
+
+// `before: null` is a created lead, `after: null` a deleted one.
+export type LeadOwnershipChange = {
+  before: LeadOwnership | null;
+  after: LeadOwnership | null;
+};
+
+export type SalesmanReservation = {
+  salesmanId: string;
+  commit: () => void;
+  release: () => void;
+};
+
+const ledgers = new Map<string, TenantLedger>();
+const pendingSeeds = new Map<string, Promise<TenantLedger>>();
+let reconcileTimer: NodeJS.Timeout | null = null;
+let reconciling = false;
+
+function bump(map: Map<string, number>, salesmanId: string, delta: number) {
+  const next = (map.get(salesmanId) ?? 0) + delta;
+  if (next > 0) map.set(salesmanId, next);
+  else map.delete(salesmanId);
+}
+
+async function readRoster(prisma: PrismaClient, tenantId: string): Promise<Roster> {
+  const [salesmen, config] = await Promise.all([
+    prisma.salesman.findMany({
+      where: { tenantId, isActive: true },
+      orderBy: { createdAt: 'asc' },
+      take: MAX_SALESMEN
+    }),
+    prisma.assignmentConfig.findUnique({ where: { tenantId } })
+  ]);
+  return { salesmen, config };
+}
+
+async function readLoad(prisma: PrismaClient, tenantId: string): Promise<Map<string, number>> {
+  const rows = await prisma.lead.groupBy({
+    by: ['assignedToSalesmanId'],
+    where: {
+      tenantId,
+      assignedToSalesmanId: { not: null },
+      status: { notIn: ['WON', 'LOST'] }
+    },
+    _count: { _all: true }
+  });
+
+  const load = new Map<string, number>();
+  for (const row of rows) {
+    if (!row.assignedToSalesmanId) continue;
+    load.set(row.assignedToSalesmanId, row._count._all);
+  }
+  return load;
+}
+
+async function seedLedger(prisma: PrismaClient, tenantId: string): Promise<TenantLedger> {
+  const [roster, load] = await Promise.all([readRoster(prisma, tenantId), readLoad(prisma, tenantId)]);
+  const now = Date.now();
+  const ledger: TenantLedger = {
+    prisma,
+    roster,
+    rosterVersion: 0,
+    load,
+    reserved: new Map(),
+    loadSyncedAt: now,
+    lastUsedAt: now
+  };
+  ledgers.set(tenantId, ledger);
+  ensureReconcileTimer();
+  return ledger;
+}
+
+export async function getSalesmanPool(prisma: PrismaClient, tenantId: string): Promise<SalesmanPool> {
+  let ledger = ledgers.get(tenantId);
+  if (!ledger) {
+    let pending = pendingSeeds.get(tenantId);
+    if (!pending) {
+      pending = seedLedger(prisma, tenantId).finally(() => pendingSeeds.delete(tenantId));
+      pendingSeeds.set(tenantId, pending);
+    }
+    ledger = await pending;
+  }
+
+  let roster = ledger.roster;
+  if (!roster) {
+    const version = ledger.rosterVersion;
+    roster = await readRoster(prisma, tenantId);
+    // Don't cache a read that raced with another invalidation.
+    if (ledger.rosterVersion === version) ledger.roster = roster;
+  }
+
+  const current = ledger;
+  current.lastUsedAt = Date.now();
+  return {
+    salesmen: roster.salesmen,
+    config: roster.config,
+    loadOf: (salesmanId) => (current.load.get(salesmanId) ?? 0) + (current.reserved.get(salesmanId) ?? 0)
+  };
+}
+
+// Must be called in the same tick as the pick that chose `salesmanId`. `commit()` once
+// the assignment is persisted; `release()` if the write failed.
+export function reserveSalesmanSlot(tenantId: string, salesmanId: string): SalesmanReservation {
+  const ledger = ledgers.get(tenantId);
+  if (ledger) bump(ledger.reserved, salesmanId, 1);
+
+  let settled = false;
+  const settle = (committed: boolean) => {
+    if (settled) return;
+    settled = true;
+    // If the ledger was reset meanwhile, the reseed already read the DB.
+    if (!ledger || ledgers.get(tenantId) !== ledger) return;
+    bump(ledger.reserved, salesmanId, -1);
+    if (committed) bump(ledger.load, salesmanId, 1);
+  };
+
+  return { salesmanId, commit: () => settle(true), release: () => settle(false) };
+}
+
+function countedSalesmanId(lead: LeadOwnership | null): string | null {
+  if (!lead || !lead.assignedToSalesmanId) return null;
+  if (CLOSED_STATUSES.has(lead.status)) return null;
+  return lead.assignedToSalesmanId;
+}
+
+// Record committed lead writes that change who holds an open lead: assign, reassign,
+// unassign, WON/LOST transitions (and reopening), creates and deletes.
+export function applyLeadOwnershipChanges(tenantId: string, changes: LeadOwnershipChange[]) {
+  const ledger = ledgers.get(tenantId);
+  if (!ledger) return; // Not seeded yet; the seed will read the DB.
+
+  for (const change of changes) {
+    const from = countedSalesmanId(change.before);
+    const to = countedSalesmanId(change.after);
+    if (from === to) continue;
+    if (from) bump(ledger.load, from, -1);
+    if (to) bump(ledger.load, to, 1);
+  }
+}
+
+// Salesman rows (active flag, score, capacity) or the assignment config changed.
+export function invalidateSalesmanRoster(tenantId: string) {
+  const ledger = ledgers.get(tenantId);
+  if (!ledger) return;
+  ledger.roster = null;
+  ledger.rosterVersion++;
+}
+
+// Bulk writes that bypass the incremental hooks (seeding, imports, admin cleanups).
+export function resetLoadLedger(tenantId: string) {
+  ledgers.delete(tenantId);
+}
+
+async function reconcileLedgers() {
+  if (reconciling) return;
+  reconciling = true;
+  try {
+    const now = Date.now();
+    for (const [tenantId, ledger] of ledgers) {
+      if (now - ledger.lastUsedAt > IDLE_EVICT_MS) {
+        ledgers.delete(tenantId);
+        continue;
+      }
+      if (now - ledger.loadSyncedAt < RECONCILE_MS) continue;
+
+      try {
+        const load = await readLoad(ledger.prisma, tenantId);
+        if (ledgers.get(tenantId) !== ledger) continue;
+
+        // Writes that race the snapshot can leave it off by one or two; the next pass
+        // corrects that.
+        let drift = 0;
+        for (const id of new Set([...load.keys(), ...ledger.load.keys()])) {
+          drift += Math.abs((load.get(id) ?? 0) - (ledger.load.get(id) ?? 0));
+        }
+        if (drift > 0) {
+          console.log(`[LoadLedger] Reconciled tenant ${tenantId}: corrected ${drift} lead(s) of drift`);
+        }
+
+        ledger.load = load;
+        ledger.loadSyncedAt = Date.now();
+        // Pick up score recomputes and other salesman edits made elsewhere.
+        invalidateSalesmanRoster(tenantId);
+      } catch (error: any) {
+        console.warn(`[LoadLedger] Reconcile failed for tenant ${tenantId}:`, error?.message || error);
+      }
+    }
+  } finally {
+    reconciling = false;
+    if (ledgers.size === 0 && reconcileTimer) {
+      clearInterval(reconcileTimer);
+      reconcileTimer = null;
+    }
+  }
+}
+
+function ensureReconcileTimer() {
+  if (reconcileTimer) return;
+  reconcileTimer = setInterval(() => void reconcileLedgers(), Math.min(RECONCILE_MS, 60_000));
+  reconcileTimer.unref();
+}
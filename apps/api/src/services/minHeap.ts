@@ -0,0 +1,32 @@
+// Binary min-heap on `at`, kept in a plain array (heap[0] is the earliest item).
+
+export function heapPush<T extends { at: number }>(heap: T[], item: T) {
+  heap.push(item);
+  let i = heap.length - 1;
+  while (i > 0) {
+    const parent = (i - 1) >> 1;
+    if (heap[parent].at <= heap[i].at) break;
+    [heap[parent], heap[i]] = [heap[i], heap[parent]];
+    i = parent;
+  }
+}
+
+export function heapPop<T extends { at: number }>(heap: T[]): T | undefined {
+  const top = heap[0];
+  const last = heap.pop();
+  if (heap.length > 0 && last) {
+    heap[0] = last;
+    let i = 0;
+    for (;;) {
+      const left = 2 * i + 1;
+      const right = left + 1;
+      let smallest = i;
+      if (left < heap.length && heap[left].at < heap[smallest].at) smallest = left;
+      if (right < heap.length && heap[right].at < heap[smallest].at) smallest = right;
+      if (smallest === i) break;
+      [heap[smallest], heap[i]] = [heap[i], heap[smallest]];
+      i = smallest;
+    }
+  }
+  return top;
+}
@@ -0,0 +1,223 @@
+import type { Response } from 'express';
+import { prisma } from '../db.js';
+
+// Per-user notifications.
+//
+// Writes go through createNotifications (one createMany for any fan-out). New rows are
+// pushed to the recipient's open GET /notifications/stream connections (server-sent
+// events), together with the new unread count.
+//
+// Unread counts are kept in memory per user: seeded from the DB on first use, then moved
+// by creates and mark-read on this instance. Entries expire after
+// NOTIFICATION_COUNT_TTL_MS so writes made by other instances are picked up; a
+// count that raced with a write during its seed is served once and not cached.
+
+const COUNT_TTL_MS = Math.max(1000, Number(process.env.NOTIFICATION_COUNT_TTL_MS ?? 60_000));
+const HEARTBEAT_MS = 25_000;
+
+export type NotificationInput = {
+  tenantId: string;
+  userId: string;
+  type: string;
+  title: string;
+  body?: string | null;
+  entityType?: string | null;
+  entityId?: string | null;
+};
+
+type UnreadEntry = { count: number; expiresAt: number };
+
+const unreadCounts = new Map<string, UnreadEntry>();
+const unreadLoads = new Map<string, { promise: Promise<number>; stale: boolean }>();
+const subscribers = new Map<string, Set<Response>>();
+let heartbeatTimer: NodeJS.Timeout | null = null;
+
+function userKey(tenantId: string, userId: string) {
+  return `${tenantId}|${userId}`;
+}
+
+export async function getUnreadNotificationCount(tenantId: string, userId: string): Promise<number> {
+  const key = userKey(tenantId, userId);
+  const cached = unreadCounts.get(key);
+  if (cached && cached.expiresAt > Date.now()) return cached.count;
+
+  let load = unreadLoads.get(key);
+  if (!load) {
+    const entry = {
+      promise: prisma.notification.count({ where: { tenantId, userId, readAt: null } }),
+      stale: false
+    };
+    entry.promise
+      .then(
+        (count) => {
+          if (!entry.stale) unreadCounts.set(key, { count, expiresAt: Date.now() + COUNT_TTL_MS });
+        },
+        () => {}
+      )
+      .finally(() => {
+        if (unreadLoads.get(key) === entry) unreadLoads.delete(key);
+      });
+    unreadLoads.set(key, entry);
+    load = entry;
+  }
+  return load.promise;
+}
+
+function adjustUnread(tenantId: string, userId: string, delta: number | 'reset') {
+  const key = userKey(tenantId, userId);
+  const load = unreadLoads.get(key);
+  if (load) load.stale = true;
+
+  const cached = unreadCounts.get(key);
+  if (delta === 'reset') {
+    unreadCounts.set(key, { count: 0, expiresAt: Date.now() + COUNT_TTL_MS });
+  } else if (cached) {
+    cached.count = Math.max(0, cached.count + delta);
+  }
+  if (subscribers.has(key)) void pushUnreadCount(tenantId, userId);
+}
+
+async function pushUnreadCount(tenantId: string, userId: string) {
+  try {
+    const count = await getUnreadNotificationCount(tenantId, userId);
+    sendEvent(userKey(tenantId, userId), 'unread', { count });
+  } catch {
+    // The next change (or reconnect) sends a fresh count.
+  }
+}
+
+function sendEvent(key: string, event: string, data: unknown) {
+  const conns = subscribers.get(key);
+  if (!conns) return;
+  const frame = `event: ${event}\ndata: ${JSON.stringify(data)}\n\n`;
+  for (const res of conns) res.write(frame);
+}
+
+// Many notifications in one insert (role fan-out, SLA breaches, escalations).
+export async function createNotifications(inputs: NotificationInput[]) {
+  if (inputs.length === 0) return;
+  try {
+    const created = await prisma.notification.createManyAndReturn({
+      data: inputs.map((params) => ({
+        tenantId: params.tenantId,
+        userId: params.userId,
+        type: params.type,
+        title: params.title,
+        body: params.body ?? null,
+        entityType: params.entityType ?? null,
+        entityId: params.entityId ?? null
+      }))
+    });
+
+    const perUser = new Map<string, number>();
+    for (const notification of created) {
+      const key = userKey(notification.tenantId, notification.userId);
+      perUser.set(key, (perUser.get(key) ?? 0) + 1);
+      sendEvent(key, 'notification', notification);
+    }
+    for (const [key, count] of perUser) {
+      const [tenantId, userId] = key.split('|');
+      adjustUnread(tenantId, userId, count);
+    }
+  } catch (err) {
+    // If migrations aren't applied yet, keep the app usable.
+    // eslint-disable-next-line no-console
+    console.warn(
+      'Failed to create notifications (missing migration?):',
+      err instanceof Error ? err.message : err
+    );
+  }
+}
+
+export async function createNotificationForUser(params: NotificationInput) {
+  await createNotifications([params]);
+}
+
+export async function notifyTenantRoles(params: {
+  tenantId: string;
+  roles: Array<'OWNER' | 'ADMIN' | 'MANAGER' | 'SALESMAN'>;
+  type: string;
+  title: string;
+  body?: string | null;
+  entityType?: string | null;
+  entityId?: string | null;
+}) {
+  const users: Array<{ id: string }> = await prisma.user.findMany({
+    where: { tenantId: params.tenantId, active: true, role: { in: params.roles } },
+    select: { id: true }
+  });
+
+  await createNotifications(
+    users.map((u: { id: string }) => ({
+      tenantId: params.tenantId,
+      userId: u.id,
+      type: params.type,
+      title: params.title,
+      body: params.body,
+      entityType: params.entityType,
+      entityId: params.entityId
+    }))
+  );
+}
+
+export async function markNotificationRead(tenantId: string, userId: string, notificationId: string) {
+  const { count } = await prisma.notification.updateMany({
+    where: { id: notificationId, tenantId, userId, readAt: null },
+    data: { readAt: new Date() }
+  });
+  if (count > 0) adjustUnread(tenantId, userId, -count);
+}
+
+export async function markAllNotificationsRead(tenantId: string, userId: string) {
+  await prisma.notification.updateMany({
+    where: { tenantId, userId, readAt: null },
+    data: { readAt: new Date() }
+  });
+  adjustUnread(tenantId, userId, 'reset');
+}
+
+// GET /notifications/stream: keep the response open and push events to it.
+export function subscribeNotifications(tenantId: string, userId: string, res: Response) {
+  const key = userKey(tenantId, userId);
+
+  res.status(200);
+  res.setHeader('Content-Type', 'text/event-stream');
+  res.setHeader('Cache-Control', 'no-cache, no-transform');
+  res.setHeader('Connection', 'keep-alive');
+  // Ask proxies (nginx) not to buffer the stream.
+  res.setHeader('X-Accel-Buffering', 'no');
+  res.flushHeaders();
+  res.write(`retry: 5000\n\n`);
+
+  let conns = subscribers.get(key);
+  if (!conns) {
+    conns = new Set();
+    subscribers.set(key, conns);
+  }
+  conns.add(res);
+  ensureHeartbeat();
+  void pushUnreadCount(tenantId, userId);
+
+  res.on('close', () => {
+    const current = subscribers.get(key);
+    if (!current) return;
+    current.delete(res);
+    if (current.size === 0) subscribers.delete(key);
+  });
+}
+
+// Comment frames keep idle connections from being cut by proxies.
+function ensureHeartbeat() {
+  if (heartbeatTimer) return;
+  heartbeatTimer = setInterval(() => {
+    if (subscribers.size === 0) {
+      if (heartbeatTimer) clearInterval(heartbeatTimer);
+      heartbeatTimer = null;
+      return;
+    }
+    for (const conns of subscribers.values()) {
+      for (const res of conns) res.write(': ping\n\n');
+    }
+  }, HEARTBEAT_MS);
+  heartbeatTimer.unref();
+}
@@ -0,0 +1,331 @@
+import type { LeadChannel, Message } from '@prisma/client';
+import { prisma } from '../db.js';
+import { computeBackoffMs } from './backoff.js';
+import { createNotificationForUser } from './notifications.js';
+import { takeToken, type TokenBucket } from './tokenBucket.js';
+
+// Outbound message dispatcher.
+//
+// POST /leads/:id/send-message stores the Message as QUEUED and returns; in-process
+// workers claim queued rows and hand them to the provider (SAK WhatsApp gateway over
+// the shared keep-alive pool, or the pooled SMTP transport). Messages to one lead on one
+// channel go out strictly in order.
+//
+// Sends are paced by a token bucket per sending identity (WhatsApp session / SMTP
+// account) so bursts stay under the provider's throughput caps. Transient failures
+// (timeouts, 429, 5xx) are retried with jittered exponential backoff; the row ends up
+// SENT with the provider message id, or FAILED with the last error, and the user who
+// sent it is notified.
+
+export const OUTBOUND_STATUSES = ['QUEUED', 'SENDING', 'SENT', 'FAILED'] as const;
+export type OutboundStatus = (typeof OUTBOUND_STATUSES)[number];
+
+const WORKER_CONCURRENCY = Math.max(0, Number(process.env.OUTBOUND_WORKER_CONCURRENCY ?? 4));
+const POLL_INTERVAL_MS = Math.max(100, Number(process.env.OUTBOUND_POLL_INTERVAL_MS ?? 1000));
+const MAX_ATTEMPTS = Math.max(1, Number(process.env.OUTBOUND_MAX_ATTEMPTS ?? 5));
+const BACKOFF_BASE_MS = Math.max(100, Number(process.env.OUTBOUND_BACKOFF_BASE_MS ?? 2000));
+const BACKOFF_MAX_MS = Math.max(BACKOFF_BASE_MS, Number(process.env.OUTBOUND_BACKOFF_MAX_MS ?? 5 * 60 * 1000));
+// A claimed row whose worker died is released after this long.
+const LOCK_TIMEOUT_MS = Math.max(10_000, Number(process.env.OUTBOUND_LOCK_TIMEOUT_MS ?? 2 * 60 * 1000));
+// Longer waits for a send token put the message back in the queue instead of holding a worker.
+const MAX_THROTTLE_WAIT_MS = 5000;
+const MAINTENANCE_INTERVAL_MS = 60 * 1000;
+
+const WHATSAPP_RATE = {
+  perSecond: Math.max(0.01, Number(process.env.WHATSAPP_SEND_PER_SECOND ?? 1)),
+  burst: Math.max(1, Number(process.env.WHATSAPP_SEND_BURST ?? 5))
+};
+const EMAIL_RATE = {
+  perSecond: Math.max(0.01, Number(process.env.EMAIL_SEND_PER_SECOND ?? 5)),
+  burst: Math.max(1, Number(process.env.EMAIL_SEND_BURST ?? 10))
+};
+
+// What the worker needs besides the Message columns; kept in Message.raw.
+type OutboundRaw = {
+  outbound: { to: string; subject?: string; userId?: string };
+};
+
+type SendResult = { success: boolean; messageId?: string; error?: string; retryable?: boolean; retryAfterMs?: number };
+
+export function isDispatchableChannel(channel: LeadChannel): channel is 'WHATSAPP' | 'EMAIL' {
+  return channel === 'WHATSAPP' || channel === 'EMAIL';
+}
+
+// --- token buckets ---------------------------------------------------------
+
+// One per WhatsApp session / SMTP account (see rateKey).
+const buckets = new Map<string, TokenBucket>();
+
+// --- queue -----------------------------------------------------------------
+
+let running = false;
+let maintenanceTimer: NodeJS.Timeout | null = null;
+const activeLoops: Promise<void>[] = [];
+let wakeWaiters: Array<() => void> = [];
+
+const stats = { sent: 0, failed: 0, retried: 0, throttled: 0 };
+
+export function getOutboundStats() {
+  return { ...stats };
+}
+
+function wakeWorkers() {
+  const waiters = wakeWaiters;
+  wakeWaiters = [];
+  for (const wake of waiters) wake();
+}
+
+function sleepUntilWoken(ms: number): Promise<void> {
+  return new Promise((resolve) => {
+    const timer = setTimeout(done, ms);
+    function done() {
+      clearTimeout(timer);
+      wakeWaiters = wakeWaiters.filter((w) => w !== done);
+      resolve();
+    }
+    wakeWaiters.push(done);
+  });
+}
+
+function sleep(ms: number) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+// Persist an outbound message. WhatsApp/email messages with a recipient are QUEUED for
+// delivery; anything else (manual channels, missing contact) is only logged.
+export async function enqueueOutboundMessage(params: {
+  tenantId: string;
+  leadId: string;
+  conversationId: string | null;
+  channel: LeadChannel;
+  body: string;
+  to?: string | null;
+  subject?: string;
+  userId?: string;
+}): Promise<Message> {
+  const dispatch = isDispatchableChannel(params.channel) && Boolean(params.to);
+  const raw: OutboundRaw | undefined = dispatch
+    ? { outbound: { to: params.to as string, subject: params.subject, userId: params.userId } }
+    : undefined;
+
+  const message = await prisma.message.create({
+    data: {
+      tenantId: params.tenantId,
+      leadId: params.leadId,
+      conversationId: params.conversationId,
+      direction: 'OUT',
+      channel: params.channel,
+      body: params.body,
+      ...(dispatch ? { raw, status: 'QUEUED', nextAttemptAt: new Date() } : {})
+    }
+  });
+  if (dispatch) wakeWorkers();
+  return message;
+}
+
+// Claim the next sendable message. Like the ingest queue, a message waits while an
+// earlier one to the same lead/channel is queued or in flight. The claim lease is kept
+// in nextAttemptAt.
+export async function claimNextMessage(): Promise<Message | null> {
+  const leaseUntil = new Date(Date.now() + LOCK_TIMEOUT_MS);
+  const rows = await prisma.$queryRaw<Message[]>`
+    UPDATE "Message" AS m
+    SET "status" = 'SENDING',
+        "attempts" = m."attempts" + 1,
+        "nextAttemptAt" = ${leaseUntil}
+    WHERE m."id" = (
+      SELECT c."id" FROM "Message" c
+      WHERE c."status" = 'QUEUED'
+        AND c."nextAttemptAt" <= NOW()
+        AND NOT EXISTS (
+          SELECT 1 FROM "Message" p
+          WHERE p."leadId" = c."leadId"
+            AND p."channel" = c."channel"
+            AND (
+              p."status" = 'SENDING'
+              OR (p."status" = 'QUEUED' AND (p."createdAt", p."id") < (c."createdAt", c."id"))
+            )
+        )
+      ORDER BY c."nextAttemptAt" ASC
+      LIMIT 1
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING m.*
+  `;
+  return rows[0] ?? null;
+}
+
+async function sendMessage(message: Message, outbound: OutboundRaw['outbound']): Promise<SendResult> {
+  if (message.channel === 'WHATSAPP') {
+    const { sendWhatsAppMessage } = await import('./whatsapp.js');
+    return sendWhatsAppMessage({ to: outbound.to, message: message.body, tenantId: message.tenantId });
+  }
+  if (message.channel === 'EMAIL') {
+    const { sendEmail } = await import('./email.js');
+    return sendEmail({ to: outbound.to, subject: outbound.subject || 'Re: Your enquiry', text: message.body });
+  }
+  return { success: false, error: `Channel ${message.channel} cannot be dispatched`, retryable: false };
+}
+
+async function rateKey(message: Message) {
+  if (message.channel === 'WHATSAPP') {
+    const { getWhatsAppSessionId } = await import('./whatsapp.js');
+    return { key: `wa:${await getWhatsAppSessionId(message.tenantId)}`, rate: WHATSAPP_RATE };
+  }
+  return { key: 'smtp', rate: EMAIL_RATE };
+}
+
+// `send` is the provider call; the worker always uses sendMessage.
+export async function processMessage(message: Message, send: typeof sendMessage = sendMessage) {
+  const outbound = (message.raw as unknown as OutboundRaw | null)?.outbound;
+  if (!outbound?.to) {
+    await finishFailed(message, 'Missing recipient');
+    return;
+  }
+
+  const { key, rate } = await rateKey(message);
+  for (;;) {
+    const wait = takeToken(buckets, key, rate);
+    if (wait === 0) break;
+    stats.throttled++;
+    if (wait > MAX_THROTTLE_WAIT_MS) {
+      // Hand the row back without spending an attempt.
+      await prisma.message.update({
+        where: { id: message.id },
+        data: { status: 'QUEUED', attempts: { decrement: 1 }, nextAttemptAt: new Date(Date.now() + wait) }
+      });
+      return;
+    }
+    await sleep(wait);
+  }
+
+  const result = await send(message, outbound);
+  if (result.success) {
+    await prisma.message.update({
+      where: { id: message.id },
+      data: {
+        status: 'SENT',
+        providerMessageId: result.messageId ?? null,
+        sentAt: new Date(),
+        nextAttemptAt: null,
+        lastError: null
+      }
+    });
+    stats.sent++;
+    return;
+  }
+
+  const error = String(result.error || 'Send failed').slice(0, 2000);
+  if (result.retryable !== false && message.attempts < MAX_ATTEMPTS) {
+    // A provider's Retry-After (429/503) is the earliest we may try again.
+    const delay = Math.max(
+      computeBackoffMs(message.attempts, { baseMs: BACKOFF_BASE_MS, maxMs: BACKOFF_MAX_MS }),
+      result.retryAfterMs ?? 0
+    );
+    await prisma.message.update({
+      where: { id: message.id },
+      data: { status: 'QUEUED', lastError: error, nextAttemptAt: new Date(Date.now() + delay) }
+    });
+    stats.retried++;
+    console.warn(`[Outbound] Message ${message.id} failed (attempt ${message.attempts}/${MAX_ATTEMPTS}): ${error}`);
+    return;
+  }
+  await finishFailed(message, error, outbound.userId);
+}
+
+async function finishFailed(message: Message, error: string, userId?: string) {
+  await prisma.message.update({
+    where: { id: message.id },
+    data: { status: 'FAILED', lastError: error, nextAttemptAt: null }
+  });
+  stats.failed++;
+  console.error(`[Outbound] Message ${message.id} failed after ${message.attempts} attempt(s): ${error}`);
+
+  await prisma.leadEvent.create({
+    data: {
+      tenantId: message.tenantId,
+      leadId: message.leadId,
+      type: 'MESSAGE_FAILED',
+      payload: { messageId: message.id, channel: message.channel, error }
+    }
+  });
+  if (userId) {
+    await createNotificationForUser({
+      tenantId: message.tenantId,
+      userId,
+      type: 'MESSAGE_FAILED',
+      title: `${message.channel === 'EMAIL' ? 'Email' : 'WhatsApp message'} could not be delivered`,
+      body: error,
+      entityType: 'LEAD',
+      entityId: message.leadId
+    });
+  }
+}
+
+async function workerLoop() {
+  while (running) {
+    let message: Message | null = null;
+    try {
+      message = await claimNextMessage();
+    } catch (error: any) {
+      console.error('[Outbound] Failed to claim message (missing migration?):', error?.message || error);
+      await sleepUntilWoken(POLL_INTERVAL_MS * 5);
+      continue;
+    }
+
+    if (!message) {
+      await sleepUntilWoken(POLL_INTERVAL_MS);
+      continue;
+    }
+
+    try {
+      await processMessage(message);
+    } catch (error: any) {
+      // The lease expires and maintenance puts the row back in the queue.
+      console.error(`[Outbound] Failed to process message ${message.id}:`, error?.message || error);
+    }
+    // A finished message may unblock the next one for the same lead.
+    wakeWorkers();
+  }
+}
+
+async function runMaintenance() {
+  try {
+    const released = await prisma.message.updateMany({
+      where: { status: 'SENDING', nextAttemptAt: { lt: new Date() } },
+      data: { status: 'QUEUED', nextAttemptAt: new Date() }
+    });
+    if (released.count > 0) {
+      console.warn(`[Outbound] Released ${released.count} stale send lock(s)`);
+      wakeWorkers();
+    }
+  } catch (error: any) {
+    console.warn('[Outbound] Maintenance failed (missing migration?):', error?.message || error);
+  }
+}
+
+export function startOutboundDispatcher(options?: { concurrency?: number }) {
+  if (running) return;
+  const concurrency = options?.concurrency ?? WORKER_CONCURRENCY;
+  if (concurrency <= 0) {
+    console.log('[Outbound] Dispatcher disabled (OUTBOUND_WORKER_CONCURRENCY=0)');
+    return;
+  }
+
+  running = true;
+  for (let i = 0; i < concurrency; i++) activeLoops.push(workerLoop());
+  maintenanceTimer = setInterval(runMaintenance, MAINTENANCE_INTERVAL_MS);
+  maintenanceTimer.unref();
+  void runMaintenance();
+
+  console.log(`[Outbound] Started ${concurrency} worker(s)`);
+}
+
+export async function stopOutboundDispatcher() {
+  if (!running) return;
+  running = false;
+  if (maintenanceTimer) clearInterval(maintenanceTimer);
+  maintenanceTimer = null;
+  wakeWorkers();
+  await Promise.allSettled(activeLoops.splice(0));
+}
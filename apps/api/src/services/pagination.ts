@@ -0,0 +1,65 @@
+import { HttpError } from '../http.js';
+
+// Keyset pagination cursors. A cursor is the (timestamp, id) of the last row of the
+// previous page; clients get it as an opaque base64url token.
+
+export type KeysetCursor = { at: Date; id: string };
+
+export function encodeCursor(cursor: KeysetCursor): string {
+  return Buffer.from(JSON.stringify([cursor.at.toISOString(), cursor.id]), 'utf8').toString('base64url');
+}
+
+export function decodeCursor(token: string): KeysetCursor {
+  try {
+    const [at, id] = JSON.parse(Buffer.from(token, 'base64url').toString('utf8'));
+    const date = new Date(at);
+    if (typeof id !== 'string' || !id || Number.isNaN(date.getTime())) throw new Error('bad cursor');
+    return { at: date, id };
+  } catch {
+    throw new HttpError(400, 'Invalid cursor');
+  }
+}
+
+export type KeysetOrder = 'asc' | 'desc';
+
+export function compareKeyset(a: { createdAt: Date; id: string }, b: { createdAt: Date; id: string }) {
+  const diff = a.createdAt.getTime() - b.createdAt.getTime();
+  if (diff !== 0) return diff;
+  return a.id < b.id ? -1 : a.id > b.id ? 1 : 0;
+}
+
+// Rows strictly past `cursor` when reading in (createdAt, id) `order`.
+export function createdAtPast(cursor: KeysetCursor, order: KeysetOrder) {
+  return {
+    OR:
+      order === 'asc'
+        ? [{ createdAt: { gt: cursor.at } }, { createdAt: cursor.at, id: { gt: cursor.id } }]
+        : [{ createdAt: { lt: cursor.at } }, { createdAt: cursor.at, id: { lt: cursor.id } }]
+  };
+}
+
+// k-way merge of per-table pages that are each sorted by (createdAt, id) in `order` and
+// were each read with `take: limit + 1` from the same cursor. The first `limit` merged
+// rows are then exactly the next page of the combined stream; `more` says whether
+// anything follows it.
+export function mergeKeysetPages<T extends { createdAt: Date; id: string }>(
+  sources: T[][],
+  limit: number,
+  order: KeysetOrder
+): { items: T[]; more: boolean } {
+  const sign = order === 'asc' ? 1 : -1;
+  const heads = sources.map(() => 0);
+  const merged: T[] = [];
+
+  while (merged.length <= limit) {
+    let best = -1;
+    for (let s = 0; s < sources.length; s++) {
+      const row = sources[s][heads[s]];
+      if (row && (best < 0 || sign * compareKeyset(row, sources[best][heads[best]]) < 0)) best = s;
+    }
+    if (best < 0) break;
+    merged.push(sources[best][heads[best]++]);
+  }
+
+  return { items: merged.slice(0, limit), more: merged.length > limit };
+}
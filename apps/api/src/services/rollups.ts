@@ -0,0 +1,321 @@
+import { Prisma } from '@prisma/client';
+import type { LeadChannel, SuccessEventType } from '@prisma/client';
+import { prisma } from '../db.js';
+
+// Daily analytics rollups.
+//
+// DailyRollup holds per tenant, UTC day and channel: new leads, inbound/outbound
+// messages and net WON transitions. SuccessDailyRollup holds success event counts and
+// weight per day, type and salesman. Write paths bump counters in memory; they are
+// folded into the tables every ROLLUP_FLUSH_MS with one upsert per touched row, so a
+// busy channel doesn't serialize every message on the same row lock.
+//
+// Analytics endpoints read these tables, so their cost depends on the number of days,
+// not on event volume. `rebuildDailyRollups` recomputes them from source tables
+// (npm run rollups:rebuild, or POST /analytics/rollups/rebuild).
+
+const FLUSH_INTERVAL_MS = Math.max(200, Number(process.env.ROLLUP_FLUSH_MS ?? 1000));
+
+export type DailyCounters = {
+  newLeads: number;
+  messagesIn: number;
+  messagesOut: number;
+  wonLeads: number;
+};
+
+type DailyKey = { tenantId: string; day: string; channel: LeadChannel };
+type SuccessKey = { tenantId: string; day: string; type: SuccessEventType; salesmanId: string };
+
+let dailyBuffer = new Map<string, DailyKey & DailyCounters>();
+let successBuffer = new Map<string, SuccessKey & { count: number; weight: number }>();
+let flushTimer: NodeJS.Timeout | null = null;
+let flushing: Promise<void> | null = null;
+
+export function utcDay(at: Date): string {
+  return at.toISOString().slice(0, 10);
+}
+
+export function bumpDailyRollup(
+  tenantId: string,
+  channel: LeadChannel,
+  delta: Partial<DailyCounters>,
+  at: Date = new Date()
+) {
+  const day = utcDay(at);
+  const key = `${tenantId}|${day}|${channel}`;
+  const row = dailyBuffer.get(key) ?? { tenantId, day, channel, newLeads: 0, messagesIn: 0, messagesOut: 0, wonLeads: 0 };
+  row.newLeads += delta.newLeads ?? 0;
+  row.messagesIn += delta.messagesIn ?? 0;
+  row.messagesOut += delta.messagesOut ?? 0;
+  row.wonLeads += delta.wonLeads ?? 0;
+  dailyBuffer.set(key, row);
+  scheduleFlush();
+}
+
+export function bumpMessageRollup(tenantId: string, channel: LeadChannel, direction: string, at: Date = new Date()) {
+  bumpDailyRollup(tenantId, channel, direction === 'IN' ? { messagesIn: 1 } : { messagesOut: 1 }, at);
+}
+
+// Net WON count: +1 when a lead enters WON, -1 when it leaves it.
+export function bumpStatusRollups(
+  tenantId: string,
+  changes: Array<{ channel: LeadChannel; from: string; to: string }>,
+  at: Date = new Date()
+) {
+  for (const change of changes) {
+    if (change.from === change.to) continue;
+    if (change.to === 'WON') bumpDailyRollup(tenantId, change.channel, { wonLeads: 1 }, at);
+    else if (change.from === 'WON') bumpDailyRollup(tenantId, change.channel, { wonLeads: -1 }, at);
+  }
+}
+
+export function bumpSuccessRollup(
+  tenantId: string,
+  event: { type: SuccessEventType; weight: number; salesmanId: string | null; createdAt: Date }
+) {
+  const day = utcDay(event.createdAt);
+  const salesmanId = event.salesmanId ?? '';
+  const key = `${tenantId}|${day}|${event.type}|${salesmanId}`;
+  const row = successBuffer.get(key) ?? { tenantId, day, type: event.type, salesmanId, count: 0, weight: 0 };
+  row.count += 1;
+  row.weight += event.weight;
+  successBuffer.set(key, row);
+  scheduleFlush();
+}
+
+function scheduleFlush() {
+  if (flushTimer) return;
+  flushTimer = setTimeout(() => {
+    flushTimer = null;
+    void flushRollups();
+  }, FLUSH_INTERVAL_MS);
+  flushTimer.unref();
+}
+
+export async function flushRollups() {
+  while (flushing) await flushing;
+  if (dailyBuffer.size === 0 && successBuffer.size === 0) return;
+
+  const daily = [...dailyBuffer.values()];
+  const success = [...successBuffer.values()];
+  dailyBuffer = new Map();
+  successBuffer = new Map();
+
+  flushing = writeRollups(daily, success).finally(() => {
+    flushing = null;
+  });
+  await flushing;
+}
+
+async function writeRollups(
+  daily: Array<DailyKey & DailyCounters>,
+  success: Array<SuccessKey & { count: number; weight: number }>
+) {
+  try {
+    if (daily.length > 0) {
+      const values = Prisma.join(
+        daily.map(
+          (r) => Prisma.sql`(${r.tenantId}, ${r.day}::date, ${r.channel}::"LeadChannel", ${r.newLeads}::int,
+            ${r.messagesIn}::int, ${r.messagesOut}::int, ${r.wonLeads}::int, NOW())`
+        )
+      );
+      await prisma.$executeRaw`
+        INSERT INTO "DailyRollup" ("tenantId", "day", "channel", "newLeads", "messagesIn", "messagesOut", "wonLeads", "updatedAt")
+        VALUES ${values}
+        ON CONFLICT ("tenantId", "day", "channel") DO UPDATE SET
+          "newLeads" = "DailyRollup"."newLeads" + EXCLUDED."newLeads",
+          "messagesIn" = "DailyRollup"."messagesIn" + EXCLUDED."messagesIn",
+          "messagesOut" = "DailyRollup"."messagesOut" + EXCLUDED."messagesOut",
+          "wonLeads" = "DailyRollup"."wonLeads" + EXCLUDED."wonLeads",
+          "updatedAt" = NOW()
+      `;
+    }
+
+    if (success.length > 0) {
+      const values = Prisma.join(
+        success.map(
+          (r) => Prisma.sql`(${r.tenantId}, ${r.day}::date, ${r.type}::"SuccessEventType", ${r.salesmanId},
+            ${r.count}::int, ${r.weight}::float8, NOW())`
+        )
+      );
+      await prisma.$executeRaw`
+        INSERT INTO "SuccessDailyRollup" ("tenantId", "day", "type", "salesmanId", "count", "weight", "updatedAt")
+        VALUES ${values}
+        ON CONFLICT ("tenantId", "day", "type", "salesmanId") DO UPDATE SET
+          "count" = "SuccessDailyRollup"."count" + EXCLUDED."count",
+          "weight" = "SuccessDailyRollup"."weight" + EXCLUDED."weight",
+          "updatedAt" = NOW()
+      `;
+    }
+  } catch (error: any) {
+    // Counters lost here are restored by a rebuild.
+    console.warn('[Rollups] Failed to write rollups (missing migration?):', error?.message || error);
+  }
+}
+
+// Remove the contribution of leads that are about to be deleted (call inside the
+// deleting transaction, before the rows go). Callers `flushRollups()` before opening
+// the transaction so buffered counters can't re-add the deleted activity afterwards.
+export async function subtractLeadsFromRollups(tx: Prisma.TransactionClient, tenantId: string, leadIds: string[]) {
+  if (leadIds.length === 0) return;
+
+  await tx.$executeRaw`
+    INSERT INTO "DailyRollup" ("tenantId", "day", "channel", "newLeads", "messagesIn", "messagesOut", "wonLeads", "updatedAt")
+    SELECT ${tenantId}::text, x."day", x."channel", -SUM(x."newLeads"), -SUM(x."messagesIn"), -SUM(x."messagesOut"), -SUM(x."wonLeads"), NOW()
+    FROM (
+      SELECT "createdAt"::date AS "day", "channel", COUNT(*)::int AS "newLeads", 0 AS "messagesIn", 0 AS "messagesOut", 0 AS "wonLeads"
+      FROM "Lead" WHERE "tenantId" = ${tenantId} AND "id" = ANY(${leadIds}::text[])
+      GROUP BY 1, 2
+      UNION ALL
+      SELECT "wonAt"::date, "channel", 0, 0, 0, COUNT(*)::int
+      FROM "Lead" WHERE "tenantId" = ${tenantId} AND "id" = ANY(${leadIds}::text[]) AND "status" = 'WON' AND "wonAt" IS NOT NULL
+      GROUP BY 1, 2
+      UNION ALL
+      SELECT "createdAt"::date, "channel", 0,
+             COUNT(*) FILTER (WHERE "direction" = 'IN')::int,
+             COUNT(*) FILTER (WHERE "direction" <> 'IN')::int,
+             0
+      FROM "Message" WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[])
+      GROUP BY 1, 2
+    ) x
+    GROUP BY x."day", x."channel"
+    ON CONFLICT ("tenantId", "day", "channel") DO UPDATE SET
+      "newLeads" = "DailyRollup"."newLeads" + EXCLUDED."newLeads",
+      "messagesIn" = "DailyRollup"."messagesIn" + EXCLUDED."messagesIn",
+      "messagesOut" = "DailyRollup"."messagesOut" + EXCLUDED."messagesOut",
+      "wonLeads" = "DailyRollup"."wonLeads" + EXCLUDED."wonLeads",
+      "updatedAt" = NOW()
+  `;
+
+  await tx.$executeRaw`
+    INSERT INTO "SuccessDailyRollup" ("tenantId", "day", "type", "salesmanId", "count", "weight", "updatedAt")
+    SELECT ${tenantId}::text, "createdAt"::date, "type", COALESCE("salesmanId", ''), -COUNT(*)::int, -COALESCE(SUM("weight"), 0), NOW()
+    FROM "SuccessEvent"
+    WHERE "tenantId" = ${tenantId} AND "leadId" = ANY(${leadIds}::text[])
+    GROUP BY 2, 3, 4
+    ON CONFLICT ("tenantId", "day", "type", "salesmanId") DO UPDATE SET
+      "count" = "SuccessDailyRollup"."count" + EXCLUDED."count",
+      "weight" = "SuccessDailyRollup"."weight" + EXCLUDED."weight",
+      "updatedAt" = NOW()
+  `;
+}
+
+// Recompute a tenant's rollups from Lead, Message and SuccessEvent. WON leads are
+// attributed to the day they entered WON ("wonAt"), like the incremental path.
+export async function rebuildDailyRollups(tenantId: string) {
+  await flushRollups();
+
+  const [, daily, , success] = await prisma.$transaction([
+    prisma.$executeRaw`DELETE FROM "DailyRollup" WHERE "tenantId" = ${tenantId}`,
+    prisma.$executeRaw`
+      INSERT INTO "DailyRollup" ("tenantId", "day", "channel", "newLeads", "messagesIn", "messagesOut", "wonLeads", "updatedAt")
+      SELECT ${tenantId}::text, x."day", x."channel", SUM(x."newLeads"), SUM(x."messagesIn"), SUM(x."messagesOut"), SUM(x."wonLeads"), NOW()
+      FROM (
+        SELECT "createdAt"::date AS "day", "channel", COUNT(*)::int AS "newLeads", 0 AS "messagesIn", 0 AS "messagesOut", 0 AS "wonLeads"
+        FROM "Lead" WHERE "tenantId" = ${tenantId}
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT "wonAt"::date, "channel", 0, 0, 0, COUNT(*)::int
+        FROM "Lead" WHERE "tenantId" = ${tenantId} AND "status" = 'WON' AND "wonAt" IS NOT NULL
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT "createdAt"::date, "channel", 0,
+               COUNT(*) FILTER (WHERE "direction" = 'IN')::int,
+               COUNT(*) FILTER (WHERE "direction" <> 'IN')::int,
+               0
+        FROM "Message" WHERE "tenantId" = ${tenantId}
+        GROUP BY 1, 2
+      ) x
+      GROUP BY x."day", x."channel"
+    `,
+    prisma.$executeRaw`DELETE FROM "SuccessDailyRollup" WHERE "tenantId" = ${tenantId}`,
+    prisma.$executeRaw`
+      INSERT INTO "SuccessDailyRollup" ("tenantId", "day", "type", "salesmanId", "count", "weight", "updatedAt")
+      SELECT ${tenantId}::text, "createdAt"::date, "type", COALESCE("salesmanId", ''), COUNT(*)::int, COALESCE(SUM("weight"), 0), NOW()
+      FROM "SuccessEvent"
+      WHERE "tenantId" = ${tenantId}
+      GROUP BY 2, 3, 4
+    `
+  ]);
+
+  return { dailyRows: daily, successRows: success };
+}
+
+export async function getDailyTimeSeries(tenantId: string, sinceDay: string) {
+  const [daily, success] = await Promise.all([
+    prisma.$queryRaw<Array<DailyCounters & { day: Date }>>`
+      SELECT "day", SUM("newLeads")::int AS "newLeads", SUM("messagesIn")::int AS "messagesIn",
+             SUM("messagesOut")::int AS "messagesOut", SUM("wonLeads")::int AS "wonLeads"
+      FROM "DailyRollup"
+      WHERE "tenantId" = ${tenantId} AND "day" >= ${sinceDay}::date
+      GROUP BY "day"
+    `,
+    prisma.$queryRaw<Array<{ day: Date; count: number; weight: number }>>`
+      SELECT "day", SUM("count")::int AS "count", SUM("weight")::float8 AS "weight"
+      FROM "SuccessDailyRollup"
+      WHERE "tenantId" = ${tenantId} AND "day" >= ${sinceDay}::date
+      GROUP BY "day"
+    `
+  ]);
+
+  const byDay = new Map<
+    string,
+    { date: string; newLeads: number; messagesIn: number; messagesOut: number; successEvents: number; successWeight: number }
+  >();
+  const entry = (day: Date) => {
+    const date = utcDay(day);
+    let row = byDay.get(date);
+    if (!row) {
+      row = { date, newLeads: 0, messagesIn: 0, messagesOut: 0, successEvents: 0, successWeight: 0 };
+      byDay.set(date, row);
+    }
+    return row;
+  };
+
+  for (const r of daily) {
+    const row = entry(r.day);
+    row.newLeads += r.newLeads;
+    row.messagesIn += r.messagesIn;
+    row.messagesOut += r.messagesOut;
+  }
+  for (const r of success) {
+    const row = entry(r.day);
+    row.successEvents += r.count;
+    row.successWeight += r.weight;
+  }
+
+  // Days whose counters were all cancelled out by deletes carry no activity.
+  return [...byDay.values()]
+    .filter((r) => r.newLeads || r.messagesIn || r.messagesOut || r.successEvents)
+    .sort((a, b) => a.date.localeCompare(b.date));
+}
+
+export async function getChannelTotals(tenantId: string) {
+  const rows = await prisma.$queryRaw<Array<{ channel: LeadChannel; total: number; won: number }>>`
+    SELECT "channel", SUM("newLeads")::int AS "total", SUM("wonLeads")::int AS "won"
+    FROM "DailyRollup"
+    WHERE "tenantId" = ${tenantId}
+    GROUP BY "channel"
+  `;
+  return rows.filter((r) => r.total > 0);
+}
+
+export async function getSuccessTotals(tenantId: string, sinceDay: string) {
+  const [byType, bySalesman] = await Promise.all([
+    prisma.$queryRaw<Array<{ type: SuccessEventType; count: number; weight: number }>>`
+      SELECT "type", SUM("count")::int AS "count", SUM("weight")::float8 AS "weight"
+      FROM "SuccessDailyRollup"
+      WHERE "tenantId" = ${tenantId} AND "day" >= ${sinceDay}::date
+      GROUP BY "type"
+      HAVING SUM("count") > 0
+    `,
+    prisma.$queryRaw<Array<{ salesmanId: string; count: number; weight: number }>>`
+      SELECT "salesmanId", SUM("count")::int AS "count", SUM("weight")::float8 AS "weight"
+      FROM "SuccessDailyRollup"
+      WHERE "tenantId" = ${tenantId} AND "day" >= ${sinceDay}::date AND "salesmanId" <> ''
+      GROUP BY "salesmanId"
+      HAVING SUM("count") > 0
+    `
+  ]);
+  return { byType, bySalesman };
+}
@@ -1,4 +1,5 @@
-import type { PrismaClient } from '@prisma/client'
+import type { AssignmentConfig, PrismaClient, Salesman } from '@prisma/client'
+import { getSalesmanPool, reserveSalesmanSlot, type SalesmanPool, type SalesmanReservation } from './loadLedger.js'
 
 function stableHash(input: string): number {
   // Small deterministic hash for tie-breaking; not crypto.
@@ -10,16 +11,19 @@ function stableHash(input: string): number {
   return hash >>> 0
 }
 
-// Pick salesman based on assignment configuration
+// Pick salesman based on assignment configuration.
+// Loads come from the in-memory ledger (services/loadLedger.ts); no per-pick groupBy.
 export async function pickSalesmanWithConfig(
   prisma: PrismaClient,
   tenantId: string,
   opts?: { seed?: string }
 ) {
-  // Get assignment config
-  const config = await prisma.assignmentConfig.findUnique({
-    where: { tenantId }
-  });
+  const pool = await getSalesmanPool(prisma, tenantId);
+  return chooseWithConfig(pool, opts);
+}
+
+function chooseWithConfig(pool: SalesmanPool, opts?: { seed?: string }) {
+  const config = pool.config;
 
   if (!config || !config.autoAssign) {
     return null; // Manual assignment required
@@ -29,57 +33,27 @@ export async function pickSalesmanWithConfig(
 
   switch (strategy) {
     case 'ROUND_ROBIN':
-      return pickSalesmanRoundRobinInternal(prisma, tenantId, config, opts);
+      return chooseRoundRobin(pool, config, opts);
     case 'LEAST_ACTIVE':
-      return pickSalesmanLeastActive(prisma, tenantId, config, opts);
+      return chooseLeastActive(pool, config, opts);
     case 'SKILLS_BASED':
     case 'GEOGRAPHIC':
     case 'CUSTOM':
       // For now, fall back to weighted logic
-      return pickSalesmanRoundRobinInternal(prisma, tenantId, config, opts);
+      return chooseRoundRobin(pool, config, opts);
     default:
-      return pickSalesmanRoundRobinInternal(prisma, tenantId, config, opts);
+      return chooseRoundRobin(pool, config, opts);
   }
 }
 
 // Round-robin with optional capacity and score consideration
-async function pickSalesmanRoundRobinInternal(
-  prisma: PrismaClient,
-  tenantId: string,
-  config: any,
-  opts?: { seed?: string }
-) {
-  const salesmen = await prisma.salesman.findMany({
-    where: { tenantId, isActive: true },
-    orderBy: { createdAt: 'asc' },
-    take: 200
-  });
-
-  if (salesmen.length === 0) return null;
-
-  // Compute active load per salesman
-  const loadRows = await prisma.lead.groupBy({
-    by: ['assignedToSalesmanId'],
-    where: {
-      tenantId,
-      assignedToSalesmanId: { not: null },
-      status: { notIn: ['WON', 'LOST'] }
-    },
-    _count: { _all: true }
-  });
-
-  const loadBySalesmanId = new Map<string, number>();
-  for (const row of loadRows) {
-    if (!row.assignedToSalesmanId) continue;
-    loadBySalesmanId.set(row.assignedToSalesmanId, row._count._all);
-  }
-
+function chooseRoundRobin(pool: SalesmanPool, config: AssignmentConfig, opts?: { seed?: string }) {
   const seed = opts?.seed ?? '';
-  let best: (typeof salesmen)[number] | null = null;
+  let best: Salesman | null = null;
   let bestWeight = -Infinity;
 
-  for (const s of salesmen) {
-    const load = loadBySalesmanId.get(s.id) ?? 0;
+  for (const s of pool.salesmen) {
+    const load = pool.loadOf(s.id);
 
     // Check capacity if enabled
     if (config.considerCapacity && s.capacity > 0 && load >= s.capacity) {
@@ -105,43 +79,13 @@ async function pickSalesmanRoundRobinInternal(
 }
 
 // Least active strategy - assign to salesman with fewest active leads
-async function pickSalesmanLeastActive(
-  prisma: PrismaClient,
-  tenantId: string,
-  config: any,
-  opts?: { seed?: string }
-) {
-  const salesmen = await prisma.salesman.findMany({
-    where: { tenantId, isActive: true },
-    orderBy: { createdAt: 'asc' },
-    take: 200
-  });
-
-  if (salesmen.length === 0) return null;
-
-  // Compute active load per salesman
-  const loadRows = await prisma.lead.groupBy({
-    by: ['assignedToSalesmanId'],
-    where: {
-      tenantId,
-      assignedToSalesmanId: { not: null },
-      status: { notIn: ['WON', 'LOST'] }
-    },
-    _count: { _all: true }
-  });
-
-  const loadBySalesmanId = new Map<string, number>();
-  for (const row of loadRows) {
-    if (!row.assignedToSalesmanId) continue;
-    loadBySalesmanId.set(row.assignedToSalesmanId, row._count._all);
-  }
-
+function chooseLeastActive(pool: SalesmanPool, config: AssignmentConfig, opts?: { seed?: string }) {
   const seed = opts?.seed ?? '';
-  let best: (typeof salesmen)[number] | null = null;
+  let best: Salesman | null = null;
   let leastLoad = Infinity;
 
-  for (const s of salesmen) {
-    const load = loadBySalesmanId.get(s.id) ?? 0;
+  for (const s of pool.salesmen) {
+    const load = pool.loadOf(s.id);
 
     // Check capacity if enabled
     if (config.considerCapacity && s.capacity > 0 && load >= s.capacity) {
@@ -170,37 +114,17 @@ export async function pickSalesmanWeighted(
   tenantId: string,
   opts?: { seed?: string }
 ) {
-  const salesmen = await prisma.salesman.findMany({
-    where: { tenantId, isActive: true },
-    orderBy: { createdAt: 'asc' },
-    take: 200
-  })
-
-  if (salesmen.length === 0) return null
-
-  // Compute active load per salesman (assigned leads that aren't closed).
-  const loadRows = await prisma.lead.groupBy({
-    by: ['assignedToSalesmanId'],
-    where: {
-      tenantId,
-      assignedToSalesmanId: { not: null },
-      status: { notIn: ['WON', 'LOST'] }
-    },
-    _count: { _all: true }
-  })
-
-  const loadBySalesmanId = new Map<string, number>()
-  for (const row of loadRows) {
-    if (!row.assignedToSalesmanId) continue
-    loadBySalesmanId.set(row.assignedToSalesmanId, row._count._all)
-  }
+  const pool = await getSalesmanPool(prisma, tenantId)
+  return chooseWeighted(pool, opts)
+}
 
+function chooseWeighted(pool: SalesmanPool, opts?: { seed?: string }) {
   const seed = opts?.seed ?? ''
-  let best: (typeof salesmen)[number] | null = null
+  let best: Salesman | null = null
   let bestWeight = -Infinity
 
-  for (const s of salesmen) {
-    const load = loadBySalesmanId.get(s.id) ?? 0
+  for (const s of pool.salesmen) {
+    const load = pool.loadOf(s.id)
 
     // If capacity is set (>0), treat it as a hard cap.
     if (s.capacity > 0 && load >= s.capacity) continue
@@ -225,10 +149,22 @@ export async function pickSalesmanWeighted(
 
 // Backwards-compatible name used by routes; now uses config
 export async function pickSalesmanRoundRobin(prisma: PrismaClient, tenantId: string, seed?: string) {
-  // First try config-based picker
-  const withConfig = await pickSalesmanWithConfig(prisma, tenantId, { seed });
-  if (withConfig) return withConfig;
-  
-  // Fall back to weighted picker
-  return pickSalesmanWeighted(prisma, tenantId, { seed })
+  const pool = await getSalesmanPool(prisma, tenantId)
+  // First try config-based picker, then fall back to weighted picker
+  return chooseWithConfig(pool, { seed }) ?? chooseWeighted(pool, { seed })
+}
+
+// Same pick as pickSalesmanRoundRobin, but the slot is reserved in the load ledger before
+// returning, so concurrent assignments see it. Call `reservation.commit()` once the
+// assignment is written, `reservation.release()` if it wasn't.
+export async function reserveSalesmanRoundRobin(
+  prisma: PrismaClient,
+  tenantId: string,
+  seed?: string
+): Promise<{ salesman: Salesman; reservation: SalesmanReservation } | null> {
+  const pool = await getSalesmanPool(prisma, tenantId)
+  // No await between the pick and the reservation.
+  const salesman = chooseWithConfig(pool, { seed }) ?? chooseWeighted(pool, { seed })
+  if (!salesman) return null
+  return { salesman, reservation: reserveSalesmanSlot(tenantId, salesman.id) }
 }
@@ -1,4 +1,5 @@
 import type { PrismaClient } from '@prisma/client'
+import { invalidateSalesmanRoster } from './loadLedger.js'
 
 export type ScoreUpdate = {
   salesmanId: string
@@ -53,6 +54,7 @@ export async function recomputeSalesmanScores(
       })
     )
   )
+  invalidateSalesmanRoster(tenantId)
 
   return updates
 }
@@ -1,10 +1,43 @@
-import type { PrismaClient } from '@prisma/client';
+import type { Role, SlaRule } from '@prisma/client';
 import { prisma } from '../db.js';
+import { applyLeadOwnershipChanges } from './loadLedger.js';
+import { heapPop, heapPush } from './minHeap.js';
+import { createNotifications } from './notifications.js';
+import type { NotificationInput } from './notifications.js';
+
+// SLA engine.
+//
+// Rules: each tenant's rules are cached in memory, grouped by trigger, with the matching
+// set memoized per (trigger, status, heat, channel). /sla/rules writes invalidate the
+// tenant; SLA_RULE_CACHE_TTL_MS bounds staleness for writes made by other instances.
+// An inbound message costs a couple of Map lookups and, for tenants without rules, no
+// query at all.
+//
+// Violations: matches are buffered and inserted every SLA_FLUSH_MS with one createMany.
+// A lead/rule pair with a clock already running (PENDING) is not started again. An
+// outbound message on the lead marks its pending violations RESPONDED, and drops any
+// that were still buffered.
+//
+// Breaches: violations this instance creates go on an in-memory min-heap keyed by due
+// time, with one timer armed for the earliest. Every SLA_SWEEP_INTERVAL_MS a sweep walks
+// (status, dueAt) and (status, escalateAt) in batches of SLA_SWEEP_BATCH_SIZE, handles
+// whatever is overdue, and puts whatever comes due before the next sweep on the heap.
+// Breaches fire within seconds either way. Each transition is claimed with a conditional
+// UPDATE ... RETURNING, so several instances never notify twice.
+
+const RULE_CACHE_TTL_MS = Math.max(1000, Number(process.env.SLA_RULE_CACHE_TTL_MS ?? 60_000));
+const FLUSH_DELAY_MS = Math.max(50, Number(process.env.SLA_FLUSH_MS ?? 500));
+const SWEEP_INTERVAL_MS = Math.max(1000, Number(process.env.SLA_SWEEP_INTERVAL_MS ?? 30_000));
+const SWEEP_BATCH_SIZE = Math.max(50, Number(process.env.SLA_SWEEP_BATCH_SIZE ?? 500));
+// Beyond this many scheduled items, the rest wait for the sweep.
+const MAX_SCHEDULED = 50_000;
+
+export type SlaTrigger = 'NEW_LEAD' | 'MESSAGE_RECEIVED' | 'TRIAGE_ESCALATED' | 'LEAD_ASSIGNED';
 
 export type SlaRuleCreateInput = {
   name: string;
   description?: string;
-  triggerOn: 'NEW_LEAD' | 'MESSAGE_RECEIVED' | 'TRIAGE_ESCALATED' | 'LEAD_ASSIGNED';
+  triggerOn: SlaTrigger;
   leadStatus?: string;
   leadHeat?: string;
   channel?: string;
@@ -15,146 +48,537 @@ export type SlaRuleCreateInput = {
   autoReassign?: boolean;
 };
 
+type LeadConditions = { status: string; heat: string; channel: string };
+
+type RuleIndex = {
+  // Every rule of the tenant, active or not, by id.
+  rules: Map<string, SlaRule>;
+  byTrigger: Map<string, SlaRule[]>;
+  matches: Map<string, SlaRule[]>;
+  expiresAt: number;
+};
+
+const ruleIndexes = new Map<string, RuleIndex>();
+const ruleLoads = new Map<string, Promise<RuleIndex>>();
+const ruleVersions = new Map<string, number>();
+
+async function loadRuleIndex(tenantId: string): Promise<RuleIndex> {
+  const rules = await prisma.slaRule.findMany({ where: { tenantId }, orderBy: { createdAt: 'asc' } });
+  const byTrigger = new Map<string, SlaRule[]>();
+  for (const rule of rules) {
+    if (!rule.isActive) continue;
+    const list = byTrigger.get(rule.triggerOn) ?? [];
+    list.push(rule);
+    byTrigger.set(rule.triggerOn, list);
+  }
+  return {
+    rules: new Map(rules.map((r) => [r.id, r])),
+    byTrigger,
+    matches: new Map(),
+    expiresAt: Date.now() + RULE_CACHE_TTL_MS
+  };
+}
+
+async function getRuleIndex(tenantId: string): Promise<RuleIndex> {
+  const cached = ruleIndexes.get(tenantId);
+  if (cached && cached.expiresAt > Date.now()) return cached;
+
+  let load = ruleLoads.get(tenantId);
+  if (!load) {
+    const version = ruleVersions.get(tenantId) ?? 0;
+    load = loadRuleIndex(tenantId).finally(() => {
+      if (ruleLoads.get(tenantId) === load) ruleLoads.delete(tenantId);
+    });
+    ruleLoads.set(tenantId, load);
+    // A rule write during the load makes this result stale; serve it once, don't cache it.
+    void load.then(
+      (index) => {
+        if ((ruleVersions.get(tenantId) ?? 0) === version) ruleIndexes.set(tenantId, index);
+      },
+      () => {}
+    );
+  }
+  return load;
+}
+
+export function invalidateSlaRules(tenantId: string) {
+  ruleIndexes.delete(tenantId);
+  ruleLoads.delete(tenantId);
+  ruleVersions.set(tenantId, (ruleVersions.get(tenantId) ?? 0) + 1);
+}
+
+function matchRules(index: RuleIndex, trigger: SlaTrigger, lead: LeadConditions): SlaRule[] {
+  const key = `${trigger}|${lead.status}|${lead.heat}|${lead.channel}`;
+  let matched = index.matches.get(key);
+  if (!matched) {
+    matched = (index.byTrigger.get(trigger) ?? []).filter((rule) => {
+      if (rule.leadStatus && rule.leadStatus !== lead.status) return false;
+      if (rule.leadHeat && rule.leadHeat !== lead.heat) return false;
+      if (rule.channel && rule.channel !== lead.channel) return false;
+      return true;
+    });
+    index.matches.set(key, matched);
+  }
+  return matched;
+}
+
 // Create SLA rule
 export async function createSlaRule(
   tenantId: string,
   input: SlaRuleCreateInput
 ) {
-  return prisma.slaRule.create({
+  const rule = await prisma.slaRule.create({
     data: {
       tenantId,
       ...input
     }
   });
+  invalidateSlaRules(tenantId);
+  return rule;
 }
 
+type BufferedViolation = {
+  tenantId: string;
+  slaRuleId: string;
+  leadId: string;
+  triggeredAt: Date;
+  dueAt: Date;
+  escalateAt: Date | null;
+};
+
+// `${leadId}|${ruleId}` → first trigger since the last flush.
+let buffer = new Map<string, BufferedViolation>();
+let flushTimer: NodeJS.Timeout | null = null;
+let flushing: Promise<void> | null = null;
+
 // Trigger SLA monitoring for a lead event
 export async function triggerSlaMonitoring(params: {
   tenantId: string;
   leadId: string;
-  event: 'NEW_LEAD' | 'MESSAGE_RECEIVED' | 'TRIAGE_ESCALATED' | 'LEAD_ASSIGNED';
-  lead?: {
-    status: string;
-    heat: string;
-    channel: string;
-  };
+  event: SlaTrigger;
+  lead?: LeadConditions;
 }): Promise<void> {
   const { tenantId, leadId, event } = params;
 
-  // Find applicable SLA rules
-  const rules = await prisma.slaRule.findMany({
-    where: {
-      tenantId,
-      isActive: true,
-      triggerOn: event
-    }
-  });
-
-  if (rules.length === 0) return;
+  const index = await getRuleIndex(tenantId);
+  if (!index.byTrigger.has(event)) return;
 
   // Get lead details if not provided
   const lead = params.lead || await prisma.lead.findUnique({
     where: { id: leadId },
     select: { status: true, heat: true, channel: true }
   });
-
   if (!lead) return;
 
-  // Filter rules by lead conditions
-  const applicableRules = rules.filter(rule => {
-    if (rule.leadStatus && rule.leadStatus !== lead.status) return false;
-    if (rule.leadHeat && rule.leadHeat !== lead.heat) return false;
-    if (rule.channel && rule.channel !== lead.channel) return false;
-    return true;
+  const now = new Date();
+  for (const rule of matchRules(index, event, lead)) {
+    const key = `${leadId}|${rule.id}`;
+    if (buffer.has(key)) continue;
+    const dueAt = new Date(now.getTime() + rule.responseTimeMinutes * 60 * 1000);
+    buffer.set(key, {
+      tenantId,
+      slaRuleId: rule.id,
+      leadId,
+      triggeredAt: now,
+      dueAt,
+      escalateAt: rule.escalationTimeMinutes
+        ? new Date(dueAt.getTime() + rule.escalationTimeMinutes * 60 * 1000)
+        : null
+    });
+  }
+  if (buffer.size > 0) scheduleFlush();
+}
+
+function scheduleFlush() {
+  if (flushTimer) return;
+  flushTimer = setTimeout(() => {
+    flushTimer = null;
+    void flushSlaViolations();
+  }, FLUSH_DELAY_MS);
+  flushTimer.unref();
+}
+
+export async function flushSlaViolations() {
+  while (flushing) await flushing;
+  if (buffer.size === 0) return;
+
+  const rows = [...buffer.values()];
+  buffer = new Map();
+  flushing = insertViolations(rows).finally(() => {
+    flushing = null;
   });
+  await flushing;
+}
 
-  const now = new Date();
+async function insertViolations(rows: BufferedViolation[]) {
+  try {
+    const byTenant = new Map<string, BufferedViolation[]>();
+    for (const row of rows) {
+      const list = byTenant.get(row.tenantId) ?? [];
+      list.push(row);
+      byTenant.set(row.tenantId, list);
+    }
 
-  // Create SLA violations for each applicable rule
-  for (const rule of applicableRules) {
-    const dueAt = new Date(now.getTime() + rule.responseTimeMinutes * 60 * 1000);
+    const fresh: BufferedViolation[] = [];
+    for (const [tenantId, tenantRows] of byTenant) {
+      // A lead/rule pair whose clock is already running keeps its original due time.
+      const running = await prisma.slaViolation.findMany({
+        where: { tenantId, leadId: { in: [...new Set(tenantRows.map((r) => r.leadId))] }, status: 'PENDING' },
+        select: { leadId: true, slaRuleId: true }
+      });
+      const open = new Set(running.map((v) => `${v.leadId}|${v.slaRuleId}`));
+      fresh.push(...tenantRows.filter((r) => !open.has(`${r.leadId}|${r.slaRuleId}`)));
+    }
+    if (fresh.length === 0) return;
 
-    await prisma.slaViolation.create({
-      data: {
-        tenantId,
-        slaRuleId: rule.id,
-        leadId,
-        triggeredAt: now,
-        dueAt,
-        status: 'PENDING'
-      }
+    const created = await prisma.slaViolation.createManyAndReturn({
+      data: fresh.map((row) => ({ ...row, status: 'PENDING' })),
+      select: { id: true, dueAt: true }
     });
+    for (const violation of created) schedule(violation.id, 'BREACH', violation.dueAt);
+  } catch (error: any) {
+    console.warn(`[SLA] Failed to record ${rows.length} violation(s) (missing migration?):`, error?.message || error);
   }
 }
 
-// Check and process SLA violations (run periodically)
-export async function processSlaViolations(): Promise<void> {
-  const now = new Date();
+// Mark SLA as responded (on any outbound message to the lead)
+export async function markSlaResponded(tenantId: string, leadId: string): Promise<void> {
+  for (const key of buffer.keys()) {
+    if (key.startsWith(`${leadId}|`)) buffer.delete(key);
+  }
+  // Violations already on their way into the table must land before we answer them.
+  while (flushing) await flushing;
 
-  // Find all pending violations that are past due
-  const violations = await prisma.slaViolation.findMany({
+  const index = await getRuleIndex(tenantId);
+  if (index.rules.size === 0) return;
+
+  await prisma.slaViolation.updateMany({
     where: {
-      status: 'PENDING',
-      dueAt: {
-        lte: now
-      }
+      tenantId,
+      leadId,
+      status: 'PENDING'
     },
-    include: {
-      slaRule: true,
-      lead: {
-        include: {
-          assignee: {
-            include: {
-              user: true
-            }
-          }
+    data: {
+      status: 'RESPONDED',
+      respondedAt: new Date()
+    }
+  });
+}
+
+type DueKind = 'BREACH' | 'ESCALATE';
+type DueItem = { at: number; id: string; kind: DueKind };
+
+// Min-heap on `at` (services/minHeap.ts).
+const heap: DueItem[] = [];
+const scheduled = new Set<string>();
+let dueTimer: NodeJS.Timeout | null = null;
+let dueTimerAt = Infinity;
+let ticking: Promise<void> | null = null;
+let sweepTimer: NodeJS.Timeout | null = null;
+let sweeping = false;
+
+function schedule(id: string, kind: DueKind, at: Date) {
+  const key = `${kind}|${id}`;
+  if (scheduled.has(key) || scheduled.size >= MAX_SCHEDULED) return;
+  scheduled.add(key);
+  heapPush(heap, { at: at.getTime(), id, kind });
+  armDueTimer();
+}
+
+function armDueTimer() {
+  if (heap.length === 0 || ticking) return;
+  const at = heap[0].at;
+  if (dueTimer && dueTimerAt <= at) return;
+  if (dueTimer) clearTimeout(dueTimer);
+  dueTimerAt = at;
+  // setTimeout overflows past ~24.8 days; the sweep re-arms long before that.
+  dueTimer = setTimeout(() => {
+    dueTimer = null;
+    dueTimerAt = Infinity;
+    void runDue();
+  }, Math.min(Math.max(0, at - Date.now()), SWEEP_INTERVAL_MS));
+  dueTimer.unref();
+}
+
+async function runDue() {
+  if (ticking) return;
+  ticking = (async () => {
+    const now = Date.now();
+    const breaches: string[] = [];
+    const escalations: string[] = [];
+    while (heap.length > 0 && heap[0].at <= now && breaches.length + escalations.length < SWEEP_BATCH_SIZE) {
+      const item = heapPop(heap) as DueItem;
+      scheduled.delete(`${item.kind}|${item.id}`);
+      (item.kind === 'BREACH' ? breaches : escalations).push(item.id);
+    }
+    await processBreaches(breaches);
+    await processEscalations(escalations);
+  })().finally(() => {
+    ticking = null;
+  });
+  await ticking;
+  armDueTimer();
+}
+
+// Walk overdue and soon-due violations in bounded batches.
+export async function sweepSlaViolations() {
+  if (sweeping) return;
+  sweeping = true;
+  try {
+    const horizon = new Date(Date.now() + SWEEP_INTERVAL_MS);
+    for (const kind of ['BREACH', 'ESCALATE'] as const) {
+      let after: { at: Date; id: string } | null = null;
+      for (;;) {
+        const keyset: { at: Date; id: string } | null = after;
+        const page: Array<{ id: string; at: Date | null }> =
+          kind === 'BREACH'
+            ? (
+                await prisma.slaViolation.findMany({
+                  where: {
+                    status: 'PENDING',
+                    dueAt: { lte: horizon },
+                    ...(keyset
+                      ? { OR: [{ dueAt: { gt: keyset.at } }, { dueAt: keyset.at, id: { gt: keyset.id } }] }
+                      : {})
+                  },
+                  orderBy: [{ dueAt: 'asc' }, { id: 'asc' }],
+                  take: SWEEP_BATCH_SIZE,
+                  select: { id: true, dueAt: true }
+                })
+              ).map((v) => ({ id: v.id, at: v.dueAt }))
+            : (
+                await prisma.slaViolation.findMany({
+                  where: {
+                    status: 'BREACHED',
+                    escalateAt: { lte: horizon },
+                    ...(keyset
+                      ? { OR: [{ escalateAt: { gt: keyset.at } }, { escalateAt: keyset.at, id: { gt: keyset.id } }] }
+                      : {})
+                  },
+                  orderBy: [{ escalateAt: 'asc' }, { id: 'asc' }],
+                  take: SWEEP_BATCH_SIZE,
+                  select: { id: true, escalateAt: true }
+                })
+              ).map((v) => ({ id: v.id, at: v.escalateAt }));
+        if (page.length === 0) break;
+
+        const now = Date.now();
+        const due: string[] = [];
+        for (const row of page) {
+          if (!row.at) continue;
+          if (row.at.getTime() <= now) due.push(row.id);
+          else schedule(row.id, kind, row.at);
         }
+        if (kind === 'BREACH') await processBreaches(due);
+        else await processEscalations(due);
+
+        const last = page[page.length - 1];
+        after = last.at ? { at: last.at, id: last.id } : null;
+        if (page.length < SWEEP_BATCH_SIZE || !after) break;
       }
     }
+  } catch (error: any) {
+    console.warn('[SLA] Sweep failed (missing migration?):', error?.message || error);
+  } finally {
+    sweeping = false;
+  }
+}
+
+type ClaimedViolation = {
+  id: string;
+  tenantId: string;
+  slaRuleId: string;
+  leadId: string;
+  breachMinutes: number | null;
+  escalateAt: Date | null;
+};
+
+async function loadViolationContext(claimed: ClaimedViolation[]) {
+  const [rules, leads] = await Promise.all([
+    prisma.slaRule.findMany({ where: { id: { in: [...new Set(claimed.map((v) => v.slaRuleId))] } } }),
+    prisma.lead.findMany({
+      where: { id: { in: [...new Set(claimed.map((v) => v.leadId))] } },
+      select: { id: true, fullName: true, phone: true, status: true, assignedToSalesmanId: true }
+    })
+  ]);
+  return {
+    rules: new Map(rules.map((r) => [r.id, r])),
+    leads: new Map(leads.map((l) => [l.id, l]))
+  };
+}
+
+// Active users per tenant and role, for everyone these violations need to reach.
+async function loadRecipients(wanted: Array<{ tenantId: string; roles: string[] }>) {
+  const tenantIds = [...new Set(wanted.map((w) => w.tenantId))];
+  const roles = [...new Set(wanted.flatMap((w) => w.roles))] as Role[];
+  if (tenantIds.length === 0 || roles.length === 0) return new Map<string, string[]>();
+
+  const users = await prisma.user.findMany({
+    where: { tenantId: { in: tenantIds }, active: true, role: { in: roles } },
+    select: { id: true, tenantId: true, role: true }
   });
+  const byTenantRole = new Map<string, string[]>();
+  for (const user of users) {
+    const key = `${user.tenantId}|${user.role}`;
+    const list = byTenantRole.get(key) ?? [];
+    list.push(user.id);
+    byTenantRole.set(key, list);
+  }
+  return byTenantRole;
+}
 
-  for (const violation of violations) {
-    const breachMinutes = Math.floor((now.getTime() - violation.dueAt.getTime()) / (1000 * 60));
+async function processBreaches(ids: string[]) {
+  if (ids.length === 0) return;
+  try {
+    const claimed = await prisma.$queryRaw<ClaimedViolation[]>`
+      UPDATE "SlaViolation"
+      SET "status" = 'BREACHED',
+          "breachMinutes" = GREATEST(0, FLOOR(EXTRACT(EPOCH FROM (NOW() - "dueAt")) / 60))::int,
+          "notificationsSent" = "notificationsSent" + 1,
+          "updatedAt" = NOW()
+      WHERE "id" = ANY(${ids}::text[]) AND "status" = 'PENDING'
+      RETURNING "id", "tenantId", "slaRuleId", "leadId", "breachMinutes", "escalateAt"
+    `;
+    if (claimed.length === 0) return;
+
+    const { rules, leads } = await loadViolationContext(claimed);
+    const recipients = await loadRecipients(
+      claimed.map((v) => ({ tenantId: v.tenantId, roles: rules.get(v.slaRuleId)?.notifyRoles ?? [] }))
+    );
 
-    // Mark as breached
-    await prisma.slaViolation.update({
-      where: { id: violation.id },
-      data: {
-        status: 'BREACHED',
-        breachMinutes
+    const notifications: NotificationInput[] = [];
+    for (const violation of claimed) {
+      const rule = rules.get(violation.slaRuleId);
+      const lead = leads.get(violation.leadId);
+      if (!rule) continue;
+      const userIds = new Set(rule.notifyRoles.flatMap((role) => recipients.get(`${violation.tenantId}|${role}`) ?? []));
+      for (const userId of userIds) {
+        notifications.push({
+          tenantId: violation.tenantId,
+          userId,
+          type: 'SLA_VIOLATED',
+          title: `SLA Violated: ${rule.name}`,
+          body: `Lead ${lead?.fullName || lead?.phone || violation.leadId} breached SLA by ${violation.breachMinutes ?? 0} minutes`,
+          entityType: 'Lead',
+          entityId: violation.leadId
+        });
       }
-    });
+      if (violation.escalateAt) schedule(violation.id, 'ESCALATE', violation.escalateAt);
+    }
+    await createNotifications(notifications);
+    console.log(`[SLA] ${claimed.length} violation(s) breached`);
+  } catch (error: any) {
+    console.error(`[SLA] Failed to process ${ids.length} breach(es):`, error?.message || error);
+  }
+}
 
-    // Send notifications
-    await notifySlaViolation(violation);
+async function processEscalations(ids: string[]) {
+  if (ids.length === 0) return;
+  try {
+    const claimed = await prisma.$queryRaw<ClaimedViolation[]>`
+      UPDATE "SlaViolation"
+      SET "status" = 'ESCALATED', "escalatedAt" = NOW(), "updatedAt" = NOW()
+      WHERE "id" = ANY(${ids}::text[]) AND "status" = 'BREACHED'
+      RETURNING "id", "tenantId", "slaRuleId", "leadId", "breachMinutes", "escalateAt"
+    `;
+    if (claimed.length === 0) return;
+
+    const { rules, leads } = await loadViolationContext(claimed);
+    const recipients = await loadRecipients(
+      claimed.map((v) => {
+        const role = rules.get(v.slaRuleId)?.escalateToRole;
+        return { tenantId: v.tenantId, roles: role ? [role] : [] };
+      })
+    );
 
-    // Handle escalation if configured
-    if (violation.slaRule.escalationTimeMinutes) {
-      const escalationDue = new Date(
-        violation.dueAt.getTime() + violation.slaRule.escalationTimeMinutes * 60 * 1000
-      );
+    const notifications: NotificationInput[] = [];
+    for (const violation of claimed) {
+      const rule = rules.get(violation.slaRuleId);
+      const lead = leads.get(violation.leadId);
+      if (!rule) continue;
 
-      if (now >= escalationDue) {
-        await escalateSlaViolation(violation);
+      // Notify escalation target
+      if (rule.escalateToRole) {
+        for (const userId of recipients.get(`${violation.tenantId}|${rule.escalateToRole}`) ?? []) {
+          notifications.push({
+            tenantId: violation.tenantId,
+            userId,
+            type: 'SLA_ESCALATED',
+            title: `SLA Escalated: ${rule.name}`,
+            body: `Lead ${lead?.fullName || lead?.phone || violation.leadId} requires immediate attention`,
+            entityType: 'Lead',
+            entityId: violation.leadId
+          });
+        }
       }
+
+      if (rule.autoReassign && lead) await reassignForSla(violation, lead);
     }
+    await createNotifications(notifications);
+    console.log(`[SLA] ${claimed.length} violation(s) escalated`);
+  } catch (error: any) {
+    console.error(`[SLA] Failed to process ${ids.length} escalation(s):`, error?.message || error);
   }
 }
 
-// Mark SLA as responded (when salesman replies)
-export async function markSlaResponded(leadId: string): Promise<void> {
-  await prisma.slaViolation.updateMany({
-    where: {
-      leadId,
-      status: 'PENDING'
-    },
+// Auto-reassign an escalated lead to another available salesman
+async function reassignForSla(
+  violation: ClaimedViolation,
+  lead: { id: string; status: string; assignedToSalesmanId: string | null }
+) {
+  const { reserveSalesmanRoundRobin } = await import('./routing.js');
+  const picked = await reserveSalesmanRoundRobin(prisma, violation.tenantId, violation.leadId);
+  if (!picked) return;
+
+  const newSalesman = picked.salesman;
+  try {
+    await prisma.lead.update({
+      where: { id: violation.leadId },
+      data: { assignedToSalesmanId: newSalesman.id }
+    });
+  } finally {
+    // The ledger change below accounts for the new owner; drop the reservation either way.
+    picked.reservation.release();
+  }
+  applyLeadOwnershipChanges(violation.tenantId, [
+    {
+      before: { status: lead.status, assignedToSalesmanId: lead.assignedToSalesmanId },
+      after: { status: lead.status, assignedToSalesmanId: newSalesman.id }
+    }
+  ]);
+
+  await prisma.leadEvent.create({
     data: {
-      status: 'RESPONDED',
-      respondedAt: new Date()
+      tenantId: violation.tenantId,
+      leadId: violation.leadId,
+      type: 'SLA_AUTO_REASSIGNED',
+      payload: {
+        fromSalesmanId: lead.assignedToSalesmanId,
+        toSalesmanId: newSalesman.id,
+        slaRuleId: violation.slaRuleId
+      }
     }
   });
 }
 
+export function startSlaEngine() {
+  if (sweepTimer) return;
+  void sweepSlaViolations();
+  sweepTimer = setInterval(() => void sweepSlaViolations(), SWEEP_INTERVAL_MS);
+  sweepTimer.unref();
+}
+
+export async function stopSlaEngine() {
+  if (sweepTimer) clearInterval(sweepTimer);
+  sweepTimer = null;
+  if (dueTimer) clearTimeout(dueTimer);
+  dueTimer = null;
+  dueTimerAt = Infinity;
+  if (flushTimer) clearTimeout(flushTimer);
+  flushTimer = null;
+  await flushSlaViolations();
+}
+
 // Mark SLA as resolved
 export async function markSlaResolved(leadId: string): Promise<void> {
   await prisma.slaViolation.updateMany({
@@ -193,111 +617,6 @@ export async function getLeadSlaStatus(leadId: string) {
   };
 }
 
-// Notify about SLA violation
-async function notifySlaViolation(violation: any): Promise<void> {
-  const { prisma } = await import('../db.js');
-  
-  // Find users with target roles
-  const users = await prisma.user.findMany({
-    where: { 
-      tenantId: violation.tenantId,
-      active: true,
-      role: { in: violation.slaRule.notifyRoles }
-    },
-    select: { id: true }
-  });
-
-  // Create notifications for each user
-  await Promise.all(
-    users.map(u =>
-      prisma.notification.create({
-        data: {
-          tenantId: violation.tenantId,
-          userId: u.id,
-          type: 'SLA_VIOLATED',
-          title: `SLA Violated: ${violation.slaRule.name}`,
-          body: `Lead ${violation.lead.fullName || violation.lead.phone || violation.leadId} breached SLA by ${violation.breachMinutes} minutes`,
-          entityType: 'Lead',
-          entityId: violation.leadId
-        }
-      })
-    )
-  );
-
-  await prisma.slaViolation.update({
-    where: { id: violation.id },
-    data: {
-      notificationsSent: violation.notificationsSent + 1
-    }
-  });
-}
-
-// Escalate SLA violation
-async function escalateSlaViolation(violation: any): Promise<void> {
-  await prisma.slaViolation.update({
-    where: { id: violation.id },
-    data: {
-      status: 'ESCALATED',
-      escalatedAt: new Date()
-    }
-  });
-
-  // Notify escalation target
-  if (violation.slaRule.escalateToRole) {
-    const users = await prisma.user.findMany({
-      where: {
-        tenantId: violation.tenantId,
-        active: true,
-        role: violation.slaRule.escalateToRole
-      },
-      select: { id: true }
-    });
-
-    await Promise.all(
-      users.map(u =>
-        prisma.notification.create({
-          data: {
-            tenantId: violation.tenantId,
-            userId: u.id,
-            type: 'SLA_ESCALATED',
-            title: `SLA Escalated: ${violation.slaRule.name}`,
-            body: `Lead ${violation.lead.fullName || violation.lead.phone || violation.leadId} requires immediate attention`,
-            entityType: 'Lead',
-            entityId: violation.leadId
-          }
-        })
-      )
-    );
-  }
-
-  // Auto-reassign if configured
-  if (violation.slaRule.autoReassign) {
-    // Find another available salesman
-    const { pickSalesmanRoundRobin } = await import('./routing.js');
-    const newSalesman = await pickSalesmanRoundRobin(prisma, violation.tenantId, violation.leadId);
-
-    if (newSalesman) {
-      await prisma.lead.update({
-        where: { id: violation.leadId },
-        data: { assignedToSalesmanId: newSalesman.id }
-      });
-
-      await prisma.leadEvent.create({
-        data: {
-          tenantId: violation.tenantId,
-          leadId: violation.leadId,
-          type: 'SLA_AUTO_REASSIGNED',
-          payload: {
-            fromSalesmanId: violation.lead.assignedToSalesmanId,
-            toSalesmanId: newSalesman.id,
-            slaRuleId: violation.slaRuleId
-          }
-        }
-      });
-    }
-  }
-}
-
 // Get SLA analytics for dashboard
 export async function getSlaAnalytics(tenantId: string, days: number = 30) {
   const since = new Date(Date.now() - days * 24 * 60 * 60 * 1000);
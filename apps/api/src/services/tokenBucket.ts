@@ -0,0 +1,26 @@
+// Token buckets for pacing sends per identity (WhatsApp session, SMTP account).
+
+export type TokenBucket = { tokens: number; updatedAt: number; perSecond: number; burst: number };
+export type TokenRate = { perSecond: number; burst: number };
+
+// Take a token from `key`'s bucket if one is available (returns 0), else the ms until
+// the next one. A bucket starts full and keeps the rate it was created with.
+export function takeToken(
+  buckets: Map<string, TokenBucket>,
+  key: string,
+  rate: TokenRate,
+  now: number = Date.now()
+): number {
+  let bucket = buckets.get(key);
+  if (!bucket) {
+    bucket = { tokens: rate.burst, updatedAt: now, ...rate };
+    buckets.set(key, bucket);
+  }
+  bucket.tokens = Math.min(bucket.burst, bucket.tokens + ((now - bucket.updatedAt) / 1000) * bucket.perSecond);
+  bucket.updatedAt = now;
+  if (bucket.tokens >= 1) {
+    bucket.tokens -= 1;
+    return 0;
+  }
+  return Math.ceil(((1 - bucket.tokens) / bucket.perSecond) * 1000);
+}
@@ -1,48 +1,76 @@
+import { requestJson } from '../httpClient.js';
+import { parseRetryAfterMs } from './backoff.js';
+import { getTenantWhatsAppSession } from './whatsappSessions.js';
+
 const SAK_API_URL = process.env.SAK_API_URL || 'http://13.201.102.10/api/v1';
 const SAK_SESSION_ID = process.env.SAK_SESSION_ID || '';
 const SAK_API_KEY = process.env.SAK_API_KEY || '';
+const SAK_SEND_TIMEOUT_MS = Math.max(1000, Number(process.env.SAK_SEND_TIMEOUT_MS ?? 15_000));
+
+export type WhatsAppSendResult = {
+  success: boolean;
+  messageId?: string;
+  error?: string;
+  // Worth trying again later (timeouts, 429, 5xx); false for bad numbers/config.
+  retryable?: boolean;
+  // From the gateway's Retry-After header, when it sent one.
+  retryAfterMs?: number;
+};
+
+// The tenant's registered session (services/whatsappSessions.ts), else the env session.
+async function sendingSession(tenantId?: string): Promise<{ sessionId: string; apiKey: string }> {
+  const session = tenantId ? await getTenantWhatsAppSession(tenantId) : null;
+  if (session?.apiKey) return { sessionId: session.sessionId, apiKey: session.apiKey };
+  return { sessionId: SAK_SESSION_ID, apiKey: SAK_API_KEY };
+}
 
+export async function getWhatsAppSessionId(tenantId?: string): Promise<string> {
+  return (await sendingSession(tenantId)).sessionId;
+}
+
+// One POST to the SAK gateway over the shared keep-alive pool. Callers that need
+// retries and rate limiting go through the outbound dispatcher (services/outbound.ts).
 export async function sendWhatsAppMessage(params: {
   to: string;
   message: string;
-}): Promise<{ success: boolean; messageId?: string; error?: string }> {
-  try {
-    if (!SAK_SESSION_ID || !SAK_API_KEY) {
-      console.error('SAK WhatsApp credentials not configured');
-      return { success: false, error: 'WhatsApp not configured' };
-    }
+  tenantId?: string;
+}): Promise<WhatsAppSendResult> {
+  const { sessionId, apiKey } = await sendingSession(params.tenantId);
+  if (!sessionId || !apiKey) {
+    console.error('SAK WhatsApp credentials not configured');
+    return { success: false, error: 'WhatsApp not configured', retryable: false };
+  }
 
-    const response = await fetch(`${SAK_API_URL}/messages/send`, {
+  try {
+    const response = await requestJson<{ messageId?: string }>(`${SAK_API_URL}/messages/send`, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'x-api-key': SAK_API_KEY
-      },
-      body: JSON.stringify({
-        sessionId: SAK_SESSION_ID,
+      headers: { 'x-api-key': apiKey },
+      body: {
+        sessionId,
         to: params.to.replace(/^\+/, ''), // Remove leading +
         message: params.message
-      })
+      },
+      timeoutMs: SAK_SEND_TIMEOUT_MS
     });
 
     if (!response.ok) {
-      const error = await response.text();
-      console.error('Failed to send WhatsApp message:', error);
-      return { success: false, error: `WhatsApp API error: ${response.status}` };
+      console.error('Failed to send WhatsApp message:', response.status, response.data);
+      return {
+        success: false,
+        error: `WhatsApp API error: ${response.status}`,
+        retryable: response.status === 429 || response.status >= 500,
+        retryAfterMs: parseRetryAfterMs(response.headers['retry-after'])
+      };
     }
 
-    const result = await response.json() as { messageId?: string };
-    console.log(`WhatsApp message sent to ${params.to}: ${result.messageId || 'success'}`);
-    
-    return { 
-      success: true, 
-      messageId: result.messageId 
-    };
+    console.log(`WhatsApp message sent to ${params.to}: ${response.data.messageId || 'success'}`);
+    return { success: true, messageId: response.data.messageId };
   } catch (error) {
     console.error('Error sending WhatsApp message:', error);
-    return { 
-      success: false, 
-      error: error instanceof Error ? error.message : 'Unknown error' 
+    return {
+      success: false,
+      error: error instanceof Error ? error.message : 'Unknown error',
+      retryable: true
     };
   }
 }
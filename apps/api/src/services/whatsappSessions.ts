@@ -0,0 +1,137 @@
+import crypto from 'crypto';
+import type { KeyObject } from 'crypto';
+import { prisma } from '../db.js';
+
+// SAK WhatsApp session registry.
+//
+// Maps each SAK sessionId to its tenant, API key and webhook secret, so one API instance
+// can serve many WhatsApp numbers. The table is loaded into memory once and reloaded on
+// admin changes (/whatsapp/sessions) and every WHATSAPP_SESSION_REFRESH_MS (changes made
+// through another instance). Webhook secrets are kept as prepared HMAC keys: resolving
+// a webhook's tenant and checking its signature costs no DB query.
+//
+// The legacy single-session env config (SAK_SESSION_ID / SAK_API_KEY /
+// SAK_WEBHOOK_SECRET) still works and is routed to DEFAULT_TENANT_ID or the first tenant;
+// a WhatsAppSession row with the same sessionId takes precedence.
+
+const REFRESH_MS = Math.max(5000, Number(process.env.WHATSAPP_SESSION_REFRESH_MS ?? 60_000));
+
+export type WhatsAppSessionEntry = {
+  sessionId: string;
+  tenantId: string;
+  apiKey: string;
+  hmacKey: KeyObject;
+};
+
+let bySession = new Map<string, WhatsAppSessionEntry>();
+// Session used for outbound sends per tenant (oldest active one).
+let byTenant = new Map<string, WhatsAppSessionEntry>();
+let loaded = false;
+let loading: Promise<void> | null = null;
+let refreshTimer: NodeJS.Timeout | null = null;
+
+function entry(row: { sessionId: string; tenantId: string; apiKey: string; webhookSecret: string }): WhatsAppSessionEntry {
+  return {
+    sessionId: row.sessionId,
+    tenantId: row.tenantId,
+    apiKey: row.apiKey,
+    hmacKey: crypto.createSecretKey(Buffer.from(row.webhookSecret, 'utf8'))
+  };
+}
+
+async function loadSessions() {
+  const nextBySession = new Map<string, WhatsAppSessionEntry>();
+  const nextByTenant = new Map<string, WhatsAppSessionEntry>();
+  let failed = false;
+
+  const envSessionId = process.env.SAK_SESSION_ID || '';
+  const envSecret = process.env.SAK_WEBHOOK_SECRET || '';
+  if (envSessionId && envSecret) {
+    try {
+      let tenantId = process.env.DEFAULT_TENANT_ID;
+      if (!tenantId) {
+        const tenant = await prisma.tenant.findFirst({ orderBy: { createdAt: 'asc' }, select: { id: true } });
+        tenantId = tenant?.id;
+      }
+      if (tenantId) {
+        const legacy = entry({ sessionId: envSessionId, tenantId, apiKey: process.env.SAK_API_KEY || '', webhookSecret: envSecret });
+        nextBySession.set(envSessionId, legacy);
+        nextByTenant.set(tenantId, legacy);
+      }
+    } catch (err) {
+      failed = true;
+      console.warn('[WhatsAppSessions] Failed to resolve tenant for SAK_SESSION_ID:', err instanceof Error ? err.message : err);
+    }
+  }
+
+  try {
+    const rows = await prisma.whatsAppSession.findMany({
+      where: { isActive: true },
+      orderBy: { createdAt: 'asc' },
+      select: { sessionId: true, tenantId: true, apiKey: true, webhookSecret: true }
+    });
+    for (const row of rows) {
+      const session = entry(row);
+      nextBySession.set(row.sessionId, session);
+      const current = nextByTenant.get(row.tenantId);
+      // Registered sessions win over the env fallback for outbound sends.
+      if (!current || current.sessionId === envSessionId) nextByTenant.set(row.tenantId, session);
+    }
+  } catch (err) {
+    failed = true;
+    console.warn('[WhatsAppSessions] Failed to load sessions (missing migration?):', err instanceof Error ? err.message : err);
+  }
+
+  if (failed) {
+    // A failed reload keeps the sessions we already know. Before the first successful
+    // load, serve what we have (e.g. the env session without migrations) and retry on
+    // the next lookup.
+    if (!loaded) {
+      bySession = nextBySession;
+      byTenant = nextByTenant;
+    }
+    return;
+  }
+
+  bySession = nextBySession;
+  byTenant = nextByTenant;
+  loaded = true;
+}
+
+// Reload the registry; waits for an in-flight load first so a change written before
+// this call is always picked up.
+export async function refreshWhatsAppSessions() {
+  while (loading) await loading;
+  loading = loadSessions().finally(() => {
+    loading = null;
+  });
+  await loading;
+}
+
+async function ensureLoaded() {
+  if (!loaded) await refreshWhatsAppSessions();
+}
+
+export async function resolveWhatsAppSession(sessionId: string): Promise<WhatsAppSessionEntry | null> {
+  await ensureLoaded();
+  return bySession.get(sessionId) ?? null;
+}
+
+export async function getTenantWhatsAppSession(tenantId: string): Promise<WhatsAppSessionEntry | null> {
+  await ensureLoaded();
+  return byTenant.get(tenantId) ?? null;
+}
+
+// `signature` is the X-Webhook-Signature header (hex, optionally "sha256=" prefixed).
+export function verifyWebhookSignature(session: WhatsAppSessionEntry, raw: Buffer, signature: string): boolean {
+  const provided = Buffer.from(signature.replace(/^sha256=/i, '').trim(), 'hex');
+  const expected = crypto.createHmac('sha256', session.hmacKey).update(raw).digest();
+  return provided.length === expected.length && crypto.timingSafeEqual(provided, expected);
+}
+
+export function startWhatsAppSessions() {
+  if (refreshTimer) return;
+  void refreshWhatsAppSessions();
+  refreshTimer = setInterval(() => void refreshWhatsAppSessions(), REFRESH_MS);
+  refreshTimer.unref();
+}
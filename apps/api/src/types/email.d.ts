@@ -9,13 +9,18 @@ declare module 'imapflow' {
       disableCompression?: boolean;
       disableAutoEnable?: boolean;
       tls?: any;
+      // Restart IDLE after this long so servers don't drop the session.
+      maxIdleTime?: number;
     });
+    usable: boolean;
+    mailbox: false | { path: string; uidValidity: bigint; uidNext: number; exists: number };
     connect(): Promise<void>;
     logout(): Promise<void>;
     mailboxOpen(path: string): Promise<any>;
     fetch(
-      range: string,
-      options: { envelope?: boolean; source?: boolean; flags?: boolean }
+      range: string | number[],
+      query: { envelope?: boolean; source?: boolean; flags?: boolean; uid?: boolean },
+      options?: { uid?: boolean }
     ): AsyncIterable<{
       seq: number;
       uid: number;
@@ -23,10 +28,12 @@ declare module 'imapflow' {
       flags?: Set<string>;
       envelope?: any;
     }>;
+    search(query: { uid?: string; seen?: boolean; all?: boolean }, options?: { uid?: boolean }): Promise<number[] | false>;
     messageFlagsAdd(seq: number | string, flags: string[]): Promise<void>;
     getMailboxLock(path: string): Promise<{ release: () => void }>;
     idle(): Promise<void>;
     on(event: string, handler: (...args: any[]) => void): void;
+    close(): void;
   }
 }
 
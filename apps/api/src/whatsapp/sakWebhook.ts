@@ -1,8 +1,8 @@
-import crypto from 'crypto';
 import { Router } from 'express';
 import type { Request, Response } from 'express';
 import { asyncHandler } from '../http.js';
-import { prisma } from '../db.js';
+import { enqueueIngest } from '../services/ingestQueue.js';
+import { resolveWhatsAppSession, verifyWebhookSignature } from '../services/whatsappSessions.js';
 
 type SakWebhookEvent = {
   event: string;
@@ -18,9 +18,6 @@ type SakWebhookEvent = {
   pushName?: string;
 };
 
-const SESSION_ID = process.env.SAK_SESSION_ID || '';
-const WEBHOOK_SECRET = process.env.SAK_WEBHOOK_SECRET || '';
-
 export const sakWebhookRouter = Router();
 
 sakWebhookRouter.post(
@@ -28,32 +25,28 @@ sakWebhookRouter.post(
   asyncHandler(async (req: Request, res: Response) => {
     const payload = req.body as SakWebhookEvent;
 
-    // Only process message.received events for our session
+    // Only process message.received events
     if (!payload?.sessionId || payload?.event !== 'message.received') {
       res.json({ ok: true });
       return;
     }
 
-    if (payload.sessionId !== SESSION_ID) {
+    // Sessions we don't serve are acknowledged and ignored.
+    const session = await resolveWhatsAppSession(payload.sessionId);
+    if (!session) {
       res.json({ ok: true });
       return;
     }
 
-    // Verify webhook signature
-    const sigHeader = req.get('x-webhook-signature') || req.get('X-Webhook-Signature') || '';
-    const provided = sigHeader.replace(/^sha256=/i, '').trim();
-    
-    if (!provided || !WEBHOOK_SECRET) {
+    // Verify webhook signature with the session's secret
+    const signature = req.get('x-webhook-signature') || '';
+    if (!signature) {
       res.status(401).json({ error: 'missing signature' });
       return;
     }
 
     const raw = (req as any).rawBody || Buffer.from(JSON.stringify(req.body || {}));
-    const expected = crypto.createHmac('sha256', WEBHOOK_SECRET).update(raw).digest('hex');
-    const a = Buffer.from(provided, 'hex');
-    const b = Buffer.from(expected, 'hex');
-    
-    if (a.length !== b.length || !crypto.timingSafeEqual(a, b)) {
+    if (!verifyWebhookSignature(session, raw, signature)) {
       res.status(401).json({ error: 'invalid signature' });
       return;
     }
@@ -68,34 +61,27 @@ sakWebhookRouter.post(
       return;
     }
 
-    // Get the first tenant (or you can add session-to-tenant mapping later)
-    const tenant = await prisma.tenant.findFirst();
-    if (!tenant) {
-      console.error('No tenant found');
-      res.json({ ok: true });
-      return;
-    }
-    
     console.log(`WhatsApp message received from ${phoneNumber} (${senderName}): ${message.substring(0, 50)}...`);
-    
-    try {
-      // Import and call the ingest handler directly
-      const { handleIngestMessage } = await import('../routes.js');
-      
-      await handleIngestMessage({
-        tenantId: tenant.id,
+
+    // Persist and acknowledge; the ingest workers run the AI/SLA/assignment pipeline.
+    // If the enqueue itself fails we answer with an error so SAK retries the delivery.
+    const { jobId, duplicate } = await enqueueIngest({
+      tenantId: session.tenantId,
+      source: 'SAK_WEBHOOK',
+      dedupeKey: payload.messageId ? `sak:${payload.sessionId}:${payload.messageId}` : undefined,
+      payload: {
         body: {
-          channel: 'WHATSAPP' as const,
+          channel: 'WHATSAPP',
           phone: phoneNumber,
           fullName: senderName || undefined,
           customerMessage: message,
           externalId: payload.messageId,
-        }
-      });
-      
-      console.log(`Successfully ingested WhatsApp message from ${phoneNumber}`);
-    } catch (error) {
-      console.error('Error ingesting WhatsApp message:', error);
+        },
+      },
+    });
+
+    if (duplicate) {
+      console.log(`Ignoring redelivered WhatsApp message ${payload.messageId} (job ${jobId})`);
     }
 
     res.json({ ok: true });
@@ -0,0 +1,72 @@
+import { before, describe, test } from 'node:test';
+import assert from 'node:assert/strict';
+import { createTenant, needsDb } from './db.js';
+import { prisma } from '../src/db.js';
+import { createAuditLog, flushAuditLogs, getAuditLogStats } from '../src/services/auditLog.js';
+
+const FLUSH_DELAY_MS = Math.max(50, Number(process.env.AUDIT_LOG_FLUSH_MS ?? 1000));
+
+describe('buffered audit log', needsDb, () => {
+  let tenantId: string;
+
+  before(async () => {
+    tenantId = (await createTenant('audit-log')).id;
+  });
+
+  const entry = (action: string, changes?: unknown) => ({
+    tenantId,
+    userId: 'user-1',
+    action,
+    entityType: 'Lead',
+    entityId: 'lead-1',
+    changes
+  });
+
+  test('createAuditLog buffers and a flush writes the batch', async () => {
+    const before = getAuditLogStats();
+    await createAuditLog(entry('BATCH_1'));
+    await createAuditLog(entry('BATCH_2', { status: { from: 'NEW', to: 'CONTACTED' } }));
+    assert.equal(getAuditLogStats().buffered, 2);
+    assert.equal(await prisma.auditLog.count({ where: { tenantId, action: { startsWith: 'BATCH_' } } }), 0);
+
+    await flushAuditLogs();
+    const rows = await prisma.auditLog.findMany({ where: { tenantId, action: { startsWith: 'BATCH_' } }, orderBy: { action: 'asc' } });
+    assert.deepEqual(
+      rows.map((r) => [r.action, r.userId, r.changes]),
+      [
+        ['BATCH_1', 'user-1', null],
+        ['BATCH_2', 'user-1', { status: { from: 'NEW', to: 'CONTACTED' } }]
+      ]
+    );
+    const after = getAuditLogStats();
+    assert.equal(after.buffered, 0);
+    assert.equal(after.written - before.written, 2);
+  });
+
+  test('the flush timer writes entries without an explicit flush', async () => {
+    await createAuditLog(entry('TIMED'));
+    const deadline = Date.now() + FLUSH_DELAY_MS + 5000;
+    while ((await prisma.auditLog.count({ where: { tenantId, action: 'TIMED' } })) === 0) {
+      assert.ok(Date.now() < deadline, 'entry was not flushed by the timer');
+      await new Promise((resolve) => setTimeout(resolve, 100));
+    }
+  });
+
+  test('a failed batch is retried once, then dropped', async () => {
+    const before = getAuditLogStats();
+    // A BigInt cannot be serialized to JSON, so every write of this entry fails.
+    await createAuditLog(entry('POISON', { n: 1n }));
+
+    await flushAuditLogs();
+    let stats = getAuditLogStats();
+    assert.equal(stats.failed - before.failed, 1);
+    assert.equal(stats.buffered, 1);
+
+    await flushAuditLogs();
+    stats = getAuditLogStats();
+    assert.equal(stats.failed - before.failed, 2);
+    assert.equal(stats.dropped - before.dropped, 1);
+    assert.equal(stats.buffered, 0);
+    assert.equal(await prisma.auditLog.count({ where: { tenantId, action: 'POISON' } }), 0);
+  });
+});
@@ -0,0 +1,40 @@
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { emailKey, phoneKey } from '../src/services/contactIdentity.js';
+
+// Expected values follow contact_phone_key()/contact_email_key() in
+// prisma/migrations/20261016150000_contact_identity_keys; the DB trigger fills the
+// columns with those, so any drift here means lookups miss.
+
+test('phoneKey matches contact_phone_key', () => {
+  const cases: Array<[string | null | undefined, string | null]> = [
+    ['917737845253', '+917737845253'],
+    ['+91 77378 45253', '+917737845253'],
+    ['0091-7737845253', '+917737845253'],
+    ['(022) 555-0199', '+0225550199'],
+    ['1234567', '+1234567'],
+    ['123456', null],
+    ['0012345', null],
+    ['abc', null],
+    ['', null],
+    [null, null],
+    [undefined, null]
+  ];
+  for (const [raw, expected] of cases) assert.equal(phoneKey(raw), expected, String(raw));
+});
+
+test('emailKey matches contact_email_key', () => {
+  const cases: Array<[string | null | undefined, string | null]> = [
+    [' Foo@Example.COM ', 'foo@example.com'],
+    ['a@b', 'a@b'],
+    // btrim() only strips spaces.
+    ['\tfoo@bar.com', '\tfoo@bar.com'],
+    ['@bar.com', null],
+    ['  @bar.com', null],
+    ['no-at-sign', null],
+    ['', null],
+    [null, null],
+    [undefined, null]
+  ];
+  for (const [raw, expected] of cases) assert.equal(emailKey(raw), expected, String(raw));
+});
@@ -0,0 +1,61 @@
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { CsvParseError, parseCsvRecords } from '../src/services/csvParser.js';
+
+async function* chunks(...parts: Array<string | Buffer>) {
+  yield* parts;
+}
+
+async function parse(...parts: Array<string | Buffer>) {
+  const records = [];
+  for await (const record of parseCsvRecords(chunks(...parts))) records.push(record);
+  return records;
+}
+
+test('quoted fields keep commas and doubled quotes', async () => {
+  assert.deepEqual(await parse('name,note\r\n"Smith, J","said ""hi"""\r\n'), [
+    { fields: ['name', 'note'], line: 1 },
+    { fields: ['Smith, J', 'said "hi"'], line: 2 }
+  ]);
+});
+
+test('embedded newlines stay in the field and advance line numbers', async () => {
+  assert.deepEqual(await parse('id,text\n1,"line one\nline two"\n2,x\n'), [
+    { fields: ['id', 'text'], line: 1 },
+    { fields: ['1', 'line one\nline two'], line: 2 },
+    { fields: ['2', 'x'], line: 4 }
+  ]);
+});
+
+test('leading UTF-8 BOM is dropped and a missing final newline is fine', async () => {
+  assert.deepEqual(await parse(Buffer.from('\uFEFFa,b\n1,2', 'utf8')), [
+    { fields: ['a', 'b'], line: 1 },
+    { fields: ['1', '2'], line: 2 }
+  ]);
+});
+
+test('an escaped quote split across chunks', async () => {
+  assert.deepEqual(await parse('"a"', '"b",c\n'), [{ fields: ['a"b', 'c'], line: 1 }]);
+});
+
+test('blank lines are skipped but still counted', async () => {
+  assert.deepEqual(await parse('a\n\n\nb\n'), [
+    { fields: ['a'], line: 1 },
+    { fields: ['b'], line: 4 }
+  ]);
+});
+
+test('CR and CRLF both end a record', async () => {
+  assert.deepEqual(await parse('a\rb\r\n'), [
+    { fields: ['a'], line: 1 },
+    { fields: ['b'], line: 2 }
+  ]);
+});
+
+test('unterminated quoted field reports the line it started on', async () => {
+  await assert.rejects(parse('a,"b\n'), (err: unknown) => {
+    assert.ok(err instanceof CsvParseError);
+    assert.equal(err.line, 1);
+    return true;
+  });
+});
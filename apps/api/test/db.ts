@@ -0,0 +1,25 @@
+import { after } from 'node:test';
+import type { LeadChannel, Prisma } from '@prisma/client';
+import { prisma } from '../src/db.js';
+
+// Suites that need Postgres run against TEST_DATABASE_URL, a disposable database with
+// migrations applied; they clear the queue tables they exercise. Without it they are
+// skipped. The client is created lazily, so setting DATABASE_URL here is early enough.
+
+const databaseUrl = process.env.TEST_DATABASE_URL;
+if (databaseUrl) process.env.DATABASE_URL = databaseUrl;
+
+export const needsDb = { skip: databaseUrl ? false : 'TEST_DATABASE_URL not set' };
+
+if (databaseUrl) after(() => prisma.$disconnect());
+
+export async function createTenant(name: string) {
+  return prisma.tenant.create({ data: { name: `test:${name}` } });
+}
+
+export async function createLead(
+  tenantId: string,
+  data: Partial<Omit<Prisma.LeadUncheckedCreateInput, 'tenantId'>> & { channel?: LeadChannel } = {}
+) {
+  return prisma.lead.create({ data: { channel: 'WHATSAPP', fullName: 'Test Lead', ...data, tenantId } });
+}
@@ -0,0 +1,118 @@
+import { before, beforeEach, describe, test } from 'node:test';
+import assert from 'node:assert/strict';
+import { createTenant, needsDb } from './db.js';
+import { prisma } from '../src/db.js';
+import {
+  claimNextJob,
+  completeJob,
+  enqueueIngest,
+  failJob,
+  retryDeadIngestJob
+} from '../src/services/ingestQueue.js';
+
+describe('ingest queue', needsDb, () => {
+  let tenantId: string;
+
+  before(async () => {
+    tenantId = (await createTenant('ingest-queue')).id;
+  });
+
+  beforeEach(async () => {
+    await prisma.ingestJob.deleteMany({});
+  });
+
+  const enqueue = (phone: string, text: string, dedupeKey?: string) =>
+    enqueueIngest({
+      tenantId,
+      source: 'SAK_WEBHOOK',
+      payload: { body: { channel: 'WHATSAPP', phone, text } },
+      dedupeKey
+    });
+
+  const makeRunnable = (id: string) => prisma.ingestJob.update({ where: { id }, data: { runAt: new Date(0) } });
+
+  test('concurrent workers never claim the same job', async () => {
+    const ids: string[] = [];
+    for (let i = 0; i < 5; i++) ids.push((await enqueue(`+9170000000${i}`, `hi ${i}`)).jobId);
+
+    const claimed = await Promise.all(Array.from({ length: 8 }, (_, i) => claimNextJob(`worker:${i}`)));
+    const claimedIds = claimed.flatMap((job) => (job ? [job.id] : []));
+    assert.deepEqual(claimedIds.sort(), [...ids].sort());
+
+    const rows = await prisma.ingestJob.findMany({ where: { id: { in: ids } } });
+    for (const row of rows) {
+      assert.equal(row.status, 'PROCESSING');
+      assert.equal(row.attempts, 1);
+      assert.ok(row.lockedBy?.startsWith('worker:'));
+    }
+  });
+
+  test('jobs for one contact run one at a time, in order', async () => {
+    const first = await enqueue('+91 77378 45253', 'first');
+    const second = await enqueue('917737845253', 'second');
+    const other = await enqueue('+919999999999', 'other contact');
+
+    const a = await claimNextJob('w1');
+    assert.equal(a?.id, first.jobId);
+    // The second message waits for the first; another contact does not.
+    const b = await claimNextJob('w2');
+    assert.equal(b?.id, other.jobId);
+    assert.equal(await claimNextJob('w3'), null);
+
+    await completeJob(a!, { ok: true });
+    const c = await claimNextJob('w3');
+    assert.equal(c?.id, second.jobId);
+  });
+
+  test('a failed job backs off and holds back later jobs for the contact', async () => {
+    const first = await enqueue('+917737845253', 'first');
+    await enqueue('+917737845253', 'second');
+
+    const job = await claimNextJob('w1');
+    assert.equal(job?.id, first.jobId);
+    const failedAt = Date.now();
+    await failJob(job!, new Error('AI provider timeout'));
+
+    const row = await prisma.ingestJob.findUniqueOrThrow({ where: { id: first.jobId } });
+    assert.equal(row.status, 'PENDING');
+    assert.equal(row.lastError, 'AI provider timeout');
+    assert.equal(row.lockedBy, null);
+    assert.ok(row.runAt.getTime() > failedAt);
+    assert.equal(await claimNextJob('w2'), null);
+
+    await makeRunnable(first.jobId);
+    const retried = await claimNextJob('w2');
+    assert.equal(retried?.id, first.jobId);
+    assert.equal(retried?.attempts, 2);
+  });
+
+  test('exhausted jobs are dead-lettered and can be requeued', async () => {
+    const { jobId } = await enqueue('+917737845253', 'poison');
+    await prisma.ingestJob.update({ where: { id: jobId }, data: { maxAttempts: 2 } });
+
+    await failJob((await claimNextJob('w1'))!, new Error('boom 1'));
+    await makeRunnable(jobId);
+    await failJob((await claimNextJob('w1'))!, new Error('boom 2'));
+
+    const dead = await prisma.ingestJob.findUniqueOrThrow({ where: { id: jobId } });
+    assert.equal(dead.status, 'DEAD');
+    assert.equal(dead.attempts, 2);
+    assert.equal(dead.lastError, 'boom 2');
+    assert.ok(dead.completedAt);
+    assert.equal(await claimNextJob('w1'), null);
+
+    assert.equal(await retryDeadIngestJob('another-tenant', jobId), false);
+    assert.equal(await retryDeadIngestJob(tenantId, jobId), true);
+    const again = await claimNextJob('w1');
+    assert.equal(again?.id, jobId);
+    assert.equal(again?.attempts, 1);
+  });
+
+  test('a redelivered webhook with the same dedupeKey is not queued twice', async () => {
+    const first = await enqueue('+917737845253', 'hello', 'wamid.1');
+    const second = await enqueue('+917737845253', 'hello', 'wamid.1');
+    assert.equal(second.jobId, first.jobId);
+    assert.equal(second.duplicate, true);
+    assert.equal(await prisma.ingestJob.count({ where: { tenantId } }), 1);
+  });
+});
@@ -0,0 +1,86 @@
+import { before, describe, test } from 'node:test';
+import assert from 'node:assert/strict';
+import { createLead, createTenant, needsDb } from './db.js';
+import { prisma } from '../src/db.js';
+import { flushLeadScores, recordLeadActivity, sweepLeadScoreDecay } from '../src/services/leadScoreState.js';
+
+const HOUR = 60 * 60 * 1000;
+
+describe('incremental lead scores', needsDb, () => {
+  let tenantId: string;
+
+  before(async () => {
+    tenantId = (await createTenant('lead-score-state')).id;
+  });
+
+  // A lead with an answered inbound message, scored once so it has a state row.
+  async function scoredLead() {
+    const lead = await createLead(tenantId, { phone: '+917737845253' });
+    const inAt = new Date(Date.now() - 2 * HOUR);
+    const outAt = new Date(Date.now() - HOUR);
+    await prisma.message.createMany({
+      data: [
+        { tenantId, leadId: lead.id, direction: 'IN', channel: 'WHATSAPP', body: 'price?', createdAt: inAt },
+        { tenantId, leadId: lead.id, direction: 'OUT', channel: 'WHATSAPP', body: 'sent', createdAt: outAt }
+      ]
+    });
+    recordLeadActivity(tenantId, lead.id, { kind: 'MESSAGE', direction: 'OUT', at: outAt });
+    await flushLeadScores();
+    return lead;
+  }
+
+  test('a lead without state is built from its history', async () => {
+    const lead = await scoredLead();
+
+    const state = await prisma.leadScoreState.findUniqueOrThrow({ where: { leadId: lead.id } });
+    assert.equal(state.messages, 2);
+    assert.equal(state.responseCount, 1);
+    assert.equal(state.responseMsSum, HOUR);
+    assert.equal(state.pendingInboundCount, 0);
+
+    const scored = await prisma.lead.findUniqueOrThrow({ where: { id: lead.id } });
+    assert.ok(scored.score > 0);
+    assert.ok(scored.qualificationLevel);
+    assert.ok(scored.lastActivityAt);
+  });
+
+  test('an existing state takes the recorded deltas', async () => {
+    const lead = await scoredLead();
+    const before = await prisma.lead.findUniqueOrThrow({ where: { id: lead.id } });
+
+    // Not written to Message: a rebuild from history would not see it.
+    const inAt = new Date(Date.now() - 30 * 60 * 1000);
+    recordLeadActivity(tenantId, lead.id, { kind: 'MESSAGE', direction: 'IN', at: inAt });
+    recordLeadActivity(tenantId, lead.id, { kind: 'NOTE', at: new Date() });
+    await flushLeadScores();
+
+    let state = await prisma.leadScoreState.findUniqueOrThrow({ where: { leadId: lead.id } });
+    assert.equal(state.messages, 3);
+    assert.equal(state.notes, 1);
+    assert.equal(state.pendingInboundCount, 1);
+    assert.equal(state.pendingInboundMsSum, inAt.getTime());
+
+    const outAt = new Date();
+    recordLeadActivity(tenantId, lead.id, { kind: 'MESSAGE', direction: 'OUT', at: outAt });
+    await flushLeadScores();
+    state = await prisma.leadScoreState.findUniqueOrThrow({ where: { leadId: lead.id } });
+    assert.equal(state.responseCount, 2);
+    assert.equal(state.responseMsSum, HOUR + (outAt.getTime() - inAt.getTime()));
+    assert.equal(state.pendingInboundCount, 0);
+
+    const after = await prisma.lead.findUniqueOrThrow({ where: { id: lead.id } });
+    assert.ok(after.score > before.score);
+  });
+
+  test('the decay sweep rescores without moving updatedAt', async () => {
+    const lead = await scoredLead();
+    const idleSince = new Date('2026-01-01T00:00:00Z');
+    await prisma.$executeRaw`UPDATE "Lead" SET "score" = -1000, "updatedAt" = ${idleSince} WHERE "id" = ${lead.id}`;
+
+    await sweepLeadScoreDecay();
+
+    const swept = await prisma.lead.findUniqueOrThrow({ where: { id: lead.id } });
+    assert.notEqual(swept.score, -1000);
+    assert.equal(swept.updatedAt.getTime(), idleSince.getTime());
+  });
+});
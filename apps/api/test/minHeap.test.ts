@@ -0,0 +1,31 @@
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { heapPop, heapPush } from '../src/services/minHeap.js';
+
+test('pops in order of `at`, duplicates included', () => {
+  const heap: Array<{ at: number; id: string }> = [];
+  const ats = [50, 10, 40, 10, 30, 20, 60, 0, 40];
+  ats.forEach((at, i) => heapPush(heap, { at, id: `v${i}` }));
+  assert.equal(heap[0].at, 0);
+
+  const popped: number[] = [];
+  for (let item = heapPop(heap); item; item = heapPop(heap)) popped.push(item.at);
+  assert.deepEqual(popped, [...ats].sort((a, b) => a - b));
+  assert.equal(heap.length, 0);
+});
+
+test('interleaved pushes and pops keep the minimum on top', () => {
+  const heap: Array<{ at: number }> = [];
+  heapPush(heap, { at: 5 });
+  heapPush(heap, { at: 3 });
+  assert.equal(heapPop(heap)?.at, 3);
+  heapPush(heap, { at: 1 });
+  heapPush(heap, { at: 4 });
+  assert.equal(heapPop(heap)?.at, 1);
+  assert.equal(heapPop(heap)?.at, 4);
+  assert.equal(heapPop(heap)?.at, 5);
+});
+
+test('popping an empty heap returns undefined', () => {
+  assert.equal(heapPop([]), undefined);
+});
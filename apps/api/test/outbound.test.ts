@@ -0,0 +1,95 @@
+import { before, beforeEach, describe, test } from 'node:test';
+import assert from 'node:assert/strict';
+import { createLead, createTenant, needsDb } from './db.js';
+import { prisma } from '../src/db.js';
+import { claimNextMessage, enqueueOutboundMessage, processMessage } from '../src/services/outbound.js';
+
+const MAX_ATTEMPTS = Math.max(1, Number(process.env.OUTBOUND_MAX_ATTEMPTS ?? 5));
+
+// Email keeps the suite off the WhatsApp session registry; the provider call is stubbed.
+const delivered = async () => ({ success: true, messageId: 'smtp-1' });
+
+describe('outbound dispatcher', needsDb, () => {
+  let tenantId: string;
+  let leadA: string;
+  let leadB: string;
+
+  before(async () => {
+    tenantId = (await createTenant('outbound')).id;
+    leadA = (await createLead(tenantId, { channel: 'EMAIL', email: 'a@example.com' })).id;
+    leadB = (await createLead(tenantId, { channel: 'EMAIL', email: 'b@example.com' })).id;
+  });
+
+  beforeEach(async () => {
+    await prisma.message.deleteMany({ where: { status: { in: ['QUEUED', 'SENDING'] } } });
+  });
+
+  const enqueue = (leadId: string, body: string) =>
+    enqueueOutboundMessage({ tenantId, leadId, conversationId: null, channel: 'EMAIL', body, to: 'lead@example.com' });
+
+  test('only dispatchable messages with a recipient are queued', async () => {
+    const queued = await enqueue(leadA, 'hello');
+    assert.equal(queued.status, 'QUEUED');
+    const manual = await enqueueOutboundMessage({ tenantId, leadId: leadA, conversationId: null, channel: 'MANUAL', body: 'called' });
+    assert.equal(manual.status, null);
+    const noAddress = await enqueueOutboundMessage({ tenantId, leadId: leadA, conversationId: null, channel: 'EMAIL', body: 'x', to: null });
+    assert.equal(noAddress.status, null);
+  });
+
+  test('concurrent claims take one message per lead, in order', async () => {
+    const a1 = await enqueue(leadA, 'a1');
+    const a2 = await enqueue(leadA, 'a2');
+    const b1 = await enqueue(leadB, 'b1');
+
+    const claimed = await Promise.all([claimNextMessage(), claimNextMessage(), claimNextMessage()]);
+    const claimedIds = claimed.flatMap((m) => (m ? [m.id] : []));
+    assert.deepEqual(claimedIds.sort(), [a1.id, b1.id].sort());
+
+    const first = claimed.find((m) => m?.id === a1.id)!;
+    assert.equal(first.status, 'SENDING');
+    assert.equal(first.attempts, 1);
+    await processMessage(first, delivered);
+
+    const sent = await prisma.message.findUniqueOrThrow({ where: { id: a1.id } });
+    assert.equal(sent.status, 'SENT');
+    assert.equal(sent.providerMessageId, 'smtp-1');
+    assert.ok(sent.sentAt);
+    assert.equal((await claimNextMessage())?.id, a2.id);
+  });
+
+  test('a retryable failure is requeued no earlier than Retry-After', async () => {
+    const { id } = await enqueue(leadA, 'rate limited');
+    const message = (await claimNextMessage())!;
+    const failedAt = Date.now();
+    await processMessage(message, async () => ({ success: false, error: 'HTTP 429', retryable: true, retryAfterMs: 120_000 }));
+
+    const row = await prisma.message.findUniqueOrThrow({ where: { id } });
+    assert.equal(row.status, 'QUEUED');
+    assert.equal(row.lastError, 'HTTP 429');
+    assert.ok(row.nextAttemptAt!.getTime() >= failedAt + 120_000);
+    assert.equal(await claimNextMessage(), null);
+  });
+
+  test('permanent failures and exhausted retries end FAILED with a lead event', async () => {
+    const rejected = await enqueue(leadA, 'bad address');
+    await processMessage((await claimNextMessage())!, async () => ({ success: false, error: 'invalid recipient', retryable: false }));
+
+    const exhausted = await enqueue(leadB, 'flaky');
+    await prisma.message.update({ where: { id: exhausted.id }, data: { attempts: MAX_ATTEMPTS - 1 } });
+    const last = (await claimNextMessage())!;
+    assert.equal(last.attempts, MAX_ATTEMPTS);
+    await processMessage(last, async () => ({ success: false, error: 'HTTP 503', retryable: true }));
+
+    for (const [id, error] of [
+      [rejected.id, 'invalid recipient'],
+      [exhausted.id, 'HTTP 503']
+    ]) {
+      const row = await prisma.message.findUniqueOrThrow({ where: { id } });
+      assert.equal(row.status, 'FAILED');
+      assert.equal(row.lastError, error);
+      assert.equal(row.nextAttemptAt, null);
+      const events = await prisma.leadEvent.findMany({ where: { leadId: row.leadId, type: 'MESSAGE_FAILED' } });
+      assert.ok(events.some((e) => (e.payload as { messageId?: string }).messageId === id));
+    }
+  });
+});
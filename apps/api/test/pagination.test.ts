@@ -0,0 +1,48 @@
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { HttpError } from '../src/http.js';
+import { decodeCursor, encodeCursor, mergeKeysetPages } from '../src/services/pagination.js';
+
+const at = (n: number) => new Date(Date.UTC(2026, 0, 1, 0, 0, n));
+const row = (n: number, id: string) => ({ createdAt: at(n), id });
+
+test('cursor round-trips', () => {
+  const cursor = { at: at(5), id: 'lead_1' };
+  assert.deepEqual(decodeCursor(encodeCursor(cursor)), cursor);
+});
+
+test('malformed cursors are a 400', () => {
+  const bad = [
+    'not-a-cursor',
+    Buffer.from('{"at":1}').toString('base64url'),
+    Buffer.from('["nope","x"]').toString('base64url'),
+    Buffer.from(JSON.stringify([at(1).toISOString(), ''])).toString('base64url')
+  ];
+  for (const token of bad) {
+    assert.throws(
+      () => decodeCursor(token),
+      (err: unknown) => err instanceof HttpError && err.status === 400
+    );
+  }
+});
+
+test('merges desc pages by (createdAt, id) with id as tie-break', () => {
+  const a = [row(5, 'a'), row(3, 'a2')];
+  const b = [row(5, 'b'), row(4, 'b'), row(1, 'b2')];
+
+  const page = mergeKeysetPages([a, b], 3, 'desc');
+  assert.deepEqual(page.items, [row(5, 'b'), row(5, 'a'), row(4, 'b')]);
+  assert.equal(page.more, true);
+
+  const all = mergeKeysetPages([a, b], 5, 'desc');
+  assert.deepEqual(all.items, [row(5, 'b'), row(5, 'a'), row(4, 'b'), row(3, 'a2'), row(1, 'b2')]);
+  assert.equal(all.more, false);
+});
+
+test('merges asc pages and handles empty sources', () => {
+  const page = mergeKeysetPages([[], [row(1, 'x'), row(2, 'x')], [row(1, 'w')]], 2, 'asc');
+  assert.deepEqual(page.items, [row(1, 'w'), row(1, 'x')]);
+  assert.equal(page.more, true);
+
+  assert.deepEqual(mergeKeysetPages([[], []], 10, 'asc'), { items: [], more: false });
+});
@@ -0,0 +1,116 @@
+import { describe, test } from 'node:test';
+import assert from 'node:assert/strict';
+import { createLead, createTenant, needsDb } from './db.js';
+import { prisma } from '../src/db.js';
+import {
+  bumpDailyRollup,
+  bumpMessageRollup,
+  bumpStatusRollups,
+  flushRollups,
+  getChannelTotals,
+  getDailyTimeSeries,
+  rebuildDailyRollups,
+  subtractLeadsFromRollups,
+  utcDay
+} from '../src/services/rollups.js';
+
+const DAY = 24 * 60 * 60 * 1000;
+
+describe('daily rollups', needsDb, () => {
+  const dailyRows = (tenantId: string) =>
+    // Channels sort in LeadChannel declaration order.
+    prisma.dailyRollup.findMany({ where: { tenantId }, orderBy: [{ day: 'asc' }, { channel: 'asc' }] });
+
+  test('buffered bumps are added onto one row per day and channel', async () => {
+    const { id: tenantId } = await createTenant('rollups-bumps');
+    const at = new Date('2026-03-01T10:00:00Z');
+
+    bumpDailyRollup(tenantId, 'WHATSAPP', { newLeads: 1 }, at);
+    bumpDailyRollup(tenantId, 'WHATSAPP', { newLeads: 1 }, at);
+    bumpMessageRollup(tenantId, 'WHATSAPP', 'IN', at);
+    bumpMessageRollup(tenantId, 'EMAIL', 'OUT', at);
+    await flushRollups();
+
+    bumpMessageRollup(tenantId, 'WHATSAPP', 'IN', at);
+    bumpStatusRollups(tenantId, [{ channel: 'WHATSAPP', from: 'QUOTED', to: 'WON' }], at);
+    await flushRollups();
+
+    const rows = await dailyRows(tenantId);
+    assert.deepEqual(
+      rows.map((r) => [utcDay(r.day), r.channel, r.newLeads, r.messagesIn, r.messagesOut, r.wonLeads]),
+      [
+        ['2026-03-01', 'WHATSAPP', 2, 2, 0, 1],
+        ['2026-03-01', 'EMAIL', 0, 0, 1, 0]
+      ]
+    );
+  });
+
+  test('a rebuild matches the incremental counters and credits WON to the day it happened', async () => {
+    const { id: tenantId } = await createTenant('rollups-rebuild');
+    const createdAt = new Date(Date.now() - 3 * DAY);
+
+    // What the write paths do: persist, then bump.
+    const lead = await createLead(tenantId, { createdAt });
+    bumpDailyRollup(tenantId, 'WHATSAPP', { newLeads: 1 }, createdAt);
+    for (const direction of ['IN', 'OUT', 'IN']) {
+      await prisma.message.create({
+        data: { tenantId, leadId: lead.id, direction, channel: 'WHATSAPP', body: direction, createdAt }
+      });
+      bumpMessageRollup(tenantId, 'WHATSAPP', direction, createdAt);
+    }
+    const won = await prisma.lead.update({ where: { id: lead.id }, data: { status: 'WON' } });
+    bumpStatusRollups(tenantId, [{ channel: 'WHATSAPP', from: 'NEW', to: 'WON' }]);
+    await flushRollups();
+
+    assert.ok(won.wonAt);
+    assert.equal(utcDay(won.wonAt), utcDay(new Date()));
+
+    const incremental = await dailyRows(tenantId);
+    const incrementalSeries = await getDailyTimeSeries(tenantId, utcDay(new Date(Date.now() - 7 * DAY)));
+
+    await rebuildDailyRollups(tenantId);
+    const rebuilt = await dailyRows(tenantId);
+
+    const counters = (rows: typeof rebuilt) =>
+      rows.map((r) => [utcDay(r.day), r.channel, r.newLeads, r.messagesIn, r.messagesOut, r.wonLeads]);
+    assert.deepEqual(counters(rebuilt), counters(incremental));
+    assert.deepEqual(counters(rebuilt), [
+      [utcDay(createdAt), 'WHATSAPP', 1, 2, 1, 0],
+      [utcDay(won.wonAt), 'WHATSAPP', 0, 0, 0, 1]
+    ]);
+    assert.deepEqual(await getDailyTimeSeries(tenantId, utcDay(new Date(Date.now() - 7 * DAY))), incrementalSeries);
+    assert.deepEqual(await getChannelTotals(tenantId), [{ channel: 'WHATSAPP', total: 1, won: 1 }]);
+  });
+
+  test('wonAt follows status changes only', async () => {
+    const { id: tenantId } = await createTenant('rollups-won-at');
+    const lead = await createLead(tenantId);
+    assert.equal(lead.wonAt, null);
+
+    const won = await prisma.lead.update({ where: { id: lead.id }, data: { status: 'WON' } });
+    assert.ok(won.wonAt);
+    const touched = await prisma.lead.update({ where: { id: lead.id }, data: { fullName: 'Renamed' } });
+    assert.equal(touched.wonAt?.getTime(), won.wonAt.getTime());
+
+    const reopened = await prisma.lead.update({ where: { id: lead.id }, data: { status: 'QUOTED' } });
+    assert.equal(reopened.wonAt, null);
+  });
+
+  test('subtracting deleted leads cancels their contribution', async () => {
+    const { id: tenantId } = await createTenant('rollups-subtract');
+    const keep = await createLead(tenantId);
+    const drop = await createLead(tenantId, { channel: 'EMAIL', status: 'WON' });
+    await prisma.message.create({
+      data: { tenantId, leadId: drop.id, direction: 'IN', channel: 'EMAIL', body: 'hi' }
+    });
+    await rebuildDailyRollups(tenantId);
+
+    await prisma.$transaction(async (tx) => {
+      await subtractLeadsFromRollups(tx, tenantId, [drop.id]);
+    });
+
+    assert.deepEqual(await getChannelTotals(tenantId), [{ channel: keep.channel, total: 1, won: 0 }]);
+    const email = (await dailyRows(tenantId)).filter((r) => r.channel === 'EMAIL');
+    assert.ok(email.every((r) => r.newLeads === 0 && r.messagesIn === 0 && r.messagesOut === 0 && r.wonLeads === 0));
+  });
+});
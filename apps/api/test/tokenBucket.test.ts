@@ -0,0 +1,31 @@
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { takeToken, type TokenBucket } from '../src/services/tokenBucket.js';
+
+const rate = { perSecond: 1, burst: 2 };
+
+test('starts full, then waits for the refill', () => {
+  const buckets = new Map<string, TokenBucket>();
+  assert.equal(takeToken(buckets, 'wa:1', rate, 0), 0);
+  assert.equal(takeToken(buckets, 'wa:1', rate, 0), 0);
+  assert.equal(takeToken(buckets, 'wa:1', rate, 0), 1000);
+  assert.equal(takeToken(buckets, 'wa:1', rate, 500), 500);
+  assert.equal(takeToken(buckets, 'wa:1', rate, 1000), 0);
+  assert.equal(takeToken(buckets, 'wa:1', rate, 1000), 1000);
+});
+
+test('keys are paced independently', () => {
+  const buckets = new Map<string, TokenBucket>();
+  const single = { perSecond: 1, burst: 1 };
+  assert.equal(takeToken(buckets, 'wa:1', single, 0), 0);
+  assert.equal(takeToken(buckets, 'wa:1', single, 0), 1000);
+  assert.equal(takeToken(buckets, 'smtp:1', single, 0), 0);
+});
+
+test('refill is capped at burst', () => {
+  const buckets = new Map<string, TokenBucket>();
+  takeToken(buckets, 'wa:1', rate, 0);
+  assert.equal(takeToken(buckets, 'wa:1', rate, 60_000), 0);
+  assert.equal(takeToken(buckets, 'wa:1', rate, 60_000), 0);
+  assert.equal(takeToken(buckets, 'wa:1', rate, 60_000), 1000);
+});
@@ -32,6 +32,7 @@ import {
   getSuccessAnalytics,
   getAiConfig,
   getLead,
+  getLeadTimeline,
   // getLeadNotes,
   // addLeadNote,
   // getLeadCalls,
@@ -60,6 +61,7 @@ import {
   type Notification,
   // type TriageStatusFilter,  // Unused in new Triage2025
   type SessionUser,
+  type TimelineItem,
   updateAiConfig,
   createSalesman,
   updateSalesman,
@@ -949,8 +951,7 @@ function LeadsPageOld({ onError }: { onError: (m: string) => void }) {
                 const file = e.target?.files?.[0]
                 if (!file) return
                 try {
-                  const text = await file.text()
-                  const result = await importLeadsCsv(text)
+                  const result = await importLeadsCsv(file)
                   onError(`Imported: ${result.created} created, ${result.skipped} skipped`)
                   refresh()
                 } catch (err) {
@@ -1172,28 +1173,54 @@ function LeadDetailPage({ onError, onInfo }: { onError: (m: string) => void; onI
   const params = useParams()
   const leadId = params.id ?? ''
   const [lead, setLead] = useState<any | null>(null)
+  const [timeline, setTimeline] = useState<TimelineItem[]>([])
+  const [olderCursor, setOlderCursor] = useState<string | null>(null)
 
   async function refresh() {
     try {
-      const out = await getLead(leadId)
+      const [out, page] = await Promise.all([
+        getLead(leadId),
+        getLeadTimeline(leadId, { kinds: ['message', 'event'] })
+      ])
       setLead(out.lead)
+      setTimeline(page.items)
+      setOlderCursor(page.olderCursor)
     } catch (e) {
       onError(e instanceof Error ? e.message : 'Failed')
     }
   }
 
+  async function loadOlder() {
+    if (!olderCursor) return
+    try {
+      const page = await getLeadTimeline(leadId, { kinds: ['message', 'event'], before: olderCursor })
+      setTimeline((items) => [...page.items, ...items])
+      setOlderCursor(page.olderCursor)
+    } catch (e) {
+      onError(e instanceof Error ? e.message : 'Failed')
+    }
+  }
+
+  const detail = useMemo(() => {
+    if (!lead) return null
+    const pick = (kind: TimelineItem['kind']) =>
+      timeline.filter((i) => i.kind === kind).map((i) => ({ id: i.id, createdAt: i.createdAt, ...i.data }))
+    return { ...lead, messages: pick('message'), events: pick('event') }
+  }, [lead, timeline])
+
   useEffect(() => {
     refresh()
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [leadId])
 
-  if (!lead) return <div style={{ padding: 12 }}>Loading…</div>
+  if (!detail) return <div style={{ padding: 12 }}>Loading…</div>
 
   // Use modern LeadDetail2025 component
   return (
     <LeadDetail2025
-      lead={lead}
+      lead={detail}
       onRefresh={refresh}
+      onLoadOlder={olderCursor ? loadOlder : undefined}
       onSendMessage={async (content: string) => {
         try {
           await sendLeadMessage(leadId, 'WHATSAPP', content)
@@ -1587,6 +1614,7 @@ function ActivityFeedPage({ onError, onInfo }: { onError: (m: string) => void; o
   const [feed, setFeed] = useState<any[]>([])
   const [loading, setLoading] = useState(true)
   const [limit, setLimit] = useState(50)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
 
   const load = async () => {
     setLoading(true)
@@ -1594,6 +1622,7 @@ function ActivityFeedPage({ onError, onInfo }: { onError: (m: string) => void; o
       const { getActivityFeed } = await import('./lib/api')
       const data = await getActivityFeed(limit)
       setFeed(data.feed || [])
+      setNextCursor(data.nextCursor ?? null)
       if (data.feed && data.feed.length > 0) {
         onInfo(`Loaded ${data.feed.length} activities`)
       }
@@ -1604,6 +1633,21 @@ function ActivityFeedPage({ onError, onInfo }: { onError: (m: string) => void; o
     }
   }
 
+  const loadMore = async () => {
+    if (!nextCursor) return
+    setLoading(true)
+    try {
+      const { getActivityFeed } = await import('./lib/api')
+      const data = await getActivityFeed(limit, { cursor: nextCursor })
+      setFeed((items) => [...items, ...(data.feed || [])])
+      setNextCursor(data.nextCursor ?? null)
+    } catch (err) {
+      onError('Failed to load activity feed')
+    } finally {
+      setLoading(false)
+    }
+  }
+
   useEffect(() => {
     load()
     // eslint-disable-next-line react-hooks/exhaustive-deps
@@ -1620,6 +1664,7 @@ function ActivityFeedPage({ onError, onInfo }: { onError: (m: string) => void; o
       limit={limit}
       onLimitChange={handleLimitChange}
       onRefresh={load}
+      onLoadMore={nextCursor ? loadMore : undefined}
     />
   )
 }
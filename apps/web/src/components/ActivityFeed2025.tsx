@@ -1,6 +1,7 @@
 import { Calendar, FileText, Phone, CheckCircle, Activity, RefreshCw } from 'lucide-react'
 
 interface ActivityItem {
+  id?: string
   type: 'event' | 'note' | 'call' | 'task' | string
   time: string
   data: {
@@ -22,9 +23,11 @@ interface ActivityFeed2025Props {
   limit: number
   onLimitChange: (limit: number) => void
   onRefresh: () => void
+  // Set when older activity exists.
+  onLoadMore?: () => void
 }
 
-export function ActivityFeed2025({ feed, loading, limit, onLimitChange, onRefresh }: ActivityFeed2025Props) {
+export function ActivityFeed2025({ feed, loading, limit, onLimitChange, onRefresh, onLoadMore }: ActivityFeed2025Props) {
   const getIcon = (type: string) => {
     switch (type) {
       case 'event': return Calendar
@@ -125,7 +128,7 @@ export function ActivityFeed2025({ feed, loading, limit, onLimitChange, onRefres
 
               return (
                 <div
-                  key={idx}
+                  key={item.id ?? idx}
                   className="group bg-white/90 backdrop-blur-md border border-slate-200 rounded-2xl p-5 hover:shadow-soft-lg transition-all duration-300 animate-fade-in"
                   style={{ animationDelay: `${idx * 30}ms` }}
                 >
@@ -210,12 +213,16 @@ export function ActivityFeed2025({ feed, loading, limit, onLimitChange, onRefres
           </div>
         )}
 
-        {/* Load More Hint */}
-        {feed.length >= limit && (
+        {/* Load More */}
+        {onLoadMore && feed.length > 0 && (
           <div className="mt-6 text-center">
-            <p className="text-slate-500 text-sm">
-              Showing {feed.length} activities. Select a higher limit to see more.
-            </p>
+            <button
+              onClick={onLoadMore}
+              disabled={loading}
+              className="px-6 py-2 bg-white/80 border border-slate-200 rounded-xl text-sm font-medium text-slate-700 hover:bg-white transition-all disabled:opacity-50 disabled:cursor-not-allowed"
+            >
+              {loading ? 'Loading...' : 'Load older activity'}
+            </button>
           </div>
         )}
       </div>
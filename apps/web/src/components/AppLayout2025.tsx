@@ -1,6 +1,7 @@
-import { useState } from 'react'
+import { useEffect, useState } from 'react'
 import { Link, useLocation, useNavigate } from 'react-router-dom'
 import { Menu, X, Settings, Bell, Search, LogOut, User } from 'lucide-react'
+import { subscribeNotifications } from '../lib/api'
 
 interface AppLayout2025Props {
   children: React.ReactNode
@@ -16,9 +17,16 @@ export function AppLayout2025({ children, user, onLogout }: AppLayout2025Props)
   const [mobileMenuOpen, setMobileMenuOpen] = useState(false)
   const [userMenuOpen, setUserMenuOpen] = useState(false)
   const [moreMenuOpen, setMoreMenuOpen] = useState(false)
+  const [unreadCount, setUnreadCount] = useState(0)
   const location = useLocation()
   const navigate = useNavigate()
 
+  // The server pushes the unread count on connect and whenever it changes.
+  useEffect(() => {
+    if (!user) return
+    return subscribeNotifications({ onUnreadCount: setUnreadCount })
+  }, [user])
+
   const navItems = [
     { to: '/', label: 'Dashboard' },
     { to: '/leads', label: 'Leads' },
@@ -114,7 +122,11 @@ export function AppLayout2025({ children, user, onLogout }: AppLayout2025Props)
               </button>
               <button className="w-10 h-10 rounded-xl bg-white/50 flex items-center justify-center hover:bg-white transition-colors relative">
                 <Bell className="w-5 h-5 text-slate-600" />
-                <span className="absolute top-1 right-1 w-2 h-2 bg-lemon-500 rounded-full" />
+                {unreadCount > 0 && (
+                  <span className="absolute -top-1 -right-1 min-w-[18px] h-[18px] px-1 bg-lemon-500 text-white text-[10px] font-bold rounded-full flex items-center justify-center">
+                    {unreadCount > 99 ? '99+' : unreadCount}
+                  </span>
+                )}
               </button>
 
               {/* User Menu */}
@@ -1,6 +1,6 @@
 import { useEffect, useState } from 'react'
 import { Inbox, Send, Sparkles } from 'lucide-react'
-import { ingestMessage, listBots } from '../lib/api'
+import { ingestMessage, listBots, waitForIngestJob } from '../lib/api'
 
 type Channel =
   | 'MANUAL'
@@ -63,7 +63,10 @@ export function Ingest2025({
         phone: phone || undefined,
         customerMessage: message
       })
-      onInfo(`Ingested. Lead: ${out.leadId}`)
+      const job = await waitForIngestJob(out.jobId)
+      if (job.status === 'DONE') onInfo(`Ingested. Lead: ${job.result?.leadId ?? '-'}`)
+      else if (job.status === 'DEAD') onError(`Ingest failed: ${job.lastError ?? 'unknown error'}`)
+      else onInfo(`Queued (job ${out.jobId}, ${job.status.toLowerCase()})`)
     } catch (e) {
       onError(e instanceof Error ? e.message : 'Failed')
     } finally {
@@ -23,6 +23,8 @@ interface Lead {
     body: string
     channel: string
     createdAt: string
+    // Outbound delivery: QUEUED | SENDING | SENT | FAILED
+    status?: string | null
   }>
   events?: Array<{
     id: string
@@ -35,6 +37,8 @@ interface Lead {
 interface LeadDetail2025Props {
   lead: Lead
   onRefresh: () => void
+  // Set when older conversation history exists.
+  onLoadOlder?: () => void
   onSendMessage?: (content: string) => void
   onUpdateStatus?: (status: string) => void
 }
@@ -57,7 +61,7 @@ const heatConfig: Record<string, { gradient: string; label: string }> = {
   'COLD': { gradient: 'from-slate-400 to-slate-500', label: '❄️ Cold' },
 }
 
-export function LeadDetail2025({ lead, onRefresh, onSendMessage, onUpdateStatus: _onUpdateStatus }: LeadDetail2025Props) {
+export function LeadDetail2025({ lead, onRefresh, onLoadOlder, onSendMessage, onUpdateStatus: _onUpdateStatus }: LeadDetail2025Props) {
   const navigate = useNavigate()
   const [messageText, setMessageText] = useState('')
   const [showMessageBox, setShowMessageBox] = useState(false)
@@ -253,6 +257,17 @@ export function LeadDetail2025({ lead, onRefresh, onSendMessage, onUpdateStatus:
               <MessageSquare className="w-6 h-6 text-mint-500" />
               Conversation
             </h2>
+
+            {onLoadOlder && (
+              <div className="text-center mb-3">
+                <button
+                  onClick={onLoadOlder}
+                  className="px-4 py-2 rounded-lg bg-slate-100 text-slate-700 text-sm font-medium hover:bg-slate-200 transition-colors"
+                >
+                  Load earlier activity
+                </button>
+              </div>
+            )}
             
             {lead.messages && lead.messages.length > 0 ? (
               <div className="space-y-3">
@@ -275,6 +290,8 @@ export function LeadDetail2025({ lead, onRefresh, onSendMessage, onUpdateStatus:
                         }`}
                       >
                         {formatDate(message.createdAt)} • {message.channel}
+                        {message.status === 'FAILED' && ' • Not delivered'}
+                        {(message.status === 'QUEUED' || message.status === 'SENDING') && ' • Sending…'}
                       </div>
                     </div>
                   </div>
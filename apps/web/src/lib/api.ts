@@ -48,8 +48,8 @@ function baseUrl(): string {
   return import.meta.env.DEV ? 'http://localhost:4000' : '/api'
 }
 
-async function request<T>(path: string, init?: RequestInit): Promise<T> {
-  const headers = new Headers(init?.headers)
+function authHeaders(init?: HeadersInit): Headers {
+  const headers = new Headers(init)
 
   if (authMode() === 'dev_headers') {
     const auth = loadDevAuth()
@@ -61,6 +61,12 @@ async function request<T>(path: string, init?: RequestInit): Promise<T> {
     if (tenantId) headers.set('x-tenant-id', tenantId)
   }
 
+  return headers
+}
+
+async function request<T>(path: string, init?: RequestInit): Promise<T> {
+  const headers = authHeaders(init?.headers)
+
   if (!headers.has('content-type')) headers.set('content-type', 'application/json')
 
   const res = await fetch(`${baseUrl()}${path}`, { ...init, headers, credentials: 'include' })
@@ -128,6 +134,72 @@ export async function markAllNotificationsRead() {
   return request<{ ok: true }>('/notifications/read-all', { method: 'POST', body: '{}' })
 }
 
+// Push channel (server-sent events). Read with fetch rather than EventSource so the dev
+// auth headers go along. Reconnects with backoff until the returned function is called.
+export function subscribeNotifications(handlers: {
+  onNotification?: (notification: Notification) => void
+  onUnreadCount?: (count: number) => void
+}): () => void {
+  let stopped = false
+  let controller: AbortController | null = null
+  let retryMs = 1000
+
+  const dispatch = (event: string, data: string) => {
+    try {
+      if (event === 'notification') handlers.onNotification?.(JSON.parse(data) as Notification)
+      else if (event === 'unread') handlers.onUnreadCount?.((JSON.parse(data) as { count: number }).count)
+    } catch {
+      // Ignore malformed frames.
+    }
+  }
+
+  const connect = async () => {
+    while (!stopped) {
+      controller = new AbortController()
+      try {
+        const res = await fetch(`${baseUrl()}/notifications/stream`, {
+          headers: authHeaders({ accept: 'text/event-stream' }),
+          credentials: 'include',
+          signal: controller.signal
+        })
+        if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`)
+        retryMs = 1000
+
+        const reader = res.body.pipeThrough(new TextDecoderStream()).getReader()
+        let buffer = ''
+        for (;;) {
+          const { value, done } = await reader.read()
+          if (done) break
+          buffer += value
+          let end: number
+          while ((end = buffer.indexOf('\n\n')) >= 0) {
+            const frame = buffer.slice(0, end)
+            buffer = buffer.slice(end + 2)
+            let event = 'message'
+            const data: string[] = []
+            for (const line of frame.split('\n')) {
+              if (line.startsWith('event:')) event = line.slice(6).trim()
+              else if (line.startsWith('data:')) data.push(line.slice(5).trimStart())
+            }
+            if (data.length > 0) dispatch(event, data.join('\n'))
+          }
+        }
+      } catch {
+        // Fall through to the reconnect delay.
+      }
+      if (stopped) return
+      await new Promise((resolve) => setTimeout(resolve, retryMs))
+      retryMs = Math.min(retryMs * 2, 30000)
+    }
+  }
+
+  void connect()
+  return () => {
+    stopped = true
+    controller?.abort()
+  }
+}
+
 export type Lead = {
   id: string
   channel: string
@@ -229,17 +301,65 @@ export async function exportLeadsCsv() {
   window.URL.revokeObjectURL(downloadUrl)
 }
 
-export async function importLeadsCsv(csvData: string) {
-  return request<{ ok: boolean; created: number; skipped: number; errors: string[] }>('/leads/import/csv', {
+export async function startLeadsCsvImport(file: Blob) {
+  return request<{ ok: true; jobId: string }>('/leads/import/csv', {
     method: 'POST',
-    body: JSON.stringify({ csvData })
+    headers: { 'content-type': 'text/csv' },
+    body: file
   })
 }
 
+export async function importLeadsCsv(file: Blob, opts?: { onProgress?: (job: BackgroundJob) => void }) {
+  const { jobId } = await startLeadsCsvImport(file)
+  const job = await waitForBackgroundJob(jobId, opts)
+  if (job.status === 'FAILED') throw new Error(job.error ?? 'Import failed')
+  const result = job.result ?? {}
+  return {
+    ok: true as const,
+    created: result.created ?? 0,
+    skipped: (result.skipped ?? 0) + (result.duplicates ?? 0) + (result.failed ?? 0),
+    duplicates: result.duplicates ?? 0,
+    errors: ((result.errors ?? []) as Array<{ row: number; error: string }>).map((e) => `Row ${e.row}: ${e.error}`)
+  }
+}
+
 export async function getLead(id: string) {
   return request<{ lead: any }>(`/leads/${id}`)
 }
 
+export type TimelineKind = 'message' | 'event' | 'note' | 'call' | 'task'
+
+export type TimelineItem = {
+  kind: TimelineKind
+  id: string
+  createdAt: string
+  data: any
+}
+
+export type LeadTimelinePage = {
+  items: TimelineItem[]
+  olderCursor: string | null
+  newerCursor: string | null
+  hasOlder: boolean
+  hasNewer: boolean
+}
+
+// Items come oldest first. Pass `olderCursor` as `before` for earlier history,
+// `newerCursor` as `after` for anything new.
+export async function getLeadTimeline(
+  id: string,
+  params?: { before?: string; after?: string; limit?: number; kinds?: TimelineKind[]; includePayload?: boolean }
+) {
+  const query = new URLSearchParams()
+  if (params?.before) query.set('before', params.before)
+  if (params?.after) query.set('after', params.after)
+  if (params?.limit) query.set('limit', String(params.limit))
+  if (params?.kinds?.length) query.set('kinds', params.kinds.join(','))
+  if (params?.includePayload) query.set('includePayload', '1')
+  const suffix = query.toString() ? `?${query.toString()}` : ''
+  return request<LeadTimelinePage>(`/leads/${id}/timeline${suffix}`)
+}
+
 export async function deleteLead(id: string) {
   return request<{ ok: true; deletedLeadId: string }>(`/leads/${id}`, {
     method: 'DELETE'
@@ -477,23 +597,74 @@ export async function recalculateLeadScore(leadId: string) {
   })
 }
 
-export async function bulkRecalculateScores() {
-  return request<{ ok: true; totalLeads: number; updated: number }>('/leads/bulk/recalculate-scores', {
+export type BackgroundJob = {
+  id: string
+  type: string
+  status: 'PENDING' | 'RUNNING' | 'SUCCEEDED' | 'FAILED'
+  total: number
+  processed: number
+  failed: number
+  result: any
+  error: string | null
+  startedAt: string | null
+  finishedAt: string | null
+  createdAt: string
+}
+
+export async function getBackgroundJob(id: string) {
+  return request<{ job: BackgroundJob }>(`/jobs/${id}`)
+}
+
+export async function waitForBackgroundJob(
+  id: string,
+  opts?: { intervalMs?: number; onProgress?: (job: BackgroundJob) => void }
+) {
+  const intervalMs = opts?.intervalMs ?? 1000
+  for (;;) {
+    const { job } = await getBackgroundJob(id)
+    opts?.onProgress?.(job)
+    if (job.status === 'SUCCEEDED' || job.status === 'FAILED') return job
+    await new Promise((resolve) => setTimeout(resolve, intervalMs))
+  }
+}
+
+export async function startBulkRecalculateScores() {
+  return request<{ ok: true; jobId: string; alreadyRunning: boolean }>('/leads/bulk/recalculate-scores', {
     method: 'POST',
     body: '{}'
   })
 }
 
+// Rescoring runs as a background job on the API; this waits for it to finish.
+export async function bulkRecalculateScores(opts?: { onProgress?: (job: BackgroundJob) => void }) {
+  const { jobId } = await startBulkRecalculateScores()
+  const job = await waitForBackgroundJob(jobId, opts)
+  if (job.status === 'FAILED') throw new Error(job.error ?? 'Score recalculation failed')
+  return { ok: true as const, totalLeads: job.total, updated: job.result?.updated ?? job.processed - job.failed }
+}
+
 // Activity Feed
-export async function getActivityFeed(limit?: number) {
-  const query = limit ? `?limit=${limit}` : ''
+// Newest first. Pass `nextCursor` back as `cursor` for older activity.
+export async function getActivityFeed(
+  limit?: number,
+  params?: { cursor?: string; leadId?: string; salesmanId?: string; types?: Array<'event' | 'note' | 'call' | 'task'> }
+) {
+  const query = new URLSearchParams()
+  if (limit) query.set('limit', String(limit))
+  if (params?.cursor) query.set('cursor', params.cursor)
+  if (params?.leadId) query.set('leadId', params.leadId)
+  if (params?.salesmanId) query.set('salesmanId', params.salesmanId)
+  if (params?.types?.length) query.set('types', params.types.join(','))
+  const suffix = query.toString() ? `?${query.toString()}` : ''
   return request<{
     feed: Array<{
+      id: string
       time: string
       type: string
       data: any
     }>
-  }>(`/activity-feed${query}`)
+    nextCursor: string | null
+  }>(`/activity-feed${suffix}`)
 }
 
 // Audit Logs
@@ -536,7 +707,7 @@ export async function updateMessageTemplate(id: string, payload: { name?: string
 }
 
 export async function sendLeadMessage(leadId: string, channel: string, content: string) {
-  return request<{ ok: true; message: { id: string; createdAt: string } }>(`/leads/${leadId}/send-message`, {
+  return request<{ ok: true; message: { id: string; createdAt: string; status: string | null } }>(`/leads/${leadId}/send-message`, {
     method: 'POST',
     body: JSON.stringify({ channel, content })
   })
@@ -602,7 +773,38 @@ export async function ingestMessage(payload: {
   email?: string
   customerMessage: string
 }) {
-  return request<any>('/ingest/message', { method: 'POST', body: JSON.stringify(payload) })
+  return request<{ ok: true; queued: true; jobId: string; duplicate: boolean }>('/ingest/message', {
+    method: 'POST',
+    body: JSON.stringify(payload)
+  })
+}
+
+export type IngestJob = {
+  id: string
+  source: string
+  status: 'PENDING' | 'PROCESSING' | 'DONE' | 'DEAD'
+  attempts: number
+  maxAttempts: number
+  runAt: string
+  lastError: string | null
+  result: { leadId?: string; escalated?: boolean } | null
+  createdAt: string
+  completedAt: string | null
+}
+
+export async function getIngestJob(id: string) {
+  return request<{ job: IngestJob }>(`/ingest/jobs/${id}`)
+}
+
+// Ingestion is asynchronous; poll the queued job until a worker finishes it.
+export async function waitForIngestJob(id: string, opts?: { timeoutMs?: number; intervalMs?: number }) {
+  const deadline = Date.now() + (opts?.timeoutMs ?? 30_000)
+  const intervalMs = opts?.intervalMs ?? 750
+  for (;;) {
+    const { job } = await getIngestJob(id)
+    if (job.status === 'DONE' || job.status === 'DEAD' || Date.now() >= deadline) return job
+    await new Promise((resolve) => setTimeout(resolve, intervalMs))
+  }
 }
 
 export async function listSuccessDefinitions() {
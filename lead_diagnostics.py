@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Bulk Lead Diagnostics
+Phones / emails from a file or stdin -> matching leads with their latest message,
+conversation, open triage items and SLA violations, as JSONL or CSV.
+
+The batch version of check_lead.py: inputs are normalized the same way as
+phoneKey()/emailKey() in apps/api/src/services/contactIdentity.ts and resolved with
+one `= ANY(%s)` query per chunk (default 10000) on Lead."phoneKey" / "emailKey", over a
+single connection. Rows stream through a server-side cursor, so memory stays flat
+however many leads match. Inputs with no lead are reported as `not_found`, unparseable
+ones as `invalid`.
+
+The key indexes are (tenantId, phoneKey) and (tenantId, emailKey): with --tenant the
+lookup is index seeks; without it each chunk is one pass over Lead. Pass --tenant
+for large inputs.
+
+  python lead_diagnostics.py missing.txt > report.jsonl
+  cat numbers.csv | python lead_diagnostics.py --tenant <tenantId> --format csv --country-code 91 > report.csv
+
+DATABASE_URL comes from --database-url, the environment, or --env-file
+(default: apps/api/.env, then the server path check_lead.py used).
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from datetime import date, datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import psycopg2
+
+DEFAULT_ENV_FILES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "apps", "api", ".env"),
+    "/opt/sak-ai-enquiry-handler/apps/api/.env",
+]
+
+FIELDS = [
+    "input", "match", "key",
+    "lead_id", "tenant_id", "full_name", "phone", "email", "channel", "status", "heat", "score",
+    "created_at", "last_activity_at", "assigned_to_salesman_id",
+    "message_count", "last_message_direction", "last_message_status", "last_message_at",
+    "last_message_error", "last_message_body",
+    "conversation_id", "conversation_status", "conversation_last_message_at",
+    "open_triage_items", "triage_reasons",
+    "sla_violations", "sla_open", "sla_breached", "sla_next_due_at",
+]
+
+# One row per matching lead. Each LATERAL uses an existing index:
+# Message(leadId, createdAt), Conversation(leadId), TriageQueueItem(leadId, status),
+# SlaViolation(tenantId, leadId).
+QUERY = '''
+    SELECT l."phoneKey", l."emailKey",
+           l.id, l."tenantId", l."fullName", l.phone, l.email, l.channel, l.status, l.heat, l.score,
+           l."createdAt", l."lastActivityAt", l."assignedToSalesmanId",
+           mc.n,
+           m.direction, m.status, m."createdAt", m."lastError", left(m.body, %(body_chars)s),
+           c.id, c.status, c."lastMessageAt",
+           t.open_items, t.reasons,
+           s.total, s.open, s.breached, s.next_due
+    FROM "Lead" l
+    LEFT JOIN LATERAL (
+        SELECT count(*) AS n FROM "Message" WHERE "leadId" = l.id
+    ) mc ON true
+    LEFT JOIN LATERAL (
+        SELECT direction, status, "createdAt", "lastError", body
+        FROM "Message"
+        WHERE "leadId" = l.id
+        ORDER BY "createdAt" DESC
+        LIMIT 1
+    ) m ON true
+    LEFT JOIN "Conversation" c ON c."leadId" = l.id
+    LEFT JOIN LATERAL (
+        SELECT count(*) AS open_items, string_agg(DISTINCT reason, '; ') AS reasons
+        FROM "TriageQueueItem"
+        WHERE "leadId" = l.id AND status <> 'CLOSED'
+    ) t ON true
+    LEFT JOIN LATERAL (
+        SELECT count(*) AS total,
+               count(*) FILTER (WHERE status IN ('PENDING', 'ESCALATED')) AS open,
+               count(*) FILTER (WHERE status = 'BREACHED' OR "breachMinutes" > 0) AS breached,
+               min("dueAt") FILTER (WHERE status IN ('PENDING', 'ESCALATED')) AS next_due
+        FROM "SlaViolation"
+        WHERE "tenantId" = l."tenantId" AND "leadId" = l.id
+    ) s ON true
+    WHERE (l."phoneKey" = ANY(%(phones)s) OR l."emailKey" = ANY(%(emails)s))
+      AND (%(tenant)s::text IS NULL OR l."tenantId" = %(tenant)s)
+    ORDER BY l."createdAt" DESC
+'''
+
+
+def phone_key(raw, country_code=None):
+    # Same rule as contact_phone_key(): digits only, international 00 dropped, >= 7 digits.
+    digits = re.sub(r"[^0-9]", "", raw)
+    digits = re.sub(r"^00", "", digits)
+    if country_code and len(digits) == 10 and not raw.strip().startswith(("+", "00")):
+        digits = country_code + digits
+    return f"+{digits}" if len(digits) >= 7 else None
+
+
+def email_key(raw):
+    # Spaces only, like btrim() in contact_email_key().
+    email = raw.strip(" ").lower()
+    return email if email.find("@") > 0 else None
+
+
+def read_inputs(paths):
+    streams = [open(p, encoding="utf-8") for p in paths] if paths else [sys.stdin]
+    for stream in streams:
+        with stream:
+            for line in stream:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                # Also accepts one-column CSV and comma/semicolon separated lists.
+                for value in re.split(r"[,;\t]", line):
+                    value = value.strip().strip('"').strip()
+                    if value:
+                        yield value
+
+
+def load_database_url(args):
+    if args.database_url:
+        return args.database_url
+    if os.environ.get("DATABASE_URL"):
+        return os.environ["DATABASE_URL"]
+    for env_path in [args.env_file] if args.env_file else DEFAULT_ENV_FILES:
+        if not os.path.exists(env_path):
+            continue
+        with open(env_path) as f:
+            for line in f:
+                if line.startswith("DATABASE_URL="):
+                    return line.strip().split("=", 1)[1].strip().strip('"').strip("'")
+    raise SystemExit("❌ DATABASE_URL not set (use --database-url, the environment or --env-file)")
+
+
+def connect(db_url):
+    # Prisma URLs carry ?schema=...; libpq rejects it, so turn it into a search_path.
+    parts = urlsplit(db_url)
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    schema = next((v for k, v in params if k == "schema"), None)
+    query = urlencode([(k, v) for k, v in params if k not in ("schema", "connection_limit", "pool_timeout", "pgbouncer")])
+    conn = psycopg2.connect(urlunsplit(parts._replace(query=query)))
+    if schema:
+        with conn.cursor() as cur:
+            cur.execute("SELECT set_config('search_path', %s, false)", (schema,))
+        conn.commit()
+    conn.set_session(readonly=True)
+    return conn
+
+
+def to_cell(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class Writer:
+    def __init__(self, fmt, out):
+        self.fmt = fmt
+        self.out = out
+        if fmt == "csv":
+            self.csv = csv.DictWriter(out, fieldnames=FIELDS, extrasaction="ignore")
+            self.csv.writeheader()
+
+    def write(self, row):
+        row = {k: to_cell(row.get(k)) for k in FIELDS}
+        if self.fmt == "csv":
+            self.csv.writerow(row)
+        else:
+            self.out.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def diagnose(conn, writer, keys, args):
+    """Runs one query per chunk of keys; returns (set of matched keys, lead rows written)."""
+    phones = {k: raw for k, raw in keys.items() if k.startswith("+")}
+    emails = {k: raw for k, raw in keys.items() if not k.startswith("+")}
+    matched, leads = set(), 0
+
+    key_list = list(keys)
+    for start in range(0, len(key_list), args.chunk_size):
+        chunk = key_list[start:start + args.chunk_size]
+        params = {
+            "phones": [k for k in chunk if k in phones],
+            "emails": [k for k in chunk if k in emails],
+            "tenant": args.tenant,
+            "body_chars": args.body_chars,
+        }
+        # Named cursor = server-side; rows arrive itersize at a time.
+        with conn.cursor(name=f"lead_diagnostics_{start}") as cur:
+            cur.itersize = args.fetch_size
+            cur.execute(QUERY, params)
+            for r in cur:
+                phone, email = r[0], r[1]
+                key = phone if phone in phones else email
+                matched.update(k for k in (phone, email) if k in keys)
+                leads += 1
+                writer.write({
+                    "input": keys[key], "match": "found", "key": key,
+                    "lead_id": r[2], "tenant_id": r[3], "full_name": r[4], "phone": r[5], "email": r[6],
+                    "channel": r[7], "status": r[8], "heat": r[9], "score": r[10],
+                    "created_at": r[11], "last_activity_at": r[12], "assigned_to_salesman_id": r[13],
+                    "message_count": r[14],
+                    "last_message_direction": r[15], "last_message_status": r[16],
+                    "last_message_at": r[17], "last_message_error": r[18], "last_message_body": r[19],
+                    "conversation_id": r[20], "conversation_status": r[21], "conversation_last_message_at": r[22],
+                    "open_triage_items": r[23], "triage_reasons": r[24],
+                    "sla_violations": r[25], "sla_open": r[26], "sla_breached": r[27], "sla_next_due_at": r[28],
+                })
+        conn.commit()
+    return matched, leads
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Look up many phones/emails at once and report their leads")
+    parser.add_argument("files", nargs="*", help="input files, one phone or email per line (default: stdin)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl", help="output format (default jsonl)")
+    parser.add_argument("--output", "-o", help="write to this file instead of stdout")
+    parser.add_argument("--tenant", help="only leads of this tenantId (lets the lookup use the key indexes)")
+    parser.add_argument("--country-code", help="prefix for 10-digit numbers without a country code, e.g. 91")
+    parser.add_argument("--database-url", help="Postgres URL (default: $DATABASE_URL or --env-file)")
+    parser.add_argument("--env-file", help="read DATABASE_URL from this .env file")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="keys per query (default 10000)")
+    parser.add_argument("--fetch-size", type=int, default=2000, help="rows fetched per round trip (default 2000)")
+    parser.add_argument("--body-chars", type=int, default=200, help="characters of the last message body (default 200)")
+    args = parser.parse_args()
+    if args.chunk_size < 1 or args.fetch_size < 1 or args.body_chars < 0:
+        parser.error("--chunk-size and --fetch-size must be >= 1, --body-chars >= 0")
+    if args.country_code and not args.country_code.lstrip("+").isdigit():
+        parser.error("--country-code must be digits, e.g. 91")
+    if args.country_code:
+        args.country_code = args.country_code.lstrip("+")
+    return args
+
+
+def main():
+    args = parse_args()
+    started = time.perf_counter()
+
+    # key -> first raw input that produced it
+    keys, invalid, total = {}, [], 0
+    for raw in read_inputs(args.files):
+        total += 1
+        key = email_key(raw) if "@" in raw else phone_key(raw, args.country_code)
+        if key is None:
+            invalid.append(raw)
+        else:
+            keys.setdefault(key, raw)
+
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    writer = Writer(args.format, out)
+    try:
+        for raw in invalid:
+            writer.write({"input": raw, "match": "invalid"})
+
+        matched, leads = set(), 0
+        if keys:
+            conn = connect(load_database_url(args))
+            try:
+                matched, leads = diagnose(conn, writer, keys, args)
+            finally:
+                conn.close()
+
+        not_found = [k for k in keys if k not in matched]
+        for key in not_found:
+            writer.write({"input": keys[key], "match": "not_found", "key": key})
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\n📊 {total} input(s), {len(keys)} unique, {len(invalid)} invalid", file=sys.stderr)
+    print(f"✅ {len(matched)} matched ({leads} lead row(s))", file=sys.stderr)
+    print(f"❌ {len(not_found)} not found", file=sys.stderr)
+    print(f"⏱️  {elapsed:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Webhook Load Generator
+Virtual WhatsApp contacts -> signed message.received events -> /api/webhooks/sak
+
+Grown out of test-webhook.py / test_real_message.py / test_two_way_communication.py:
+the same payloads and HMAC signature, sent by an asyncio client at a controlled rate.
+
+Conversations arrive as a Poisson process (--rate per second) for --duration seconds.
+Each one picks a virtual contact and sends --messages messages, --think seconds apart.
+Arrivals don't wait for responses, so a slow API shows up as latency, not as a lower
+send rate.
+
+Payload shapes (--shape):
+  flat    from_number / text (what SAK sends; ingested by the API)
+  nested  data.from / data.message.text (acknowledged without ingest by the current handler)
+  mixed   both, alternating per contact
+
+The terminal summary goes to stderr and the JSON report to stdout (and --json-out).
+
+Stdlib only; runs offline against a local API:
+  python load_test_webhook.py --secret <SAK_WEBHOOK_SECRET> --session-id <SAK_SESSION_ID>
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from urllib.parse import urlsplit
+
+DEFAULT_URL = "http://localhost:4000/api/webhooks/sak"
+
+ENQUIRIES = [
+    "Hello! I need information about your products. Can you help me?",
+    "Need 2000 CFM kitchen exhaust fan with 2HP motor",
+    "What is the price for 50 units?",
+    "Can you share the catalog?",
+    "Is delivery available to Pune this week?",
+    "Please call me back about my order",
+]
+
+
+def build_payload(shape, session_id, phone, name, text):
+    if shape == "nested":
+        return {
+            "event": "message.received",
+            "sessionId": session_id,
+            "data": {
+                "from": phone,
+                "name": name,
+                "message": {
+                    "text": text,
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+                }
+            }
+        }
+    return {
+        "event": "message.received",
+        "sessionId": session_id,
+        "from_number": phone,
+        "text": text,
+        "pushName": name,
+        "messageId": f"load-{uuid.uuid4().hex}",
+        "timestamp": int(time.time())
+    }
+
+
+def sign(secret, body):
+    # Same HMAC the API checks: sha256 over the exact bytes sent.
+    return hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+class HttpPool:
+    """Minimal HTTP/1.1 keep-alive client over asyncio streams (no third-party deps)."""
+
+    def __init__(self, url, size, timeout):
+        parts = urlsplit(url)
+        if parts.scheme != "http":
+            raise SystemExit("Only plain http:// targets are supported (run against a local API)")
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 80
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(size)
+        self.idle = []
+
+    async def post(self, body, headers):
+        async with self.slots:
+            conn = self.idle.pop() if self.idle else None
+            if conn is not None:
+                try:
+                    return await self._send(conn, body, headers)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    # The server closed an idle keep-alive connection; retry on a fresh one.
+                    pass
+            conn = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+            return await self._send(conn, body, headers)
+
+    async def _send(self, conn, body, headers):
+        try:
+            status, keep_alive = await asyncio.wait_for(self._exchange(conn, body, headers), self.timeout)
+        except BaseException:
+            conn[1].close()
+            raise
+        if keep_alive:
+            self.idle.append(conn)
+        else:
+            conn[1].close()
+        return status
+
+    async def _exchange(self, conn, body, headers):
+        reader, writer = conn
+        head = [
+            f"POST {self.path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            "Connection: keep-alive",
+        ]
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by server")
+        status = int(status_line.split()[1])
+        length, chunked, keep_alive = 0, False, True
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            key, value = key.strip().lower(), value.strip().lower()
+            if key == "content-length":
+                length = int(value)
+            elif key == "transfer-encoding" and "chunked" in value:
+                chunked = True
+            elif key == "connection" and value == "close":
+                keep_alive = False
+
+        if chunked:
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif length:
+            await reader.readexactly(length)
+        return status, keep_alive
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.by_shape = {}
+        self.outcomes = Counter()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, shape, outcome, latency):
+        self.outcomes[outcome] += 1
+        shape_stats = self.by_shape.setdefault(shape, {"latencies": [], "outcomes": Counter()})
+        shape_stats["outcomes"][outcome] += 1
+        if outcome.startswith("2"):
+            self.latencies.append(latency)
+            shape_stats["latencies"].append(latency)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def summarize(latencies, outcomes):
+    total = sum(outcomes.values())
+    ok = sum(n for outcome, n in outcomes.items() if outcome.startswith("2"))
+    ms = [l * 1000 for l in latencies]
+    return {
+        "requests": total,
+        "ok": ok,
+        "errors": total - ok,
+        "error_rate": round((total - ok) / total, 4) if total else 0.0,
+        "outcomes": dict(sorted(outcomes.items())),
+        "latency_ms": {
+            "p50": round(percentile(ms, 50), 2) if ms else None,
+            "p95": round(percentile(ms, 95), 2) if ms else None,
+            "p99": round(percentile(ms, 99), 2) if ms else None,
+            "mean": round(sum(ms) / len(ms), 2) if ms else None,
+            "max": round(max(ms), 2) if ms else None,
+        },
+    }
+
+
+def build_report(stats, args):
+    elapsed = (stats.finished or time.perf_counter()) - stats.started
+    report = summarize(stats.latencies, stats.outcomes)
+    report["elapsed_s"] = round(elapsed, 3)
+    report["throughput_rps"] = round(report["ok"] / elapsed, 2) if elapsed > 0 else 0.0
+    report["by_shape"] = {
+        shape: summarize(s["latencies"], s["outcomes"]) for shape, s in sorted(stats.by_shape.items())
+    }
+    report["config"] = {
+        "url": args.url,
+        "contacts": args.contacts,
+        "rate": args.rate,
+        "duration_s": args.duration,
+        "messages": args.messages,
+        "think_s": args.think,
+        "shape": args.shape,
+        "connections": args.connections,
+    }
+    return report
+
+
+def print_histogram(latencies, width=50):
+    if not latencies:
+        print("No successful requests to chart.", file=sys.stderr)
+        return
+    # Log-spaced buckets from 1ms up to the slowest request.
+    ms = [max(l * 1000, 0.001) for l in latencies]
+    edges = [1.0]
+    while edges[-1] < max(ms):
+        edges.append(edges[-1] * 2)
+    counts = [0] * len(edges)
+    for value in ms:
+        counts[min(len(edges) - 1, max(0, math.ceil(math.log2(value))))] += 1
+    peak = max(counts)
+    print("\nLatency histogram (ms, successful requests):", file=sys.stderr)
+    for edge, count in zip(edges, counts):
+        bar = "█" * (round(count / peak * width) if count else 0)
+        print(f"  <= {edge:>8.0f} | {bar:<{width}} {count}", file=sys.stderr)
+
+
+async def conversation(pool, stats, args, contact, rng):
+    phone, name, shape = contact
+    for i in range(args.messages):
+        if i and args.think:
+            await asyncio.sleep(rng.expovariate(1 / args.think))
+        text = f"{rng.choice(ENQUIRIES)} (#{i + 1})"
+        body = json.dumps(build_payload(shape, args.session_id, phone, name, text)).encode("utf-8")
+        headers = {"x-webhook-signature": f"sha256={sign(args.secret, body)}"}
+
+        started = time.perf_counter()
+        try:
+            status = await pool.post(body, headers)
+            outcome = str(status)
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+        except (ConnectionError, OSError):
+            outcome = "connection_error"
+        except Exception as e:
+            outcome = type(e).__name__
+        stats.record(shape, outcome, time.perf_counter() - started)
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    shapes = {"flat": ["flat"], "nested": ["nested"], "mixed": ["flat", "nested"]}[args.shape]
+    contacts = [
+        (f"{args.phone_prefix}{i:06d}", f"Load Contact {i}", shapes[i % len(shapes)])
+        for i in range(args.contacts)
+    ]
+
+    pool = HttpPool(args.url, args.connections, args.timeout)
+    stats = Stats()
+    tasks = set()
+    deadline = time.perf_counter() + args.duration
+    next_arrival = time.perf_counter()
+    last_progress = 0.0
+
+    try:
+        while True:
+            next_arrival += rng.expovariate(args.rate)
+            if next_arrival >= deadline:
+                break
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            task = asyncio.create_task(conversation(pool, stats, args, rng.choice(contacts), rng))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+            now = time.perf_counter()
+            if not args.quiet and now - last_progress >= 1:
+                last_progress = now
+                done = sum(stats.outcomes.values())
+                print(f"\r⏱️  {now - stats.started:6.1f}s  sent {done}  in-flight conversations {len(tasks)}", end="", file=sys.stderr)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        stats.finished = time.perf_counter()
+        pool.close()
+        if not args.quiet:
+            print(file=sys.stderr)
+    return stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test /api/webhooks/sak with signed message.received events")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"webhook URL (default {DEFAULT_URL})")
+    parser.add_argument("--secret", required=True, help="session webhook secret used for x-webhook-signature")
+    parser.add_argument("--session-id", required=True, help="SAK sessionId registered with the API")
+    parser.add_argument("--contacts", type=int, default=100, help="virtual WhatsApp contacts (default 100)")
+    parser.add_argument("--rate", type=float, default=10.0, help="new conversations per second (default 10)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to keep starting conversations (default 30)")
+    parser.add_argument("--messages", type=int, default=3, help="messages per conversation (default 3)")
+    parser.add_argument("--think", type=float, default=1.0, help="mean seconds between a contact's messages (default 1)")
+    parser.add_argument("--shape", choices=["flat", "nested", "mixed"], default="flat", help="payload shape (default flat)")
+    parser.add_argument("--connections", type=int, default=50, help="max concurrent HTTP connections (default 50)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout in seconds (default 10)")
+    parser.add_argument("--phone-prefix", default="91990", help="prefix for virtual contact numbers (default 91990)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for repeatable runs")
+    parser.add_argument("--json-out", help="also write the JSON report to this file")
+    parser.add_argument("--quiet", action="store_true", help="no progress line or histogram; JSON only")
+    args = parser.parse_args()
+    if args.contacts < 1 or args.messages < 1 or args.connections < 1 or args.rate <= 0 or args.duration <= 0:
+        parser.error("--contacts, --messages, --connections, --rate and --duration must be positive")
+    return args
+
+
+def main():
+    args = parse_args()
+    if not args.quiet:
+        print("=" * 70, file=sys.stderr)
+        print("🚀 Webhook load test", file=sys.stderr)
+        print(f"   Target: {args.url}", file=sys.stderr)
+        print(f"   {args.contacts} contacts, {args.rate}/s conversations for {args.duration}s, "
+              f"{args.messages} messages each ({args.shape})", file=sys.stderr)
+        print("=" * 70, file=sys.stderr)
+
+    try:
+        stats = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("\n⚠️  Interrupted", file=sys.stderr)
+        return 130
+
+    report = build_report(stats, args)
+    if not args.quiet:
+        print_histogram(stats.latencies)
+        lat = {k: "-" if v is None else f"{v}ms" for k, v in report["latency_ms"].items()}
+        print(f"\n✅ {report['ok']}/{report['requests']} ok, error rate {report['error_rate']:.2%}, "
+              f"{report['throughput_rps']} req/s, p50 {lat['p50']} p95 {lat['p95']} p99 {lat['p99']}\n", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            f.write(output + "\n")
+    return 0 if report["requests"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
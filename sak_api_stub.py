@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Local SAK WhatsApp API stand-in
+Implements /auth/login, /sessions and /messages/send under /api/v1 so the CRM outbound
+path (services/whatsapp.ts, the Communicator's SakApiClient) and the test scripts can be
+pointed at it instead of the live gateway:
+
+  SAK_API_URL=http://localhost:4100/api/v1
+
+Knobs for benchmarking:
+  --latency-dist / --latency-ms / --latency-spread   response delay distribution
+  --rate-limit / --burst                             per-session token bucket; 429 + Retry-After
+  --error-rate                                       random 500/502/503 on sends
+  --webhook-url / --reply-rate / --inbound-rate      signed message.received callbacks
+
+Counters: GET /__stub/stats (per-session sends, 429s, injected errors, callbacks),
+POST /__stub/reset to zero them between runs.
+
+Stdlib only:
+  python sak_api_stub.py --session <sessionId>:<apiKey>:<webhookSecret> --webhook-url http://localhost:4000/api/webhooks/sak
+"""
+
+import argparse
+import hashlib
+import hmac
+import http.client
+import json
+import math
+import queue
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+API_PREFIX = "/api/v1"
+
+REPLIES = [
+    "Thanks, please send the price list",
+    "Can you share more details?",
+    "What is the delivery time?",
+    "OK, call me tomorrow",
+]
+
+
+class Session:
+    def __init__(self, session_id, api_key, webhook_secret, name=None):
+        self.id = session_id
+        self.api_key = api_key
+        self.webhook_secret = webhook_secret
+        self.name = name or f"Stub {session_id[:8]}"
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Returns 0 when a token was taken, else the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Stub:
+    def __init__(self, args, sessions):
+        self.args = args
+        self.sessions = {s.id: s for s in sessions}
+        self.by_api_key = {s.api_key: s for s in sessions}
+        self.users = dict(args.user or [])
+        self.tokens = {}
+        self.lock = threading.Lock()
+        self.rng = random.Random(args.seed)
+        self.buckets = {}
+        self.reset()
+
+        self.callbacks = queue.Queue()
+        self.webhook = urlsplit(args.webhook_url) if args.webhook_url else None
+        self.stopping = threading.Event()
+
+    def reset(self):
+        with self.lock:
+            self.counters = defaultdict(Counter)
+            self.callback_counters = Counter()
+            self.started = time.time()
+
+    def count(self, session_id, key, n=1):
+        with self.lock:
+            self.counters[session_id][key] += n
+
+    def delay(self):
+        a = self.args
+        with self.lock:
+            if a.latency_dist == "fixed":
+                ms = a.latency_ms
+            elif a.latency_dist == "uniform":
+                ms = self.rng.uniform(a.latency_ms - a.latency_spread, a.latency_ms + a.latency_spread)
+            elif a.latency_dist == "normal":
+                ms = self.rng.gauss(a.latency_ms, a.latency_spread)
+            elif a.latency_dist == "exponential":
+                ms = self.rng.expovariate(1 / a.latency_ms) if a.latency_ms > 0 else 0
+            else:
+                # lognormal: --latency-ms is the median, --latency-spread the sigma.
+                ms = a.latency_ms * math.exp(self.rng.gauss(0, a.latency_spread))
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    def rate_limited(self, session_id):
+        if not self.args.rate_limit:
+            return 0.0
+        with self.lock:
+            bucket = self.buckets.get(session_id)
+            if bucket is None:
+                bucket = self.buckets[session_id] = TokenBucket(self.args.rate_limit, self.args.burst)
+            return bucket.take()
+
+    def inject_error(self):
+        with self.lock:
+            if self.args.error_rate and self.rng.random() < self.args.error_rate:
+                return self.rng.choice([500, 502, 503])
+        return None
+
+    def maybe_reply(self, session, to):
+        if not self.webhook or not self.args.reply_rate:
+            return
+        with self.lock:
+            if self.rng.random() >= self.args.reply_rate:
+                return
+            text = self.rng.choice(REPLIES)
+        due = time.monotonic() + self.args.reply_delay_ms / 1000
+        self.callbacks.put((due, session, to, text, "Stub Contact"))
+
+    def stats(self):
+        with self.lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            sessions = {}
+            for session_id, c in sorted(self.counters.items()):
+                sessions[session_id] = dict(c)
+                sessions[session_id]["sent_per_second"] = round(c["sent"] / elapsed, 2)
+            return {
+                "elapsed_s": round(elapsed, 3),
+                "sessions": sessions,
+                "callbacks": dict(self.callback_counters),
+                "callback_queue": self.callbacks.qsize(),
+            }
+
+    # --- webhook callbacks -------------------------------------------------
+
+    def start_callbacks(self):
+        if not self.webhook:
+            return
+        for _ in range(self.args.callback_workers):
+            threading.Thread(target=self.callback_worker, daemon=True).start()
+        if self.args.inbound_rate:
+            threading.Thread(target=self.inbound_generator, daemon=True).start()
+
+    def inbound_generator(self):
+        """Spontaneous customer messages: Poisson arrivals per session."""
+        rng = random.Random(self.args.seed)
+        sessions = list(self.sessions.values())
+        while not self.stopping.is_set():
+            time.sleep(rng.expovariate(self.args.inbound_rate * len(sessions)))
+            session = rng.choice(sessions)
+            phone = f"{self.args.contact_prefix}{rng.randrange(self.args.contacts):06d}"
+            self.callbacks.put((0, session, phone, rng.choice(REPLIES), f"Stub Contact {phone[-6:]}"))
+
+    def callback_worker(self):
+        conn = None
+        while not self.stopping.is_set():
+            try:
+                due, session, phone, text, name = self.callbacks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            payload = {
+                "event": "message.received",
+                "sessionId": session.id,
+                "from_number": phone,
+                "text": text,
+                "pushName": name,
+                "messageId": f"stub-{uuid.uuid4().hex}",
+                "timestamp": int(time.time())
+            }
+            body = json.dumps(payload).encode("utf-8")
+            signature = hmac.new(session.webhook_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+            headers = {"Content-Type": "application/json", "x-webhook-signature": f"sha256={signature}"}
+
+            started = time.perf_counter()
+            try:
+                # One kept-alive connection per worker; reconnect once if the server dropped it.
+                for attempt in (1, 2):
+                    if conn is None:
+                        conn = http.client.HTTPConnection(self.webhook.hostname, self.webhook.port or 80, timeout=10)
+                    try:
+                        conn.request("POST", self.webhook.path or "/", body=body, headers=headers)
+                        response = conn.getresponse()
+                        response.read()
+                        break
+                    except (http.client.HTTPException, ConnectionError):
+                        conn.close()
+                        conn = None
+                        if attempt == 2:
+                            raise
+                outcome = "delivered" if 200 <= response.status < 300 else f"http_{response.status}"
+            except Exception:
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                outcome = "failed"
+            with self.lock:
+                self.callback_counters[outcome] += 1
+                self.callback_counters["latency_ms_total"] += round((time.perf_counter() - started) * 1000)
+            self.count(session.id, "callbacks")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stub = None
+
+    def log_message(self, format, *args):
+        if self.stub.args.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"{}")
+        except ValueError:
+            return None
+
+    def bearer_user(self):
+        auth = self.headers.get("Authorization", "")
+        token = auth[7:] if auth.lower().startswith("bearer ") else ""
+        return self.stub.tokens.get(token)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/__stub/stats":
+            self.send_json(200, self.stub.stats())
+        elif path == f"{API_PREFIX}/sessions":
+            self.stub.delay()
+            if not self.bearer_user():
+                self.send_json(401, {"success": False, "error": "Unauthorized"})
+                return
+            self.send_json(200, {"success": True, "data": [
+                {"id": s.id, "name": s.name, "status": "connected", "api_key": s.api_key}
+                for s in self.stub.sessions.values()
+            ]})
+        elif path in ("/health", f"{API_PREFIX}/health"):
+            self.send_json(200, {"ok": True})
+        else:
+            self.send_json(404, {"success": False, "error": "Not found"})
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        body = self.read_json()
+        if body is None:
+            self.send_json(400, {"success": False, "error": "Invalid JSON"})
+        elif path == "/__stub/reset":
+            self.stub.reset()
+            self.send_json(200, {"ok": True})
+        elif path == f"{API_PREFIX}/auth/login":
+            self.login(body)
+        elif path == f"{API_PREFIX}/messages/send":
+            self.send_message(body)
+        else:
+            self.send_json(404, {"success": False, "error": "Not found"})
+
+    def login(self, body):
+        self.stub.delay()
+        email, password = body.get("email"), body.get("password")
+        if not email or self.stub.users.get(email) != password:
+            self.send_json(401, {"success": False, "error": "Invalid credentials"})
+            return
+        token = secrets.token_hex(24)
+        self.stub.tokens[token] = email
+        self.send_json(200, {"success": True, "data": {"token": token, "user": {"email": email}}})
+
+    def send_message(self, body):
+        stub = self.stub
+        api_key = self.headers.get("x-api-key", "")
+        # Session-scoped keys identify the session; a user token can name one explicitly.
+        session_id = self.headers.get("x-session-id") or body.get("sessionId")
+        session = stub.sessions.get(session_id) if session_id else stub.by_api_key.get(api_key)
+        if not session or session.api_key != api_key:
+            stub.count(session_id or "unknown", "rejected_auth")
+            self.send_json(401, {"success": False, "error": "Invalid API key or session"})
+            return
+
+        stub.count(session.id, "requests")
+        retry_after = stub.rate_limited(session.id)
+        if retry_after:
+            stub.count(session.id, "rate_limited")
+            self.send_json(429, {"success": False, "error": "Rate limit exceeded"},
+                           {"Retry-After": str(max(1, math.ceil(retry_after)))})
+            return
+
+        stub.delay()
+        status = stub.inject_error()
+        if status:
+            stub.count(session.id, "injected_errors")
+            self.send_json(status, {"success": False, "error": "Injected failure"})
+            return
+
+        to = str(body.get("to") or "").lstrip("+")
+        text = body.get("text") or body.get("message")
+        if not to.isdigit() or not text:
+            stub.count(session.id, "invalid")
+            self.send_json(400, {"success": False, "error": "'to' (digits) and 'text' are required"})
+            return
+
+        message_id = f"stub-{uuid.uuid4().hex}"
+        stub.count(session.id, "sent")
+        stub.maybe_reply(session, to)
+        # Both shapes seen in callers: top-level messageId and data.messageId.
+        self.send_json(200, {"success": True, "messageId": message_id, "data": {"messageId": message_id, "to": to}})
+
+
+def parse_session(value):
+    parts = value.split(":")
+    if len(parts) != 3 or not all(parts):
+        raise argparse.ArgumentTypeError("expected <sessionId>:<apiKey>:<webhookSecret>")
+    return Session(*parts)
+
+
+def parse_user(value):
+    email, sep, password = value.partition(":")
+    if not sep or not email:
+        raise argparse.ArgumentTypeError("expected <email>:<password>")
+    return email, password
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local stand-in for the SAK WhatsApp API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4100)
+    parser.add_argument("--session", type=parse_session, action="append",
+                        help="<sessionId>:<apiKey>:<webhookSecret>; repeatable (default: one generated session)")
+    parser.add_argument("--user", type=parse_user, action="append",
+                        help="<email>:<password> accepted by /auth/login; repeatable (default test@example.com:test)")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "normal", "exponential", "lognormal"],
+                        default="lognormal", help="response delay distribution (default lognormal)")
+    parser.add_argument("--latency-ms", type=float, default=50.0,
+                        help="mean delay (median for lognormal) in ms (default 50)")
+    parser.add_argument("--latency-spread", type=float, default=0.5,
+                        help="ms half-width (uniform), ms stddev (normal) or sigma (lognormal) (default 0.5)")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="sends per second allowed per session; 0 disables (default 0)")
+    parser.add_argument("--burst", type=int, default=5, help="rate limit burst size (default 5)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of sends answered with 5xx (default 0)")
+    parser.add_argument("--webhook-url", help="CRM webhook for message.received callbacks, e.g. http://localhost:4000/api/webhooks/sak")
+    parser.add_argument("--reply-rate", type=float, default=0.0,
+                        help="probability a successful send gets a customer reply callback (default 0)")
+    parser.add_argument("--reply-delay-ms", type=float, default=500.0, help="delay before a reply callback (default 500)")
+    parser.add_argument("--inbound-rate", type=float, default=0.0,
+                        help="spontaneous inbound messages per second per session (default 0)")
+    parser.add_argument("--contacts", type=int, default=1000, help="virtual contacts for inbound messages (default 1000)")
+    parser.add_argument("--contact-prefix", default="91980", help="prefix for virtual contact numbers (default 91980)")
+    parser.add_argument("--callback-workers", type=int, default=8, help="concurrent callback senders (default 8)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for repeatable runs")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+    if not 0 <= args.error_rate <= 1 or not 0 <= args.reply_rate <= 1:
+        parser.error("--error-rate and --reply-rate must be between 0 and 1")
+    if args.rate_limit < 0 or args.inbound_rate < 0 or args.burst < 1 or args.callback_workers < 1 or args.contacts < 1:
+        parser.error("--rate-limit/--inbound-rate must be >= 0; --burst, --callback-workers and --contacts >= 1")
+    if args.latency_ms < 0:
+        parser.error("--latency-ms must be >= 0")
+    if not args.user:
+        args.user = [("test@example.com", "test")]
+    return args
+
+
+def main():
+    args = parse_args()
+    sessions = args.session or [Session(str(uuid.uuid4()), secrets.token_hex(32), secrets.token_hex(32))]
+    stub = Stub(args, sessions)
+    Handler.stub = stub
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+
+    print("=" * 70)
+    print("🧪 SAK API stand-in")
+    print(f"   SAK_API_URL=http://{args.host}:{args.port}{API_PREFIX}")
+    for s in sessions:
+        print(f"   Session {s.id}  api key {s.api_key}  webhook secret {s.webhook_secret}")
+    print(f"   Latency: {args.latency_dist} {args.latency_ms}ms (spread {args.latency_spread})")
+    if args.rate_limit:
+        print(f"   Rate limit: {args.rate_limit}/s per session, burst {args.burst}")
+    if args.error_rate:
+        print(f"   Injected 5xx: {args.error_rate:.1%} of sends")
+    if args.webhook_url:
+        print(f"   Callbacks -> {args.webhook_url} (reply rate {args.reply_rate}, inbound {args.inbound_rate}/s per session)")
+    print(f"   Stats: http://{args.host}:{args.port}/__stub/stats")
+    print("=" * 70)
+
+    stub.start_callbacks()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.stopping.set()
+        server.server_close()
+        print("\n📊 Final counters:")
+        print(json.dumps(stub.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -49,7 +49,7 @@ print("\n2️⃣ Finding lead by phone number...")
 try:
     leads_response = requests.get(
         f"{API_URL}/api/leads",
-        params={"limit": 100},
+        params={"search": PHONE, "limit": 20},
         timeout=10
     )
     
@@ -18,7 +18,8 @@ print(f"\n🔍 Step 1: Search for lead with phone containing '{phone}'...")
 try:
     # Try to find lead via different methods
     response = requests.get(
-        "http://localhost:4000/api/leads?limit=100",
+        "http://localhost:4000/api/leads",
+        params={"search": phone, "limit": 20},
         timeout=10
     )
     